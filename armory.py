@@ -174,17 +174,13 @@ class ArmoryAddonPreferences(AddonPreferences):
     khamake_threads: IntProperty(name='Khamake Processes', description='Allow Khamake to spawn multiple processes for faster builds', default=4, min=1)
     khamake_threads_use_auto: BoolProperty(name='Auto', description='Let Khamake choose the number of processes automatically', default=False)
     compilation_server: BoolProperty(name='Compilation Server', description='Allow Haxe to create a local compilation server for faster builds', default=True)
+    mesh_cache: BoolProperty(name="Mesh Cache", description="Reuse exported mesh data with identical content across scenes, projects and builds", default=True)
+    mesh_cache_path: StringProperty(name="Mesh Cache Path", description="Directory of the mesh cache, leave empty to use the user cache directory", subtype="DIR_PATH", default="")
+    mesh_cache_size: IntProperty(name="Mesh Cache Size (MB)", description="Maximum size of the mesh cache, least recently used meshes are removed first", default=2048, min=0)
     renderdoc_path: StringProperty(name="RenderDoc Path", description="Binary path", subtype="FILE_PATH", update=renderdoc_path_update, default="")
     ffmpeg_path: StringProperty(name="FFMPEG Path", description="Binary path", subtype="FILE_PATH", update=ffmpeg_path_update, default="")
     save_on_build: BoolProperty(name="Save on Build", description="Save .blend", default=False)
     open_build_directory: BoolProperty(name="Open Build Directory After Publishing", description="Open the build directory after successfully publishing the project", default=False)
-    cmft_use_opencl: BoolProperty(
-        name="CMFT: Use OpenCL", default=True,
-        description=(
-            "Whether to use OpenCL processing to generate radiance maps with CMFT."
-            " If you experience extremely long build times caused by CMFT, try disabling this option."
-            " For more information see https://github.com/armory3d/armory/issues/2760"
-        ))
     legacy_shaders: BoolProperty(name="Legacy Shaders", description="Attempt to compile shaders runnable on older hardware, use this for WebGL1 or GLES2 support in mobile render path", default=False)
     relative_paths: BoolProperty(name="Generate Relative Paths", description="Write relative paths in khafile", default=False)
     viewport_controls: EnumProperty(
@@ -292,6 +288,10 @@ class ArmoryAddonPreferences(AddonPreferences):
         name="Exporter Profiling", default=False,
         description="Run profiling when exporting the scene. A file named 'profile_exporter.prof' with the results will"
                     " be saved into the SDK directory and can be opened with tools such as SnakeViz")
+    trace_build: BoolProperty(
+        name="Build Tracing", default=False,
+        description="Record the time spent in each phase of the build. A file named 'trace.json' will be saved into the"
+                    " build directory and can be opened with Perfetto or chrome://tracing, a summary is printed to the console")
     khamake_debug: BoolProperty(
         name="Set Khamake Flag: --debug", default=False,
         description="Set the --debug flag when running Khamake. Useful for debugging HLSL shaders with RenderDoc")
@@ -402,12 +402,14 @@ class ArmoryAddonPreferences(AddonPreferences):
                 _col.prop(self, "khamake_threads")
                 row.prop(self, "khamake_threads_use_auto", toggle=True)
                 box.prop(self, "compilation_server")
+                box.prop(self, "mesh_cache")
+                _col = box.column()
+                _col.enabled = self.mesh_cache
+                _col.prop(self, "mesh_cache_path")
+                _col.prop(self, "mesh_cache_size")
                 box.prop(self, "open_build_directory")
                 box.prop(self, "save_on_build")
 
-                box.separator()
-                box.prop(self, "cmft_use_opencl")
-
                 box = box_main.column()
                 box.label(text="Android Settings")
                 box.prop(self, "android_sdk_root_path")
@@ -438,6 +440,7 @@ class ArmoryAddonPreferences(AddonPreferences):
 
                 col = box.column(align=True)
                 col.prop(self, "profile_exporter")
+                col.prop(self, "trace_build")
                 col.prop(self, "khamake_debug")
                 col.prop(self, "haxe_times")
 
@@ -0,0 +1,149 @@
+package armory.logicnode;
+
+import kha.arrays.Float32Array;
+import kha.arrays.Int32Array;
+import kha.arrays.Uint32Array;
+import iron.data.Data;
+import iron.system.ArmPack;
+
+typedef TLogicTreeData = {
+	public var classes: Array<String>;
+	public var constants: Array<Dynamic>;
+	public var tables: Int32Array;
+	public var name: String;
+}
+
+/**
+	Logic tree that is built from the data file of a logic node tree
+	exported as data (see `DataTreeWriter` in `make_logic.py`) instead of
+	a generated class, so that changes of the tree don't require a
+	recompilation.
+**/
+@:keep
+@:access(armory.logicnode.LogicNode)
+class DataLogicTree extends LogicTree {
+
+	static var cachedData = new Map<String, TLogicTreeData>();
+
+	public var treeName(default, null): String;
+
+	public function new(treeName: String) {
+		super();
+		this.treeName = treeName;
+		#if arm_debug
+		name = treeName;
+		#end
+		notifyOnAdd(add);
+	}
+
+	override public function add() {
+		var data = cachedData.get(treeName);
+		if (data != null) {
+			build(data);
+			return;
+		}
+
+		Data.getBlob("logic_" + treeName + ".arm", function(blob: kha.Blob) {
+			// Not a scene file, decode into anonymous structures
+			var data: TLogicTreeData = ArmPack.decode(blob.toBytes(), "logic_tree");
+
+			// ArmPack decodes typed int32 arrays as Uint32Array, the
+			// tables contain -1 entries
+			var decoded: Uint32Array = cast data.tables;
+			var tables = new Int32Array(decoded.length);
+			for (i in 0...decoded.length) tables[i] = decoded[i];
+			data.tables = tables;
+
+			cachedData.set(treeName, data);
+			build(data);
+		});
+	}
+
+	function build(data: TLogicTreeData) {
+		var tables = data.tables;
+		var constants = data.constants;
+		var numNodes = tables[0];
+		var numProps = tables[1];
+		var numLinks = tables[2];
+		var numWatched = tables[3];
+		var pos = 4;
+
+		// Nodes are created in the same order as by a generated class,
+		// properties and links are set once all nodes exist
+		var nodes = new haxe.ds.Vector<LogicNode>(numNodes);
+		for (i in 0...numNodes) {
+			var className = data.classes[tables[pos]];
+			var value = tables[pos + 1];
+			if (value == -1) {
+				var node = createNode(className);
+				node.preallocInputs(tables[pos + 2]);
+				node.preallocOutputs(tables[pos + 3]);
+				nodes[i] = node;
+			}
+			else {
+				nodes[i] = createValueNode(className, constants[value]);
+			}
+			pos += 4;
+		}
+
+		for (i in 0...numProps) {
+			// Properties may have setters (e.g. MathExpressionNode)
+			Reflect.setProperty(nodes[tables[pos]], constants[tables[pos + 1]], constants[tables[pos + 2]]);
+			pos += 3;
+		}
+
+		for (i in 0...numLinks) {
+			LogicNode.addLink(nodes[tables[pos]], nodes[tables[pos + 1]], tables[pos + 2], tables[pos + 3]);
+			pos += 4;
+		}
+
+		#if arm_debug
+		for (i in 0...numWatched) {
+			var node = nodes[tables[pos]];
+			node.name = constants[tables[pos + 1]];
+			node.watch(true);
+			pos += 2;
+		}
+		#end
+	}
+
+	function createNode(className: String): LogicNode {
+		var cls = Type.resolveClass("armory.logicnode." + className);
+		if (cls == null) {
+			trace('Error: Logic node "$className" of tree "$treeName" not found');
+			return new NullNode(this);
+		}
+		return Type.createInstance(cls, [this]);
+	}
+
+	/**
+		Creates a node that gives a not connected socket its value.
+		Equivalent to `make_logic.build_default_node()` in Python.
+	**/
+	function createValueNode(className: String, value: Dynamic): LogicNode {
+		// Nodes without a value use the defaults of their constructor
+		if (value == null) return createNode(className);
+
+		return switch (className) {
+			case "VectorNode": {
+				var v: Float32Array = value;
+				new VectorNode(this, v[0], v[1], v[2]);
+			}
+			case "RotationNode": {
+				var v: Float32Array = value;
+				new RotationNode(this, v[0], v[1], v[2], v[3]);
+			}
+			case "ColorNode": {
+				var v: Float32Array = value;
+				v.length > 3 ? new ColorNode(this, v[0], v[1], v[2], v[3]) : new ColorNode(this, v[0], v[1], v[2]);
+			}
+			case "FloatNode": new FloatNode(this, value);
+			case "IntegerNode": new IntegerNode(this, value);
+			case "BooleanNode": new BooleanNode(this, value);
+			case "StringNode": new StringNode(this, value);
+			case "ObjectNode": new ObjectNode(this, value);
+			case "NullNode": new NullNode(this);
+			default: new DynamicNode(this, value);
+		}
+	}
+}
@@ -1,6 +1,6 @@
 package armory.logicnode;
 
-#if arm_patch @:keep @:keepSub #end
+#if (arm_patch || arm_logic_data) @:keep @:keepSub #end
 class LogicNode {
 
 	var tree: LogicTree;
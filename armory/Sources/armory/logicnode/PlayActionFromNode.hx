@@ -4,6 +4,7 @@ import iron.object.Animation;
 import iron.object.Object;
 import iron.Scene;
 import kha.arrays.Float32Array;
+import kha.arrays.Uint32Array;
 import iron.object.ObjectAnimation;
 
 class PlayActionFromNode extends LogicNode {
@@ -89,7 +90,7 @@ class PlayActionFromNode extends LogicNode {
 							        anim : {
 							                tracks : [{
 						                                target : v.target,
-						                                frames : v.frames,
+						                                frames : reverseFrames(v.frames),
 						                                values : val,
 						                                ref_values : null
 							                        }]//,
@@ -164,7 +165,7 @@ class PlayActionFromNode extends LogicNode {
 								for(c in b.values) val.unshift(c);
 								var vali = new Float32Array(val.length);
 								for(i in 0...val.length) vali[i] = val[i];
-								tracks.push({target: b.target, frames: b.frames, values: vali});
+								tracks.push({target: b.target, frames: reverseFrames(b.frames), values: vali});
 							}
 
 						oactions.push({
@@ -190,4 +191,15 @@ class PlayActionFromNode extends LogicNode {
 		runOutput(0);
 
 	}
+
+	/**
+		Mirror the keyframe times of a track, reduced tracks don't have
+		evenly spaced keyframes.
+	**/
+	static function reverseFrames(frames: Uint32Array): Uint32Array {
+		var last = frames.length - 1;
+		var reversed = new Uint32Array(frames.length);
+		for (i in 0...frames.length) reversed[i] = frames[0] + frames[last] - frames[last - i];
+		return reversed;
+	}
 }
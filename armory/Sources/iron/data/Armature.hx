@@ -2,8 +2,12 @@ package iron.data;
 
 #if arm_skin
 
+import kha.FastFloat;
+import kha.arrays.Float32Array;
 import iron.data.SceneFormat;
 import iron.math.Mat4;
+import iron.math.Quat;
+import iron.math.Vec4;
 
 class Armature {
 	public var uid: Int;
@@ -11,6 +15,11 @@ class Armature {
 	public var actions: Array<TAction> = [];
 	var matsReady = false;
 
+	static var loc = new Vec4();
+	static var rot = new Quat();
+	static var scl = new Vec4();
+	static var mat = Mat4.identity();
+
 	public function new(uid: Int, name: String, actions: Array<TSceneFormat>) {
 		this.uid = uid;
 		this.name = name;
@@ -19,6 +28,10 @@ class Armature {
 			for (o in a.objects) setParents(o);
 			var bones: Array<TObj> = [];
 			traverseBones(a.objects, function(object: TObj) { bones.push(object); });
+			for (b in bones) {
+				if (b.anim == null) continue;
+				for (track in b.anim.tracks) if (track.trs != null) decodeTrack(track);
+			}
 			this.actions.push({ name: a.name, bones: bones, mats: null });
 		}
 	}
@@ -41,6 +54,37 @@ class Armature {
 		return null;
 	}
 
+	/**
+		Decode the quantized translation, rotation and scale channels of a
+		sampled bone track (see `arm.lib.keyframes.quantize_tracks()`) into
+		the matrix values that are interpolated by `Animation`.
+	**/
+	static function decodeTrack(track: TTrack) {
+		var numFrames = Std.int(track.trs.length / 10);
+		var values = new Float32Array(numFrames * 16);
+		for (i in 0...numFrames) {
+			var p = i * 10;
+			loc.set(dequantize(track, p, 0), dequantize(track, p, 1), dequantize(track, p, 2));
+			rot.set(dequantize(track, p, 3), dequantize(track, p, 4), dequantize(track, p, 5), dequantize(track, p, 6));
+			rot.normalize();
+			scl.set(dequantize(track, p, 7), dequantize(track, p, 8), dequantize(track, p, 9));
+			mat.compose(loc, rot, scl);
+
+			// Same layout as Mat4.setF32()
+			var o = i * 16;
+			values[o] = mat._00; values[o + 1] = mat._10; values[o + 2] = mat._20; values[o + 3] = mat._30;
+			values[o + 4] = mat._01; values[o + 5] = mat._11; values[o + 6] = mat._21; values[o + 7] = mat._31;
+			values[o + 8] = mat._02; values[o + 9] = mat._12; values[o + 10] = mat._22; values[o + 11] = mat._32;
+			values[o + 12] = mat._03; values[o + 13] = mat._13; values[o + 14] = mat._23; values[o + 15] = mat._33;
+		}
+		track.values = values;
+		track.trs = null;
+	}
+
+	static inline function dequantize(track: TTrack, pos: Int, channel: Int): FastFloat {
+		return (track.trs[pos + channel] + 32768) * track.trs_scale[channel] + track.trs_offset[channel];
+	}
+
 	static function setParents(object: TObj) {
 		if (object.children == null) return;
 		for (o in object.children) {
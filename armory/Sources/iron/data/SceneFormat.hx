@@ -610,4 +610,7 @@ typedef TTrack = {
 	public var frames: Uint32Array;
 	public var values: Float32Array; // sampled - full matrix transforms, non-sampled - values
 	@:optional public var ref_values: Array<Array<String>>; // ref values
+	@:optional public var trs: Int16Array; // quantized sampled transforms, decoded into values by Armature
+	@:optional public var trs_offset: Float32Array;
+	@:optional public var trs_scale: Float32Array;
 }
@@ -192,10 +192,37 @@ class Animation {
 
 	public function setFrame(frame: Int) {
 		time = 0;
-		frameIndex = frame;
+		var track = getTrack();
+		frameIndex = track != null ? frameToIndex(track, frame) : frame;
 		update(frame * Scene.active.raw.frame_time);
 	}
 
+	/**
+		The track that advances the frame index of the current action.
+	**/
+	function getTrack(): TTrack {
+		return null;
+	}
+
+	/**
+		Index of the last keyframe of `track` at or before `frame`,
+		counted from the first keyframe. Keyframes can be removed on
+		export (see `arm.lib.keyframes.reduce_tracks()`), so frames
+		don't map to indices directly.
+	**/
+	function frameToIndex(track: TTrack, frame: Int): Int {
+		var frames = track.frames;
+		var target = frames[0] + frame;
+		var lo = 0;
+		var hi = frames.length - 1;
+		while (lo < hi) {
+			var mid = (lo + hi + 1) >> 1;
+			if (frames[mid] <= target) lo = mid;
+			else hi = mid - 1;
+		}
+		return lo;
+	}
+
 	public function notifyOnMarker(name: String, onMarker: Void->Void) {
 		if (markerEvents == null) markerEvents = new Map();
 		var ar = markerEvents.get(name);
@@ -239,6 +239,12 @@ class BoneAnimation extends Animation {
 		super.blend(actionName1, actionName2, factor);
 	}
 
+	override function getTrack(): TTrack {
+		if (skeletonBones == null) return null;
+		for (b in skeletonBones) if (b.anim != null) return b.anim.tracks[0];
+		return null;
+	}
+
 	override public function update(delta: FastFloat) {
 		if (!isSkinned && skeletonBones == null) setAction(armature.actions[0].name);
 		if (object != null && (!object.visible || object.culled)) return;
@@ -46,6 +46,10 @@ class ObjectAnimation extends Animation {
 		}
 	}
 
+	override function getTrack(): TTrack {
+		return oaction != null && oaction.anim != null ? oaction.anim.tracks[0] : null;
+	}
+
 	override public function update(delta: FastFloat) {
 		if (!object.visible || object.culled || oaction == null) return;
 
@@ -33,10 +33,16 @@ import kha.arrays.Int16Array;
 
 class ArmPack {
 
-	public static inline function decode<T>(b: Bytes): T {
+	/**
+		Decode the given bytes. On static targets, `key` selects the class
+		of the root map like the key of a map inside of a scene file, the
+		default is `TSceneFormat`. Pass a key without a class (e.g.
+		`"data"`) to decode other data into anonymous structures.
+	**/
+	public static inline function decode<T>(b: Bytes, key = ""): T {
 		var i = new BytesInput(b);
 		i.bigEndian = false;
-		return read(i);
+		return read(i, key);
 	}
 
 	static function read(i: BytesInput, key = "", parentKey = ""): Any {
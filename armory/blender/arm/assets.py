@@ -48,22 +48,22 @@ def reset():
     shader_datas = []
     shader_passes = []
     shader_cons = {}
-    shader_cons['mesh_vert'] = []
-    shader_cons['depth_vert'] = []
-    shader_cons['depth_frag'] = []
-    shader_cons['voxel_vert'] = []
-    shader_cons['voxel_frag'] = []
-    shader_cons['voxel_geom'] = []
+    shader_cons['mesh_vert'] = {}
+    shader_cons['depth_vert'] = {}
+    shader_cons['depth_frag'] = {}
+    shader_cons['voxel_vert'] = {}
+    shader_cons['voxel_frag'] = {}
+    shader_cons['voxel_geom'] = {}
 
 def reset_shader_cons():
     # Reset shader comparison arrays to prevent cross-scene shader merging
     global shader_cons
-    shader_cons['mesh_vert'] = []
-    shader_cons['depth_vert'] = []
-    shader_cons['depth_frag'] = []
-    shader_cons['voxel_vert'] = []
-    shader_cons['voxel_frag'] = []
-    shader_cons['voxel_geom'] = []
+    shader_cons['mesh_vert'] = {}
+    shader_cons['depth_vert'] = {}
+    shader_cons['depth_frag'] = {}
+    shader_cons['voxel_vert'] = {}
+    shader_cons['voxel_frag'] = {}
+    shader_cons['voxel_geom'] = {}
 
 def add(asset_file):
     global assets
@@ -190,13 +190,15 @@ def invalidate_compiler_cache(self, context):
     bpy.data.worlds['Arm'].arm_recompile = True
 
 def shader_equal(sh, ar, shtype):
-    # Merge equal shaders
-    for e in ar:
-        if sh.is_equal(e):
-            sh.context.data[shtype] = e.context.data[shtype]
-            sh.is_linked = True
-            return
-    ar.append(sh)
+    # Merge equal shaders, ar maps the equality keys of all previous
+    # shaders of this type to the shader
+    key = sh.equality_key()
+    e = ar.get(key)
+    if e is not None:
+        sh.context.data[shtype] = e.context.data[shtype]
+        sh.is_linked = True
+        return
+    ar[key] = sh
 
 def vs_equal(c, ar):
     shader_equal(c.vert, ar, 'vertex_shader')
@@ -11,28 +11,36 @@ This software is licensed under the Creative Commons
 Attribution-ShareAlike 3.0 Unported License:
 https://creativecommons.org/licenses/by-sa/3.0/deed.en_US
 """
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor
 import copy
 from enum import Enum, unique
+import hashlib
 import math
 import os
+import threading
 import time
-from typing import Any, Dict, List, Tuple, Union, Optional
+from typing import Any, Deque, Dict, List, Tuple, Union, Optional
 
 import numpy as np
 
 import bpy
 from mathutils import Matrix, Vector
 
-import bmesh
-
 import arm.utils
+import arm.node_utils
 import arm.profiler
+import arm.lib.decimate
+import arm.lib.file_cache
+import arm.lib.keyframes
+import arm.lib.meshopt
 import arm.linked_utils as linked_utils
-from arm import assets, exporter_opt, log, make_renderpath
+from arm import assets, exporter_anim, exporter_opt, log, make_renderpath
 from arm.material import cycles, make as make_material, mat_batch
 
 if arm.is_reload(__name__):
     assets = arm.reload_module(assets)
+    exporter_anim = arm.reload_module(exporter_anim)
     exporter_opt = arm.reload_module(exporter_opt)
     log = arm.reload_module(log)
     make_renderpath = arm.reload_module(make_renderpath)
@@ -40,7 +48,12 @@ if arm.is_reload(__name__):
     make_material = arm.reload_module(make_material)
     mat_batch = arm.reload_module(mat_batch)
     arm.utils = arm.reload_module(arm.utils)
+    arm.node_utils = arm.reload_module(arm.node_utils)
     arm.profiler = arm.reload_module(arm.profiler)
+    arm.lib.decimate = arm.reload_module(arm.lib.decimate)
+    arm.lib.file_cache = arm.reload_module(arm.lib.file_cache)
+    arm.lib.keyframes = arm.reload_module(arm.lib.keyframes)
+    arm.lib.meshopt = arm.reload_module(arm.lib.meshopt)
     linked_utils = arm.reload_module(linked_utils)
 else:
     arm.enable_reload(__name__)
@@ -103,6 +116,22 @@ FCURVE_TARGET_NAMES = {
 
 current_output = None
 
+# Hash of the exporter sources, part of all mesh cache keys
+exporter_source_hash: Optional[bytes] = None
+
+
+def get_exporter_source_hash() -> bytes:
+    global exporter_source_hash
+    if exporter_source_hash is None:
+        h = hashlib.blake2b(digest_size=20)
+        arm_dir = os.path.dirname(__file__)
+        for name in ('exporter.py', 'exporter_opt.py', os.path.join('lib', 'armpack.py'),
+                     os.path.join('lib', 'decimate.py'), os.path.join('lib', 'meshopt.py')):
+            with open(os.path.join(arm_dir, name), 'rb') as f:
+                h.update(f.read())
+        exporter_source_hash = h.digest()
+    return exporter_source_hash
+
 
 class BuildExportCache:
     """Shared cache across all scene exports in a single build.
@@ -112,6 +141,116 @@ class BuildExportCache:
         self.exported_action_files: set = set()
         self.processed_mesh_names: set = set()
 
+        # Data is extracted from Blender on the main thread, packing,
+        # compressing and writing the files doesn't need bpy and runs
+        # in a pool
+        self.write_pool: Optional[ThreadPoolExecutor] = None
+        self.pending_writes: Deque[Future] = collections.deque()
+        self.pending_paths: Dict[str, Future] = {}
+        self.max_pending_writes = 0
+        self.stage_times: Dict[str, float] = collections.defaultdict(float)
+        self.stage_times_lock = threading.Lock()
+        # Source and generated triangles per level of detail
+        self.lod_triangles: Dict[int, List[int]] = collections.defaultdict(lambda: [0, 0])
+
+        # Persistent cache of mesh files, keyed by a hash of their
+        # content, see ArmoryExporter.get_mesh_cache_key()
+        self.mesh_cache: Optional[arm.lib.file_cache.FileCache] = None
+        if arm.utils.get_pref_or_default('mesh_cache', True):
+            self.mesh_cache = arm.lib.file_cache.FileCache(
+                arm.utils.get_mesh_cache_path(), arm.utils.get_pref_or_default('mesh_cache_size', 2048) * 1024 * 1024
+            )
+
+    def write_arm(self, filepath: str, output: Dict, cache_key: Optional[str] = None):
+        """Write the given data file in the write pool. `output` must
+        not be modified afterwards. If `cache_key` is given, the file
+        is also stored in the mesh cache."""
+        if self.write_pool is None:
+            num_workers = arm.utils.cpu_count() or 1
+            self.write_pool = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix='arm_write')
+            # Limit the amount of extracted data that is kept in memory
+            self.max_pending_writes = num_workers * 2
+
+        with self.time_stage('wait'):
+            while len(self.pending_writes) >= self.max_pending_writes:
+                self.pending_writes.popleft().result()
+
+            # Files written more than once (e.g. shared object actions)
+            # are written in order
+            previous = self.pending_paths.get(filepath)
+            if previous is not None:
+                previous.result()
+
+        minimize = bpy.data.worlds['Arm'].arm_minimize
+        future = self.write_pool.submit(self._write_arm, filepath, output, minimize, cache_key)
+        self.pending_writes.append(future)
+        self.pending_paths[filepath] = future
+
+    def _write_arm(self, filepath: str, output: Dict, minimize: bool, cache_key: Optional[str]):
+        start = time.perf_counter()
+        # The file might be a hard link into the mesh cache, don't
+        # overwrite the cached file
+        if os.path.lexists(filepath):
+            os.remove(filepath)
+        arm.utils.write_arm(filepath, output, minimize=minimize)
+        if cache_key is not None:
+            self.mesh_cache.put(cache_key, filepath)
+        self.add_stage_time('write', time.perf_counter() - start)
+
+    def add_stage_time(self, stage: str, seconds: float):
+        with self.stage_times_lock:
+            self.stage_times[stage] += seconds
+
+    def time_stage(self, stage: str) -> 'StageTimer':
+        return StageTimer(self, stage)
+
+    def add_lod_stats(self, level: int, source_tris: int, lod_tris: int):
+        self.lod_triangles[level][0] += source_tris
+        self.lod_triangles[level][1] += lod_tris
+
+    def finish(self):
+        """Wait until all data files are written. Errors raised while
+        writing are re-raised here, in submission order."""
+        if self.write_pool is not None:
+            try:
+                with self.time_stage('wait'):
+                    while len(self.pending_writes) > 0:
+                        self.pending_writes.popleft().result()
+            finally:
+                for future in self.pending_writes:
+                    future.cancel()
+                self.pending_writes.clear()
+                self.pending_paths.clear()
+                self.write_pool.shutdown()
+                self.write_pool = None
+
+        if self.mesh_cache is not None:
+            self.mesh_cache.evict()
+
+        if bpy.data.worlds['Arm'].arm_verbose_output:
+            print('Export stages: ' + ', '.join(f'{stage} {seconds:0.3f}s' for stage, seconds in self.stage_times.items()))
+            if self.mesh_cache is not None:
+                print('Mesh cache: ' + self.mesh_cache.stats())
+
+            for level, (source_tris, lod_tris) in sorted(self.lod_triangles.items()):
+                print(f'Generated LOD {level + 1}: {source_tris} -> {lod_tris} triangles ({lod_tris / max(source_tris, 1) * 100:.1f}%)')
+
+
+class StageTimer:
+    """Context manager that adds the time spent in its body to the
+    given stage of a BuildExportCache."""
+    def __init__(self, build_cache: BuildExportCache, stage: str):
+        self.build_cache = build_cache
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.build_cache.add_stage_time(self.stage, time.perf_counter() - self.start)
+
 
 class ArmoryExporter:
     """Export to Armory format.
@@ -185,6 +324,9 @@ class ArmoryExporter:
         self.object_to_arm_object_dict: Dict[bpy.types.Object, Dict] = {}
 
         self.bone_tracks = []
+        # (armature, action) => bone matrices baked before the objects
+        # are exported, see prebake_bone_matrices()
+        self.baked_bone_matrices: Dict[Tuple[bpy.types.Object, bpy.types.Action], Tuple[Dict[str, int], np.ndarray]] = {}
 
         ArmoryExporter.preprocess()
 
@@ -193,8 +335,17 @@ class ArmoryExporter:
         """Exports the given scene to the given file path. This is the
         function that is called in make.py and the entry point of the
         exporter."""
-        with arm.profiler.Profile('profile_exporter.prof', arm.utils.get_pref_or_default('profile_exporter', False)):
-            cls(context, filepath, scene, depsgraph, build_cache).execute()
+        owns_build_cache = build_cache is None
+        if owns_build_cache:
+            build_cache = BuildExportCache()
+
+        try:
+            with arm.profiler.Profile('profile_exporter.prof', arm.utils.get_pref_or_default('profile_exporter', False)):
+                cls(context, filepath, scene, depsgraph, build_cache).execute()
+        finally:
+            # Otherwise make.py waits for the files of all scenes
+            if owns_build_cache:
+                build_cache.finish()
 
     @classmethod
     def preprocess(cls):
@@ -352,16 +503,8 @@ class ArmoryExporter:
     @staticmethod
     def export_animation_track(fcurve: bpy.types.FCurve, frame_range: Tuple[int, int], target: str) -> Dict:
         """This function exports a single animation track."""
-        out_track = {'target': target, 'frames': [], 'values': []}
-
-        start = frame_range[0]
-        end = frame_range[1]
-
-        for frame in range(start, end + 1):
-            out_track['frames'].append(frame)
-            out_track['values'].append(fcurve.evaluate(frame))
-
-        return out_track
+        frames = np.arange(frame_range[0], frame_range[1] + 1, dtype='<i4')
+        return {'target': target, 'frames': frames, 'values': exporter_anim.evaluate_fcurve(fcurve, frames)}
 
     def export_object_transform(self, bobject: bpy.types.Object, o):
         wrd = bpy.data.worlds['Arm']
@@ -434,6 +577,10 @@ class ArmoryExporter:
                         warning += '\n  To see the list of unresolved data paths please recompile with Armory Project > Verbose Output enabled.'
                     log.warn(warning)
 
+                if len(out_anim['tracks']) > 0 and 'marker_frames' not in out_anim:
+                    channels = np.stack([track['values'] for track in out_anim['tracks']], axis=1)
+                    self.reduce_action_tracks(action_name, out_anim['tracks'], channels)
+
                 if True:  # not action.arm_cached or not os.path.exists(fp):
                     if wrd.arm_verbose_output:
                         print('Exporting object action ' + action_name)
@@ -446,7 +593,7 @@ class ArmoryExporter:
                         'transform': None
                     }
                     action_file = {'objects': [out_object_action]}
-                    arm.utils.write_arm(fp, action_file)
+                    self.build_cache.write_arm(fp, action_file)
 
     def process_bone(self, bone: bpy.types.Bone) -> None:
         if ArmoryExporter.export_all_flag or bone.select:
@@ -523,13 +670,10 @@ class ArmoryExporter:
         if fcurve_list and pose_bone:
             begin_frame, end_frame = self.calculate_anim_frame_range(action)
 
-            out_track = {'target': "transform", 'frames': [], 'values': []}
+            out_track = {'target': "transform", 'frames': np.arange(end_frame - begin_frame + 1, dtype='<i4'), 'values': []}
             o['anim'] = {'tracks': [out_track]}
 
-            for i in range(begin_frame, end_frame + 1):
-                out_track['frames'].append(i - begin_frame)
-
-            self.bone_tracks.append((out_track['values'], pose_bone))
+            self.bone_tracks.append((out_track, pose_bone))
 
     def use_default_material(self, bobject: bpy.types.Object, o):
         if arm.utils.export_bone_data(bobject):
@@ -617,19 +761,119 @@ class ArmoryExporter:
 
     def write_bone_matrices(self, scene, action):
         # profile_time = time.time()
-        begin_frame, end_frame = self.calculate_anim_frame_range(action)
+        frame_range = self.calculate_anim_frame_range(action)
         if len(self.bone_tracks) > 0:
-            for i in range(begin_frame, end_frame + 1):
-                scene.frame_set(i)
-                for track in self.bone_tracks:
-                    values, pose_bone = track[0], track[1]
-                    parent = pose_bone.parent
-                    if parent:
-                        values += ArmoryExporter.write_matrix((parent.matrix.inverted_safe() @ pose_bone.matrix))
-                    else:
-                        values += ArmoryExporter.write_matrix(pose_bone.matrix)
+            armature = self.bone_tracks[0][1].id_data
+            pose_bones = [track[1] for track in self.bone_tracks]
+            baked = self.baked_bone_matrices.pop((armature, action), None)
+            if baked is not None and all(bone.name in baked[0] for bone in pose_bones):
+                bone_indices, baked_matrices = baked
+                matrices = baked_matrices[[bone_indices[bone.name] for bone in pose_bones]]
+            else:
+                matrices = exporter_anim.bake_bone_matrices(scene, armature, pose_bones, frame_range)
+            for i, track in enumerate(self.bone_tracks):
+                track[0]['values'] = matrices[i].reshape(-1)
         # print('Bone matrices exported in ' + str(time.time() - profile_time))
 
+    @staticmethod
+    def collect_bone_actions(adata, action: bpy.types.Action) -> List[bpy.types.Action]:
+        """Returns the actions exported for an armature: the given
+        active action followed by the other actions of its NLA
+        tracks."""
+        export_actions = [action]
+        # hasattr - armature modifier may reference non-parent
+        # armature object to deform with
+        if hasattr(adata, 'nla_tracks') and adata.nla_tracks is not None:
+            for track in adata.nla_tracks:
+                if track.strips is None:
+                    continue
+                for strip in track.strips:
+                    if strip.action is None:
+                        continue
+                    if strip.action.name == action.name:
+                        continue
+                    export_actions.append(strip.action)
+        return export_actions
+
+    def get_bone_action_file_path(self, bdata: bpy.types.Armature, action: bpy.types.Action) -> str:
+        armatureid = arm.utils.safestr(arm.utils.asset_name(bdata))
+        aname = arm.utils.safestr(arm.utils.asset_name(action))
+        return self.get_meshes_file_path('action_' + armatureid + '_' + aname, compressed=ArmoryExporter.compress_enabled)
+
+    def needs_bone_action_export(self, bdata: bpy.types.Armature, fp: str) -> bool:
+        return (not bdata.arm_cached or not os.path.exists(fp)) and fp not in self.build_cache.exported_action_files
+
+    def prebake_bone_matrices(self, scene_objects: List[bpy.types.Object]):
+        """Bakes the bone matrices of all actions exported for the
+        armatures of the scene with shared frame sweeps, instead of one
+        sweep per armature and action while the objects are exported.
+        write_bone_matrices() takes the results from
+        self.baked_bone_matrices.
+
+        Armatures that are autobaked or have constraints targeting
+        other armatures are left to write_bone_matrices(), their
+        matrices depend on the actions played by other objects or on
+        the baked action."""
+        jobs = []
+        for bobject in scene_objects:
+            if bobject.type != 'ARMATURE' or bobject.data is None or not bobject.arm_export:
+                continue
+            bdata = bobject.data
+            adata = bobject.animation_data
+            if bdata.arm_autobake or adata is None or adata.action is None:
+                continue
+            if self.has_armature_constraint_target(bobject):
+                continue
+
+            for action in self.collect_bone_actions(adata, adata.action):
+                if not self.needs_bone_action_export(bdata, self.get_bone_action_file_path(bdata, action)):
+                    continue
+                # Bones that get a track in export_bone_transform()
+                animated = {fcurve.data_path[12:].split('"]', 1)[0] for fcurve in action.fcurves if fcurve.data_path.startswith('pose.bones["')}
+                pose_bones = [bone for bone in bobject.pose.bones if bone.name in animated]
+                if len(pose_bones) > 0:
+                    jobs.append((bobject, action, pose_bones, self.calculate_anim_frame_range(action)))
+
+        if len(jobs) == 0:
+            return
+
+        results = exporter_anim.bake_scene_bone_matrices(self.scene, jobs)
+        for (bobject, action, pose_bones, _), matrices in zip(jobs, results):
+            self.baked_bone_matrices[(bobject, action)] = ({bone.name: i for i, bone in enumerate(pose_bones)}, matrices)
+
+    @staticmethod
+    def has_armature_constraint_target(bobject: bpy.types.Object) -> bool:
+        for pose_bone in bobject.pose.bones:
+            for constraint in pose_bone.constraints:
+                target = getattr(constraint, 'target', None)
+                if target is not None and target != bobject and target.type == 'ARMATURE':
+                    return True
+        return False
+
+    @staticmethod
+    def reduce_action_tracks(action_name: str, tracks: List[Dict], channels: np.ndarray):
+        """Remove keyframes that linear interpolation can reproduce
+        within the configured error from the given tracks, if enabled.
+        Actions with pose markers are not reduced because markers refer
+        to frame indices."""
+        wrd = bpy.data.worlds['Arm']
+        if not wrd.arm_anim_reduce:
+            return
+
+        num_frames, num_kept, size_before, size_after = arm.lib.keyframes.reduce_tracks(tracks, channels, wrd.arm_anim_reduce_error)
+        if wrd.arm_verbose_output:
+            ratio = 100.0 * (1.0 - size_after / size_before) if size_before > 0 else 0.0
+            print(f'Reduced action {action_name}: {num_frames} -> {num_kept} frames, {size_before} -> {size_after} bytes ({ratio:.1f}% smaller)')
+
+    @staticmethod
+    def quantize_action_tracks(action_name: str, tracks: List[Dict]):
+        """Store the sampled bone tracks of an action as 16-bit
+        translation, rotation and scale channels instead of float
+        matrices."""
+        size_before, size_after = arm.lib.keyframes.quantize_tracks(tracks)
+        if bpy.data.worlds['Arm'].arm_verbose_output:
+            print(f'Quantized action {action_name}: {size_before} -> {size_after} bytes')
+
     @staticmethod
     def has_baked_material(bobject, materials):
         for mat in materials:
@@ -1103,6 +1347,9 @@ class ArmoryExporter:
                     self.build_cache.processed_mesh_names.add(oid)
                 out_object['dimensions'] = [aabb[0], aabb[1], aabb[2]]
 
+                if self.use_auto_lod(self.mesh_array[objref]["objectTable"][0]):
+                    self.export_auto_lods(oid, out_object)
+
                 # shapeKeys = ArmoryExporter.get_shape_keys(objref)
                 # if shapeKeys:
                 #     self.ExportMorphWeights(bobject, shapeKeys, scene, out_object)
@@ -1203,19 +1450,7 @@ class ArmoryExporter:
                         action = actions.new(name='armorypose')
 
                 # Export actions
-                export_actions = [action]
-                # hasattr - armature modifier may reference non-parent
-                # armature object to deform with
-                if hasattr(adata, 'nla_tracks') and adata.nla_tracks is not None:
-                    for track in adata.nla_tracks:
-                        if track.strips is None:
-                            continue
-                        for strip in track.strips:
-                            if strip.action is None:
-                                continue
-                            if strip.action.name == action.name:
-                                continue
-                            export_actions.append(strip.action)
+                export_actions = self.collect_bone_actions(adata, action)
 
                 armatureid = arm.utils.safestr(arm.utils.asset_name(bdata))
                 ext = '.lz4' if ArmoryExporter.compress_enabled else ''
@@ -1242,9 +1477,9 @@ class ArmoryExporter:
                 for action in export_actions:
                     aname = arm.utils.safestr(arm.utils.asset_name(action))
                     skelobj.animation_data.action = action
-                    fp = self.get_meshes_file_path('action_' + armatureid + '_' + aname, compressed=ArmoryExporter.compress_enabled)
+                    fp = self.get_bone_action_file_path(bdata, action)
                     assets.add(fp)
-                    if (not bdata.arm_cached or not os.path.exists(fp)) and fp not in self.build_cache.exported_action_files:
+                    if self.needs_bone_action_export(bdata, fp):
                         # Store action to use it after autobake was handled
                         original_action = action
 
@@ -1287,9 +1522,16 @@ class ArmoryExporter:
                         self.write_bone_matrices(bpy.context.scene, action)
                         if len(bones) > 0 and 'anim' in bones[0]:
                             self.export_pose_markers(bones[0]['anim'], original_action)
+                        if len(self.bone_tracks) > 0:
+                            tracks = [track[0] for track in self.bone_tracks]
+                            if len(original_action.pose_markers) == 0:
+                                matrices = np.stack([track['values'].reshape(-1, 16) for track in tracks])
+                                self.reduce_action_tracks(aname, tracks, arm.lib.keyframes.matrix_channels(matrices))
+                            if wrd.arm_anim_quantize:
+                                self.quantize_action_tracks(aname, tracks)
                         # Save action separately
                         action_obj = {'name': aname, 'objects': bones}
-                        arm.utils.write_arm(fp, action_obj)
+                        self.build_cache.write_arm(fp, action_obj)
                         self.build_cache.exported_action_files.add(fp)
 
                 # Use relative bone constraints
@@ -1321,6 +1563,120 @@ class ArmoryExporter:
             for subbobject in bobject.children:
                 self.export_object(subbobject, out_object)
 
+    @staticmethod
+    def use_auto_lod(bobject: bpy.types.Object) -> bool:
+        """Whether levels of detail are generated for the mesh of the
+        given object on export. Meshes with manual LODs, skinned,
+        morphed and instanced meshes are skipped."""
+        return (bpy.data.worlds['Arm'].arm_lod_auto and len(bobject.data.arm_lodlist) == 0
+                and bobject.find_armature() is None and not ArmoryExporter.get_shape_keys(bobject.data)
+                and bobject.arm_instanced == 'Off')
+
+    @staticmethod
+    def get_lod_mesh_name(oid: str, level: int) -> str:
+        return oid + '_LOD' + str(level + 1)
+
+    def export_auto_lods(self, oid: str, out_object: Dict):
+        """Reference the levels of detail generated for the mesh of the
+        given object, see generate_lods(). Iron looks up LOD objects by
+        name, so an invisible child object is exported for each level."""
+        wrd = bpy.data.worlds['Arm']
+        num_levels = wrd.arm_lod_gen_levels
+        # Mesh data of the levels is stored next to the source mesh
+        data_path = out_object['data_ref'][:-len(oid)]
+
+        out_object['lods'] = []
+        if 'children' not in out_object:
+            out_object['children'] = []
+        for level in range(num_levels):
+            lod_name = self.get_lod_mesh_name(out_object['name'], level)
+            out_object['lods'].append({
+                'object_ref': lod_name,
+                'screen_size': (1 - (1 / (num_levels + 1)) * level) - (1 / (num_levels + 1))
+            })
+            out_object['children'].append({
+                'name': lod_name,
+                'type': 'mesh_object',
+                'data_ref': data_path + self.get_lod_mesh_name(oid, level),
+                'material_refs': out_object['material_refs'],
+                'transform': {'values': ArmoryExporter.write_matrix(Matrix.Identity(4))},
+                'dimensions': out_object['dimensions'],
+                'visible': False,
+                'traits': []
+            })
+
+    @staticmethod
+    def get_bone_influences(bobject: bpy.types.Object, bone_array, bone_count: int, vertex_indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Return the bone influences of the given vertices of `bobject`.
+
+        The vertex group weights are gathered once per vertex, remapped
+        to the first `bone_count` bones of `bone_array` and reduced to
+        the four strongest influences (only if there are more than four,
+        otherwise the vertex group order is kept). The result is then
+        expanded to `vertex_indices`, e.g. the vertex index of each loop.
+
+        Returns a tuple of the influence count per element and the
+        flattened bone indices, weights and weight normalizers
+        (1.0 / total weight of all influences of the vertex, or 1.0 if
+        the total is 0 or 1).
+        """
+        bone_names = {}
+        for i in range(bone_count):
+            bone_names.setdefault(bone_array[i].name, i)
+        group_remap = np.array([bone_names.get(group.name, -1) for group in bobject.vertex_groups] or [-1], dtype=np.int32)
+
+        vertices = bobject.data.vertices
+        num_vertices = len(vertices)
+        group_counts = np.fromiter((len(v.groups) for v in vertices), dtype=np.int32, count=num_vertices)
+        num_entries = int(group_counts.sum())
+        entry_groups = np.fromiter((g.group for v in vertices for g in v.groups), dtype=np.int32, count=num_entries)
+        entry_weights = np.fromiter((g.weight for v in vertices for g in v.groups), dtype=np.float64, count=num_entries)
+        entry_vertices = np.repeat(np.arange(num_vertices, dtype=np.int32), group_counts)
+
+        # Drop groups that don't belong to a bone
+        entry_bones = group_remap[entry_groups]
+        valid = entry_bones >= 0
+        entry_bones = entry_bones[valid]
+        entry_weights = entry_weights[valid]
+        entry_vertices = entry_vertices[valid]
+
+        bone_counts = np.bincount(entry_vertices, minlength=num_vertices)
+        # bincount accumulates in input order, like a sequential sum
+        total_weights = np.bincount(entry_vertices, weights=entry_weights, minlength=num_vertices)
+
+        # Scatter the influences into a padded (vertex, slot) table
+        width = max(int(bone_counts.max(initial=0)), 4)
+        slots = np.arange(entry_vertices.size) - (np.cumsum(bone_counts) - bone_counts)[entry_vertices]
+        weights = np.full((num_vertices, width), -np.inf)
+        bones = np.full((num_vertices, width), -1, dtype=np.int32)
+        weights[entry_vertices, slots] = entry_weights
+        bones[entry_vertices, slots] = entry_bones
+
+        # Keep the four strongest influences, sorted by descending
+        # (weight, bone index) like a reverse tuple sort
+        over = bone_counts > 4
+        if np.any(over):
+            over_weights = weights[over]
+            over_bones = bones[over]
+            order = np.lexsort((over_bones, over_weights), axis=-1)[:, ::-1]
+            weights[over] = np.take_along_axis(over_weights, order, axis=-1)
+            bones[over] = np.take_along_axis(over_bones, order, axis=-1)
+        bone_counts = np.minimum(bone_counts, 4)
+
+        normalizers = np.ones(num_vertices)
+        normalize = (total_weights != 0.0) & (total_weights != 1.0)
+        normalizers[normalize] = 1.0 / total_weights[normalize]
+
+        # Expand from vertices to the requested elements
+        elem_counts = bone_counts[vertex_indices]
+        mask = np.arange(4) < elem_counts[:, None]
+        bone_count_array = elem_counts.astype('<i2')
+        bone_index_array = bones[vertex_indices, :4][mask].astype('<i2')
+        bone_weight_array = weights[vertex_indices, :4][mask]
+        normalizer_array = np.repeat(normalizers[vertex_indices], elem_counts)
+
+        return bone_count_array, bone_index_array, bone_weight_array, normalizer_array
+
     def export_skin(self, bobject: bpy.types.Object, armature, export_mesh: bpy.types.Mesh, out_mesh):
         """This function exports all skinning data, which includes the
         skeleton and per-vertex bone influence data"""
@@ -1358,51 +1714,12 @@ class ArmoryExporter:
             oskin['transformsI'].append(ArmoryExporter.write_matrix(skeleton_inv))
 
         # Export the per-vertex bone influence data
-        group_remap = []
-        for group in bobject.vertex_groups:
-            for i in range(bone_count):
-                if bone_array[i].name == group.name:
-                    group_remap.append(i)
-                    break
-            else:
-                group_remap.append(-1)
-
-        bone_count_array = np.empty(len(export_mesh.loops), dtype='<i2')
-        bone_index_array = np.empty(len(export_mesh.loops) * 4, dtype='<i2')
-        bone_weight_array = np.empty(len(export_mesh.loops) * 4, dtype='<f4')
+        loop_vertex_indices = np.empty(len(export_mesh.loops), dtype=np.int32)
+        export_mesh.loops.foreach_get('vertex_index', loop_vertex_indices)
+        bone_count_array, bone_index_array, bone_weight_array, normalizers = ArmoryExporter.get_bone_influences(
+            bobject, bone_array, bone_count, loop_vertex_indices)
 
-        vertices = bobject.data.vertices
-        count = 0
-        for index, l in enumerate(export_mesh.loops):
-            bone_count = 0
-            total_weight = 0.0
-            bone_values = []
-            for g in vertices[l.vertex_index].groups:
-                bone_index = group_remap[g.group]
-                bone_weight = g.weight
-                if bone_index >= 0:  #and bone_weight != 0.0:
-                    bone_values.append((bone_weight, bone_index))
-                    total_weight += bone_weight
-                    bone_count += 1
-
-            if bone_count > 4:
-                bone_count = 4
-                bone_values.sort(reverse=True)
-                bone_values = bone_values[:4]
-
-            bone_count_array[index] = bone_count
-            for bv in bone_values:
-                bone_weight_array[count] = bv[0]
-                bone_index_array[count] = bv[1]
-                count += 1
-
-            if total_weight not in (0.0, 1.0):
-                normalizer = 1.0 / total_weight
-                for i in range(bone_count):
-                    bone_weight_array[count - i - 1] *= normalizer
-
-        bone_index_array = bone_index_array[:count]
-        bone_weight_array = bone_weight_array[:count]
+        bone_weight_array = np.array(bone_weight_array * normalizers, dtype='<f4')
         bone_weight_array *= 32767
         bone_weight_array = np.array(bone_weight_array, dtype='<i2')
 
@@ -1431,6 +1748,7 @@ class ArmoryExporter:
         default_values = [0] * max_shape_keys
         # Shape key base mesh
         shape_key_base = bobject.data.shape_keys.key_blocks[0]
+        base_co, base_nor = self.get_shape_key_data(shape_key_base)
 
         count = 0
         # Loop through all shape keys
@@ -1441,7 +1759,7 @@ class ArmoryExporter:
             # get vertex data from shape key
             if shape_key.mute:
                 continue
-            vert_data = self.get_vertex_data_from_shape_key(shape_key_base, shape_key)
+            vert_data = self.get_vertex_data_from_shape_key(base_co, base_nor, shape_key)
             vert_pos.append(vert_data['pos'])
             vert_nor.append(vert_data['nor'])
             names.append(shape_key.name)
@@ -1454,8 +1772,8 @@ class ArmoryExporter:
             return
 
         # Convert to array for easy manipulation
-        pos_array = np.array(vert_pos)
-        nor_array = np.array(vert_nor)
+        pos_array = np.stack(vert_pos)
+        nor_array = np.stack(vert_nor)
 
         # Min and Max values of shape key displacements
         max = np.amax(pos_array)
@@ -1492,27 +1810,25 @@ class ArmoryExporter:
         out_mesh['morph_target'] = morph_target
         return
 
-    def get_vertex_data_from_shape_key(self, shape_key_base, shape_key_data):
-
-        base_vert_pos = shape_key_base.data.values()
-        base_vert_nor = shape_key_base.normals_split_get()
-        vert_pos = shape_key_data.data.values()
-        vert_nor = shape_key_data.normals_split_get()
+    @staticmethod
+    def get_shape_key_data(shape_key: bpy.types.ShapeKey) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the vertex positions (float32) and split normals
+        (float64) of the given shape key as flat arrays."""
+        co = np.empty(len(shape_key.data) * 3, dtype=np.float32)
+        shape_key.data.foreach_get('co', co)
+        nor = np.asarray(shape_key.normals_split_get(), dtype=np.float64)
+        return co, nor
 
-        num_verts = len(vert_pos)
+    def get_vertex_data_from_shape_key(self, base_co: np.ndarray, base_nor: np.ndarray, shape_key_data: bpy.types.ShapeKey):
+        vert_co, vert_nor = self.get_shape_key_data(shape_key_data)
 
-        pos = []
-        nor = []
+        num_verts = len(shape_key_data.data)
 
-        # Loop through all vertices
-        for i in range(num_verts):
-            # Vertex position relative to base vertex
-            pos.append(list(vert_pos[i].co - base_vert_pos[i].co))
-            temp = []
-            for j in range(3):
-                # Vertex normal relative to base vertex
-                temp.append(vert_nor[j + i * 3] - base_vert_nor[j + i * 3])
-            nor.append(temp)
+        # Vertex positions relative to base vertices, computed in single
+        # precision like mathutils does
+        pos = (vert_co - base_co).astype(np.float64).reshape(num_verts, 3)
+        # Vertex normals relative to base vertex normals
+        nor = (vert_nor[:num_verts * 3] - base_nor[:num_verts * 3]).reshape(num_verts, 3)
 
         return {'pos': pos, 'nor': nor}
 
@@ -1530,20 +1846,15 @@ class ArmoryExporter:
 
         # Pad data with zeros to make up for required number of pixels of 2^n format
         data = np.pad(data, ((0, 0), (0, extra_x), (0, 0)), 'minimum')
-        pixel_list = []
 
-        for y in range(len(data)):
-            for x in range(len(data[0])):
-                # assign RGBA
-                pixel_list.append(data[y, x, 0])
-                pixel_list.append(data[y, x, 1])
-                pixel_list.append(data[y, x, 2])
-                pixel_list.append(1.0)
-
-        pixel_list = (pixel_list + [0] * (img_size * img_size * 4 - len(pixel_list)))
+        # One row of pixels per block of vertices, remaining pixels are zero
+        pixels = np.zeros(img_size * img_size * 4, dtype=np.float32)
+        rgba = pixels[:data.shape[0] * data.shape[1] * 4].reshape(-1, 4)
+        rgba[:, :3] = data.reshape(-1, 3)
+        rgba[:, 3] = 1.0
 
         image = bpy.data.images.new(name, width = img_size, height = img_size, is_data = True)
-        image.pixels = pixel_list
+        image.pixels.foreach_set(pixels)
         output_path = os.path.join(output_dir,  name + ".png")
         image.save_render(output_path, scene= bpy.context.scene)
         bpy.data.images.remove(image)
@@ -1569,35 +1880,30 @@ class ArmoryExporter:
         if obj.data.uv_layers.get('UVMap_shape_key') is None:
             obj.data.uv_layers.new(name = 'UVMap_shape_key')
 
-        bm = bmesh.new()
-        bm.from_mesh(obj.data)
-        uv_layer = bm.loops.layers.uv.get('UVMap_shape_key')
+        uv_layer = obj.data.uv_layers.get('UVMap_shape_key')
 
         pixel_size = 1.0 / img_size
 
-        i = 0
-        j = 0
-        # Arrange UVs to match exported image pixels
-        for v in bm.verts:
-            for l in v.link_loops:
-                uv_data = l[uv_layer]
-                uv_data.uv = Vector(((i + 0.5) * pixel_size, (j + 0.5) * pixel_size))
-            i += 1
-            if i > img_size - 1:
-                j += 1
-                i = 0
-
-        bm.to_mesh(obj.data)
-        bm.free()
-
-    def write_mesh(self, bobject: bpy.types.Object, fp, out_mesh):
+        # Arrange UVs to match exported image pixels, vertex i is stored
+        # in pixel (i % img_size, i // img_size)
+        loop_vertex_indices = np.empty(len(obj.data.loops), dtype=np.int32)
+        obj.data.loops.foreach_get('vertex_index', loop_vertex_indices)
+        uvs = np.empty((len(loop_vertex_indices), 2), dtype=np.float32)
+        uvs[:, 0] = (loop_vertex_indices % img_size + 0.5) * pixel_size
+        uvs[:, 1] = (loop_vertex_indices // img_size + 0.5) * pixel_size
+        uv_layer.data.foreach_set('uv', uvs.reshape(-1))
+        obj.data.update()
+
+    def write_mesh(self, bobject: bpy.types.Object, fp, out_mesh, cache_key: Optional[str] = None, lod_meshes: List[Dict] = ()):
         if bpy.data.worlds['Arm'].arm_single_data_file:
             self.output['mesh_datas'].append(out_mesh)
+            self.output['mesh_datas'].extend(lod_meshes)
 
-        # One mesh data per file
+        # One mesh data per file, generated levels of detail are
+        # stored in the file of their source mesh
         else:
-            mesh_obj = {'mesh_datas': [out_mesh]}
-            arm.utils.write_arm(fp, mesh_obj)
+            mesh_obj = {'mesh_datas': [out_mesh, *lod_meshes]}
+            self.build_cache.write_arm(fp, mesh_obj, cache_key)
             bobject.data.arm_cached = True
 
     @staticmethod
@@ -1658,6 +1964,22 @@ class ArmoryExporter:
                 f' origin: {uv_max_dim}). The UV precision may suffer.'
             )
 
+    @staticmethod
+    def get_uv_data(uv_layer: bpy.types.MeshUVLoopLayer, num_loops: int) -> np.ndarray:
+        """Return the UV coordinates of the given layer as a flat
+        float32 array (u0, v0, u1, v1, ...)."""
+        uvs = np.empty(num_loops * 2, dtype='<f4')
+        uv_layer.data.foreach_get('uv', uvs)
+        return uvs
+
+    @staticmethod
+    def get_uv_maxdim(uvs: np.ndarray) -> float:
+        """Return the largest absolute value of the UV coordinates,
+        measured with the Y axis reversed as it is exported."""
+        if uvs.size == 0:
+            return 0.0
+        return max(float(np.max(np.abs(uvs[0::2]))), float(np.max(np.abs(1.0 - uvs[1::2].astype(np.float64)))))
+
     def export_mesh_data(self, export_mesh: bpy.types.Mesh, bobject: bpy.types.Object, o, has_armature=False):
         if bpy.app.version < (4, 1, 0):
             export_mesh.calc_normals_split()
@@ -1714,30 +2036,23 @@ class ArmoryExporter:
                 # Scale for packed coords
                 lay0 = uv_layers[t0map]
                 maxdim_uvlayer = lay0
-                for v in lay0.data:
-                    if abs(v.uv[0]) > maxdim:
-                        maxdim = abs(v.uv[0])
-                    if abs(1.0 - v.uv[1]) > maxdim:
-                        maxdim = abs(1.0 - v.uv[1])
+                t0uvs = self.get_uv_data(lay0, num_verts)
+                maxdim = max(maxdim, self.get_uv_maxdim(t0uvs))
                 if has_tex1:
                     lay1 = uv_layers[t1map]
-                    for v in lay1.data:
-                        if abs(v.uv[0]) > maxdim:
-                            maxdim = abs(v.uv[0])
-                            maxdim_uvlayer = lay1
-                        if abs(1.0 - v.uv[1]) > maxdim:
-                            maxdim = abs(1.0 - v.uv[1])
-                            maxdim_uvlayer = lay1
+                    t1uvs = self.get_uv_data(lay1, num_verts)
+                    lay1_maxdim = self.get_uv_maxdim(t1uvs)
+                    if lay1_maxdim > maxdim:
+                        maxdim = lay1_maxdim
+                        maxdim_uvlayer = lay1
             if has_morph_target:
                 morph_data = np.empty(num_verts * 2, dtype='<f4')
                 lay2 = uv_layers[morph_uv_index]
-                for v in lay2.data:
-                    if abs(v.uv[0]) > maxdim:
-                        maxdim = abs(v.uv[0])
-                        maxdim_uvlayer = lay2
-                    if abs(1.0 - v.uv[1]) > maxdim:
-                        maxdim = abs(1.0 - v.uv[1])
-                        maxdim_uvlayer = lay2
+                morph_uvs = self.get_uv_data(lay2, num_verts)
+                lay2_maxdim = self.get_uv_maxdim(morph_uvs)
+                if lay2_maxdim > maxdim:
+                    maxdim = lay2_maxdim
+                    maxdim_uvlayer = lay2
             if maxdim > 1:
                 o['scale_tex'] = maxdim
                 invscale_tex = (1 / o['scale_tex']) * 32767
@@ -1771,95 +2086,68 @@ Make sure the mesh only has tris/quads.""")
         scale_pos = o['scale_pos']
         invscale_pos = (1 / scale_pos) * 32767
 
-        verts = export_mesh.vertices
+        # Bulk-read loop and vertex data, indexing through the loop
+        # vertex indices instead of visiting each MeshLoop in Python
+        loop_vertex_indices = np.empty(num_verts, dtype=np.int32)
+        loops.foreach_get('vertex_index', loop_vertex_indices)
+        vert_cos = np.empty(len(export_mesh.vertices) * 3, dtype='<f4')
+        export_mesh.vertices.foreach_get('co', vert_cos)
+        normals = np.empty(num_verts * 3, dtype='<f4')
+        loops.foreach_get('normal', normals)
+        normals = normals.reshape(-1, 3)
+
+        pdata_view = pdata.reshape(-1, 4)
+        pdata_view[:, :3] = vert_cos.reshape(-1, 3)[loop_vertex_indices]
+        pdata_view[:, 3] = normals[:, 2].astype(np.float64) * scale_pos # Cancel scale
+        ndata.reshape(-1, 2)[:] = normals[:, :2]
         if has_tex:
-            lay0 = export_mesh.uv_layers[t0map]
+            t0data[0::2] = t0uvs[0::2]
+            t0data[1::2] = 1.0 - t0uvs[1::2].astype(np.float64) # Reverse Y
             if has_tex1:
-                lay1 = export_mesh.uv_layers[t1map]
+                t1data[0::2] = t1uvs[0::2]
+                t1data[1::2] = 1.0 - t1uvs[1::2].astype(np.float64)
+            if has_tang:
+                loops.foreach_get('tangent', tangdata)
         if has_morph_target:
-            lay2 = export_mesh.uv_layers[morph_uv_index]
+            morph_data[0::2] = morph_uvs[0::2]
+            morph_data[1::2] = 1.0 - morph_uvs[1::2].astype(np.float64)
         if has_col:
             vcol0 = self.get_nth_vertex_colors(export_mesh, 0).data
-
-        loop: bpy.types.MeshLoop
-        for i, loop in enumerate(loops):
-            v = verts[loop.vertex_index]
-            co = v.co
-            normal = loop.normal
-            tang = loop.tangent
-
-            i4 = i * 4
-            i2 = i * 2
-            pdata[i4    ] = co[0]
-            pdata[i4 + 1] = co[1]
-            pdata[i4 + 2] = co[2]
-            pdata[i4 + 3] = normal[2] * scale_pos # Cancel scale
-            ndata[i2    ] = normal[0]
-            ndata[i2 + 1] = normal[1]
-            if has_tex:
-                uv = lay0.data[loop.index].uv
-                t0data[i2    ] = uv[0]
-                t0data[i2 + 1] = 1.0 - uv[1] # Reverse Y
-                if has_tex1:
-                    uv = lay1.data[loop.index].uv
-                    t1data[i2    ] = uv[0]
-                    t1data[i2 + 1] = 1.0 - uv[1]
-                if has_tang:
-                    i3 = i * 3
-                    tangdata[i3    ] = tang[0]
-                    tangdata[i3 + 1] = tang[1]
-                    tangdata[i3 + 2] = tang[2]
-            if has_morph_target:
-                uv = lay2.data[loop.index].uv
-                morph_data[i2    ] = uv[0]
-                morph_data[i2 + 1] = 1.0 - uv[1]
-            if has_col:
-                col = vcol0[loop.index].color
-                i3 = i * 3
-                cdata[i3    ] = col[0]
-                cdata[i3 + 1] = col[1]
-                cdata[i3 + 2] = col[2]
+            cols = np.empty(num_verts * 4, dtype='<f4')
+            vcol0.foreach_get('color', cols)
+            cdata.reshape(-1, 3)[:] = cols.reshape(-1, 4)[:, :3]
 
         mats = export_mesh.materials
-        poly_map = []
-        for i in range(max(len(mats), 1)):
-            poly_map.append([])
-        for poly in export_mesh.polygons:
-            poly_map[poly.material_index].append(poly)
+        num_mats = max(len(mats), 1)
+
+        poly_material_indices = np.empty(len(export_mesh.polygons), dtype=np.int32)
+        export_mesh.polygons.foreach_get('material_index', poly_material_indices)
+
+        num_tris = len(export_mesh.loop_triangles)
+        tri_loop_indices = np.empty(num_tris * 3, dtype=np.int32)
+        export_mesh.loop_triangles.foreach_get('loops', tri_loop_indices)
+        tri_poly_indices = np.empty(num_tris, dtype=np.int32)
+        export_mesh.loop_triangles.foreach_get('polygon_index', tri_poly_indices)
+        tri_material_indices = poly_material_indices[tri_poly_indices]
+
+        # Group triangles by material, keeping them in polygon order
+        # within each group (lexsort is stable)
+        tri_order = np.lexsort((tri_poly_indices, tri_material_indices))
+        tri_loop_indices = tri_loop_indices.reshape(-1, 3)[tri_order]
+        tri_counts = np.bincount(tri_material_indices, minlength=num_mats)
 
         o['index_arrays'] = []
 
-        # map polygon indices to triangle loops
-        tri_loops = {}
-        for loop in export_mesh.loop_triangles:
-            if loop.polygon_index not in tri_loops:
-                tri_loops[loop.polygon_index] = []
-            tri_loops[loop.polygon_index].append(loop)
-
-        for index, polys in enumerate(poly_map):
-            tris = 0
-            for poly in polys:
-                tris += poly.loop_total - 2
+        tri_start = 0
+        for index in range(num_mats):
+            tris = int(tri_counts[index])
             if tris == 0: # No face assigned
                 continue
-            prim = np.empty(tris * 3, dtype='<i4')
-            v_map = np.empty(tris * 3, dtype='<i4')
-
-            i = 0
-            for poly in polys:
-                for loop in tri_loops[poly.index]:
-                    prim[i    ] = loops[loop.loops[0]].index
-                    prim[i + 1] = loops[loop.loops[1]].index
-                    prim[i + 2] = loops[loop.loops[2]].index
-                    i += 3
-
-            j = 0
-            for poly in polys:
-                for loop in tri_loops[poly.index]:
-                    v_map[j    ] = loops[loop.loops[0]].vertex_index
-                    v_map[j + 1] = loops[loop.loops[1]].vertex_index
-                    v_map[j + 2] = loops[loop.loops[2]].vertex_index
-                    j += 3
+            tri_loops = tri_loop_indices[tri_start:tri_start + tris].reshape(-1)
+            tri_start += tris
+
+            prim = tri_loops.astype('<i4')
+            v_map = loop_vertex_indices[tri_loops].astype('<i4')
 
             ia = {'values': prim, 'material': 0, 'vertex_map': v_map}
             if len(mats) > 1:
@@ -1955,9 +2243,144 @@ Make sure the mesh only has tris/quads.""")
     def has_tangents(self, exportMesh):
         return self.get_export_uvs(exportMesh) and self.get_export_tangents(exportMesh) and len(exportMesh.uv_layers) > 0
 
+    @staticmethod
+    def optimize_vertex_order(oid: str, out_mesh: Dict):
+        """Reorder the triangles of the exported index arrays for vertex
+        cache locality and less overdraw, then reorder the vertices by
+        their first use. Only meshes with shared vertices (see
+        exporter_opt) benefit from this."""
+        pos_values = next(va['values'] for va in out_mesh['vertex_arrays'] if va['attrib'] == 'pos')
+        num_verts = len(pos_values) // 4
+        index_arrays = out_mesh['index_arrays']
+        if num_verts >= sum(len(ia['values']) for ia in index_arrays):
+            return
+
+        verbose = bpy.data.worlds['Arm'].arm_verbose_output
+        if verbose:
+            acmr_before, atvr_before = arm.lib.meshopt.analyze_vertex_cache(np.concatenate([ia['values'] for ia in index_arrays]))
+
+        positions = np.asarray(pos_values).reshape(-1, 4)[:, :3].astype(np.float64)
+        for ia in index_arrays:
+            values = np.asarray(ia['values'])
+            tri_order, cluster_starts = arm.lib.meshopt.optimize_vertex_cache(values, num_verts)
+            tri_order = arm.lib.meshopt.optimize_overdraw(values, positions, tri_order, cluster_starts)
+            ia['values'] = values.reshape(-1, 3)[tri_order].reshape(-1)
+            ia['vertex_map'] = np.asarray(ia['vertex_map']).reshape(-1, 3)[tri_order].reshape(-1)
+
+        order, remap = arm.lib.meshopt.optimize_vertex_fetch([ia['values'] for ia in index_arrays], num_verts)
+        for ia in index_arrays:
+            ia['values'] = remap[ia['values']].astype('<i4')
+        for va in out_mesh['vertex_arrays']:
+            va['values'] = np.asarray(va['values']).reshape(num_verts, -1)[order].reshape(-1)
+
+        # Bone influences are stored with a variable count per vertex
+        if 'skin' in out_mesh:
+            oskin = out_mesh['skin']
+            counts = np.asarray(oskin['bone_count_array'])
+            offsets = np.cumsum(counts, dtype=np.int64) - counts
+            new_counts = counts[order]
+            new_offsets = np.cumsum(new_counts, dtype=np.int64) - new_counts
+            influences = np.repeat(offsets[order] - new_offsets, new_counts) + np.arange(int(np.sum(new_counts)))
+            oskin['bone_count_array'] = new_counts
+            oskin['bone_index_array'] = np.asarray(oskin['bone_index_array'])[influences]
+            oskin['bone_weight_array'] = np.asarray(oskin['bone_weight_array'])[influences]
+
+        if verbose:
+            acmr, atvr = arm.lib.meshopt.analyze_vertex_cache(np.concatenate([ia['values'] for ia in index_arrays]))
+            print(f'Optimized vertex order of mesh {oid}: ACMR {acmr_before:.3f} -> {acmr:.3f}, ATVR {atvr_before:.3f} -> {atvr:.3f}')
+
+    def generate_lods(self, oid: str, out_mesh: Dict) -> List[Dict]:
+        """Return decimated copies of the exported mesh for each level
+        of detail, see export_auto_lods(). Level n keeps about
+        `arm_lod_gen_ratio ^ n` of the triangles."""
+        wrd = bpy.data.worlds['Arm']
+        pos_values = next(va['values'] for va in out_mesh['vertex_arrays'] if va['attrib'] == 'pos')
+        num_verts = len(pos_values) // 4
+        attributes = np.concatenate([np.asarray(va['values']).reshape(num_verts, -1) for va in out_mesh['vertex_arrays']], axis=1)
+        positions = np.asarray(pos_values).reshape(-1, 4)[:, :3]
+
+        index_arrays = out_mesh['index_arrays']
+        num_tris = sum(len(ia['values']) for ia in index_arrays) // 3
+        targets = [int(num_tris * wrd.arm_lod_gen_ratio ** (level + 1)) for level in range(wrd.arm_lod_gen_levels)]
+        levels = arm.lib.decimate.decimate(positions, attributes, [np.asarray(ia['values']) for ia in index_arrays], targets)
+
+        vertex_map = np.zeros(num_verts, dtype='<i4')
+        for ia in index_arrays:
+            vertex_map[ia['values']] = ia['vertex_map']
+
+        lod_meshes = []
+        for level, lod_index_arrays in enumerate(levels):
+            # Only keep the vertices used by this level
+            order, remap = arm.lib.meshopt.optimize_vertex_fetch(lod_index_arrays, num_verts)
+            order = order[:len(np.unique(np.concatenate(lod_index_arrays)))]
+
+            lod_mesh = {key: value for key, value in out_mesh.items() if key not in ('vertex_arrays', 'index_arrays')}
+            lod_mesh['name'] = self.get_lod_mesh_name(oid, level)
+            lod_mesh['vertex_arrays'] = [
+                dict(va, values=np.asarray(va['values']).reshape(num_verts, -1)[order].reshape(-1)) for va in out_mesh['vertex_arrays']
+            ]
+            lod_mesh['index_arrays'] = [
+                {'values': remap[values].astype('<i4'), 'material': ia['material'], 'vertex_map': vertex_map[values]}
+                for ia, values in zip(index_arrays, lod_index_arrays) if len(values) > 0
+            ]
+            if wrd.arm_optimize_vertex_cache:
+                self.optimize_vertex_order(lod_mesh['name'], lod_mesh)
+            lod_meshes.append(lod_mesh)
+
+            lod_tris = sum(len(values) for values in lod_index_arrays) // 3
+            self.build_cache.add_lod_stats(level, num_tris, lod_tris)
+            if wrd.arm_verbose_output:
+                print(f'Generated LOD {level + 1} of mesh {oid}: {num_tris} -> {lod_tris} triangles ({lod_tris / max(num_tris, 1) * 100:.1f}%)')
+
+        return lod_meshes
+
+    def get_mesh_cache_key(self, export_mesh: bpy.types.Mesh, bobject: bpy.types.Object, oid: str) -> str:
+        """Return a hash of everything the exported data of the given
+        evaluated mesh depends on, used as key for the mesh cache."""
+        h = hashlib.blake2b(get_exporter_source_hash(), digest_size=20)
+
+        def update(collection, attr: str, size: int, dtype: str):
+            data = np.empty(size, dtype=dtype)
+            collection.foreach_get(attr, data)
+            h.update(data.data)
+
+        if bpy.app.version < (4, 1, 0):
+            export_mesh.calc_normals_split()
+        else:
+            updated_normals = export_mesh.corner_normals
+
+        num_loops = len(export_mesh.loops)
+        update(export_mesh.vertices, 'co', len(export_mesh.vertices) * 3, '<f4')
+        update(export_mesh.loops, 'vertex_index', num_loops, '<i4')
+        update(export_mesh.loops, 'normal', num_loops * 3, '<f4')
+        update(export_mesh.polygons, 'loop_start', len(export_mesh.polygons), '<i4')
+        update(export_mesh.polygons, 'material_index', len(export_mesh.polygons), '<i4')
+        for uv_layer in export_mesh.uv_layers:
+            h.update(f'{uv_layer.name}:{uv_layer.active_render}'.encode())
+            update(uv_layer.data, 'uv', num_loops * 2, '<f4')
+        for attr in export_mesh.attributes:
+            if attr.data_type in ('BYTE_COLOR', 'FLOAT_COLOR') and attr.domain == 'CORNER':
+                update(attr.data, 'color', num_loops * 4, '<f4')
+
+        # Includes the object properties written to the mesh data
+        settings = (
+            oid, tuple(bpy.app.version), ArmoryExporter.optimize_enabled, ArmoryExporter.compress_enabled,
+            bobject.arm_sorting_index,
+            [mat.name if mat is not None else None for mat in export_mesh.materials],
+            self.get_export_uvs(bobject.data), self.get_export_vcols(bobject.data), self.has_tangents(bobject.data),
+            self.has_baked_material(bobject, export_mesh.materials), tuple(bobject.data.arm_aabb), bobject.data.arm_dynamic_usage,
+            bpy.data.worlds['Arm'].arm_optimize_vertex_cache, self.use_auto_lod(bobject),
+            bpy.data.worlds['Arm'].arm_lod_gen_levels, bpy.data.worlds['Arm'].arm_lod_gen_ratio
+        )
+        h.update(repr(settings).encode())
+        return h.hexdigest()
+
     def export_mesh(self, object_ref):
         """Exports a single mesh object."""
-        # profile_time = time.time()
+        with self.build_cache.time_stage('mesh'), arm.profiler.span('export_mesh', 'exporter', mesh=object_ref[1]["structName"]):
+            self._export_mesh(object_ref)
+
+    def _export_mesh(self, object_ref):
         table = object_ref[1]["objectTable"]
         bobject = table[0]
         oid = arm.utils.safestr(object_ref[1]["structName"])
@@ -2033,16 +2456,33 @@ Make sure the mesh only has tris/quads.""")
         # Update aabb
         self.calc_aabb(bobject)
 
+        # Look up the mesh cache. Skinned, morphed and instanced meshes
+        # depend on other data than the mesh and are not cached, JSON
+        # output is only used for debugging
+        cache_key = None
+        if (self.build_cache.mesh_cache is not None and fp is not None and not shape_keys and armature is None
+                and all(ref.arm_instanced == 'Off' for ref in table) and (wrd.arm_minimize or ArmoryExporter.compress_enabled)):
+            cache_key = self.get_mesh_cache_key(export_mesh, bobject, oid)
+            if self.build_cache.mesh_cache.get(cache_key, fp):
+                bobject.data.arm_cached = True
+                self.build_cache.exported_mesh_files.add(fp)
+                if hasattr(bobject, 'evaluated_get'):
+                    bobject_eval.to_mesh_clear()
+                return
+
         # Process meshes
         if ArmoryExporter.optimize_enabled:
-            vert_list = exporter_opt.export_mesh_data(self, export_mesh, bobject, out_mesh, has_armature=armature is not None)
+            vertex_indices = exporter_opt.export_mesh_data(self, export_mesh, bobject, out_mesh, has_armature=armature is not None)
             if armature:
-                exporter_opt.export_skin(self, bobject, armature, vert_list, out_mesh)
+                exporter_opt.export_skin(self, bobject, armature, vertex_indices, out_mesh)
         else:
             self.export_mesh_data(export_mesh, bobject, out_mesh, has_armature=armature is not None)
             if armature:
                 self.export_skin(bobject, armature, export_mesh, out_mesh)
 
+        if wrd.arm_optimize_vertex_cache:
+            self.optimize_vertex_order(oid, out_mesh)
+
         # Restore the morph state after mesh export
         if shape_keys:
             bobject.active_shape_key_index = active_shape_key_index
@@ -2064,9 +2504,12 @@ Make sure the mesh only has tris/quads.""")
         if bobject.data.arm_dynamic_usage:
             out_mesh['dynamic_usage'] = bobject.data.arm_dynamic_usage
 
-        self.write_mesh(bobject, fp, out_mesh)
+        lod_meshes = []
+        if self.use_auto_lod(bobject):
+            lod_meshes = self.generate_lods(oid, out_mesh)
+
+        self.write_mesh(bobject, fp, out_mesh, cache_key, lod_meshes)
         self.build_cache.exported_mesh_files.add(fp)
-        # print('Mesh exported in ' + str(time.time() - profile_time))
 
         if hasattr(bobject, 'evaluated_get'):
             bobject_eval.to_mesh_clear()
@@ -2354,31 +2797,40 @@ Make sure the mesh only has tris/quads.""")
             o['override_context'] = {}
             o['override_context']['cull_mode'] = 'none'
 
-    def signature_traverse(self, node, sign):
-        sign += node.type + '-'
+    def signature_traverse(self, node, memo):
+        """Return the node tree below the given node, including unlinked
+        input values, as nested tuples. `memo` maps nodes to their
+        already computed signature."""
+        sign = memo.get(node)
+        if sign is not None:
+            return sign
+
+        sign = [node.type]
         if node.type == 'TEX_IMAGE' and node.image is not None:
-            sign += node.image.filepath + '-'
+            sign.append(node.image.filepath)
         for inp in node.inputs:
             if inp.is_linked:
-                sign = self.signature_traverse(inp.links[0].from_node, sign)
-            else:
+                sign.append(self.signature_traverse(inp.links[0].from_node, memo))
+            elif not hasattr(inp, 'default_value'):
                 # Unconnected socket
-                if not hasattr(inp, 'default_value'):
-                    sign += 'o'
-                elif inp.type in ('RGB', 'RGBA', 'VECTOR'):
-                    sign += str(inp.default_value[0])
-                    sign += str(inp.default_value[1])
-                    sign += str(inp.default_value[2])
-                else:
-                    sign += str(inp.default_value)
+                sign.append('o')
+            elif inp.type in ('RGB', 'RGBA', 'VECTOR'):
+                sign.append(tuple(inp.default_value[:3]))
+            elif hasattr(inp.default_value, '__len__') and not isinstance(inp.default_value, str):
+                sign.append(tuple(inp.default_value))
+            else:
+                sign.append(inp.default_value)
+
+        sign = tuple(sign)
+        memo[node] = sign
         return sign
 
     def get_signature(self, mat):
         nodes = mat.node_tree.nodes
         output_node = cycles.node_by_type(nodes, 'OUTPUT_MATERIAL')
         if output_node is not None:
-            sign = self.signature_traverse(output_node, '')
-            return sign
+            sign = self.signature_traverse(output_node, {})
+            return hashlib.blake2b(repr(sign).encode(), digest_size=16).hexdigest()
         return None
 
     def export_materials(self):
@@ -2395,7 +2847,8 @@ Make sure the mesh only has tris/quads.""")
         if wrd.arm_batch_materials:
             mat_users = self.material_to_object_dict
             mat_armusers = self.material_to_arm_object_dict
-            mat_batch.build(self.material_array, mat_users, mat_armusers)
+            with arm.profiler.span('mat_batch', 'exporter'):
+                mat_batch.build(self.material_array, mat_users, mat_armusers)
 
         transluc_used = False
         overlays_used = False
@@ -2440,7 +2893,8 @@ Make sure the mesh only has tris/quads.""")
 
             mat_users = self.material_to_object_dict
             mat_armusers = self.material_to_arm_object_dict
-            sd, rpasses, needs_sss = make_material.parse(material, o, mat_users, mat_armusers)
+            with arm.profiler.span('export_material', 'exporter', material=material.name):
+                sd, rpasses, needs_sss = make_material.parse(material, o, mat_users, mat_armusers)
             sss_used |= needs_sss
 
             # Attach MovieTexture
@@ -2773,7 +3227,8 @@ Make sure the mesh only has tris/quads.""")
                     if mod.type in ('CLOTH', 'SOFT_BODY'):
                         ArmoryExporter.optimize_enabled = True
 
-        self.process_skinned_meshes()
+        with arm.profiler.span('process_skinned_meshes', 'exporter'):
+            self.process_skinned_meshes()
 
         self.output['name'] = arm.utils.safestr(self.scene.name + "_" + os.path.basename(self.scene.library.filepath).replace(".blend", "") if self.scene.library else self.scene.name)
         if self.filepath.endswith('.lz4'):
@@ -2825,13 +3280,17 @@ Make sure the mesh only has tris/quads.""")
             self.output['terrain_datas'] = [out_terrain]
             self.output['terrain_ref'] = 'Terrain'
 
+        with arm.profiler.span('prebake_bone_matrices', 'exporter'):
+            self.prebake_bone_matrices(scene_objects)
+
         # Export objects
         self.output['objects'] = []
         for bobject in scene_objects:
             # Skip objects that have a parent because children are
             # exported recursively
             if not bobject.parent:
-                self.export_object(bobject)
+                with arm.profiler.span('export_object', 'exporter', object=bobject.name):
+                    self.export_object(bobject)
 
         # Export collections
         if bpy.data.collections:
@@ -2862,10 +3321,13 @@ Make sure the mesh only has tris/quads.""")
             if len(self.default_part_material_objects) > 0:
                 self.make_default_mat('armdefaultpart', self.default_part_material_objects, is_particle=True)
 
-            self.export_materials()
-            self.export_particle_systems()
+            with arm.profiler.span('export_materials', 'exporter'):
+                self.export_materials()
+            with arm.profiler.span('export_particle_systems', 'exporter'):
+                self.export_particle_systems()
             self.output['world_datas'] = []
-            self.export_world()
+            with arm.profiler.span('export_world', 'exporter'):
+                self.export_world()
 
             if self.scene.world is not None:
                 self.output['world_ref'] = arm.utils.safestr(arm.utils.asset_name(self.scene.world) if self.scene.world.library else self.scene.world.name)
@@ -2881,7 +3343,8 @@ Make sure the mesh only has tris/quads.""")
             else:
                 self.output['gravity'] = [0.0, 0.0, 0.0]
 
-        self.export_objects(self.scene)
+        with arm.profiler.span('export_object_datas', 'exporter'):
+            self.export_objects(self.scene)
 
         # Create Viewport camera
         if bpy.data.worlds['Arm'].arm_play_camera != 'Scene':
@@ -2910,7 +3373,7 @@ Make sure the mesh only has tris/quads.""")
                 self.output['embedded_datas'].append(file)
 
         # Write scene file
-        arm.utils.write_arm(self.filepath, self.output)
+        self.build_cache.write_arm(self.filepath, self.output)
 
         # Remove created material variants
         for slot in matslots: # Set back to original material
@@ -3285,7 +3748,11 @@ Make sure the mesh only has tris/quads.""")
                 group_name = arm.utils.safesrc(traitlistItem.node_tree_prop.name[0].upper() + traitlistItem.node_tree_prop.name[1:])
 
                 out_trait['type'] = 'Script'
-                out_trait['class_name'] = arm.utils.safestr(bpy.data.worlds['Arm'].arm_project_package) + '.node.' + group_name
+                if arm.node_utils.is_data_logic_tree(traitlistItem.node_tree_prop):
+                    out_trait['class_name'] = 'armory.logicnode.DataLogicTree'
+                    out_trait['parameters'] = ["'" + group_name + "'"]
+                else:
+                    out_trait['class_name'] = arm.utils.safestr(bpy.data.worlds['Arm'].arm_project_package) + '.node.' + group_name
 
             elif traitlistItem.type_prop == 'WebAssembly':
                 wpath = os.path.join(arm.utils.get_fp(), 'Bundled', traitlistItem.webassembly_prop + '.wasm')
@@ -0,0 +1,271 @@
+"""
+Batched animation baking for the exporter. F-curves are evaluated for
+all frames at once from their keyframe data and bone matrices are read
+for all bones of an armature per frame, instead of calling into
+Blender once per frame and channel. The bone matrices of all armatures
+and actions of a scene can be baked with shared frame sweeps.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import bpy
+from mathutils import Matrix
+import numpy as np
+
+import arm
+
+if arm.is_reload(__name__):
+    pass
+else:
+    arm.enable_reload(__name__)
+
+
+# Interpolation modes that can be evaluated in bulk, the easing modes
+# fall back to FCurve.evaluate()
+INTERPOLATION_CONSTANT = 0
+INTERPOLATION_LINEAR = 1
+INTERPOLATION_BEZIER = 2
+INTERPOLATION_OTHER = -1
+
+_INTERPOLATION_IDS = {
+    'CONSTANT': INTERPOLATION_CONSTANT,
+    'LINEAR': INTERPOLATION_LINEAR,
+    'BEZIER': INTERPOLATION_BEZIER,
+}
+
+# Frames closer to a keyframe evaluate to the keyframe's value, same
+# threshold as in fcurve_eval_keyframes_interpolate() in Blender
+KEYFRAME_THRESHOLD = 0.0001
+
+# Bisection steps for solving the x(t) = frame cubic of bezier segments
+BEZIER_ITERATIONS = 40
+
+
+def evaluate_fcurve(fcurve: bpy.types.FCurve, frames: np.ndarray) -> np.ndarray:
+    """Evaluate the given fcurve at all given frames and return the
+    values as a float32 array. Curves with modifiers or unsupported
+    interpolation modes are evaluated with FCurve.evaluate()."""
+    frames = np.asarray(frames, dtype=np.float64)
+    keyframes = fcurve.keyframe_points
+    num_keys = len(keyframes)
+
+    if num_keys == 0 or len(fcurve.modifiers) > 0:
+        return _evaluate_fcurve_slow(fcurve, frames)
+
+    interpolation = np.fromiter((_INTERPOLATION_IDS.get(k.interpolation, INTERPOLATION_OTHER) for k in keyframes), dtype=np.int32, count=num_keys)
+    # The interpolation of the last keyframe is never used
+    if np.any(interpolation[:-1] == INTERPOLATION_OTHER):
+        return _evaluate_fcurve_slow(fcurve, frames)
+
+    co = _get_keyframe_vectors(keyframes, 'co')
+    handle_left = _get_keyframe_vectors(keyframes, 'handle_left')
+    handle_right = _get_keyframe_vectors(keyframes, 'handle_right')
+    key_x = co[:, 0]
+    key_y = co[:, 1]
+
+    values = np.zeros(frames.size, dtype=np.float64)
+
+    # Extrapolation
+    before = frames <= key_x[0]
+    after = frames >= key_x[-1]
+    values[before] = key_y[0]
+    values[after] = key_y[-1]
+    outside = before | after
+    if fcurve.extrapolation == 'LINEAR':
+        # Depends on the handles and interpolation of the outer
+        # keyframes, leave it to Blender
+        extrapolated = outside & (frames != key_x[0]) & (frames != key_x[-1])
+        values[extrapolated] = _evaluate_fcurve_slow(fcurve, frames[extrapolated])
+
+    inside = ~outside
+    if np.any(inside):
+        values[inside] = _evaluate_segments(frames[inside], key_x, key_y, handle_left, handle_right, interpolation)
+
+    return values.astype('<f4')
+
+
+def _evaluate_fcurve_slow(fcurve: bpy.types.FCurve, frames: np.ndarray) -> np.ndarray:
+    return np.fromiter((fcurve.evaluate(frame) for frame in frames.tolist()), dtype='<f4', count=frames.size)
+
+
+def _get_keyframe_vectors(keyframes, attr: str) -> np.ndarray:
+    out = np.empty(len(keyframes) * 2, dtype=np.float32)
+    keyframes.foreach_get(attr, out)
+    return out.reshape(-1, 2).astype(np.float64)
+
+
+def _evaluate_segments(frames, key_x, key_y, handle_left, handle_right, interpolation) -> np.ndarray:
+    """Evaluate frames that lie strictly between the first and the last
+    keyframe, like fcurve_eval_keyframes_interpolate() in Blender."""
+    seg = np.searchsorted(key_x, frames, side='right') - 1
+    seg = np.clip(seg, 0, key_x.size - 2)
+
+    x1 = key_x[seg]
+    y1 = key_y[seg]
+    x4 = key_x[seg + 1]
+    y4 = key_y[seg + 1]
+    values = y1.copy()
+
+    # Linear
+    mask = interpolation[seg] == INTERPOLATION_LINEAR
+    dx = x4[mask] - x1[mask]
+    fac = np.divide(frames[mask] - x1[mask], dx, out=np.zeros_like(dx), where=dx != 0)
+    values[mask] = y1[mask] + fac * (y4[mask] - y1[mask])
+
+    # Bezier
+    mask = interpolation[seg] == INTERPOLATION_BEZIER
+    if np.any(mask):
+        s = seg[mask]
+        values[mask] = _evaluate_bezier(
+            frames[mask],
+            x1[mask], y1[mask],
+            handle_right[s, 0], handle_right[s, 1],
+            handle_left[s + 1, 0], handle_left[s + 1, 1],
+            x4[mask], y4[mask])
+
+    # Frames on a keyframe take its exact value
+    nearest = np.clip(np.searchsorted(key_x, frames), 1, key_x.size - 1)
+    nearest = np.where(np.abs(frames - key_x[nearest - 1]) < np.abs(frames - key_x[nearest]), nearest - 1, nearest)
+    exact = np.abs(frames - key_x[nearest]) < KEYFRAME_THRESHOLD
+    values[exact] = key_y[nearest[exact]]
+
+    return values
+
+
+def _evaluate_bezier(frames, x1, y1, x2, y2, x3, y3, x4, y4) -> np.ndarray:
+    flat = (np.abs(y1 - y4) < np.finfo(np.float32).eps) & (np.abs(y2 - y3) < np.finfo(np.float32).eps) & (np.abs(y3 - y4) < np.finfo(np.float32).eps)
+
+    # Keep the handles inside of the segment so that x(t) is monotonic,
+    # see BKE_fcurve_correct_bezpart()
+    h1x = x1 - x2
+    h1y = y1 - y2
+    h2x = x4 - x3
+    h2y = y4 - y3
+    len1 = np.abs(h1x)
+    len2 = np.abs(h2x)
+    len_sum = len1 + len2
+    correct = len_sum > (x4 - x1)
+    fac = np.divide(x4 - x1, len_sum, out=np.ones_like(len_sum), where=correct)
+    x2 = np.where(correct, x1 - fac * h1x, x2)
+    y2 = np.where(correct, y1 - fac * h1y, y2)
+    x3 = np.where(correct, x4 - fac * h2x, x3)
+    y3 = np.where(correct, y4 - fac * h2y, y3)
+
+    # Solve x(t) = frame for t in [0, 1]
+    t_low = np.zeros_like(frames)
+    t_high = np.ones_like(frames)
+    for _ in range(BEZIER_ITERATIONS):
+        t = (t_low + t_high) * 0.5
+        below = _bezier(x1, x2, x3, x4, t) < frames
+        t_low = np.where(below, t, t_low)
+        t_high = np.where(below, t_high, t)
+    t = (t_low + t_high) * 0.5
+
+    return np.where(flat, y1, _bezier(y1, y2, y3, y4, t))
+
+
+def _bezier(p1, p2, p3, p4, t):
+    u = 1.0 - t
+    return u * u * u * p1 + 3.0 * u * u * t * p2 + 3.0 * u * t * t * p3 + t * t * t * p4
+
+
+def bake_bone_matrices(scene: bpy.types.Scene, armature: bpy.types.Object, pose_bones: List[bpy.types.PoseBone], frame_range: Tuple[int, int]) -> np.ndarray:
+    """Return the parent-relative matrices of the given pose bones for
+    all frames in the (inclusive) frame range as an array of shape
+    (bone, frame, 16) in row-major order. The scene is stepped through
+    the frames once and all bone matrices are read in bulk per frame."""
+    return bake_scene_bone_matrices(scene, [(armature, None, pose_bones, frame_range)])[0]
+
+
+def bake_scene_bone_matrices(scene: bpy.types.Scene, jobs: List[Tuple[bpy.types.Object, Optional[bpy.types.Action], List[bpy.types.PoseBone], Tuple[int, int]]]) -> List[np.ndarray]:
+    """Bake the bone matrices of several armatures and actions with
+    shared sweeps through the frames of the scene. Each job is a tuple
+    (armature, action, pose_bones, frame_range), `action` is assigned
+    to the armature while it is baked, None keeps the current action.
+
+    The jobs are baked in rounds that play at most one action per
+    armature, all armatures of a round are read after the same
+    `frame_set()`. The current frame of the scene is restored
+    afterwards. Returns the matrices of each job like
+    `bake_bone_matrices()`."""
+    # The n-th job of each armature is baked in the n-th round
+    rounds: List[List[int]] = []
+    num_jobs: Dict[bpy.types.Object, int] = {}
+    for i, job in enumerate(jobs):
+        n = num_jobs.get(job[0], 0)
+        num_jobs[job[0]] = n + 1
+        if n == len(rounds):
+            rounds.append([])
+        rounds[n].append(i)
+
+    results: List[Optional[np.ndarray]] = [None] * len(jobs)
+    # The export continues at the current frame once the bake is done
+    current_frame, current_subframe = scene.frame_current, scene.frame_subframe
+    try:
+        for round_jobs in rounds:
+            bakes = [_BoneBake(*jobs[i]) for i in round_jobs]
+            orig_actions = [bake.armature.animation_data.action if bake.action is not None else None for bake in bakes]
+            try:
+                for bake in bakes:
+                    if bake.action is not None:
+                        bake.armature.animation_data.action = bake.action
+
+                # Only the frames in the range of at least one job
+                frames = sorted(set().union(*(range(bake.begin_frame, bake.end_frame + 1) for bake in bakes)))
+                for frame in frames:
+                    scene.frame_set(frame)
+                    for bake in bakes:
+                        if bake.begin_frame <= frame <= bake.end_frame:
+                            bake.read(frame - bake.begin_frame)
+            finally:
+                for bake, action in zip(bakes, orig_actions):
+                    if bake.action is not None:
+                        bake.armature.animation_data.action = action
+
+            for i, bake in zip(round_jobs, bakes):
+                results[i] = bake.out.reshape(len(bake.track_indices), -1, 16)
+    finally:
+        scene.frame_set(current_frame, subframe=current_subframe)
+
+    return results
+
+
+class _BoneBake:
+    """Matrices of the pose bones of one job of
+    `bake_scene_bone_matrices()`, read one frame at a time."""
+
+    def __init__(self, armature: bpy.types.Object, action: Optional[bpy.types.Action], pose_bones: List[bpy.types.PoseBone], frame_range: Tuple[int, int]):
+        self.armature = armature
+        self.action = action
+        self.begin_frame, self.end_frame = frame_range
+        self.all_bones = armature.pose.bones
+
+        bone_indices = {bone.name: i for i, bone in enumerate(self.all_bones)}
+        self.track_indices = np.array([bone_indices[bone.name] for bone in pose_bones], dtype=np.int64)
+        self.parent_indices = np.array([bone_indices[bone.parent.name] if bone.parent else -1 for bone in pose_bones], dtype=np.int64)
+        self.has_parent = self.parent_indices >= 0
+
+        num_frames = self.end_frame - self.begin_frame + 1
+        self.out = np.empty((len(pose_bones), num_frames, 4, 4), dtype=np.float32)
+        self.matrices = np.empty(len(self.all_bones) * 16, dtype=np.float32)
+
+    def read(self, frame_index: int):
+        self.all_bones.foreach_get('matrix', self.matrices)
+        # Blender stores matrices column-major
+        pose_matrices = self.matrices.reshape(-1, 4, 4).transpose(0, 2, 1).astype(np.float64)
+
+        frame_matrices = pose_matrices[self.track_indices]
+        if np.any(self.has_parent):
+            parent_inv = _inverted_safe(pose_matrices[self.parent_indices[self.has_parent]])
+            frame_matrices[self.has_parent] = parent_inv @ frame_matrices[self.has_parent]
+        self.out[:, frame_index] = frame_matrices
+
+
+def _inverted_safe(matrices: np.ndarray) -> np.ndarray:
+    """Batched equivalent of Matrix.inverted_safe()."""
+    det = np.linalg.det(matrices)
+    singular = np.abs(det) < 1e-12
+    out = np.empty_like(matrices)
+    out[~singular] = np.linalg.inv(matrices[~singular])
+    for i in np.flatnonzero(singular):
+        out[i] = np.array(Matrix(matrices[i].tolist()).inverted_safe())
+    return out
@@ -1,11 +1,11 @@
 """
-Exports smaller geometry but is slower.
+Exports smaller geometry by welding loops with identical attributes
+into shared vertices.
 To be replaced with https://github.com/zeux/meshoptimizer
 """
-from typing import Optional
+from typing import List, Tuple
 
 import bpy
-from mathutils import Vector
 import numpy as np
 
 import arm.utils
@@ -18,99 +18,85 @@ else:
     arm.enable_reload(__name__)
 
 
-class Vertex:
-    __slots__ = ("co", "normal", "uvs", "col", "loop_indices", "index", "bone_weights", "bone_indices", "bone_count", "vertex_index")
-
-    def __init__(self, mesh: bpy.types.Mesh, loop: bpy.types.MeshLoop, vcol0: Optional[bpy.types.Attribute]):
-        self.vertex_index = loop.vertex_index
-        loop_idx = loop.index
-        self.co = mesh.vertices[self.vertex_index].co[:]
-        self.normal = loop.normal[:]
-        self.uvs = tuple(layer.data[loop_idx].uv[:] for layer in mesh.uv_layers)
-        self.col = [0.0, 0.0, 0.0] if vcol0 is None else vcol0.data[loop_idx].color[:]
-        self.loop_indices = [loop_idx]
-        self.index = 0
-
-    def __hash__(self):
-        return hash((self.co, self.normal, self.uvs))
-
-    def __eq__(self, other):
-        eq = (
-            (self.co == other.co) and
-            (self.normal == other.normal) and
-            (self.uvs == other.uvs) and
-            (self.col == other.col)
-            )
-        if eq:
-            indices = self.loop_indices + other.loop_indices
-            self.loop_indices = indices
-            other.loop_indices = indices
-        return eq
+def weld_loops(attributes: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Deduplicate loops whose attributes are all equal. Each attribute
+    is an array with one row per loop.
+
+    Returns the index of the first loop of each welded vertex, with the
+    vertices in order of their first occurrence, and the index of the
+    welded vertex of each loop.
+    """
+    num_loops = len(attributes[0])
+    keys = np.concatenate([np.asarray(a, dtype=np.float32).reshape(num_loops, -1) for a in attributes], axis=1)
+    # Compare -0.0 and 0.0 as equal like floats do
+    keys += np.float32(0.0)
+    keys = np.ascontiguousarray(keys)
+    rows = keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).reshape(-1)
+
+    _, first_loops, inverse = np.unique(rows, return_index=True, return_inverse=True)
+
+    # np.unique() sorts by value, restore the order of occurrence
+    order = np.argsort(first_loops, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first_loops[order], rank[inverse.reshape(-1)]
+
+
+def triangulate_polygons(mesh: bpy.types.Mesh) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the loop indices of the triangles of all polygons, in
+    polygon order, and the polygon index of each triangle. Triangles
+    are kept as they are, larger polygons are fanned around their last
+    loop."""
+    num_polys = len(mesh.polygons)
+    loop_starts = np.empty(num_polys, dtype=np.int32)
+    loop_totals = np.empty(num_polys, dtype=np.int32)
+    mesh.polygons.foreach_get('loop_start', loop_starts)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+
+    tri_counts = np.maximum(loop_totals - 2, 0)
+    tri_polys = np.repeat(np.arange(num_polys, dtype=np.int32), tri_counts)
+    # Index of each triangle inside of its polygon
+    tri_local = np.arange(len(tri_polys), dtype=np.int32) - np.repeat(np.cumsum(tri_counts) - tri_counts, tri_counts)
+
+    starts = loop_starts[tri_polys]
+    totals = loop_totals[tri_polys]
+    tri_loops = np.empty((len(tri_polys), 3), dtype=np.int32)
+    tri_loops[:, 0] = np.where(totals == 3, starts, starts + totals - 1)
+    tri_loops[:, 1] = np.where(totals == 3, starts + 1, starts + tri_local)
+    tri_loops[:, 2] = np.where(totals == 3, starts + 2, starts + tri_local + 1)
+    return tri_loops, tri_polys
 
 
 def calc_tangents(posa, nora, uva, ias, scale_pos):
-    num_verts = int(len(posa) / 4)
-    tangents = np.empty(num_verts * 3, dtype='<f4')
-    # bitangents = np.empty(num_verts * 3, dtype='<f4')
+    """Calculate per-vertex tangents by accumulating the tangents of
+    all adjacent triangles, used if Blender can't calculate MikkTSpace
+    tangents for the mesh."""
+    pos = posa.reshape(-1, 4)[:, :3].astype(np.float64)
+    uv = uva.reshape(-1, 2).astype(np.float64)
+    tangents = np.zeros((len(pos), 3), dtype=np.float64)
+
     for ar in ias:
-        ia = ar['values']
-        num_tris = int(len(ia) / 3)
-        for i in range(0, num_tris):
-            i0 = ia[i * 3    ]
-            i1 = ia[i * 3 + 1]
-            i2 = ia[i * 3 + 2]
-            v0 = Vector((posa[i0 * 4], posa[i0 * 4 + 1], posa[i0 * 4 + 2]))
-            v1 = Vector((posa[i1 * 4], posa[i1 * 4 + 1], posa[i1 * 4 + 2]))
-            v2 = Vector((posa[i2 * 4], posa[i2 * 4 + 1], posa[i2 * 4 + 2]))
-            uv0 = Vector((uva[i0 * 2], uva[i0 * 2 + 1]))
-            uv1 = Vector((uva[i1 * 2], uva[i1 * 2 + 1]))
-            uv2 = Vector((uva[i2 * 2], uva[i2 * 2 + 1]))
-
-            deltaPos1 = v1 - v0
-            deltaPos2 = v2 - v0
-            deltaUV1 = uv1 - uv0
-            deltaUV2 = uv2 - uv0
-            d = (deltaUV1.x * deltaUV2.y - deltaUV1.y * deltaUV2.x)
-            if d != 0:
-                r = 1.0 / d
-            else:
-                r = 1.0
-            tangent = (deltaPos1 * deltaUV2.y - deltaPos2 * deltaUV1.y) * r
-            # bitangent = (deltaPos2 * deltaUV1.x - deltaPos1 * deltaUV2.x) * r
-
-            tangents[i0 * 3    ] += tangent.x
-            tangents[i0 * 3 + 1] += tangent.y
-            tangents[i0 * 3 + 2] += tangent.z
-            tangents[i1 * 3    ] += tangent.x
-            tangents[i1 * 3 + 1] += tangent.y
-            tangents[i1 * 3 + 2] += tangent.z
-            tangents[i2 * 3    ] += tangent.x
-            tangents[i2 * 3 + 1] += tangent.y
-            tangents[i2 * 3 + 2] += tangent.z
-            # bitangents[i0 * 3    ] += bitangent.x
-            # bitangents[i0 * 3 + 1] += bitangent.y
-            # bitangents[i0 * 3 + 2] += bitangent.z
-            # bitangents[i1 * 3    ] += bitangent.x
-            # bitangents[i1 * 3 + 1] += bitangent.y
-            # bitangents[i1 * 3 + 2] += bitangent.z
-            # bitangents[i2 * 3    ] += bitangent.x
-            # bitangents[i2 * 3 + 1] += bitangent.y
-            # bitangents[i2 * 3 + 2] += bitangent.z
+        tris = np.asarray(ar['values']).reshape(-1, 3)
+        delta_pos1 = pos[tris[:, 1]] - pos[tris[:, 0]]
+        delta_pos2 = pos[tris[:, 2]] - pos[tris[:, 0]]
+        delta_uv1 = uv[tris[:, 1]] - uv[tris[:, 0]]
+        delta_uv2 = uv[tris[:, 2]] - uv[tris[:, 0]]
+
+        d = delta_uv1[:, 0] * delta_uv2[:, 1] - delta_uv1[:, 1] * delta_uv2[:, 0]
+        r = 1.0 / np.where(d != 0, d, 1.0)
+        tangent = (delta_pos1 * delta_uv2[:, 1:2] - delta_pos2 * delta_uv1[:, 1:2]) * r[:, None]
+
+        for corner in range(3):
+            np.add.at(tangents, tris[:, corner], tangent)
+
     # Orthogonalize
-    for i in range(0, num_verts):
-        t = Vector((tangents[i * 3], tangents[i * 3 + 1], tangents[i * 3 + 2]))
-        # b = Vector((bitangents[i * 3], bitangents[i * 3 + 1], bitangents[i * 3 + 2]))
-        n = Vector((nora[i * 2], nora[i * 2 + 1], posa[i * 4 + 3] / scale_pos))
-        v = t - n * n.dot(t)
-        v.normalize()
-        # Calculate handedness
-        # cnv = n.cross(v)
-        # if cnv.dot(b) < 0.0:
-            # v = v * -1.0
-        tangents[i * 3    ] = v.x
-        tangents[i * 3 + 1] = v.y
-        tangents[i * 3 + 2] = v.z
-    return tangents
+    n = np.empty((len(pos), 3), dtype=np.float64)
+    n[:, :2] = nora.reshape(-1, 2)
+    n[:, 2] = posa[3::4] / scale_pos
+    v = tangents - n * np.sum(n * tangents, axis=1, keepdims=True)
+    length = np.linalg.norm(v, axis=1, keepdims=True)
+    v = np.divide(v, length, out=np.zeros_like(v), where=length > 0)
+    return np.array(v.reshape(-1), dtype='<f4')
 
 
 def export_mesh_data(self, export_mesh: bpy.types.Mesh, bobject: bpy.types.Object, o, has_armature=False):
@@ -118,10 +104,7 @@ def export_mesh_data(self, export_mesh: bpy.types.Mesh, bobject: bpy.types.Objec
         export_mesh.calc_normals_split()
     else:
         updated_normals = export_mesh.corner_normals
-    # exportMesh.calc_loop_triangles()
-    vcol0 = self.get_nth_vertex_colors(export_mesh, 0)
-    vert_list = {Vertex(export_mesh, loop, vcol0): 0 for loop in export_mesh.loops}.keys()
-    num_verts = len(vert_list)
+    num_loops = len(export_mesh.loops)
     num_uv_layers = len(export_mesh.uv_layers)
     # Check if shape keys were exported
     has_morph_target = self.get_shape_keys(bobject.data)
@@ -137,15 +120,26 @@ def export_mesh_data(self, export_mesh: bpy.types.Mesh, bobject: bpy.types.Objec
     has_col = self.get_export_vcols(export_mesh) and num_colors > 0
     has_tang = self.has_tangents(export_mesh)
 
-    pdata = np.empty(num_verts * 4, dtype='<f4') # p.xyz, n.z
-    ndata = np.empty(num_verts * 2, dtype='<f4') # n.xy
+    # Bulk-read loop attributes
+    loop_vertex_indices = np.empty(num_loops, dtype=np.int32)
+    export_mesh.loops.foreach_get('vertex_index', loop_vertex_indices)
+    vert_cos = np.empty(len(export_mesh.vertices) * 3, dtype=np.float32)
+    export_mesh.vertices.foreach_get('co', vert_cos)
+    loop_cos = vert_cos.reshape(-1, 3)[loop_vertex_indices]
+    loop_normals = np.empty((num_loops, 3), dtype=np.float32)
+    export_mesh.loops.foreach_get('normal', loop_normals.reshape(-1))
+    loop_uvs = [self.get_uv_data(layer, num_loops).reshape(-1, 2) for layer in export_mesh.uv_layers]
+    vcol0 = self.get_nth_vertex_colors(export_mesh, 0)
+    loop_cols = np.zeros((num_loops, 4 if vcol0 is not None else 3), dtype=np.float32)
+    if vcol0 is not None:
+        vcol0.data.foreach_get('color', loop_cols.reshape(-1))
+
     if has_tex or has_morph_target:
         uv_layers = export_mesh.uv_layers
         maxdim = 1.0
         maxdim_uvlayer = None
         if has_tex:
             t0map = 0 # Get active uvmap
-            t0data = np.empty(num_verts * 2, dtype='<f4')
             if uv_layers is not None:
                 if 'UVMap_baked' in uv_layers:
                     for i in range(0, len(uv_layers)):
@@ -166,34 +160,22 @@ def export_mesh_data(self, export_mesh: bpy.types.Mesh, bobject: bpy.types.Objec
                             continue
                         # Neither UVMap 0 Nor Shape Key Map
                         t1map = i
-                t1data = np.empty(num_verts * 2, dtype='<f4')
             # Scale for packed coords
             lay0 = uv_layers[t0map]
             maxdim_uvlayer = lay0
-            for v in lay0.data:
-                if abs(v.uv[0]) > maxdim:
-                    maxdim = abs(v.uv[0])
-                if abs(1.0 - v.uv[1]) > maxdim:
-                    maxdim = abs(1.0 - v.uv[1])
+            maxdim = max(maxdim, self.get_uv_maxdim(loop_uvs[t0map].reshape(-1)))
             if has_tex1:
                 lay1 = uv_layers[t1map]
-                for v in lay1.data:
-                    if abs(v.uv[0]) > maxdim:
-                        maxdim = abs(v.uv[0])
-                        maxdim_uvlayer = lay1
-                    if abs(1.0 - v.uv[1]) > maxdim:
-                        maxdim = abs(1.0 - v.uv[1])
-                        maxdim_uvlayer = lay1
+                lay1_maxdim = self.get_uv_maxdim(loop_uvs[t1map].reshape(-1))
+                if lay1_maxdim > maxdim:
+                    maxdim = lay1_maxdim
+                    maxdim_uvlayer = lay1
         if has_morph_target:
-            morph_data = np.empty(num_verts * 2, dtype='<f4')
             lay2 = uv_layers[morph_uv_index]
-            for v in lay2.data:
-                if abs(v.uv[0]) > maxdim:
-                    maxdim = abs(v.uv[0])
-                    maxdim_uvlayer = lay2
-                if abs(1.0 - v.uv[1]) > maxdim:
-                    maxdim = abs(1.0 - v.uv[1])
-                    maxdim_uvlayer = lay2
+            lay2_maxdim = self.get_uv_maxdim(loop_uvs[morph_uv_index].reshape(-1))
+            if lay2_maxdim > maxdim:
+                maxdim = lay2_maxdim
+                maxdim_uvlayer = lay2
         if maxdim > 1:
             o['scale_tex'] = maxdim
             invscale_tex = (1 / o['scale_tex']) * 32767
@@ -201,8 +183,25 @@ def export_mesh_data(self, export_mesh: bpy.types.Mesh, bobject: bpy.types.Objec
             invscale_tex = 1 * 32767
         self.check_uv_precision(export_mesh, maxdim, maxdim_uvlayer, invscale_tex)
 
-    if has_col:
-        cdata = np.empty(num_verts * 3, dtype='<f4')
+    # Use Blender's MikkTSpace tangents if possible. Loops with different
+    # tangents must not be welded, otherwise the tangents are
+    # calculated after welding
+    loop_tangents = None
+    if has_tang:
+        try:
+            export_mesh.calc_tangents(uvmap=lay0.name)
+            loop_tangents = np.empty((num_loops, 3), dtype=np.float32)
+            export_mesh.loops.foreach_get('tangent', loop_tangents.reshape(-1))
+        except RuntimeError:
+            # Tangents can only be calculated for tris and quads
+            pass
+
+    # Weld loops with identical attributes into shared vertices
+    weld_attributes = [loop_cos, loop_normals, *loop_uvs, loop_cols]
+    if loop_tangents is not None:
+        weld_attributes.append(loop_tangents)
+    vertex_loops, loop_to_vertex = weld_loops(weld_attributes)
+    num_verts = len(vertex_loops)
 
     # Save aabb
     self.calc_aabb(bobject)
@@ -220,99 +219,76 @@ def export_mesh_data(self, export_mesh: bpy.types.Mesh, bobject: bpy.types.Objec
     invscale_pos = (1 / scale_pos) * 32767
 
     # Make arrays
-    for i, v in enumerate(vert_list):
-        v.index = i
-        co = v.co
-        normal = v.normal
-        i4 = i * 4
-        i2 = i * 2
-        pdata[i4    ] = co[0]
-        pdata[i4 + 1] = co[1]
-        pdata[i4 + 2] = co[2]
-        pdata[i4 + 3] = normal[2] * scale_pos # Cancel scale
-        ndata[i2    ] = normal[0]
-        ndata[i2 + 1] = normal[1]
-        if has_tex:
-            uv = v.uvs[t0map]
-            t0data[i2    ] = uv[0]
-            t0data[i2 + 1] = 1.0 - uv[1] # Reverse Y
-            if has_tex1:
-                uv = v.uvs[t1map]
-                t1data[i2    ] = uv[0]
-                t1data[i2 + 1] = 1.0 - uv[1]
-        if has_morph_target:
-               uv = v.uvs[morph_uv_index]
-               morph_data[i2    ] = uv[0]
-               morph_data[i2 + 1] = 1.0 - uv[1]
-        if has_col:
-            i3 = i * 3
-            cdata[i3    ] = v.col[0]
-            cdata[i3 + 1] = v.col[1]
-            cdata[i3 + 2] = v.col[2]
+    normals = loop_normals[vertex_loops]
+    pdata = np.empty((num_verts, 4), dtype='<f4') # p.xyz, n.z
+    pdata[:, :3] = loop_cos[vertex_loops]
+    pdata[:, 3] = normals[:, 2].astype(np.float64) * scale_pos # Cancel scale
+    pdata = pdata.reshape(-1)
+    ndata = np.array(normals[:, :2].reshape(-1), dtype='<f4') # n.xy
+    if has_tex:
+        t0data = np.empty((num_verts, 2), dtype='<f4')
+        t0data[:, 0] = loop_uvs[t0map][vertex_loops, 0]
+        t0data[:, 1] = 1.0 - loop_uvs[t0map][vertex_loops, 1].astype(np.float64) # Reverse Y
+        t0data = t0data.reshape(-1)
+        if has_tex1:
+            t1data = np.empty((num_verts, 2), dtype='<f4')
+            t1data[:, 0] = loop_uvs[t1map][vertex_loops, 0]
+            t1data[:, 1] = 1.0 - loop_uvs[t1map][vertex_loops, 1].astype(np.float64)
+            t1data = t1data.reshape(-1)
+    if has_morph_target:
+        morph_data = np.empty((num_verts, 2), dtype='<f4')
+        morph_data[:, 0] = loop_uvs[morph_uv_index][vertex_loops, 0]
+        morph_data[:, 1] = 1.0 - loop_uvs[morph_uv_index][vertex_loops, 1].astype(np.float64)
+        morph_data = morph_data.reshape(-1)
+    if has_col:
+        cdata = np.array(loop_cols[vertex_loops, :3].reshape(-1), dtype='<f4')
 
     # Indices
-    # Create dict for every material slot
-    prims = {ma.name if ma else '': [] for ma in export_mesh.materials}
-    v_maps = {ma.name if ma else '': [] for ma in export_mesh.materials}
-    if not prims:
-        # No materials
-        prims = {'': []}
-        v_maps = {'': []}
-
-    # Create dict of {loop_indices : vertex} with each loop_index in each vertex in Vertex_list
-    vert_dict = {i : v for v in vert_list for i in v.loop_indices}
-    # For each polygon in a mesh
-    for poly in export_mesh.polygons:
-        # Index of the first loop of this polygon
-        first = poly.loop_start
-        # No materials assigned
-        if len(export_mesh.materials) == 0:
-            # Get prim
-            prim = prims['']
-            v_map = v_maps['']
-        else:
-            # First material
-            mat = export_mesh.materials[min(poly.material_index, len(export_mesh.materials) - 1)]
-            # Get prim for this material
-            prim = prims[mat.name if mat else '']
-            v_map = v_maps[mat.name if mat else '']
-        # List of indices for each loop_index belonging to this polygon
-        indices = [vert_dict[i].index for i in range(first, first+poly.loop_total)]
-        v_indices = [vert_dict[i].vertex_index for i in range(first, first+poly.loop_total)]
-
-        # If 3 loops per polygon (Triangle?)
-        if poly.loop_total == 3:
-            prim += indices
-            v_map += v_indices
-        # If > 3 loops per polygon (Non-Triangular?)
-        elif poly.loop_total > 3:
-            for i in range(poly.loop_total-2):
-                prim += (indices[-1], indices[i], indices[i + 1])
-                v_map += (v_indices[-1], v_indices[i], v_indices[i + 1])
+    # One index array for every material slot, slots with the same
+    # material share an index array
+    mats = export_mesh.materials
+    mat_names = [ma.name if ma else '' for ma in mats]
+    prim_names = list(dict.fromkeys(mat_names)) if len(mats) > 0 else ['']
+
+    tri_loops, tri_polys = triangulate_polygons(export_mesh)
+    if len(mats) == 0:
+        tri_prims = np.zeros(len(tri_polys), dtype=np.int32)
+    else:
+        poly_material_indices = np.empty(len(export_mesh.polygons), dtype=np.int32)
+        export_mesh.polygons.foreach_get('material_index', poly_material_indices)
+        slot_prims = np.array([prim_names.index(name) for name in mat_names], dtype=np.int32)
+        tri_prims = slot_prims[np.minimum(poly_material_indices, len(mats) - 1)[tri_polys]]
+
+    # Group triangles by index array, keeping their order
+    tri_order = np.argsort(tri_prims, kind='stable')
+    tri_loops = tri_loops[tri_order].reshape(-1)
+    tri_counts = np.bincount(tri_prims, minlength=len(prim_names))
 
     # Write indices
     o['index_arrays'] = []
-    for mat, prim in prims.items():
-        idata = [0] * len(prim)
-        v_map_data = [0] * len(prim)
-        v_map_sub = v_maps[mat]
-        for i, v in enumerate(prim):
-            idata[i] = v
-            v_map_data[i] = v_map_sub[i]
-        if len(idata) == 0: # No face assigned
+    tri_start = 0
+    for prim_index, mat in enumerate(prim_names):
+        tris = int(tri_counts[prim_index])
+        if tris == 0: # No face assigned
             continue
-        ia = {'values': idata, 'material': 0, 'vertex_map': v_map_data}
+        prim_loops = tri_loops[tri_start * 3:(tri_start + tris) * 3]
+        tri_start += tris
+
+        ia = {
+            'values': loop_to_vertex[prim_loops].astype('<i4'),
+            'material': 0,
+            'vertex_map': loop_vertex_indices[prim_loops].astype('<i4')
+        }
         # Find material index for multi-mat mesh
-        if len(export_mesh.materials) > 1:
-            for i in range(0, len(export_mesh.materials)):
-                if (export_mesh.materials[i] is not None and mat == export_mesh.materials[i].name) or \
-                   (export_mesh.materials[i] is None and mat == ''):  # Default material for empty slots
-                    ia['material'] = i
-                    break
+        if len(mats) > 1:
+            ia['material'] = mat_names.index(mat)
         o['index_arrays'].append(ia)
 
     if has_tang:
-        tangdata = calc_tangents(pdata, ndata, t0data, o['index_arrays'], scale_pos)
+        if loop_tangents is not None:
+            tangdata = np.array(loop_tangents[vertex_loops].reshape(-1), dtype='<f4')
+        else:
+            tangdata = calc_tangents(pdata, ndata, t0data, o['index_arrays'], scale_pos)
 
     pdata *= invscale_pos
     ndata *= 32767
@@ -350,9 +326,10 @@ def export_mesh_data(self, export_mesh: bpy.types.Mesh, bobject: bpy.types.Objec
     if has_tang:
         o['vertex_arrays'].append({ 'attrib': 'tang', 'values': tangdata, 'data': 'short4norm', 'padding': 1 })
 
-    return vert_list
+    # Original vertex index of each exported vertex
+    return loop_vertex_indices[vertex_loops]
 
-def export_skin(self, bobject, armature, vert_list, o):
+def export_skin(self, bobject, armature, vertex_indices, o):
     # This function exports all skinning data, which includes the skeleton
     # and per-vertex bone influence data
     oskin = {}
@@ -391,52 +368,16 @@ def export_skin(self, bobject, armature, vert_list, o):
         oskin['transformsI'].append(self.write_matrix(skeletonI))
 
     # Export the per-vertex bone influence data
-    group_remap = []
-    for group in bobject.vertex_groups:
-        for i in range(bone_count):
-            if bone_array[i].name == group.name:
-                group_remap.append(i)
-                break
-        else:
-            group_remap.append(-1)
-
-    bone_count_array = np.empty(len(vert_list), dtype='<i2')
-    bone_index_array = np.empty(len(vert_list) * 4, dtype='<i2')
-    bone_weight_array = np.empty(len(vert_list) * 4, dtype='<i2')
-
-    vertices = bobject.data.vertices
-    count = 0
-    for index, v in enumerate(vert_list):
-        bone_count = 0
-        total_weight = 0.0
-        bone_values = []
-        for g in vertices[v.vertex_index].groups:
-            bone_index = group_remap[g.group]
-            bone_weight = g.weight
-            if bone_index >= 0: #and bone_weight != 0.0:
-                bone_values.append((bone_weight, bone_index))
-                total_weight += bone_weight
-                bone_count += 1
-
-        if bone_count > 4:
-            bone_count = 4
-            bone_values.sort(reverse=True)
-            bone_values = bone_values[:4]
-
-        bone_count_array[index] = bone_count
-        for bv in bone_values:
-            bone_weight_array[count] = bv[0] * 32767
-            bone_index_array[count] = bv[1]
-            count += 1
-
-        if total_weight not in (0.0, 1.0):
-            normalizer = 1.0 / total_weight
-            for i in range(bone_count):
-                bone_weight_array[count - i - 1] *= normalizer
+    bone_count_array, bone_index_array, bone_weight_array, normalizers = self.get_bone_influences(
+        bobject, bone_array, bone_count, vertex_indices)
+
+    # Weights are truncated to short before and after normalization
+    bone_weight_array = np.trunc(bone_weight_array * 32767)
+    bone_weight_array = np.array(np.trunc(bone_weight_array * normalizers), dtype='<i2')
 
     oskin['bone_count_array'] = bone_count_array
-    oskin['bone_index_array'] = bone_index_array[:count]
-    oskin['bone_weight_array'] = bone_weight_array[:count]
+    oskin['bone_index_array'] = bone_index_array
+    oskin['bone_weight_array'] = bone_weight_array
 
     # Bone constraints
     for bone in armature.pose.bones:
@@ -36,9 +36,13 @@ def on_depsgraph_update_post(self):
     if state.proc_build is not None:
         return
 
-    # Recache
     depsgraph = bpy.context.evaluated_depsgraph_get()
 
+    # Collect changes for live patch, see live_patch.on_depsgraph_update()
+    # for which changes are patched without a re-export
+    live_patch.on_depsgraph_update(depsgraph)
+
+    # Recache
     for update in depsgraph.updates:
         uid = update.id
         if hasattr(uid, 'arm_cached'):
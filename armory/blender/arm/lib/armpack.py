@@ -1,4 +1,4 @@
-"""Msgpack parser with typed arrays"""
+"""Msgpack packer and parser with typed arrays"""
 
 # Based on u-msgpack-python v2.4.1 - v at sergeev.io
 # https://github.com/vsergeev/u-msgpack-python
@@ -23,6 +23,7 @@
 #
 import io
 import struct
+
 import numpy as np
 
 
@@ -85,13 +86,14 @@ def _pack_string(obj, fp):
 
 def _pack_binary(obj, fp):
     if len(obj) <= 2**8 - 1:
-        fp.write(b"\xc4" + struct.pack("B", len(obj)) + obj)
+        fp.write(b"\xc4" + struct.pack("B", len(obj)))
     elif len(obj) <= 2**16 - 1:
-        fp.write(b"\xc5" + struct.pack("<H", len(obj)) + obj)
+        fp.write(b"\xc5" + struct.pack("<H", len(obj)))
     elif len(obj) <= 2**32 - 1:
-        fp.write(b"\xc6" + struct.pack("<I", len(obj)) + obj)
+        fp.write(b"\xc6" + struct.pack("<I", len(obj)))
     else:
         raise Exception("huge binary string")
+    fp.write(obj)
 
 
 def _pack_array(obj, fp):
@@ -104,35 +106,55 @@ def _pack_array(obj, fp):
     else:
         raise Exception("huge array")
 
+    # Homogeneous arrays are written as typed arrays in one go, numpy
+    # arrays through the buffer protocol without an intermediate copy
     if len(obj) > 0 and isinstance(obj[0], float):
         fp.write(b"\xca")
-        for e in obj:
-            fp.write(struct.pack("<f", e))
+        _write_typed_array(obj, "<f4", fp)
     elif len(obj) > 0 and isinstance(obj[0], bool):
         for e in obj:
             pack(e, fp)
     elif len(obj) > 0 and isinstance(obj[0], int):
-        fp.write(b"\xd2")
-        for e in obj:
-            fp.write(struct.pack("<i", e))
+        _pack_int_list(obj, fp)
     # Float32
     elif len(obj) > 0 and isinstance(obj[0], np.float32):
         fp.write(b"\xca")
-        fp.write(obj.tobytes())
+        _write_typed_array(obj, "<f4", fp)
     # Int32
     elif len(obj) > 0 and isinstance(obj[0], np.int32):
         fp.write(b"\xd2")
-        fp.write(obj.tobytes())
+        _write_typed_array(obj, "<i4", fp)
     # Int16
     elif len(obj) > 0 and isinstance(obj[0], np.int16):
         fp.write(b"\xd1")
-        fp.write(obj.tobytes())
+        _write_typed_array(obj, "<i2", fp)
     # Regular
     else:
         for e in obj:
             pack(e, fp)
 
 
+def _pack_int_list(obj, fp):
+    # Lists that also contain floats are written as float arrays like
+    # lists starting with a float, all elements must be numbers
+    values = np.asarray(obj)
+    if values.dtype.kind == "f":
+        fp.write(b"\xca")
+        _write_typed_array(values, "<f4", fp)
+    elif values.dtype.kind in "iub":
+        if values.min() < -(2 ** 31) or values.max() > 2 ** 31 - 1:
+            raise Exception("huge int in typed array")
+        fp.write(b"\xd2")
+        _write_typed_array(values, "<i4", fp)
+    else:
+        raise Exception(f"unsupported typed array element type: {values.dtype}")
+
+
+def _write_typed_array(obj, dtype, fp):
+    # No copy if obj already is a contiguous array of the given type
+    fp.write(np.ascontiguousarray(obj, dtype=dtype).data)
+
+
 def _pack_map(obj, fp):
     if len(obj) <= 15:
         fp.write(struct.pack("B", 0x80 | len(obj)))
@@ -149,6 +171,9 @@ def _pack_map(obj, fp):
 
 
 def pack(obj, fp):
+    """Pack the given object into the writable file-like object `fp`
+    (a file, `io.BytesIO`, `mmap` etc.) without building the complete
+    output in memory first."""
     if obj is None:
         _pack_nil(obj, fp)
     elif isinstance(obj, bool):
@@ -173,3 +198,110 @@ def packb(obj):
     fp = io.BytesIO()
     pack(obj, fp)
     return fp.getvalue()
+
+
+_TYPED_ARRAYS = {0xCA: "<f4", 0xD2: "<i4", 0xD1: "<i2"}
+
+_FIXED_INTS = {
+    0xCC: ("B", 1), 0xCD: ("<H", 2), 0xCE: ("<I", 4), 0xCF: ("<Q", 8),
+    0xD0: ("b", 1), 0xD1: ("<h", 2), 0xD2: ("<i", 4), 0xD3: ("<q", 8),
+}
+
+
+def _read_length(buf, pos, size):
+    if size == 1:
+        return buf[pos], pos + 1
+    if size == 2:
+        return struct.unpack_from("<H", buf, pos)[0], pos + 2
+    return struct.unpack_from("<I", buf, pos)[0], pos + 4
+
+
+def _read_header(buf, pos):
+    """Return (kind, length, data position) of the object at `pos`.
+    For scalars, `length` is the object itself."""
+    b = buf[pos]
+    pos += 1
+    if b <= 0x7F:
+        return "scalar", b, pos
+    if b <= 0x8F:
+        return "map", b & 0x0F, pos
+    if b <= 0x9F:
+        return "array", b & 0x0F, pos
+    if b <= 0xBF:
+        return "str", b & 0x1F, pos
+    if b >= 0xE0:
+        return "scalar", b - 0x100, pos
+    if b == 0xC0:
+        return "scalar", None, pos
+    if b == 0xC2:
+        return "scalar", False, pos
+    if b == 0xC3:
+        return "scalar", True, pos
+    if b in _FIXED_INTS:
+        fmt, size = _FIXED_INTS[b]
+        return "scalar", struct.unpack_from(fmt, buf, pos)[0], pos + size
+    if b == 0xCA:
+        return "scalar", struct.unpack_from("<f", buf, pos)[0], pos + 4
+    if b == 0xCB:
+        return "scalar", struct.unpack_from("<d", buf, pos)[0], pos + 8
+    if 0xC4 <= b <= 0xC6:
+        length, pos = _read_length(buf, pos, 1 << (b - 0xC4))
+        return "bin", length, pos
+    if 0xD9 <= b <= 0xDB:
+        length, pos = _read_length(buf, pos, 1 << (b - 0xD9))
+        return "str", length, pos
+    if b == 0xDC or b == 0xDD:
+        length, pos = _read_length(buf, pos, 2 if b == 0xDC else 4)
+        return "array", length, pos
+    if b == 0xDE or b == 0xDF:
+        length, pos = _read_length(buf, pos, 2 if b == 0xDE else 4)
+        return "map", length, pos
+    raise Exception(f"unsupported type: {hex(b)}")
+
+
+def _typed_array_dtype(buf, pos, length):
+    # Same rule as iron.system.ArmPack: a typed array is recognized by
+    # the type byte that directly follows the array header
+    if length > 0 and pos < len(buf):
+        return _TYPED_ARRAYS.get(buf[pos])
+    return None
+
+
+def _unpack(buf, pos):
+    """Unpack the object at `pos` and return it and the position
+    after it."""
+    kind, length, pos = _read_header(buf, pos)
+    if kind == "scalar":
+        return length, pos
+    if kind == "str":
+        return str(buf[pos:pos + length], "utf-8"), pos + length
+    if kind == "bin":
+        return bytes(buf[pos:pos + length]), pos + length
+    if kind == "array":
+        dtype = _typed_array_dtype(buf, pos, length)
+        if dtype is not None:
+            # Zero-copy view into the buffer
+            arr = np.frombuffer(buf, dtype=dtype, count=length, offset=pos + 1)
+            return arr, pos + 1 + arr.nbytes
+        out = []
+        for _ in range(length):
+            value, pos = _unpack(buf, pos)
+            out.append(value)
+        return out, pos
+    # Map
+    out = {}
+    for _ in range(length):
+        key, pos = _unpack(buf, pos)
+        out[key], pos = _unpack(buf, pos)
+    return out, pos
+
+
+def unpack(fp):
+    """Unpack an object from the readable file-like object `fp`."""
+    return unpackb(fp.read())
+
+
+def unpackb(b):
+    """Unpack an object from the bytes-like object `b`. Typed arrays
+    are returned as read-only NumPy views into `b`."""
+    return _unpack(b, 0)[0]
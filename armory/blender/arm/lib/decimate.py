@@ -0,0 +1,220 @@
+"""
+Mesh decimation for automatically generated levels of detail, using
+half-edge collapses ordered by the quadric error metric from "Surface
+Simplification Using Quadric Error Metrics" by Garland and Heckbert
+(1997).
+
+Vertices on attribute seams (UVs, split normals...), material
+boundaries and open borders are never removed, so the simplified
+meshes can reuse the vertex data of the source mesh unchanged.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+# Upper triangle of the symmetric 4x4 quadric matrices, stored as rows
+# of 10 coefficients
+_QUADRIC_ROWS = np.array([0, 0, 0, 0, 1, 1, 1, 2, 2, 3])
+_QUADRIC_COLS = np.array([0, 1, 2, 3, 1, 2, 3, 2, 3, 3])
+
+
+def _plane_quadrics(p0: np.ndarray, p1: np.ndarray, p2: np.ndarray) -> np.ndarray:
+    """Area weighted quadrics of the planes of the given triangles."""
+    normals = np.cross(p1 - p0, p2 - p0)
+    lengths = np.linalg.norm(normals, axis=1)
+    normals /= np.where(lengths > 0, lengths, 1.0)[:, None]
+    planes = np.concatenate((normals, -np.sum(normals * p0, axis=1)[:, None]), axis=1)
+    return planes[:, _QUADRIC_ROWS] * planes[:, _QUADRIC_COLS] * (lengths * 0.5)[:, None]
+
+
+def _quadric_error(q: np.ndarray, p: np.ndarray) -> np.ndarray:
+    """Evaluate (x, y, z, 1) Q (x, y, z, 1)^T for each row."""
+    x, y, z = p[:, 0], p[:, 1], p[:, 2]
+    return (q[:, 0] * x * x + 2.0 * q[:, 1] * x * y + 2.0 * q[:, 2] * x * z + 2.0 * q[:, 3] * x
+            + q[:, 4] * y * y + 2.0 * q[:, 5] * y * z + 2.0 * q[:, 6] * y
+            + q[:, 7] * z * z + 2.0 * q[:, 8] * z + q[:, 9])
+
+
+def _row_ids(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the index of the first equal row and a dense id for each row."""
+    rows = np.ascontiguousarray(rows)
+    void_rows = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).reshape(-1)
+    _, first, inverse = np.unique(void_rows, return_index=True, return_inverse=True)
+    return first, inverse.reshape(-1)
+
+
+def _unique(keys: np.ndarray) -> np.ndarray:
+    """Sorted unique values of an integer array."""
+    keys = np.sort(keys)
+    return keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+
+
+def _gather_neighbors(offsets: np.ndarray, neighbors: np.ndarray, vertices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (i, neighbor) pairs for all neighbors of `vertices[i]`."""
+    starts = offsets[vertices]
+    counts = offsets[vertices + 1] - starts
+    owner = np.repeat(np.arange(len(vertices)), counts)
+    idx = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(int(np.sum(counts)))
+    return owner, neighbors[idx]
+
+
+def decimate(positions: np.ndarray, attributes: np.ndarray, index_arrays: List[np.ndarray], targets: List[int]) -> List[List[np.ndarray]]:
+    """Simplify a triangle mesh to each of the given triangle counts,
+    in descending order. Each level continues from the previous one.
+
+    `positions` holds the position of each vertex and `attributes` all
+    of its vertex data (including the position); vertices with equal
+    attributes are merged first. `index_arrays` are the triangle lists
+    of the materials of the mesh.
+
+    Returns the simplified index arrays for each target. They reference
+    the given vertices. Targets that can not be reached without moving
+    seams, borders or material boundaries are approximated.
+    """
+    first_vertex, vertex_ids = _row_ids(attributes)
+    canonical = first_vertex[vertex_ids]
+
+    # Topology is built from positions, so that vertices split at
+    # attribute seams are still connected
+    first_point, point_of_vertex = _row_ids(positions)
+    points = positions[first_point].astype(np.float64)
+    num_points = len(points)
+
+    tris = np.concatenate([canonical[np.asarray(ia, dtype=np.int64).reshape(-1, 3)] for ia in index_arrays])
+    mats = np.concatenate([np.full(len(ia) // 3, i, dtype=np.int64) for i, ia in enumerate(index_arrays)])
+    pt = point_of_vertex[tris]
+    valid = (pt[:, 0] != pt[:, 1]) & (pt[:, 1] != pt[:, 2]) & (pt[:, 2] != pt[:, 0])
+    tris, mats, pt = tris[valid], mats[valid], pt[valid]
+
+    # Points with more than one vertex are on a seam
+    locked = np.bincount(_unique(pt.reshape(-1) * len(attributes) + tris.reshape(-1)) // len(attributes), minlength=num_points) > 1
+    # Points shared by several materials are on a material boundary
+    locked |= np.bincount(_unique(pt.reshape(-1) * len(index_arrays) + np.repeat(mats, 3)) // len(index_arrays), minlength=num_points) > 1
+    # Edges that don't have exactly two triangles are open borders or
+    # non-manifold
+    edges = np.sort(pt[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    edge_keys, edge_counts = np.unique(edges[:, 0] * num_points + edges[:, 1], return_counts=True)
+    border = edge_keys[edge_counts != 2]
+    locked[border // num_points] = True
+    locked[border % num_points] = True
+
+    # Area weighted normals of the source surface, new triangles must
+    # face the same side so that flips can't add up over collapses
+    tri_normals = np.cross(points[pt[:, 1]] - points[pt[:, 0]], points[pt[:, 2]] - points[pt[:, 0]])
+    point_normals = np.zeros((num_points, 3))
+    for c in range(3):
+        for i in range(3):
+            point_normals[:, c] += np.bincount(pt[:, i], weights=tri_normals[:, c], minlength=num_points)
+    point_normals /= np.maximum(np.linalg.norm(point_normals, axis=1), 1e-30)[:, None]
+
+    quadrics = np.zeros((num_points, 10))
+    tri_quadrics = _plane_quadrics(points[pt[:, 0]], points[pt[:, 1]], points[pt[:, 2]])
+    for c in range(10):
+        for i in range(3):
+            quadrics[:, c] += np.bincount(pt[:, i], weights=tri_quadrics[:, c], minlength=num_points)
+
+    # Collapses that failed a validity check, as u * num_points + v
+    rejected = np.zeros(0, dtype=np.int64)
+    rank_max = np.iinfo(np.int64).max
+
+    results = []
+    for target in targets:
+        while len(tris) > target:
+            # Adjacency in compressed row format
+            keys = _unique(np.concatenate((
+                pt.reshape(-1) * num_points + pt[:, [1, 2, 0]].reshape(-1),
+                pt[:, [1, 2, 0]].reshape(-1) * num_points + pt.reshape(-1)
+            )))
+            edge_u = keys // num_points
+            edge_v = keys % num_points
+            offsets = np.searchsorted(edge_u, np.arange(num_points + 1))
+            degree = np.diff(offsets)
+
+            # Cheapest collapse u -> v of each removable point
+            candidate = ~locked[edge_u] & ~np.isin(keys, rejected)
+            cu, cv = edge_u[candidate], edge_v[candidate]
+            if len(cu) == 0:
+                break
+            cost = _quadric_error(quadrics[cu] + quadrics[cv], points[cv])
+            order = np.lexsort((cost, cu))
+            cu, cv, cost = cu[order], cv[order], cost[order]
+            best = np.flatnonzero(np.concatenate(([True], cu[1:] != cu[:-1])))
+            cu, cv, cost = cu[best], cv[best], cost[best]
+
+            # Only collapse points that are the cheapest in their 2-ring,
+            # so that the collapses of one pass don't share any triangles
+            # or neighbors
+            rank = np.full(num_points, rank_max, dtype=np.int64)
+            rank[cu[np.argsort(cost, kind='stable')]] = np.arange(len(cu))
+            ring_min = rank.copy()
+            np.minimum.at(ring_min, edge_u, rank[edge_v])
+            ring2_min = ring_min.copy()
+            np.minimum.at(ring2_min, edge_u, ring_min[edge_v])
+            independent = rank[cu] == ring2_min[cu]
+            cu, cv, cost = cu[independent], cv[independent], cost[independent]
+
+            # Every collapse removes two triangles
+            needed = (len(tris) - target + 1) // 2
+            if len(cu) > needed:
+                cheapest = np.argsort(cost, kind='stable')[:needed]
+                cu, cv = cu[cheapest], cv[cheapest]
+            num_collapses = len(cu)
+
+            collapse_of = np.full(num_points, -1, dtype=np.int64)
+            collapse_of[cu] = np.arange(num_collapses)
+            tri_collapse = collapse_of[pt].max(axis=1)
+            affected = np.flatnonzero(tri_collapse >= 0)
+            k = tri_collapse[affected]
+            has_v = np.any(pt[affected] == cv[k][:, None], axis=1)
+            valid = np.ones(num_collapses, dtype=bool)
+
+            # The triangles of the collapsed edge must agree on the vertex
+            # of v, which replaces the vertex of u in the other triangles
+            edge_tris, edge_k = affected[has_v], k[has_v]
+            v_vertex = tris[edge_tris][pt[edge_tris] == cv[edge_k][:, None]]
+            target_vertex = np.full(num_collapses, len(attributes), dtype=np.int64)
+            target_vertex_max = np.full(num_collapses, -1, dtype=np.int64)
+            np.minimum.at(target_vertex, edge_k, v_vertex)
+            np.maximum.at(target_vertex_max, edge_k, v_vertex)
+            valid &= target_vertex == target_vertex_max
+
+            # The remaining triangles must not flip
+            moved_tris, moved_k = affected[~has_v], k[~has_v]
+            pt_new = np.where(pt[moved_tris] == cu[moved_k][:, None], cv[moved_k][:, None], pt[moved_tris])
+            p_old = points[pt[moved_tris]]
+            p_new = points[pt_new]
+            n_old = np.cross(p_old[:, 1] - p_old[:, 0], p_old[:, 2] - p_old[:, 0])
+            n_new = np.cross(p_new[:, 1] - p_new[:, 0], p_new[:, 2] - p_new[:, 0])
+            len_new = np.linalg.norm(n_new, axis=1)
+            flipped = np.sum(n_old * n_new, axis=1) <= 0.2 * np.linalg.norm(n_old, axis=1) * len_new
+            flipped |= np.any(np.sum(point_normals[pt_new] * n_new[:, None, :], axis=2) <= 0.2 * len_new[:, None], axis=1)
+            valid[moved_k[flipped]] = False
+
+            # Link condition: u and v must only share the two neighbors
+            # opposite to their edge, and all points must keep at least
+            # three neighbors
+            owner_u, neighbors_u = _gather_neighbors(offsets, edge_v, cu)
+            owner_v, neighbors_v = _gather_neighbors(offsets, edge_v, cv)
+            common = np.intersect1d(owner_u * num_points + neighbors_u, owner_v * num_points + neighbors_v)
+            common_k = common // num_points
+            valid &= np.bincount(common_k, minlength=num_collapses) == 2
+            valid[common_k[degree[common % num_points] < 4]] = False
+            valid &= degree[cu] + degree[cv] - 4 >= 3
+
+            if not np.all(valid):
+                rejected = np.union1d(rejected, cu[~valid] * num_points + cv[~valid])
+                collapse_of[cu[~valid]] = -1
+
+            # Collapse the points in all of their triangles
+            rows, cols = np.nonzero(collapse_of[pt] >= 0)
+            collapses = collapse_of[pt[rows, cols]]
+            pt[rows, cols] = cv[collapses]
+            tris[rows, cols] = target_vertex[collapses]
+            quadrics[cv[valid]] += quadrics[cu[valid]]
+
+            keep = (pt[:, 0] != pt[:, 1]) & (pt[:, 1] != pt[:, 2]) & (pt[:, 2] != pt[:, 0])
+            tris, mats, pt = tris[keep], mats[keep], pt[keep]
+
+        results.append([tris[mats == i].reshape(-1) for i in range(len(index_arrays))])
+
+    return results
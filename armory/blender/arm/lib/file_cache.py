@@ -0,0 +1,98 @@
+"""
+Persistent file cache keyed by content hashes, used to share exported
+data files across scenes, .blend files and builds.
+"""
+import os
+import shutil
+import threading
+from typing import List, Tuple
+
+
+class FileCache:
+    """Stores files under a key that is usually a hash of everything
+    the file content depends on. Once the cache grows larger than
+    `max_size` bytes, the least recently used entries are evicted by
+    `evict()`.
+
+    All methods can be called from multiple threads.
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        self.directory = directory
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def _entry_path(self, key: str, ext: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ext)
+
+    def get(self, key: str, dst: str) -> bool:
+        """Place the entry for the given key at `dst`, as a hard link
+        if possible. Returns `False` if there is no such entry."""
+        src = self._entry_path(key, os.path.splitext(dst)[1])
+        try:
+            # Never link to an existing file that might be overwritten
+            # in place later on
+            if os.path.lexists(dst):
+                os.remove(dst)
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copyfile(src, dst)
+            # Mark as recently used
+            os.utime(src)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, key: str, src: str):
+        """Store a copy of the file at `src` under the given key."""
+        dst = self._entry_path(key, os.path.splitext(src)[1])
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+
+        # Write to a temporary file first so that concurrent readers
+        # never see a partial entry
+        tmp = f'{dst}.{os.getpid()}.{threading.get_ident()}.tmp'
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is
+        not larger than its maximum size."""
+        entries: List[Tuple[float, int, str]] = []
+        total_size = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total_size += st.st_size
+
+        if total_size <= self.max_size:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total_size -= size
+            with self._lock:
+                self.evicted += 1
+            if total_size <= self.max_size:
+                break
+
+    def stats(self) -> str:
+        return f'{self.hits} hits, {self.misses} misses, {self.evicted} evicted'
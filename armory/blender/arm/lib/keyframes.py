@@ -0,0 +1,176 @@
+"""
+Size reduction of baked animation tracks: removal of keyframes that
+linear interpolation reproduces and quantization of bone transforms
+to 16-bit translation/rotation/scale channels.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+# Number of channels per quantized bone transform: translation xyz,
+# rotation quaternion xyzw and scale xyz
+TRS_CHANNELS = 10
+
+_INT16_RANGE = 65535
+_INT16_OFFSET = 32768
+
+
+def reduce_keyframes(channels: np.ndarray, max_error: float) -> np.ndarray:
+    """Return the sorted indices of the frames (rows of `channels`)
+    that need to be kept so that linear interpolation between them
+    reproduces all frames with an error of at most `max_error` per
+    channel. The first and the last frame are always kept."""
+    num_frames = channels.shape[0]
+    keep = np.zeros(num_frames, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    # Iterative Ramer-Douglas-Peucker, splitting at the frame with the
+    # largest error until all segments are within the tolerance
+    segments = [(0, num_frames - 1)]
+    while segments:
+        a, b = segments.pop()
+        if b - a < 2:
+            continue
+        t = (np.arange(a + 1, b, dtype=np.float64) - a) / (b - a)
+        interpolated = channels[a] + t[:, None] * (channels[b] - channels[a])
+        error = np.abs(channels[a + 1:b] - interpolated).max(axis=1)
+        i = int(np.argmax(error))
+        if error[i] > max_error:
+            split = a + 1 + i
+            keep[split] = True
+            segments.append((a, split))
+            segments.append((split, b))
+
+    return np.flatnonzero(keep)
+
+
+def matrix_channels(matrices: np.ndarray) -> np.ndarray:
+    """Decompose row-major 4x4 matrices of shape (track, frame, 16)
+    into translation, rotation quaternion and scale channels of shape
+    (frame, track * 10), the space in which Iron interpolates sampled
+    bone animations. Like `Mat4.decompose()`, mirrored matrices get a
+    negative x scale."""
+    m = matrices.reshape(matrices.shape[0], matrices.shape[1], 4, 4).astype(np.float64)
+    translation = m[..., :3, 3]
+    basis = m[..., :3, :3]
+    scale = np.linalg.norm(basis, axis=-2)
+    scale[..., 0] = np.where(np.linalg.det(basis) < 0.0, -scale[..., 0], scale[..., 0])
+    r = basis / np.where(scale == 0.0, 1.0, scale)[..., None, :]
+
+    w = np.sqrt(np.maximum(0.0, 1.0 + r[..., 0, 0] + r[..., 1, 1] + r[..., 2, 2])) * 0.5
+    x = np.copysign(np.sqrt(np.maximum(0.0, 1.0 + r[..., 0, 0] - r[..., 1, 1] - r[..., 2, 2])) * 0.5, r[..., 2, 1] - r[..., 1, 2])
+    y = np.copysign(np.sqrt(np.maximum(0.0, 1.0 - r[..., 0, 0] + r[..., 1, 1] - r[..., 2, 2])) * 0.5, r[..., 0, 2] - r[..., 2, 0])
+    z = np.copysign(np.sqrt(np.maximum(0.0, 1.0 - r[..., 0, 0] - r[..., 1, 1] + r[..., 2, 2])) * 0.5, r[..., 1, 0] - r[..., 0, 1])
+    quat = np.stack((x, y, z, w), axis=-1)
+
+    # Keep consecutive quaternions in the same hemisphere like Quat.lerp()
+    if quat.shape[1] > 1:
+        dot = np.sum(quat[:, 1:] * quat[:, :-1], axis=-1)
+        flip = np.cumprod(np.where(dot < 0.0, -1.0, 1.0), axis=1)
+        quat[:, 1:] *= flip[..., None]
+
+    channels = np.concatenate((translation, quat, scale), axis=-1)
+    return channels.transpose(1, 0, 2).reshape(matrices.shape[1], -1)
+
+
+def compose_matrices(channels: np.ndarray) -> np.ndarray:
+    """Inverse of `matrix_channels()` for a single track: compose
+    channels of shape (frame, 10) into row-major 4x4 matrices of shape
+    (frame, 16) like `Mat4.compose()`."""
+    c = np.asarray(channels, dtype=np.float64)
+    quat = c[:, 3:7] / np.linalg.norm(c[:, 3:7], axis=1, keepdims=True)
+    x, y, z, w = quat.T
+
+    m = np.zeros((c.shape[0], 4, 4))
+    m[:, 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    m[:, 0, 1] = 2.0 * (x * y - w * z)
+    m[:, 0, 2] = 2.0 * (x * z + w * y)
+    m[:, 1, 0] = 2.0 * (x * y + w * z)
+    m[:, 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    m[:, 1, 2] = 2.0 * (y * z - w * x)
+    m[:, 2, 0] = 2.0 * (x * z - w * y)
+    m[:, 2, 1] = 2.0 * (y * z + w * x)
+    m[:, 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+    m[:, :3, :3] *= c[:, None, 7:10]
+    m[:, :3, 3] = c[:, :3]
+    m[:, 3, 3] = 1.0
+    return m.reshape(-1, 16)
+
+
+def reduce_tracks(tracks: List[dict], channels: np.ndarray, max_error: float) -> Tuple[int, int, int, int]:
+    """Remove the frames that can be reproduced by linear interpolation
+    from all given tracks. All tracks share the same frames because
+    Iron advances a single frame index for all tracks of an animation.
+
+    `channels` holds the per-frame values the error is measured on.
+    Returns the number of frames and the track data size in bytes
+    before and after the reduction.
+    """
+    num_frames = channels.shape[0]
+    kept = reduce_keyframes(channels, max_error)
+
+    size_before = 0
+    size_after = 0
+    for track in tracks:
+        values = np.asarray(track['values'], dtype='<f4').reshape(num_frames, -1)
+        frames = np.asarray(track['frames'], dtype='<i4')
+        size_before += values.nbytes + frames.nbytes
+
+        track['frames'] = frames[kept]
+        track['values'] = values[kept].reshape(-1)
+        size_after += track['values'].nbytes + track['frames'].nbytes
+
+    return num_frames, kept.size, size_before, size_after
+
+
+def quantize_channels(channels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Quantize the channels of shape (frame, channel) to int16 over
+    the value range of each channel.
+
+    Returns the quantized values and the float32 offset and scale per
+    channel, see `dequantize_channels()`. The error of a value is at
+    most half of the scale of its channel.
+    """
+    c = np.asarray(channels, dtype=np.float64)
+    # Quantize against the stored float32 parameters so that their
+    # rounding doesn't add to the error
+    offset = c.min(axis=0).astype('<f4')
+    extent = c.max(axis=0) - offset
+    scale = np.where(extent > 0.0, extent / _INT16_RANGE, 1.0).astype('<f4')
+
+    steps = np.rint((c - offset) / scale)
+    quantized = (np.clip(steps, 0, _INT16_RANGE) - _INT16_OFFSET).astype('<i2')
+    return quantized, offset, scale
+
+
+def dequantize_channels(quantized: np.ndarray, offset: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """Reference implementation of the decoding done at runtime by
+    `iron.data.Armature`."""
+    q = np.asarray(quantized, dtype=np.float64).reshape(-1, len(offset))
+    return (q + _INT16_OFFSET) * scale.astype(np.float64) + offset.astype(np.float64)
+
+
+def quantize_tracks(tracks: List[dict]) -> Tuple[int, int]:
+    """Replace the matrix values of the given sampled bone tracks with
+    quantized translation, rotation and scale channels (`trs`,
+    `trs_offset` and `trs_scale`). Iron decodes them back into matrices
+    when the armature is loaded.
+
+    Returns the track data size in bytes before and after.
+    """
+    size_before = 0
+    size_after = 0
+    for track in tracks:
+        values = np.asarray(track['values'], dtype='<f4')
+        size_before += values.nbytes
+
+        channels = matrix_channels(values.reshape(1, -1, 16))
+        quantized, offset, scale = quantize_channels(channels)
+
+        del track['values']
+        track['trs'] = quantized.reshape(-1)
+        track['trs_offset'] = offset
+        track['trs_scale'] = scale
+        size_after += quantized.nbytes + offset.nbytes + scale.nbytes
+
+    return size_before, size_after
@@ -23,8 +23,15 @@ CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
 OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
+from typing import Tuple
+
 import numpy as np
-from numpy import uint8, int32, uint32
+
+try:
+    # Optional native backend (https://github.com/python-lz4/python-lz4)
+    import lz4.block as lz4_block
+except ImportError:
+    lz4_block = None
 
 
 class LZ4RangeException(Exception):
@@ -32,7 +39,13 @@ class LZ4RangeException(Exception):
 
 
 class LZ4:
-    hash_table = None
+    # Size of the blocks the NumPy matcher works on. Matches never
+    # cross a block boundary, but may reference data of previous blocks
+    block_size = 1 << 20
+
+    # Matches are measured up to this length in bulk, longer matches
+    # are extended one by one
+    bulk_match_len = 64
 
     @staticmethod
     def encode_bound(size: int) -> int:
@@ -40,142 +53,264 @@ class LZ4:
 
     @staticmethod
     def encode(b: bytes) -> bytes:
-        i_buf: np.ndarray = np.frombuffer(b, dtype=uint8)
-        i_len = i_buf.size
+        """Compress the given bytes into a single raw LZ4 block that
+        can be decoded by iron.system.Lz4.
 
+        The native lz4 module is used if it is installed. Otherwise the
+        input is matched block by block with NumPy.
+        """
+        i_len = len(b)
         if i_len >= 0x7E000000:
             raise LZ4RangeException("Input buffer is too large")
 
+        if lz4_block is not None:
+            return lz4_block.compress(b, mode='default', store_size=False)
+
+        i_buf: np.ndarray = np.frombuffer(b, dtype=np.uint8)
+
         # "The last match must start at least 12 bytes before end of block"
         last_match_pos = i_len - 12
 
         # "The last 5 bytes are always literals"
         last_literal_pos = i_len - 5
 
-        if LZ4.hash_table is None:
-            LZ4.hash_table = np.full(shape=65536, fill_value=-65536, dtype=int32)
+        blocks = [(start, min(start + LZ4.block_size, i_len)) for start in range(0, max(last_match_pos + 1, 0), LZ4.block_size)]
 
-        LZ4.hash_table.fill(-65536)
+        matches = [LZ4._find_matches(i_buf, start, end, last_match_pos, last_literal_pos) for start, end in blocks]
 
-        o_len = LZ4.encode_bound(i_len)
-        o_buf = np.full(shape=o_len, fill_value=0, dtype=uint8)
-        i_pos = 0
-        o_pos = 0
+        # Literals of a block start where the last match of the
+        # previous block ended
+        parts = []
         anchor_pos = 0
+        for m_pos, m_offset, m_len in matches:
+            parts.append(LZ4._write_sequences(i_buf, anchor_pos, m_pos, m_offset, m_len))
+            if m_pos.size > 0:
+                anchor_pos = int(m_pos[-1] + m_len[-1])
+
+        # Last sequence is literals only
+        parts.append(LZ4._write_literals(i_buf, anchor_pos, i_len))
+
+        return b''.join(part.tobytes() for part in parts)
+
+    @staticmethod
+    def decode(b: bytes, o_len: int) -> bytes:
+        """Decompress a raw LZ4 block as written by encode().
+
+        `o_len` is the size of the decompressed data or an upper bound
+        of it, e.g. the size header of .lz4 scene files.
+        """
+        if lz4_block is not None:
+            return lz4_block.decompress(b, uncompressed_size=o_len)
+
+        i_buf = bytes(b)
+        i_len = len(i_buf)
+        o_buf = bytearray()
+        i_pos = 0
+
+        while i_pos < i_len:
+            token = i_buf[i_pos]
+            i_pos += 1
 
-        # Sequence-finding loop
-        while True:
-            ref_pos = int32(0)
-            m_offset = 0
-            sequence = uint32(
-                i_buf[i_pos] << 8 | i_buf[i_pos + 1] << 16 | i_buf[i_pos + 2] << 24
-            )
-
-            # Match-finding loop
-            while i_pos <= last_match_pos:
-                # Conversion to uint32 is mandatory to ensure correct
-                # unsigned right shift (compare with .hx implementation)
-                sequence = uint32(
-                    uint32(sequence) >> uint32(8) | i_buf[i_pos + 3] << 24
-                )
-                hash_val = (sequence * 0x9E37 & 0xFFFF) + (
-                    uint32(sequence * 0x79B1) >> uint32(16)
-                ) & 0xFFFF
-                ref_pos = LZ4.hash_table[hash_val]
-                LZ4.hash_table[hash_val] = i_pos
-                m_offset = i_pos - ref_pos
-                if (
-                    m_offset < 65536
-                    and i_buf[ref_pos + 0] == (sequence & 0xFF)
-                    and i_buf[ref_pos + 1] == ((sequence >> uint32(8)) & 0xFF)
-                    and i_buf[ref_pos + 2] == ((sequence >> uint32(16)) & 0xFF)
-                    and i_buf[ref_pos + 3] == ((sequence >> uint32(24)) & 0xFF)
-                ):
-                    break
-
-                i_pos += 1
-
-            # No match found
-            if i_pos > last_match_pos:
+            # Literals
+            l_len = token >> 4
+            if l_len == 15:
+                while True:
+                    l = i_buf[i_pos]
+                    i_pos += 1
+                    l_len += l
+                    if l != 255:
+                        break
+            o_buf += i_buf[i_pos:i_pos + l_len]
+            i_pos += l_len
+            if i_pos == i_len:
                 break
 
-            # Match found
-            l_len = i_pos - anchor_pos
-            m_len = i_pos
-            i_pos += 4
-            ref_pos += 4
-            while i_pos < last_literal_pos and i_buf[i_pos] == i_buf[ref_pos]:
-                i_pos += 1
-                ref_pos += 1
-
-            m_len = i_pos - m_len
-            token = m_len - 4 if m_len < 19 else 15
-
-            # Write token, length of literals if needed
-            if l_len >= 15:
-                o_buf[o_pos] = 0xF0 | token
-                o_pos += 1
-                l = l_len - 15
-                while l >= 255:
-                    o_buf[o_pos] = 255
-                    o_pos += 1
-                    l -= 255
-                o_buf[o_pos] = l
-                o_pos += 1
+            # Match
+            m_offset = i_buf[i_pos] | i_buf[i_pos + 1] << 8
+            i_pos += 2
+            if m_offset == 0 or m_offset > len(o_buf):
+                raise LZ4RangeException("Invalid match offset")
+
+            m_len = (token & 0x0F) + 4
+            if m_len == 19:
+                while True:
+                    l = i_buf[i_pos]
+                    i_pos += 1
+                    m_len += l
+                    if l != 255:
+                        break
+
+            m_pos = len(o_buf) - m_offset
+            if m_offset >= m_len:
+                o_buf += o_buf[m_pos:m_pos + m_len]
             else:
-                o_buf[o_pos] = (l_len << 4) | token
-                o_pos += 1
+                # Overlapping match, repeat the referenced bytes
+                pattern = o_buf[m_pos:]
+                o_buf += (pattern * (m_len // m_offset + 1))[:m_len]
 
-            # Write literals
-            while l_len > 0:
-                l_len -= 1
-                o_buf[o_pos] = i_buf[anchor_pos]
-                o_pos += 1
-                anchor_pos += 1
+        if len(o_buf) > o_len:
+            raise LZ4RangeException("Output buffer is too small")
 
-            if m_len == 0:
-                break
+        return bytes(o_buf)
 
-            # Write offset of match
-            o_buf[o_pos + 0] = m_offset
-            o_buf[o_pos + 1] = m_offset >> 8
-            o_pos += 2
+    @staticmethod
+    def _find_matches(i_buf: np.ndarray, start: int, end: int, last_match_pos: int, last_literal_pos: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Greedily find the matches starting in [start, end) and
+        return their positions, offsets and lengths."""
+        limit = min(end, last_literal_pos)
+        match_end = min(end - 1, last_match_pos, limit - 4)
+        window_start = max(start - 65535, 0)
 
-            # Write length of match if needed
-            if m_len >= 19:
-                l = m_len - 19
-                while l >= 255:
-                    o_buf[o_pos] = 255
-                    o_pos += 1
-                    l -= 255
+        # 4-byte sequence at every position that can be referenced or
+        # start a match
+        positions = np.arange(window_start, match_end + 1, dtype=np.int64)
+        if positions.size == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+        sequences = (i_buf[positions].astype(np.uint32)
+                     | i_buf[positions + 1].astype(np.uint32) << 8
+                     | i_buf[positions + 2].astype(np.uint32) << 16
+                     | i_buf[positions + 3].astype(np.uint32) << 24)
 
-                o_buf[o_pos] = l
-                o_pos += 1
+        # Most recent previous position with the same sequence. Two
+        # stable 16-bit sorts (radix sorts in NumPy) are faster than one
+        # 32-bit sort
+        order = np.argsort((sequences & 0xFFFF).astype(np.uint16), kind='stable')
+        order = order[np.argsort((sequences[order] >> 16).astype(np.uint16), kind='stable')]
+        sorted_sequences = sequences[order]
+        ref = np.full(positions.size, -1, dtype=np.int64)
+        same = sorted_sequences[1:] == sorted_sequences[:-1]
+        ref[order[1:][same]] = positions[order[:-1][same]]
 
-            anchor_pos = i_pos
+        m_pos = positions[start - window_start:]
+        ref = ref[start - window_start:]
+        valid = (ref >= 0) & (m_pos - ref < 65536)
+        m_pos = m_pos[valid]
+        ref = ref[valid]
 
-        # Last sequence is literals only
+        # Measure all candidate matches up to bulk_match_len bytes, eight
+        # bytes at a time
+        words = np.zeros(limit - window_start + 8, dtype=np.uint64)
+        data = i_buf[window_start:limit]
+        for shift in range(8):
+            words[:data.size - shift] |= data[shift:].astype(np.uint64) << np.uint64(shift * 8)
+        max_len = np.minimum(limit - m_pos, LZ4.bulk_match_len)
+        m_len = np.full(m_pos.size, 4, dtype=np.int64)
+        active = np.arange(m_pos.size)
+        while active.size > 0:
+            diff = words[m_pos[active] + m_len[active] - window_start] ^ words[ref[active] + m_len[active] - window_start]
+            matched = diff == 0
+            low_bit = diff[~matched] & (~diff[~matched] + np.uint64(1))
+            m_len[active[~matched]] += np.log2(low_bit.astype(np.float64)).astype(np.int64) // 8
+            m_len[active[matched]] += 8
+            active = active[matched]
+            active = active[m_len[active] < max_len[active]]
+        m_len = np.minimum(m_len, max_len)
+
+        # Consecutive candidates with the same offset belong to the same
+        # run, so only the length of the last candidate of each run
+        # needs to be known exactly
+        m_offset = m_pos - ref
+        same_run = np.zeros(m_pos.size, dtype=bool)
+        same_run[:-1] = (m_pos[1:] == m_pos[:-1] + 1) & (m_offset[1:] == m_offset[:-1])
+        run_end = np.where(same_run, m_pos.size, np.arange(m_pos.size))
+        run_end = np.minimum.accumulate(run_end[::-1])[::-1]
+        for k in np.flatnonzero((m_len >= LZ4.bulk_match_len) & ~same_run & (m_pos + m_len < limit)).tolist():
+            m_len[k] = LZ4._extend_match(i_buf, int(m_pos[k]), int(ref[k]), int(m_len[k]), limit)
+        long_match = m_len >= LZ4.bulk_match_len
+        m_len[long_match] = (m_len[run_end] + m_pos[run_end] - m_pos)[long_match]
+
+        # Greedy parse, like the reference encoder: after each match,
+        # take the first candidate at or after its end
+        next_candidate = np.full(limit - start + 1, m_pos.size, dtype=np.int64)
+        next_candidate[m_pos - start] = np.arange(m_pos.size)
+        next_candidate = np.minimum.accumulate(next_candidate[::-1])[::-1]
+        successors = next_candidate[np.minimum(m_pos + m_len, limit) - start].tolist()
+        num_candidates = len(successors)
+        chosen = []
+        k = 0
+        while k < num_candidates:
+            chosen.append(k)
+            k = successors[k]
+
+        chosen = np.array(chosen, dtype=np.int64)
+        return m_pos[chosen], m_offset[chosen], m_len[chosen]
+
+    @staticmethod
+    def _extend_match(i_buf: np.ndarray, pos: int, ref: int, length: int, limit: int) -> int:
+        """Extend a match of the given length as far as possible
+        without exceeding `limit`."""
+        step = 256
+        while pos + length < limit:
+            n = min(step, limit - pos - length)
+            mismatch = np.flatnonzero(i_buf[pos + length:pos + length + n] != i_buf[ref + length:ref + length + n])
+            if mismatch.size > 0:
+                return length + int(mismatch[0])
+            length += n
+            step *= 4
+        return length
+
+    @staticmethod
+    def _write_sequences(i_buf: np.ndarray, anchor_pos: int, m_pos: np.ndarray, m_offset: np.ndarray, m_len: np.ndarray) -> np.ndarray:
+        """Write the given matches and the literals preceding them."""
+        if m_pos.size == 0:
+            return np.empty(0, dtype=np.uint8)
+
+        l_start = np.empty_like(m_pos)
+        l_start[0] = anchor_pos
+        l_start[1:] = m_pos[:-1] + m_len[:-1]
+        l_len = m_pos - l_start
+
+        token = np.minimum(l_len, 15) << 4 | np.minimum(m_len - 4, 15)
+        l_ext = np.where(l_len >= 15, (l_len - 15) // 255 + 1, 0)
+        m_ext = np.where(m_len >= 19, (m_len - 19) // 255 + 1, 0)
+        size = 1 + l_ext + l_len + 2 + m_ext
+        seq_pos = np.cumsum(size) - size
+
+        o_buf = np.empty(int(size.sum()), dtype=np.uint8)
+        o_buf[seq_pos] = token
+
+        # Length of literals if needed
+        l_ext_pos = seq_pos + 1
+        o_buf[_ranges(l_ext_pos, l_ext)] = 255
+        has_ext = l_ext > 0
+        o_buf[(l_ext_pos + l_ext - 1)[has_ext]] = ((l_len - 15) % 255)[has_ext]
+
+        # Literals
+        o_buf[_ranges(l_ext_pos + l_ext, l_len)] = i_buf[_ranges(l_start, l_len)]
+
+        # Offset of match
+        offset_pos = l_ext_pos + l_ext + l_len
+        o_buf[offset_pos] = m_offset & 0xFF
+        o_buf[offset_pos + 1] = m_offset >> 8
+
+        # Length of match if needed
+        m_ext_pos = offset_pos + 2
+        o_buf[_ranges(m_ext_pos, m_ext)] = 255
+        has_ext = m_ext > 0
+        o_buf[(m_ext_pos + m_ext - 1)[has_ext]] = ((m_len - 19) % 255)[has_ext]
+
+        return o_buf
+
+    @staticmethod
+    def _write_literals(i_buf: np.ndarray, anchor_pos: int, i_len: int) -> np.ndarray:
+        """Write the final literals-only sequence."""
         l_len = i_len - anchor_pos
+        header = bytearray()
         if l_len >= 15:
-            o_buf[o_pos] = 0xF0
-            o_pos += 1
+            header.append(0xF0)
             l = l_len - 15
-            while l >= 255:
-                o_buf[o_pos] = 255
-                o_pos += 1
-                l -= 255
-
-            o_buf[o_pos] = l
-            o_pos += 1
-
+            header.extend(b'\xff' * (l // 255))
+            header.append(l % 255)
         else:
-            o_buf[o_pos] = l_len << 4
-            o_pos += 1
+            header.append(l_len << 4)
+
+        return np.concatenate((np.frombuffer(bytes(header), dtype=np.uint8), i_buf[anchor_pos:i_len]))
 
-        while l_len > 0:
-            l_len -= 1
-            o_buf[o_pos] = i_buf[anchor_pos]
-            o_pos += 1
-            anchor_pos += 1
 
-        return np.resize(o_buf, o_pos).tobytes()
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Return the concatenation of `arange(s, s + l)` for all given
+    starts and lengths."""
+    total = int(lengths.sum())
+    offsets = np.cumsum(lengths) - lengths
+    return np.arange(total, dtype=np.int64) + np.repeat(starts - offsets, lengths)
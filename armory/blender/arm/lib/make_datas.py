@@ -1,14 +1,187 @@
+import copy
+import hashlib
+import json
+import os
+import re
+from typing import Optional
+
 import arm.utils
 from arm import assets
 
+# Kinds of the items of a tokenized shader source
+IF, IFDEF, IFNDEF, ELIF, ELSE, ENDIF, DEFINE, UNDEF, INCLUDE, IN, UNIFORM, CODE = range(12)
+
+# Items that end the list of vertex elements at the top of a vertex
+# shader, see ShaderParser.parse()
+ENDS_VERTEX_ELEMENTS = (DEFINE, UNDEF, INCLUDE, UNIFORM, CODE)
+
+_EXPR_TOKEN = re.compile(
+    r"\s*(?:(0[xX][0-9a-fA-F]+|\d+)[uUlL]*|([A-Za-z_]\w*)|(&&|\|\||==|!=|<=|>=|<<|>>|[-+*/%()<>!~&|^?:]))"
+)
+_BINARY_OPS = {
+    "||": (1, lambda a, b: int(bool(a) or bool(b))),
+    "&&": (2, lambda a, b: int(bool(a) and bool(b))),
+    "|": (3, lambda a, b: a | b),
+    "^": (4, lambda a, b: a ^ b),
+    "&": (5, lambda a, b: a & b),
+    "==": (6, lambda a, b: int(a == b)),
+    "!=": (6, lambda a, b: int(a != b)),
+    "<": (7, lambda a, b: int(a < b)),
+    ">": (7, lambda a, b: int(a > b)),
+    "<=": (7, lambda a, b: int(a <= b)),
+    ">=": (7, lambda a, b: int(a >= b)),
+    "<<": (8, lambda a, b: a << b),
+    ">>": (8, lambda a, b: a >> b),
+    "+": (9, lambda a, b: a + b),
+    "-": (9, lambda a, b: a - b),
+    "*": (10, lambda a, b: a * b),
+    "/": (10, lambda a, b: int(a / b) if b != 0 else 0),
+    "%": (10, lambda a, b: a - int(a / b) * b if b != 0 else 0),
+}
+
+
+class DefSet:
+    """The defines of a build, recording which of them were looked up
+    so that the result of parsing a shader pass can be reused as long
+    as none of these defines change."""
+
+    def __init__(self, defs: list[str]):
+        self.defs = set(defs)
+        self.queried: dict[str, bool] = {}
+
+    def __contains__(self, name: str) -> bool:
+        found = name in self.defs
+        self.queried[name] = found
+        return found
+
+
+class ShaderSource:
+    """A shader file reduced to the lines that are relevant for the
+    shader data: preprocessor directives, vertex elements and
+    uniforms."""
+
+    def __init__(self, text: str):
+        self.digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        self.items = tokenize(text.splitlines())
+
+
+# Tokenized shader files by absolute path, with the modification time
+# and size of the file they were read from
+_sources: dict[str, tuple[int, int, ShaderSource]] = {}
+
+# Shader data of each shader pass from the previous builds, see make()
+_pass_cache: dict[str, dict] = {}
+
+
+def get_source(path: str) -> ShaderSource:
+    """Return the tokenized shader file at the given path. Each file is
+    only read again if it was modified."""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    cached = _sources.get(path)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+
+    with open(path, encoding="utf-8") as f:
+        source = ShaderSource(f.read())
+    # Keep the previous items if only the modification time changed
+    if cached is not None and cached[2].digest == source.digest:
+        source = cached[2]
+    _sources[path] = (st.st_mtime_ns, st.st_size, source)
+    return source
+
+
+def _strip_comment(line: str) -> str:
+    return re.sub(r"/\*.*?\*/", " ", line).split("//", 1)[0].strip()
+
+
+def tokenize(lines: list[str]) -> list[tuple]:
+    """Reduce the given lines of a shader to a list of items."""
+    items = []
+    for line in lines:
+        line = line.lstrip()
+        if len(line) == 0:
+            continue
+
+        if line.startswith("#"):
+            directive = _strip_comment(line[1:])
+            s = directive.split(None, 1)
+            name = s[0] if len(s) > 0 else ""
+            arg = s[1] if len(s) > 1 else ""
+            if name == "if":
+                items.append((IF, arg))
+            elif name == "ifdef":
+                items.append((IFDEF, arg.split()[0] if arg else ""))
+            elif name == "ifndef":
+                items.append((IFNDEF, arg.split()[0] if arg else ""))
+            elif name == "elif":
+                items.append((ELIF, arg))
+            elif name == "else":
+                items.append((ELSE,))
+            elif name == "endif":
+                items.append((ENDIF,))
+            elif name == "define" and arg:
+                match = re.match(r"([A-Za-z_]\w*)(\([^)]*\))?\s*(.*)", arg)
+                if match is not None:
+                    # Function-like macros are only tracked as defined
+                    items.append((DEFINE, match.group(1), "1" if match.group(2) else match.group(3)))
+            elif name == "undef" and arg:
+                items.append((UNDEF, arg.split()[0]))
+            elif name == "include" and len(arg) > 2:
+                items.append((INCLUDE, arg[1:-1]))
+            elif len(items) == 0 or items[-1][0] != CODE:
+                items.append((CODE,))
+            continue
+
+        if line.startswith("in "):
+            s = line.split(" ")
+            if len(s) > 2:
+                # [:-1] to get rid of the semicolon
+                items.append((IN, "float" + s[1][-1:], s[2][:-1]))
+                continue
+
+        if line.startswith("uniform ") or line.startswith("//!uniform"):
+            # Uniforms included from header files
+            s = line.split(" ")
+            # Examples:
+            #   uniform sampler2D myname;
+            #   uniform layout(RGBA8) image3D myname;
+            if s[1].startswith("layout"):
+                ctype, cid = (s[2], s[3]) if len(s) > 3 else ("", "")
+            else:
+                ctype, cid = (s[1], s[2]) if len(s) > 2 else ("", "")
+            if cid.endswith(";"):
+                cid = cid[:-1]
+            if cid != "":
+                # Comments don't end the vertex elements
+                items.append((UNIFORM, ctype, cid, line.startswith("uniform ")))
+                continue
+
+        if line.startswith("//"):
+            continue
+
+        if len(items) == 0 or items[-1][0] != CODE:
+            items.append((CODE,))
+
+    return items
+
 def parse_context(
     c: dict,
     sres: dict,
     asset,
-    defs: list[str],
+    defs: DefSet,
+    include_dirs: list[str],
     vert: list[str] = None,
     frag: list[str] = None,
-):
+    vert_path: str = None,
+    frag_path: str = None,
+) -> dict[str, str]:
+    """Adds the shader data of the given context to `sres` and returns
+    the digests of the parsed shader files by path.
+
+    If the lines of the vertex or fragment shader are given, includes
+    are resolved relative to `vert_path` and `frag_path`.
+    """
     con = {
         "name": c["name"],
         "constants": [],
@@ -72,164 +245,301 @@ def parse_context(
             con[p] = c[p]
 
     # Parse shaders
+    parser = ShaderParser(c, con, defs, include_dirs)
     if vert is None:
-        with open(c["vertex_shader"], encoding="utf-8") as f:
-            vert = f.read().splitlines()
-    parse_shader(sres, c, con, defs, vert, True)  # Parse attribs for vertex shader
+        parser.parse_file(c["vertex_shader"], True)  # Parse attribs for vertex shader
+    else:
+        parser.parse_lines(vert, vert_path or c["vertex_shader"], True)
 
     if frag is None:
-        with open(c["fragment_shader"], encoding="utf-8") as f:
-            frag = f.read().splitlines()
-    parse_shader(sres, c, con, defs, frag, False)
+        parser.parse_file(c["fragment_shader"], False)
+    else:
+        parser.parse_lines(frag, frag_path or c["fragment_shader"], False)
 
-    if "geometry_shader" in c:
-        with open(c["geometry_shader"], encoding="utf-8") as f:
-            geom = f.read().splitlines()
-        parse_shader(sres, c, con, defs, geom, False)
+    for s in ("geometry_shader", "tesscontrol_shader", "tesseval_shader"):
+        if s in c:
+            parser.parse_file(c[s], False)
 
-    if "tesscontrol_shader" in c:
-        with open(c["tesscontrol_shader"], encoding="utf-8") as f:
-            tesc = f.read().splitlines()
-        parse_shader(sres, c, con, defs, tesc, False)
+    return parser.files
 
-    if "tesseval_shader" in c:
-        with open(c["tesseval_shader"], encoding="utf-8") as f:
-            tese = f.read().splitlines()
-        parse_shader(sres, c, con, defs, tese, False)
 
+class ShaderParser:
+    """Parses the shaders of a context to get information about the
+    used vertex elements, uniforms and constants. This information is
+    later used in Iron to check what data each shader requires.
 
-def parse_shader(
-    sres, c: dict, con: dict, defs: list[str], lines: list[str], parse_attributes: bool
-):
-    """Parses the given shader to get information about the used vertex
-    elements, uniforms and constants. This information is later used in
-    Iron to check what data each shader requires.
-
-    @param defs A list of set defines for the preprocessor
-    @param lines The list of lines of the shader file
-    @param parse_attributes Whether to parse vertex elements
+    Preprocessor conditions (`#if`, `#ifdef`, `#ifndef`, `#elif`,
+    `#else`) are evaluated against the given defines and the macros
+    defined by the shaders, and uniforms of included files are added
+    as well.
     """
-    vertex_elements_parsed = False
-    vertex_elements_parsing = False
-
-    # Stack of the state of all preprocessor conditions for the current
-    # line. If there is a `False` in the stack, at least one surrounding
-    # condition is false and the line must not be parsed
-    stack: list[bool] = []
-
-    if not parse_attributes:
-        vertex_elements_parsed = True
-
-    for line in lines:
-        line = line.lstrip()
 
-        # Preprocessor
-        if line.startswith("#if"):  # if, ifdef, ifndef
-            s = line.split(" ")[1]
-            found = s in defs
-            if line.startswith("#ifndef"):
-                found = not found
-            stack.append(found)
-            continue
-
-        if line.startswith("#else"):
-            stack[-1] = not stack[-1]
-            continue
-
-        if line.startswith("#endif"):
-            stack.pop()
-            continue
-
-        # Skip lines if the stack contains at least one preprocessor
-        # condition that is not fulfilled
-        skip = False
-        for condition in stack:
-            if not condition:
-                skip = True
-                break
-        if skip:
-            continue
-
-        if not vertex_elements_parsed and line.startswith("in "):
-            vertex_elements_parsing = True
-            s = line.split(" ")
-            con["vertex_elements"].append(
-                {
-                    "data": "float" + s[1][-1:],
-                    "name": s[2][:-1],  # [:1] to get rid of the semicolon
-                }
-            )
-
-        # Stop the vertex element parsing if no other vertex elements
-        # follow directly (assuming all vertex elements are positioned
-        # directly after each other apart from empty lines and comments)
+    def __init__(self, c: dict, con: dict, defs: DefSet, include_dirs: list[str]):
+        self.c = c
+        self.con = con
+        self.defs = defs
+        self.include_dirs = include_dirs
+        # Macros defined or undefined (None) by the shaders
+        self.macros: dict[str, Optional[str]] = {}
+        # Digests of all parsed files by absolute path
+        self.files: dict[str, str] = {}
+
+    def parse_file(self, path: str, parse_attributes: bool):
+        source = get_source(path)
+        self.files[os.path.abspath(path)] = source.digest
+        self.parse(source, path, parse_attributes)
+
+    def parse_lines(self, lines: list[str], path: str, parse_attributes: bool):
+        self.parse(ShaderSource("\n".join(lines)), path, parse_attributes)
+
+    def parse(self, source: ShaderSource, path: str, parse_attributes: bool, depth: int = 0):
+        """Parse the given source. `path` is used to resolve includes
+        relative to the file.
+
+        @param parse_attributes Whether to parse vertex elements
+        """
+        vertex_elements_parsed = not parse_attributes
+        vertex_elements_parsing = False
+
+        # Stack of [active, taken, parent_active] for each surrounding
+        # preprocessor condition. Lines are only parsed if the innermost
+        # condition is active
+        stack: list[list[bool]] = []
+        active = True
+
+        for item in source.items:
+            kind = item[0]
+
+            # Preprocessor
+            if kind == IF or kind == IFDEF or kind == IFNDEF:
+                if not active:
+                    cond = False
+                elif kind == IF:
+                    cond = self.evaluate(item[1]) != 0
+                else:
+                    cond = self.is_defined(item[1]) == (kind == IFDEF)
+                stack.append([active and cond, cond, active])
+                active = active and cond
+                continue
+
+            if kind == ELIF or kind == ELSE:
+                if len(stack) == 0:
+                    continue
+                frame = stack[-1]
+                if frame[1] or not frame[2]:
+                    frame[0] = False
+                else:
+                    cond = kind == ELSE or self.evaluate(item[1]) != 0
+                    frame[0] = cond
+                    frame[1] = cond
+                active = frame[0]
+                continue
+
+            if kind == ENDIF:
+                if len(stack) > 0:
+                    active = stack.pop()[2]
+                continue
+
+            if not active:
+                continue
+
+            if kind == DEFINE:
+                self.macros[item[1]] = item[2]
+            elif kind == UNDEF:
+                self.macros[item[1]] = None
+            elif kind == INCLUDE:
+                self.include(item[1], path, depth)
+            elif kind == IN:
+                if not vertex_elements_parsed and depth == 0:
+                    vertex_elements_parsing = True
+                    self.con["vertex_elements"].append({"data": item[1], "name": item[2]})
+                    continue
+            elif kind == UNIFORM:
+                self.add_uniform(item[1], item[2])
+                if not item[3]:
+                    continue
+
+            # Stop the vertex element parsing if no other vertex elements
+            # follow directly (assuming all vertex elements are positioned
+            # directly after each other apart from empty lines and comments)
+            if vertex_elements_parsing:
+                vertex_elements_parsed = True
+                vertex_elements_parsing = False
+
+    def include(self, include_path: str, path: str, depth: int):
+        if depth >= 32:
+            return
+
+        directory = os.path.dirname(os.path.abspath(path))
+        for base in [directory, os.path.dirname(directory)] + self.include_dirs:
+            full_path = os.path.normpath(os.path.join(base, include_path))
+            if os.path.isfile(full_path):
+                source = get_source(full_path)
+                self.files[full_path] = source.digest
+                self.parse(source, full_path, False, depth + 1)
+                return
+
+    def is_defined(self, name: str) -> bool:
+        if name in self.macros:
+            return self.macros[name] is not None
+        return name in self.defs
+
+    def evaluate(self, expr: str, depth: int = 0) -> int:
+        """Evaluate the expression of an `#if` or `#elif` directive.
+        Undefined identifiers are 0, defines without value are 1."""
+        tokens = []
+        pos = 0
+        while pos < len(expr):
+            match = _EXPR_TOKEN.match(expr, pos)
+            if match is None:
+                if expr[pos:].strip() == "":
+                    break
+                # Not an integer expression
+                return 0
+            number, ident, op = match.groups()
+            if number is not None:
+                tokens.append(int(number, 0))
+            elif ident is not None:
+                tokens.append(("id", ident))
+            else:
+                tokens.append(op)
+            pos = match.end()
+
+        self._tokens = tokens
+        self._pos = 0
+        self._depth = depth
+        try:
+            value = self._ternary()
+        except (IndexError, TypeError, ValueError, RecursionError):
+            return 0
+        return value
+
+    def _next(self):
+        token = self._tokens[self._pos] if self._pos < len(self._tokens) else None
+        self._pos += 1
+        return token
+
+    def _peek(self):
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _ternary(self) -> int:
+        cond = self._binary(1)
+        if self._peek() == "?":
+            self._next()
+            a = self._ternary()
+            if self._next() != ":":
+                raise ValueError()
+            b = self._ternary()
+            return a if cond else b
+        return cond
+
+    def _binary(self, min_prec: int) -> int:
+        left = self._unary()
+        while True:
+            op = self._peek()
+            if not isinstance(op, str) or op not in _BINARY_OPS or _BINARY_OPS[op][0] < min_prec:
+                return left
+            self._next()
+            prec, func = _BINARY_OPS[op]
+            right = self._binary(prec + 1)
+            left = func(left, right)
+
+    def _unary(self) -> int:
+        token = self._next()
+        if token == "!":
+            return int(not self._unary())
+        if token == "~":
+            return ~self._unary()
+        if token == "-":
+            return -self._unary()
+        if token == "+":
+            return self._unary()
+        if token == "(":
+            value = self._ternary()
+            if self._next() != ")":
+                raise ValueError()
+            return value
+        if isinstance(token, int):
+            return token
+        if isinstance(token, tuple):
+            name = token[1]
+            if name == "defined":
+                token = self._next()
+                if token == "(":
+                    token = self._next()
+                    if self._next() != ")":
+                        raise ValueError()
+                if not isinstance(token, tuple):
+                    raise ValueError()
+                return int(self.is_defined(token[1]))
+            return self.macro_value(name)
+        raise ValueError()
+
+    def macro_value(self, name: str) -> int:
+        if name in self.macros:
+            value = self.macros[name]
+            if value is None:
+                return 0
+        elif name in self.defs:
+            return 1
+        else:
+            return 0
+
+        if value.strip() == "":
+            return 1
+        if self._depth >= 16:
+            return 0
+        # Evaluate the macro in its own parser state
+        tokens, pos, depth = self._tokens, self._pos, self._depth
+        result = self.evaluate(value, depth + 1)
+        self._tokens, self._pos, self._depth = tokens, pos, depth
+        return result
+
+    def add_uniform(self, ctype: str, cid: str):
+        c, con, defs = self.c, self.con, self.defs
+
+        found = False  # Uniqueness check
         if (
-            vertex_elements_parsing
-            and len(line) > 0
-            and not line.startswith("//")
-            and not line.startswith("in ")
-        ):
-            vertex_elements_parsed = True
-
-        if line.startswith("uniform ") or line.startswith(
-            "//!uniform"
-        ):  # Uniforms included from header files
-            s = line.split(" ")
-            # Examples:
-            #   uniform sampler2D myname;
-            #   uniform layout(RGBA8) image3D myname;
-            if s[1].startswith("layout"):
-                ctype = s[2]
-                cid = s[3]
-                if cid[-1] == ";":
-                    cid = cid[:-1]
+            ctype.startswith("sampler")
+            or ctype.startswith("image")
+            or ctype.startswith("uimage")
+        ):  # Texture unit
+            if cid[-1] == "]":  # Array of samplers - sampler2D mySamplers[2]
+                # Add individual units - mySamplers[0], mySamplers[1]
+                for i in range(int(cid[-2])):
+                    name = cid[:-2] + str(i) + "]"
+                    if not any(tu["name"] == name for tu in con["texture_units"]):
+                        con["texture_units"].append({"name": name})
             else:
-                ctype = s[1]
-                cid = s[2]
-                if cid[-1] == ";":
-                    cid = cid[:-1]
-
-            found = False  # Uniqueness check
-            if (
-                ctype.startswith("sampler")
-                or ctype.startswith("image")
-                or ctype.startswith("uimage")
-            ):  # Texture unit
                 for tu in con["texture_units"]:
                     if tu["name"] == cid:
                         # Texture already present
                         found = True
                         break
                 if not found:
-                    if cid[-1] == "]":  # Array of samplers - sampler2D mySamplers[2]
-                        # Add individual units - mySamplers[0], mySamplers[1]
-                        for i in range(int(cid[-2])):
-                            tu = {"name": cid[:-2] + str(i) + "]"}
-                            con["texture_units"].append(tu)
-                    else:
-                        tu = {"name": cid}
-                        con["texture_units"].append(tu)
-                        if ctype.startswith("image") or ctype.startswith("uimage"):
-                            tu["is_image"] = True
-
-                        check_link(c, defs, cid, tu)
-
-            else:  # Constant
-                if cid.find("[") != -1:  # Float arrays
-                    cid = cid.split("[")[0]
-                    ctype = "floats"
-                for const in con["constants"]:
-                    if const["name"] == cid:
-                        found = True
-                        break
-                if not found:
-                    const = {"type": ctype, "name": cid}
-                    con["constants"].append(const)
+                    tu = {"name": cid}
+                    con["texture_units"].append(tu)
+                    if ctype.startswith("image") or ctype.startswith("uimage"):
+                        tu["is_image"] = True
+
+                    check_link(c, defs, cid, tu)
 
-                    check_link(c, defs, cid, const)
+        else:  # Constant
+            if cid.find("[") != -1:  # Float arrays
+                cid = cid.split("[")[0]
+                ctype = "floats"
+            for const in con["constants"]:
+                if const["name"] == cid:
+                    found = True
+                    break
+            if not found:
+                const = {"type": ctype, "name": cid}
+                con["constants"].append(const)
 
+                check_link(c, defs, cid, const)
 
-def check_link(source_context: dict, defs: list[str], cid: str, out: dict):
+
+def check_link(source_context: dict, defs: DefSet, cid: str, out: dict):
     """Checks whether the uniform/constant with the given name (`cid`)
     has a link stated in the json (`source_context`) that can be safely
     included based on the given defines (`defs`). If that is the case,
@@ -242,29 +552,13 @@ def check_link(source_context: dict, defs: list[str], cid: str, out: dict):
             # Optionally only use link if at least
             # one of the given defines is set
             if "ifdef" in link:
-                def_found = False
-                for d in defs:
-                    for link_def in link["ifdef"]:
-                        if d == link_def:
-                            def_found = True
-                            break
-                    if def_found:
-                        break
-                if not def_found:
+                if not any(link_def in defs for link_def in link["ifdef"]):
                     valid_link = False
 
             # Optionally only use link if none of
             # the given defines are set
             if "ifndef" in link:
-                def_found = False
-                for d in defs:
-                    for link_def in link["ifndef"]:
-                        if d == link_def:
-                            def_found = True
-                            break
-                    if def_found:
-                        break
-                if def_found:
+                if any(link_def in defs for link_def in link["ifndef"]):
                     valid_link = False
 
             if valid_link:
@@ -275,9 +569,31 @@ def check_link(source_context: dict, defs: list[str], cid: str, out: dict):
 def make(
     res: dict, base_name: str, json_data: dict, fp, defs: list[str], make_variants: bool
 ):
-    sres = {"name": base_name, "contexts": []}
-    res["shader_datas"].append(sres)
+    """Adds the shader data of the given shader pass to `res`.
+
+    The result is reused from previous calls as long as the json data,
+    the parsed shader files and all defines that were looked up while
+    parsing stay the same, so that changing a define only parses the
+    shader passes that depend on it.
+    """
     asset = assets.shader_passes_assets[base_name]
+    key = hashlib.blake2b(
+        json.dumps([json_data, make_variants], sort_keys=True).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+    cached = _pass_cache.get(base_name)
+    if cached is not None and cached["key"] == key and is_pass_cache_valid(cached, defs):
+        res["shader_datas"].append(copy.deepcopy(cached["sres"]))
+        for name in cached["asset"]:
+            if name not in asset:
+                asset.append(name)
+        return
+
+    sres = {"name": base_name, "contexts": []}
+    defs = DefSet(defs)
+    include_dirs = [os.path.join(arm.utils.get_fp_build(), "compiled", "Shaders")]
+    files = {}
+    cacheable = True
 
     vert = None
     frag = None
@@ -322,7 +638,38 @@ def make(
             c2["vertex_shader"] = base_name + d + ".vert.glsl"
             c2["fragment_shader"] = base_name + d + ".frag.glsl"
             c2["name"] = c["name"] + d
-            parse_context(c2, sres, asset, defs, vert.splitlines(), frag.splitlines())
+            files.update(parse_context(
+                c2, sres, asset, defs, include_dirs,
+                vert.splitlines(), frag.splitlines(), c["vertex_shader"], c["fragment_shader"]
+            ))
+            # The variant files are written above, don't skip that
+            cacheable = False
 
     for c in json_data["contexts"]:
-        parse_context(c, sres, asset, defs)
+        files.update(parse_context(c, sres, asset, defs, include_dirs))
+
+    res["shader_datas"].append(sres)
+    if cacheable:
+        _pass_cache[base_name] = {
+            "key": key,
+            "defs": defs.queried,
+            "files": files,
+            "sres": copy.deepcopy(sres),
+            "asset": list(asset),
+        }
+    else:
+        _pass_cache.pop(base_name, None)
+
+
+def is_pass_cache_valid(cached: dict, defs: list[str]) -> bool:
+    defs = set(defs)
+    for name, found in cached["defs"].items():
+        if (name in defs) != found:
+            return False
+    for path, digest in cached["files"].items():
+        try:
+            if get_source(path).digest != digest:
+                return False
+        except OSError:
+            return False
+    return True
@@ -0,0 +1,169 @@
+"""
+Triangle and vertex reordering for exported index arrays, based on
+"Fast Triangle Reordering for Vertex Locality and Reduced Overdraw"
+by Sander, Nehab and Barczak (2007).
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+
+def optimize_vertex_cache(indices: np.ndarray, num_verts: int, cache_size: int = 16) -> Tuple[np.ndarray, np.ndarray]:
+    """Reorder the triangles of the given index array for a better
+    post-transform vertex cache hit rate (Tipsify).
+
+    Returns the new order of the triangles (indices into the original
+    triangles) and the start of each cluster of triangles in the new
+    order. Clusters end where the cache locality is lost and can be
+    reordered freely, see `optimize_overdraw()`.
+    """
+    tris = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    num_tris = len(tris)
+    if num_tris == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # Vertex-triangle adjacency in compressed row format
+    corner_tris = np.repeat(np.arange(num_tris), 3)
+    corner_order = np.argsort(tris.reshape(-1), kind='stable')
+    valence = np.bincount(tris.reshape(-1), minlength=num_verts)
+    adj_offsets = np.concatenate(([0], np.cumsum(valence))).tolist()
+    adj_tris = corner_tris[corner_order].tolist()
+
+    tri_list = tris.tolist()
+    live = valence.tolist()
+    cache_time = [0] * num_verts
+    emitted = [False] * num_tris
+    dead_end: List[int] = []
+    timestamp = cache_size + 1
+    cursor = 0
+
+    order: List[int] = []
+    cluster_starts = [0]
+
+    fanning = int(tris[0, 0])
+    while fanning >= 0:
+        candidates = []
+        for t in adj_tris[adj_offsets[fanning]:adj_offsets[fanning + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            order.append(t)
+            for v in tri_list[t]:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if timestamp - cache_time[v] > cache_size:
+                    cache_time[v] = timestamp
+                    timestamp += 1
+
+        # Next fanning vertex: the candidate that is still in the cache
+        # and stays there the longest while its triangles are emitted
+        fanning = -1
+        best_priority = -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if timestamp - cache_time[v] + 2 * live[v] <= cache_size:
+                    priority = timestamp - cache_time[v]
+                if priority > best_priority:
+                    best_priority = priority
+                    fanning = v
+
+        if fanning < 0:
+            # Skip dead end, starting a new cluster
+            while len(dead_end) > 0:
+                v = dead_end.pop()
+                if live[v] > 0:
+                    fanning = v
+                    break
+            else:
+                while cursor < num_verts:
+                    if live[cursor] > 0:
+                        fanning = cursor
+                        break
+                    cursor += 1
+
+            if fanning >= 0 and len(order) > cluster_starts[-1]:
+                cluster_starts.append(len(order))
+
+    return np.array(order, dtype=np.int64), np.array(cluster_starts, dtype=np.int64)
+
+
+def optimize_overdraw(indices: np.ndarray, positions: np.ndarray, tri_order: np.ndarray, cluster_starts: np.ndarray) -> np.ndarray:
+    """Sort the clusters of triangles returned by `optimize_vertex_cache()`
+    so that clusters facing away from the mesh center are drawn first,
+    as they are more likely to occlude other clusters. The triangle
+    order inside of the clusters is kept.
+
+    Returns the new order of the triangles.
+    """
+    if len(cluster_starts) < 2:
+        return tri_order
+
+    tris = np.asarray(indices, dtype=np.int64).reshape(-1, 3)[tri_order]
+    p0 = positions[tris[:, 0]]
+    p1 = positions[tris[:, 1]]
+    p2 = positions[tris[:, 2]]
+
+    # Area weighted normals and centroids per cluster
+    normals = np.cross(p1 - p0, p2 - p0)
+    areas = np.linalg.norm(normals, axis=1)
+    centroids = (p0 + p1 + p2) / 3.0
+    cluster_normals = np.add.reduceat(normals, cluster_starts, axis=0)
+    cluster_areas = np.add.reduceat(areas, cluster_starts)
+    cluster_centroids = np.add.reduceat(centroids * areas[:, None], cluster_starts, axis=0)
+    cluster_centroids /= np.where(cluster_areas > 0, cluster_areas, 1.0)[:, None]
+
+    mesh_center = np.sum(centroids * areas[:, None], axis=0) / max(float(np.sum(areas)), 1e-30)
+    lengths = np.linalg.norm(cluster_normals, axis=1)
+    cluster_normals /= np.where(lengths > 0, lengths, 1.0)[:, None]
+    occlusion = np.sum((cluster_centroids - mesh_center) * cluster_normals, axis=1)
+
+    cluster_order = np.argsort(-occlusion, kind='stable')
+    cluster_ends = np.append(cluster_starts[1:], len(tri_order))
+    return np.concatenate([tri_order[cluster_starts[c]:cluster_ends[c]] for c in cluster_order])
+
+
+def optimize_vertex_fetch(index_arrays: List[np.ndarray], num_verts: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Order vertices by their first use in the given index arrays.
+    Unused vertices are moved to the end.
+
+    Returns `order` (old vertex index for each new vertex) and `remap`
+    (new vertex index for each old vertex).
+    """
+    all_indices = np.concatenate([np.asarray(a, dtype=np.int64).reshape(-1) for a in index_arrays]) if index_arrays else np.zeros(0, dtype=np.int64)
+    used, first_use = np.unique(all_indices, return_index=True)
+    used_order = used[np.argsort(first_use, kind='stable')]
+
+    unused = np.ones(num_verts, dtype=bool)
+    unused[used] = False
+    order = np.concatenate((used_order, np.flatnonzero(unused)))
+
+    remap = np.empty(num_verts, dtype=np.int64)
+    remap[order] = np.arange(num_verts)
+    return order, remap
+
+
+def analyze_vertex_cache(indices: np.ndarray, cache_size: int = 16) -> Tuple[float, float]:
+    """Simulate a FIFO vertex cache for the given index array.
+
+    Returns the average cache miss ratio (transformed vertices per
+    triangle, ACMR) and the average transform to vertex ratio
+    (transformed vertices per used vertex, ATVR).
+    """
+    flat = np.asarray(indices, dtype=np.int64).reshape(-1)
+    if len(flat) == 0:
+        return 0.0, 0.0
+
+    cache_entry_time = {}
+    time = 0
+    transformed = 0
+    for v in flat.tolist():
+        entry = cache_entry_time.get(v)
+        if entry is None or time - entry >= cache_size:
+            cache_entry_time[v] = time
+            time += 1
+            transformed += 1
+
+    num_unique = len(cache_entry_time)
+    return transformed / (len(flat) // 3), transformed / num_unique
@@ -0,0 +1,183 @@
+"""
+Irradiance and radiance probes from equirectangular environment maps.
+
+Directions follow `envMapEquirect()` in Shaders/std/math.glsl: the
+first row of an image is the +Z pole and the u coordinate wraps around
+the Z axis.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+from typing import List, Optional
+
+import numpy as np
+
+
+def equirect_directions(width: int, height: int) -> np.ndarray:
+    """Direction of each texel center, shape (height, width, 3)."""
+    phi = (np.arange(height) + 0.5) / height * math.pi
+    theta = (np.arange(width) + 0.5) / width * 2.0 * math.pi - math.pi
+    sin_phi = np.sin(phi)[:, None]
+    return np.stack((
+        sin_phi * np.cos(theta)[None, :],
+        -sin_phi * np.sin(theta)[None, :],
+        np.broadcast_to(np.cos(phi)[:, None], (height, width))), axis=2)
+
+
+def resize(image: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Resize an equirectangular image, wrapping around horizontally.
+    Downscaling is done by averaging 2x2 blocks first, so that no
+    texels are skipped.
+    """
+    while image.shape[1] >= 2 * width and image.shape[0] >= 2 * height:
+        h, w = image.shape[0] // 2 * 2, image.shape[1] // 2 * 2
+        image = image[:h, :w].reshape(h // 2, 2, w // 2, 2, -1).mean(axis=(1, 3))
+
+    if image.shape[0] == height and image.shape[1] == width:
+        return image
+
+    u = (np.arange(width) + 0.5) / width
+    v = (np.arange(height) + 0.5) / height
+    return _sample(image, np.broadcast_to(u[None, :], (height, width)), np.broadcast_to(v[:, None], (height, width)))
+
+
+def _sample(image: np.ndarray, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Bilinear lookup at the given texture coordinates."""
+    height, width = image.shape[:2]
+    x = u * width - 0.5
+    y = np.clip(v * height - 0.5, 0.0, height - 1)
+    x0 = np.floor(x)
+    y0 = np.floor(y)
+    fx = (x - x0)[..., None]
+    fy = (y - y0)[..., None]
+    x0 = x0.astype(np.int64) % width
+    x1 = (x0 + 1) % width
+    y0 = y0.astype(np.int64)
+    y1 = np.minimum(y0 + 1, height - 1)
+    top = image[y0, x0] * (1.0 - fx) + image[y0, x1] * fx
+    bottom = image[y1, x0] * (1.0 - fx) + image[y1, x1] * fx
+    return top * (1.0 - fy) + bottom * fy
+
+
+def sh_irradiance(image: np.ndarray) -> np.ndarray:
+    """Project an equirectangular radiance map onto the first three
+    bands of spherical harmonics.
+
+    Returns the 9 RGB coefficients in the order and coordinate frame
+    expected by `shIrradiance()` in Shaders/std/shirr.glsl.
+    """
+    height, width = image.shape[:2]
+    d = equirect_directions(width, height)
+    x, y, z = d[..., 1], -d[..., 2], d[..., 0]
+
+    # Solid angle of each texel, normalized so that the whole sphere is
+    # exactly 4 pi
+    weight = np.broadcast_to(np.sin((np.arange(height) + 0.5) / height * math.pi)[:, None], (height, width))
+    weight = weight * (4.0 * math.pi / np.sum(weight))
+
+    basis = np.stack((
+        np.full_like(x, 0.282095),
+        0.488603 * y,
+        0.488603 * z,
+        0.488603 * x,
+        1.092548 * x * y,
+        1.092548 * y * z,
+        0.315392 * (3.0 * z * z - 1.0),
+        1.092548 * x * z,
+        0.546274 * (x * x - y * y)), axis=2)
+
+    return np.einsum('hwc,hwk->kc', image[..., :3] * weight[..., None], basis)
+
+
+def _hammersley(count: int) -> np.ndarray:
+    bits = np.arange(count, dtype=np.uint32)
+    bits = ((bits << 16) | (bits >> 16)).astype(np.uint32)
+    bits = (((bits & 0x55555555) << 1) | ((bits & 0xAAAAAAAA) >> 1)).astype(np.uint32)
+    bits = (((bits & 0x33333333) << 2) | ((bits & 0xCCCCCCCC) >> 2)).astype(np.uint32)
+    bits = (((bits & 0x0F0F0F0F) << 4) | ((bits & 0xF0F0F0F0) >> 4)).astype(np.uint32)
+    bits = (((bits & 0x00FF00FF) << 8) | ((bits & 0xFF00FF00) >> 8)).astype(np.uint32)
+    return np.stack((np.arange(count) / count, bits * 2.3283064365386963e-10), axis=1)
+
+
+def prefilter_radiance(image: np.ndarray, num_mips: int, num_samples: int = 64, max_workers: Optional[int] = None) -> List[np.ndarray]:
+    """Generate the mip chain of a prefiltered radiance map for the GGX
+    distribution, with importance sampling as in "Real Shading in Unreal
+    Engine 4" by Karis (2013).
+
+    Mip `i` of the result has half the size of mip `i - 1` (the first
+    one has half the size of `image`) and is filtered with roughness
+    `(i + 1) / num_mips`, matching `getMipFromRoughness()`. Samples are
+    taken from a mip pyramid of the source, so that few of them are
+    needed (filtered importance sampling).
+    """
+    height, width = image.shape[:2]
+    image = image[..., :3].astype(np.float32)
+
+    pyramid = [image]
+    while pyramid[-1].shape[0] >= 2:
+        prev = pyramid[-1]
+        h, w = prev.shape[0] // 2 * 2, prev.shape[1] // 2 * 2
+        pyramid.append(prev[:h, :w].reshape(h // 2, 2, w // 2, 2, 3).mean(axis=(1, 3)))
+    texel_solid_angle = 4.0 * math.pi / (width * height)
+
+    # With N = V = R, the sample directions relative to the normal don't
+    # depend on the normal and can be computed once per roughness
+    xi = _hammersley(num_samples)
+
+    def filter_texels(mip: np.ndarray, normals: np.ndarray, local: np.ndarray, weights: np.ndarray, lods: np.ndarray):
+        up = np.where(np.abs(normals[:, 2:3]) < 0.999, np.array([[0.0, 0.0, 1.0]]), np.array([[1.0, 0.0, 0.0]]))
+        tangent = np.cross(up, normals)
+        tangent /= np.linalg.norm(tangent, axis=1)[:, None]
+        bitangent = np.cross(normals, tangent)
+
+        accum = np.zeros((len(normals), 3), dtype=np.float32)
+        for s in range(len(local)):
+            l = tangent * local[s, 0] + bitangent * local[s, 1] + normals * local[s, 2]
+            u = (np.arctan2(-l[:, 1], l[:, 0]) + math.pi) / (2.0 * math.pi)
+            v = np.arccos(np.clip(l[:, 2], -1.0, 1.0)) / math.pi
+
+            level = min(int(lods[s]), len(pyramid) - 1)
+            next_level = min(level + 1, len(pyramid) - 1)
+            t = lods[s] - level if next_level > level else 0.0
+            color = _sample(pyramid[level], u, v)
+            if t > 0.0:
+                color = color * (1.0 - t) + _sample(pyramid[next_level], u, v) * t
+            accum += color * weights[s]
+        mip[:] = accum / np.sum(weights)
+
+    mips = []
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        for i in range(num_mips):
+            mip_w = max(width >> (i + 1), 1)
+            mip_h = max(height >> (i + 1), 1)
+            roughness = (i + 1) / num_mips
+            a = roughness * roughness
+
+            cos_theta = np.sqrt((1.0 - xi[:, 1]) / (1.0 + (a * a - 1.0) * xi[:, 1]))
+            sin_theta = np.sqrt(1.0 - cos_theta * cos_theta)
+            phi = 2.0 * math.pi * xi[:, 0]
+            # Reflect the view direction (the normal) about the half vector
+            half = np.stack((sin_theta * np.cos(phi), sin_theta * np.sin(phi), cos_theta), axis=1)
+            local = 2.0 * cos_theta[:, None] * half
+            local[:, 2] -= 1.0
+            weights = np.maximum(local[:, 2], 0.0)
+
+            # Source mip with about the solid angle of each sample
+            d = cos_theta * cos_theta * (a * a - 1.0) + 1.0
+            pdf = a * a / (math.pi * d * d) / 4.0
+            sample_solid_angle = 1.0 / (num_samples * pdf + 1e-6)
+            lods = np.maximum(0.5 * np.log2(sample_solid_angle / texel_solid_angle) + 1.0, 0.0)
+
+            used = weights > 0.0
+            local, weights, lods = local[used], weights[used], lods[used]
+
+            mip = np.empty((mip_h * mip_w, 3), dtype=np.float32)
+            normals = equirect_directions(mip_w, mip_h).reshape(-1, 3)
+            chunk = max(1, (1 << 20) // len(local))
+            futures = [pool.submit(filter_texels, mip[start:start + chunk], normals[start:start + chunk], local, weights, lods)
+                       for start in range(0, len(normals), chunk)]
+            for future in futures:
+                future.result()
+            mips.append(mip.reshape(mip_h, mip_w, 3))
+
+    return mips
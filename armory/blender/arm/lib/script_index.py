@@ -0,0 +1,106 @@
+"""
+Persistent index of the Haxe sources of a project.
+
+Each source file is only parsed again if its modification time or size
+changed since the last update, files are found with os.scandir() and
+the index is stored as JSON so that it survives Blender restarts.
+"""
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+
+class ScriptIndex:
+    """Index of the .hx files in `root` and its subdirectories. The data
+    of each file is the result of `parse(source)` and must be JSON
+    serializable. `version` must change whenever the parse function
+    returns different data for the same source."""
+
+    def __init__(self, root: str, index_path: str, parse: Callable[[str], Any], version: str):
+        self.root = root
+        self.index_path = index_path
+        self.parse = parse
+        self.version = version
+        # Path relative to the root ('/' separated) -> entry with
+        # 'mtime', 'size' and 'data'
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if index.get('version') == self.version and index.get('root') == self.root:
+            self.entries = index['entries']
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'root': self.root, 'entries': self.entries}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def scan(self) -> Dict[str, os.stat_result]:
+        files = {}
+        stack = ['']
+        while len(stack) > 0:
+            rel_dir = stack.pop()
+            try:
+                it = os.scandir(os.path.join(self.root, rel_dir))
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    rel_path = rel_dir + '/' + entry.name if rel_dir else entry.name
+                    if entry.is_dir():
+                        stack.append(rel_path)
+                    elif entry.name.endswith('.hx') and entry.is_file():
+                        files[rel_path] = entry.stat()
+        return files
+
+    def update(self) -> List[str]:
+        """Bring the index up to date with the files on disk and return
+        the relative paths of the added or modified files."""
+        files = self.scan()
+        changed = []
+
+        for rel_path in [p for p in self.entries if p not in files]:
+            del self.entries[rel_path]
+            changed.append(rel_path)
+
+        for rel_path, st in files.items():
+            entry = self.entries.get(rel_path)
+            if entry is not None and entry['mtime'] == st.st_mtime_ns and entry['size'] == st.st_size:
+                continue
+            try:
+                with open(os.path.join(self.root, rel_path), encoding='utf-8') as f:
+                    data = self.parse(f.read())
+            except (OSError, UnicodeDecodeError):
+                continue
+            self.entries[rel_path] = {'mtime': st.st_mtime_ns, 'size': st.st_size, 'data': data}
+            changed.append(rel_path)
+
+        if len(changed) > 0:
+            self.save()
+
+        return [p for p in changed if p in self.entries]
+
+    def modified_since(self, mtime_ns: int) -> List[str]:
+        """Relative paths of the indexed files modified after the given
+        time in nanoseconds."""
+        return [p for p, entry in self.entries.items() if entry['mtime'] > mtime_ns]
+
+
+_indices: Dict[str, ScriptIndex] = {}
+
+
+def get_index(root: str, index_path: str, parse: Callable[[str], Any], version: str) -> ScriptIndex:
+    """Return the index for the given root directory, loading it from
+    `index_path` the first time."""
+    index: Optional[ScriptIndex] = _indices.get(root)
+    if index is None or index.index_path != index_path or index.parse is not parse or index.version != version:
+        index = ScriptIndex(root, index_path, parse, version)
+        _indices[root] = index
+    return index
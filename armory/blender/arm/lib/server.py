@@ -1,22 +1,226 @@
 import atexit
+import email.utils
 import http.server
-import socketserver
+import os
+import re
 import subprocess
+import time
+from typing import Optional
 
 haxe_server = None
+http_server = None
 
+# Encodings of precompressed siblings (e.g. `data.arm.br`), in order of
+# preference
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
 
-def run_tcp(port: int, do_log: bool):
-    class HTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-        def log_message(self, format, *args):
-            if do_log:
-                print(format % args)
+
+class HTTPServer(http.server.ThreadingHTTPServer):
+    """Threaded HTTP server for a given directory, keeping a reference
+    to the settings shared by its request handlers."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int, directory: str, do_log: bool):
+        self.directory = directory
+        self.do_log = do_log
+        super().__init__(('', port), HTTPRequestHandler)
+
+    def finish_request(self, request, client_address):
+        HTTPRequestHandler(request, client_address, self, directory=self.directory)
+
+
+class HTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Request handler with keep-alive, ETag and byte range support
+    that serves precompressed `.br`/`.gz` siblings of files to clients
+    accepting them.
+
+    Responses must be revalidated by the browser, so that reloading a
+    page only transfers the files that changed since the last load.
+    """
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, don't delay the body of
+    # small responses on keep-alive connections
+    disable_nagle_algorithm = True
+
+    def __init__(self, *args, **kwargs):
+        self.copy_length: Optional[int] = None
+        self.status_code = 0
+        self.sent_bytes = 0
+        super().__init__(*args, **kwargs)
+
+    def handle_one_request(self):
+        start = time.perf_counter()
+        self.status_code = 0
+        self.sent_bytes = 0
+        super().handle_one_request()
+        if self.server.do_log and self.status_code != 0:
+            print(f'{self.command} {self.path} {self.status_code} {self.sent_bytes} B {(time.perf_counter() - start) * 1000:0.1f} ms')
+
+    def log_message(self, format, *args):
+        # Requests are logged with their timing by handle_one_request()
+        pass
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+
+    def end_headers(self):
+        self.send_header('Cache-Control', 'no-cache')
+        super().end_headers()
+
+    def send_head(self):
+        self.copy_length = None
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) or self.path.endswith('/'):
+            # Directory index and redirects
+            return super().send_head()
+
+        encoding, served_path = None, path
+        accept_encoding = self.headers.get('Accept-Encoding', '')
+        for name, ext in PRECOMPRESSED:
+            if re.search(r'\b' + name + r'\b', accept_encoding) and os.path.isfile(path + ext):
+                if not os.path.isfile(path) or os.path.getmtime(path + ext) >= os.path.getmtime(path):
+                    encoding, served_path = name, path + ext
+                    break
+
+        try:
+            f = open(served_path, 'rb')
+        except OSError:
+            self.send_error(404, 'File not found')
+            return None
+
+        try:
+            st = os.fstat(f.fileno())
+            etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}{"-" + encoding if encoding else ""}"'
+
+            if self.is_not_modified(etag, st.st_mtime):
+                f.close()
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+
+            start, end = 0, st.st_size - 1
+            byte_range = self.get_range(st.st_size, etag)
+            if byte_range == (-1, -1):
+                f.close()
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{st.st_size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+
+            if byte_range is not None:
+                start, end = byte_range
+                f.seek(start)
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{st.st_size}')
+            else:
+                self.send_response(200)
+
+            self.send_header('Content-Type', self.guess_type(path))
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Last-Modified', self.date_time_string(st.st_mtime))
+            self.send_header('ETag', etag)
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Vary', 'Accept-Encoding')
+            if encoding is not None:
+                self.send_header('Content-Encoding', encoding)
+            self.end_headers()
+            self.copy_length = end - start + 1
+            return f
+        except:
+            f.close()
+            raise
+
+    def is_not_modified(self, etag: str, mtime: float) -> bool:
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return if_none_match.strip() == '*' or etag in (tag.strip() for tag in if_none_match.split(','))
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return since is not None and int(mtime) <= since.timestamp()
+
+        return False
+
+    def get_range(self, size: int, etag: str):
+        """Return the first and last byte of the requested range, None
+        for the whole file or (-1, -1) if the range can't be satisfied.
+        Only single ranges are supported."""
+        range_header = self.headers.get('Range')
+        if range_header is None:
+            return None
+
+        if_range = self.headers.get('If-Range')
+        if if_range is not None and if_range.strip() != etag:
+            return None
+
+        match = re.fullmatch(r'\s*bytes=(\d*)-(\d*)\s*', range_header)
+        if match is None or match.group(1) == match.group(2) == '':
+            return None
+
+        if match.group(1) == '':
+            # Suffix range, the last n bytes
+            length = int(match.group(2))
+            if length == 0:
+                return -1, -1
+            return max(size - length, 0), size - 1
+
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) != '' else size - 1
+        if start >= size or end < start:
+            return -1, -1
+        return start, min(end, size - 1)
+
+    def copyfile(self, source, outputfile):
+        # Also used for directory listings, where the whole source is sent
+        remaining = self.copy_length
+        while remaining is None or remaining > 0:
+            chunk = source.read(1024 * 1024 if remaining is None else min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            self.sent_bytes += len(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+
+def run_tcp(port: int, do_log: bool, directory: Optional[str] = None):
+    """Serve the given directory (or the current working directory) on
+    the given port until stop_tcp() is called. If the server is already
+    running for the same port and directory, it is kept running and
+    this function returns immediately."""
+    global http_server
+    directory = os.path.abspath(directory or os.getcwd())
+
+    if http_server is not None:
+        if http_server.server_address[1] == port and http_server.directory == directory:
+            http_server.do_log = do_log
+            return
+        stop_tcp()
 
     try:
-        http_server = socketserver.TCPServer(("", port), HTTPRequestHandler)
-        http_server.serve_forever()
-    except:
-        print("Server already running")
+        server = HTTPServer(port, directory, do_log)
+    except OSError:
+        print(f"Server already running on port {port}")
+        return
+
+    http_server = server
+    server.serve_forever()
+
+
+def stop_tcp():
+    global http_server
+    if http_server is not None:
+        http_server.shutdown()
+        http_server.server_close()
+        http_server = None
 
 
 def run_haxe(haxe_path, port=6000):
@@ -0,0 +1,343 @@
+"""
+Texture processing for converted images: resizing, mipmap generation
+and PNG/JPEG/HDR encoding, without depending on Blender. The encoders
+release the GIL for most of their work (NumPy, zlib), so images can be
+processed in parallel threads.
+"""
+import struct
+from typing import List
+import zlib
+
+import numpy as np
+
+
+def resize(pixels: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Resize a (height, width, channels) float image. Downscaling
+    averages 2x2 blocks first, so that no texels are skipped."""
+    while pixels.shape[1] >= 2 * width and pixels.shape[0] >= 2 * height:
+        h, w = pixels.shape[0] // 2 * 2, pixels.shape[1] // 2 * 2
+        pixels = pixels[:h, :w].reshape(h // 2, 2, w // 2, 2, -1).mean(axis=(1, 3))
+
+    if pixels.shape[0] == height and pixels.shape[1] == width:
+        return pixels
+
+    # Bilinear filtering for the remaining factor
+    y = np.clip((np.arange(height) + 0.5) * pixels.shape[0] / height - 0.5, 0, pixels.shape[0] - 1)
+    x = np.clip((np.arange(width) + 0.5) * pixels.shape[1] / width - 0.5, 0, pixels.shape[1] - 1)
+    y0 = np.floor(y).astype(np.int64)
+    x0 = np.floor(x).astype(np.int64)
+    y1 = np.minimum(y0 + 1, pixels.shape[0] - 1)
+    x1 = np.minimum(x0 + 1, pixels.shape[1] - 1)
+    fy = (y - y0)[:, None, None]
+    fx = (x - x0)[None, :, None]
+    top = pixels[y0][:, x0] * (1.0 - fx) + pixels[y0][:, x1] * fx
+    bottom = pixels[y1][:, x0] * (1.0 - fx) + pixels[y1][:, x1] * fx
+    return top * (1.0 - fy) + bottom * fy
+
+
+def mipmaps(pixels: np.ndarray) -> List[np.ndarray]:
+    """Return the mip chain below the given image, down to 1x1."""
+    mips = []
+    while pixels.shape[0] > 1 or pixels.shape[1] > 1:
+        pixels = resize(pixels, max(pixels.shape[1] // 2, 1), max(pixels.shape[0] // 2, 1))
+        mips.append(pixels)
+    return mips
+
+
+def to_bytes(pixels: np.ndarray) -> np.ndarray:
+    """Convert [0, 1] float pixels to 8 bit."""
+    return (np.clip(pixels, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+
+
+def encode_hdr(pixels: np.ndarray) -> bytes:
+    """Encode float RGB or RGBA pixels, first row at the top, as an
+    uncompressed Radiance RGBE image. Alpha is dropped."""
+    height, width = pixels.shape[:2]
+    rgb = np.maximum(pixels[:, :, :3], 0.0).astype(np.float64)
+
+    # Shared exponent of the largest component, the mantissa of which
+    # is always >= 128 so that no pixel reads as a run length marker
+    brightest = rgb.max(axis=2)
+    mantissa, exponent = np.frexp(brightest)
+    visible = brightest >= 1e-32
+    scale = np.where(visible, mantissa * 256.0 / np.where(visible, brightest, 1.0), 0.0)
+
+    rgbe = np.empty((height, width, 4), dtype=np.uint8)
+    rgbe[:, :, :3] = np.minimum(rgb * scale[:, :, None], 255.0).astype(np.uint8)
+    rgbe[:, :, 3] = np.where(visible, np.minimum(exponent + 128, 255), 0).astype(np.uint8)
+
+    header = f'#?RADIANCE\nFORMAT=32-bit_rle_rgbe\n\n-Y {height} +X {width}\n'.encode()
+    return header + rgbe.tobytes()
+
+
+def _png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff)
+
+
+# PNG color type for each number of channels: grayscale, grayscale with
+# alpha, RGB, RGBA
+_PNG_COLOR_TYPES = {1: 0, 2: 4, 3: 2, 4: 6}
+
+
+def encode_png(pixels: np.ndarray) -> bytes:
+    """Encode 8 bit grayscale, grayscale with alpha, RGB or RGBA pixels,
+    first row at the top. 2D arrays are grayscale."""
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    height, width, channels = pixels.shape
+    color_type = _PNG_COLOR_TYPES[channels]
+
+    # Paeth filter for all rows
+    a = np.zeros_like(pixels, dtype=np.int16)
+    a[:, 1:] = pixels[:, :-1]
+    b = np.zeros_like(a)
+    b[1:] = pixels[:-1]
+    c = np.zeros_like(a)
+    c[1:, 1:] = pixels[:-1, :-1]
+    p = a + b - c
+    pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+    predictor = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+    filtered = (pixels.astype(np.int16) - predictor).astype(np.uint8).reshape(height, -1)
+
+    scanlines = np.empty((height, filtered.shape[1] + 1), dtype=np.uint8)
+    scanlines[:, 0] = 4
+    scanlines[:, 1:] = filtered
+
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)),
+        _png_chunk(b'IDAT', zlib.compress(scanlines.tobytes(), 6)),
+        _png_chunk(b'IEND', b'')))
+
+
+# Baseline JPEG tables from Annex K of the specification
+_QUANT_LUMINANCE = np.array([
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99]).reshape(8, 8)
+
+_QUANT_CHROMINANCE = np.full((8, 8), 99)
+_QUANT_CHROMINANCE[:4, :4] = np.array([
+    17, 18, 24, 47,
+    18, 21, 26, 66,
+    24, 26, 56, 99,
+    47, 66, 99, 99]).reshape(4, 4)
+
+_DC_LUMINANCE_BITS = [0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+_DC_CHROMINANCE_BITS = [0, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0]
+_DC_VALUES = list(range(12))
+
+_AC_LUMINANCE_BITS = [0, 2, 1, 3, 3, 2, 4, 3, 5, 5, 4, 4, 0, 0, 1, 0x7d]
+_AC_LUMINANCE_VALUES = [
+    0x01, 0x02, 0x03, 0x00, 0x04, 0x11, 0x05, 0x12, 0x21, 0x31, 0x41, 0x06, 0x13, 0x51, 0x61, 0x07,
+    0x22, 0x71, 0x14, 0x32, 0x81, 0x91, 0xa1, 0x08, 0x23, 0x42, 0xb1, 0xc1, 0x15, 0x52, 0xd1, 0xf0,
+    0x24, 0x33, 0x62, 0x72, 0x82, 0x09, 0x0a, 0x16, 0x17, 0x18, 0x19, 0x1a, 0x25, 0x26, 0x27, 0x28,
+    0x29, 0x2a, 0x34, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48, 0x49,
+    0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68, 0x69,
+    0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79, 0x7a, 0x83, 0x84, 0x85, 0x86, 0x87, 0x88, 0x89,
+    0x8a, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5, 0xa6, 0xa7,
+    0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4, 0xb5, 0xb6, 0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3, 0xc4, 0xc5,
+    0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda, 0xe1, 0xe2,
+    0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9, 0xea, 0xf1, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+    0xf9, 0xfa]
+
+_AC_CHROMINANCE_BITS = [0, 2, 1, 2, 4, 4, 3, 4, 7, 5, 4, 4, 0, 1, 2, 0x77]
+_AC_CHROMINANCE_VALUES = [
+    0x00, 0x01, 0x02, 0x03, 0x11, 0x04, 0x05, 0x21, 0x31, 0x06, 0x12, 0x41, 0x51, 0x07, 0x61, 0x71,
+    0x13, 0x22, 0x32, 0x81, 0x08, 0x14, 0x42, 0x91, 0xa1, 0xb1, 0xc1, 0x09, 0x23, 0x33, 0x52, 0xf0,
+    0x15, 0x62, 0x72, 0xd1, 0x0a, 0x16, 0x24, 0x34, 0xe1, 0x25, 0xf1, 0x17, 0x18, 0x19, 0x1a, 0x26,
+    0x27, 0x28, 0x29, 0x2a, 0x35, 0x36, 0x37, 0x38, 0x39, 0x3a, 0x43, 0x44, 0x45, 0x46, 0x47, 0x48,
+    0x49, 0x4a, 0x53, 0x54, 0x55, 0x56, 0x57, 0x58, 0x59, 0x5a, 0x63, 0x64, 0x65, 0x66, 0x67, 0x68,
+    0x69, 0x6a, 0x73, 0x74, 0x75, 0x76, 0x77, 0x78, 0x79, 0x7a, 0x82, 0x83, 0x84, 0x85, 0x86, 0x87,
+    0x88, 0x89, 0x8a, 0x92, 0x93, 0x94, 0x95, 0x96, 0x97, 0x98, 0x99, 0x9a, 0xa2, 0xa3, 0xa4, 0xa5,
+    0xa6, 0xa7, 0xa8, 0xa9, 0xaa, 0xb2, 0xb3, 0xb4, 0xb5, 0xb6, 0xb7, 0xb8, 0xb9, 0xba, 0xc2, 0xc3,
+    0xc4, 0xc5, 0xc6, 0xc7, 0xc8, 0xc9, 0xca, 0xd2, 0xd3, 0xd4, 0xd5, 0xd6, 0xd7, 0xd8, 0xd9, 0xda,
+    0xe2, 0xe3, 0xe4, 0xe5, 0xe6, 0xe7, 0xe8, 0xe9, 0xea, 0xf2, 0xf3, 0xf4, 0xf5, 0xf6, 0xf7, 0xf8,
+    0xf9, 0xfa]
+
+# Position of each coefficient in zigzag order, rows alternate direction
+_ZIGZAG = np.array(sorted(range(64), key=lambda i: (i // 8 + i % 8, i // 8 if (i // 8 + i % 8) % 2 else -(i // 8))))
+
+_DCT = np.array([[(np.sqrt(0.125) if u == 0 else 0.5) * np.cos((2 * x + 1) * u * np.pi / 16) for x in range(8)] for u in range(8)])
+
+
+def _huffman_table(bits: List[int], values: List[int]):
+    """Return the code and code length of each symbol."""
+    codes = np.zeros(256, dtype=np.int64)
+    lengths = np.zeros(256, dtype=np.int64)
+    code = 0
+    k = 0
+    for length in range(1, 17):
+        for _ in range(bits[length - 1]):
+            codes[values[k]] = code
+            lengths[values[k]] = length
+            code += 1
+            k += 1
+        code <<= 1
+    return codes, lengths
+
+
+_HUFFMAN_DC = [_huffman_table(_DC_LUMINANCE_BITS, _DC_VALUES), _huffman_table(_DC_CHROMINANCE_BITS, _DC_VALUES)]
+_HUFFMAN_AC = [_huffman_table(_AC_LUMINANCE_BITS, _AC_LUMINANCE_VALUES), _huffman_table(_AC_CHROMINANCE_BITS, _AC_CHROMINANCE_VALUES)]
+
+
+def _quant_table(base: np.ndarray, quality: int) -> np.ndarray:
+    quality = min(max(quality, 1), 100)
+    scale = 5000 // quality if quality < 50 else 200 - 2 * quality
+    return np.clip((base * scale + 50) // 100, 1, 255)
+
+
+def _magnitude(values: np.ndarray):
+    """Size category and additional bits of DC differences and AC
+    coefficients."""
+    size = np.zeros(values.shape, dtype=np.int64)
+    nonzero = values != 0
+    size[nonzero] = np.floor(np.log2(np.abs(values[nonzero]))).astype(np.int64) + 1
+    bits = np.where(values < 0, values + (1 << size) - 1, values)
+    return size, bits
+
+
+def _pack_bits(codes: np.ndarray, lengths: np.ndarray) -> bytes:
+    """Concatenate the given variable length codes, MSB first, padding
+    the last byte with ones and stuffing zero bytes after 0xFF."""
+    out = []
+    carry = np.zeros(0, dtype=np.uint8)
+    chunk = 1 << 18
+    for start in range(0, len(codes), chunk):
+        c = codes[start:start + chunk]
+        l = lengths[start:start + chunk]
+        total = int(np.sum(l))
+        owner = np.repeat(np.arange(len(c), dtype=np.int32), l)
+        offset = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(l) - l, l)
+        bits = ((c[owner] >> (l[owner] - 1 - offset)) & 1).astype(np.uint8)
+        bits = np.concatenate((carry, bits))
+        full = len(bits) // 8 * 8
+        out.append(np.packbits(bits[:full]))
+        carry = bits[full:]
+    if len(carry) > 0:
+        out.append(np.packbits(np.concatenate((carry, np.ones(8 - len(carry), dtype=np.uint8)))))
+
+    data = np.concatenate(out) if out else np.zeros(0, dtype=np.uint8)
+    return np.insert(data, np.flatnonzero(data == 0xff) + 1, 0).tobytes()
+
+
+def encode_jpeg(pixels: np.ndarray, quality: int = 90) -> bytes:
+    """Encode 8 bit RGB(A) pixels, first row at the top, as baseline
+    JPEG without chroma subsampling. Alpha is ignored. Grayscale pixels
+    (2D arrays or one or two channels) are written as grayscale JPEG."""
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    height, width = pixels.shape[:2]
+    num_components = 1 if pixels.shape[2] < 3 else 3
+    rgb = pixels[:, :, :num_components].astype(np.float64)
+
+    # Pad to whole blocks by repeating the last row and column
+    rgb = np.pad(rgb, ((0, -height % 8), (0, -width % 8), (0, 0)), mode='edge')
+    if num_components == 1:
+        ycc = rgb - 128.0
+    else:
+        r, g, b = rgb[:, :, 0], rgb[:, :, 1], rgb[:, :, 2]
+        ycc = np.stack((
+            0.299 * r + 0.587 * g + 0.114 * b - 128.0,
+            -0.168736 * r - 0.331264 * g + 0.5 * b,
+            0.5 * r - 0.418688 * g - 0.081312 * b), axis=2)
+
+    # (block row, block column, component, 8, 8)
+    blocks_h, blocks_w = ycc.shape[0] // 8, ycc.shape[1] // 8
+    blocks = ycc.reshape(blocks_h, 8, blocks_w, 8, num_components).transpose(0, 2, 4, 1, 3)
+    # 2D DCT of all blocks as two large matrix products
+    coeffs = np.tensordot(blocks, _DCT, axes=([4], [1]))
+    coeffs = np.moveaxis(np.tensordot(coeffs, _DCT, axes=([3], [1])), 4, 3)
+
+    quant = [_quant_table(_QUANT_LUMINANCE, quality), _quant_table(_QUANT_CHROMINANCE, quality)]
+    quant_per_component = np.stack((quant[0], quant[1], quant[1])[:num_components])
+    coeffs = np.round(coeffs / quant_per_component).astype(np.int64)
+
+    # One unit per block and component, in scan order
+    units = coeffs.reshape(-1, 64)[:, _ZIGZAG]
+    num_units = len(units)
+    unit_table = (np.arange(num_units) % num_components > 0).astype(np.int64)
+
+    # DC differences to the previous block of the same component
+    dc = units[:, 0].reshape(-1, num_components)
+    dc_diff = np.diff(dc, axis=0, prepend=0).reshape(-1)
+    dc_size, dc_bits = _magnitude(dc_diff)
+    dc_codes = np.where(unit_table == 0, _HUFFMAN_DC[0][0][dc_size], _HUFFMAN_DC[1][0][dc_size])
+    dc_lengths = np.where(unit_table == 0, _HUFFMAN_DC[0][1][dc_size], _HUFFMAN_DC[1][1][dc_size])
+
+    # Nonzero AC coefficients with the zero run before them
+    ac = units[:, 1:]
+    unit, pos = np.nonzero(ac)
+    values = ac[unit, pos]
+    first = np.concatenate(([True], unit[1:] != unit[:-1]))
+    prev = np.where(first, -1, np.concatenate(([0], pos[:-1])))
+    run = pos - prev - 1
+    ac_size, ac_bits = _magnitude(values)
+    ac_table = unit_table[unit]
+    symbols = (run % 16) * 16 + ac_size
+    ac_codes = np.where(ac_table == 0, _HUFFMAN_AC[0][0][symbols], _HUFFMAN_AC[1][0][symbols])
+    ac_lengths = np.where(ac_table == 0, _HUFFMAN_AC[0][1][symbols], _HUFFMAN_AC[1][1][symbols])
+
+    # Runs of 16 zeros (ZRL) before coefficients with longer runs
+    zrl_counts = run // 16
+    zrl_item = np.repeat(np.arange(len(unit)), zrl_counts)
+    zrl_table = ac_table[zrl_item]
+    zrl_codes = np.where(zrl_table == 0, _HUFFMAN_AC[0][0][0xf0], _HUFFMAN_AC[1][0][0xf0])
+    zrl_lengths = np.where(zrl_table == 0, _HUFFMAN_AC[0][1][0xf0], _HUFFMAN_AC[1][1][0xf0])
+
+    # End of block, unless the last coefficient is nonzero
+    last = np.full(num_units, -1, dtype=np.int64)
+    last[unit] = pos
+    eob_unit = np.flatnonzero(last < 62)
+    eob_codes = np.where(unit_table[eob_unit] == 0, _HUFFMAN_AC[0][0][0], _HUFFMAN_AC[1][0][0])
+    eob_lengths = np.where(unit_table[eob_unit] == 0, _HUFFMAN_AC[0][1][0], _HUFFMAN_AC[1][1][0])
+
+    # Scatter all codes to their place in the scan: for each unit the DC
+    # code, then each coefficient after its ZRL codes, then EOB
+    ac_counts = np.bincount(unit, minlength=num_units)
+    zrl_per_unit = np.bincount(unit, weights=zrl_counts, minlength=num_units).astype(np.int64)
+    unit_counts = 1 + ac_counts + zrl_per_unit + (last < 62)
+    unit_start = np.cumsum(unit_counts) - unit_counts
+    ac_rank = np.arange(len(unit)) - np.repeat(np.cumsum(ac_counts) - ac_counts, ac_counts)
+    zrl_before = np.cumsum(zrl_counts) - np.repeat(np.cumsum(zrl_per_unit) - zrl_per_unit, ac_counts)
+    ac_index = unit_start[unit] + 1 + ac_rank + zrl_before
+    zrl_index = np.repeat(ac_index - zrl_counts, zrl_counts) + np.arange(len(zrl_item)) - np.repeat(np.cumsum(zrl_counts) - zrl_counts, zrl_counts)
+    eob_index = unit_start[eob_unit] + unit_counts[eob_unit] - 1
+
+    total = int(np.sum(unit_counts))
+    codes = np.empty(total, dtype=np.int64)
+    lengths = np.empty(total, dtype=np.int64)
+    codes[unit_start] = (dc_codes << dc_size) | dc_bits
+    lengths[unit_start] = dc_lengths + dc_size
+    codes[ac_index] = (ac_codes << ac_size) | ac_bits
+    lengths[ac_index] = ac_lengths + ac_size
+    codes[zrl_index] = zrl_codes
+    lengths[zrl_index] = zrl_lengths
+    codes[eob_index] = eob_codes
+    lengths[eob_index] = eob_lengths
+    scan = _pack_bits(codes, lengths)
+
+    # Component id, sampling factors and table ids of Y, Cb and Cr
+    components = [(1, 0x11, 0, 0x00), (2, 0x11, 1, 0x11), (3, 0x11, 1, 0x11)][:num_components]
+    tables = [
+        (0, 0, _DC_LUMINANCE_BITS, _DC_VALUES), (1, 0, _AC_LUMINANCE_BITS, _AC_LUMINANCE_VALUES),
+        (0, 1, _DC_CHROMINANCE_BITS, _DC_VALUES), (1, 1, _AC_CHROMINANCE_BITS, _AC_CHROMINANCE_VALUES)]
+    if num_components == 1:
+        quant, tables = quant[:1], tables[:2]
+
+    header = [b'\xff\xd8', b'\xff\xe0' + struct.pack('>H5sBBBHHBB', 16, b'JFIF\0', 1, 1, 0, 1, 1, 0, 0)]
+    for i, q in enumerate(quant):
+        header.append(b'\xff\xdb' + struct.pack('>HB', 67, i) + q.reshape(-1)[_ZIGZAG].astype(np.uint8).tobytes())
+    header.append(b'\xff\xc0' + struct.pack('>HBHHB', 8 + 3 * num_components, 8, height, width, num_components)
+                  + bytes(v for c in components for v in c[:3]))
+    for table_class, table_id, bits, values in tables:
+        header.append(b'\xff\xc4' + struct.pack('>HB', 19 + len(values), table_class << 4 | table_id) + bytes(bits) + bytes(values))
+    header.append(b'\xff\xda' + struct.pack('>HB', 6 + 2 * num_components, num_components)
+                  + bytes(v for c in components for v in (c[0], c[3])) + bytes([0, 63, 0]))
+
+    return b''.join(header) + scan + b'\xff\xd9'
@@ -262,6 +262,10 @@ class TLM_PT_Denoise(bpy.types.Panel):
             row.prop(denoiseProperties, "tlm_oidn_maxmem")
             row = layout.row(align=True)
             row.prop(denoiseProperties, "tlm_oidn_affinity")
+            row = layout.row(align=True)
+            row.prop(sceneProperties, "tlm_denoise_jobs")
+            row = layout.row(align=True)
+            row.prop(sceneProperties, "tlm_denoise_memory")
             # row = layout.row(align=True)
             # row.prop(denoiseProperties, "tlm_denoise_ao")
         elif sceneProperties.tlm_denoise_engine == "Optix":
@@ -273,6 +277,10 @@ class TLM_PT_Denoise(bpy.types.Panel):
             row.prop(denoiseProperties, "tlm_optix_maxmem")
             #row = layout.row(align=True)
             #row.prop(denoiseProperties, "tlm_denoise_ao")
+        elif sceneProperties.tlm_denoise_engine == "NumPy":
+            row.prop(sceneProperties, "tlm_denoise_jobs")
+            row = layout.row(align=True)
+            row.prop(sceneProperties, "tlm_denoise_memory")
 
 class TLM_PT_Filtering(bpy.types.Panel):
     bl_label = "Filtering"
@@ -128,11 +128,25 @@ class TLM_SceneProperties(bpy.types.PropertyGroup):
     tlm_denoise_engine : EnumProperty(
         items = [('Integrated', 'Integrated', 'Use the Blender native denoiser (Compositor; Slow)'),
                 ('OIDN', 'Intel Denoiser', 'Use Intel denoiser (CPU powered)'),
-                ('Optix', 'Optix Denoiser', 'Use Nvidia Optix denoiser (GPU powered)')],
+                ('Optix', 'Optix Denoiser', 'Use Nvidia Optix denoiser (GPU powered)'),
+                ('NumPy', 'NumPy Denoiser', 'Use a built-in edge-avoiding filter (CPU powered; No external binaries)')],
                 name = "Denoiser", 
                 description="Select which denoising engine to use.", 
                 default='Integrated')
 
+    tlm_denoise_jobs : IntProperty(
+        name="Parallel jobs", 
+        description="Amount of lightmaps denoised at the same time. Set to 0 for auto-detect.", 
+        default=0, 
+        min=0, 
+        max=64)
+
+    tlm_denoise_memory : IntProperty(
+        name="Max memory (MB)", 
+        description="Memory budget for the image data of lightmaps denoised at the same time. Set to 0 for no limit.", 
+        default=0, 
+        min=0)
+
     #FILTERING SETTINGS GROUP
     tlm_filtering_use : BoolProperty(
         name="Enable denoising", 
@@ -4,7 +4,7 @@ from . import encoding, pack, log
 from . cycles import lightmap, prepare, nodes, cache
 from . luxcore import setup
 from . octane import configure, lightmap2
-from . denoiser import integrated, oidn, optix
+from . denoiser import atrous, integrated, oidn, optix
 from . filtering import opencv
 from . gui import Viewport
 from .. network import client
@@ -364,7 +364,7 @@ def begin_build():
 
             oidnProperties = scene.TLM_OIDNEngineProperties
 
-            denoiser = oidn.TLM_OIDN_Denoise(oidnProperties, baked_image_array, dirpath)
+            denoiser = oidn.TLM_OIDN_Denoise(oidnProperties, baked_image_array, dirpath, sceneProperties)
 
             try:
                 denoiser.denoise()
@@ -383,6 +383,24 @@ def begin_build():
 
             del denoiser
 
+        elif sceneProperties.tlm_denoise_engine == "NumPy":
+
+            baked_image_array = []
+
+            dirfiles = [f for f in listdir(dirpath) if isfile(join(dirpath, f))]
+
+            for file in dirfiles:
+                if file.endswith("_baked.hdr"):
+                    baked_image_array.append(file)
+
+            denoiser = atrous.TLM_Atrous_Denoise(sceneProperties, baked_image_array, dirpath)
+
+            denoiser.denoise()
+
+            denoiser.clean()
+
+            del denoiser
+
         else:
 
             baked_image_array = []
@@ -485,6 +503,7 @@ def begin_build():
 
                     end = "_filtered"
 
+                images = []
                 for file in dirfiles:
                     if file.endswith(end + ".hdr"):
 
@@ -493,7 +512,9 @@ def begin_build():
                         tlm_log.append("Encoding:" + str(file))
                         if bpy.context.scene.TLM_SceneProperties.tlm_verbose:
                             print("Encoding:" + str(file))
-                        encoding.encodeImageRGBMCPU(img, sceneProperties.tlm_encoding_range, dirpath, 0)
+                        images.append(img)
+
+                encoding.encodeImagesCPU(images, "RGBM", sceneProperties.tlm_encoding_range, dirpath, 0)
 
             if sceneProperties.tlm_encoding_mode_a == "RGBD":
 
@@ -514,6 +535,7 @@ def begin_build():
 
                     end = "_filtered"
 
+                images = []
                 for file in dirfiles:
                     if file.endswith(end + ".hdr"):
 
@@ -522,7 +544,9 @@ def begin_build():
                         if bpy.context.scene.TLM_SceneProperties.tlm_verbose:
                             tlm_log.append("Encoding:" + str(file))
                             print("Encoding:" + str(file))
-                        encoding.encodeImageRGBDCPU(img, sceneProperties.tlm_encoding_range, dirpath, 0)
+                        images.append(img)
+
+                encoding.encodeImagesCPU(images, "RGBD", sceneProperties.tlm_encoding_range, dirpath, 0)
 
             if sceneProperties.tlm_encoding_mode_a == "SDR":
 
@@ -607,24 +631,32 @@ def begin_build():
                     end = "_filtered"
 
                 #CHECK FOR ATLAS MAPS!
+                images = []
                 for file in dirfiles:
                     if file.endswith(end + ".hdr"):
 
                         img = bpy.data.images.load(os.path.join(dirpath, file), check_existing=False)
-                        
-                        encoding.encodeLogLuvGPU(img, dirpath, 0)
 
-                        if sceneProperties.tlm_split_premultiplied:
+                        bpy.app.driver_namespace["logman"].append("Starting LogLuv encode for: " + str(img.name))
+                        images.append(img)
+
+                #The NumPy encoder gives the same result as the LogLuv shader
+                #without reading every lightmap back from the GPU
+                encoding.encodeImagesCPU(images, "LogLuv", 1.0, dirpath, 0)
+
+                if sceneProperties.tlm_split_premultiplied:
+
+                    for img in images:
 
-                            image_name = img.name
+                        image_name = img.name
 
-                            if image_name[-4:] == '.exr' or image_name[-4:] == '.hdr':
-                                image_name = image_name[:-4]
+                        if image_name[-4:] == '.exr' or image_name[-4:] == '.hdr':
+                            image_name = image_name[:-4]
 
-                            image_name = image_name + '_encoded.png'
+                        image_name = image_name + '_encoded.png'
 
-                            print("SPLIT PREMULTIPLIED: " + image_name)
-                            encoding.splitLogLuvAlpha(os.path.join(dirpath, image_name), dirpath, 0)
+                        print("SPLIT PREMULTIPLIED: " + image_name)
+                        encoding.splitLogLuvAlpha(os.path.join(dirpath, image_name), dirpath, 0)
 
             if sceneProperties.tlm_encoding_mode_b == "RGBM":
 
@@ -0,0 +1,75 @@
+import bpy, os
+import numpy as np
+from . import scheduler
+
+#B3 spline kernel of the a-trous wavelet transform
+atrous_kernel = np.array([1.0 / 16.0, 1.0 / 4.0, 3.0 / 8.0, 1.0 / 4.0, 1.0 / 16.0], dtype=np.float32)
+
+def atrous_filter(rgb, iterations=5, sigma=0.8):
+
+    """Edge-avoiding a-trous wavelet filter (Dammertz et al. 2010) for
+    HDR lightmaps, using only the color as edge-stopping function.
+
+    Filters in log space, so that the edge-stopping sigma is relative
+    to the brightness. The sigma is halved with every iteration, as the
+    noise left after each iteration is smaller."""
+
+    height, width = rgb.shape[:2]
+    result = np.log1p(np.maximum(rgb, 0.0)).astype(np.float32)
+
+    for i in range(iterations):
+
+        step = 2 ** i
+        pad = 2 * step
+        inv_sigma_sq = 1.0 / ((sigma * 2.0 ** -i) ** 2)
+
+        padded = np.pad(result, ((pad, pad), (pad, pad), (0, 0)), mode='edge')
+
+        accum = np.zeros_like(result)
+        weights = np.zeros((height, width), dtype=np.float32)
+
+        for ky in range(5):
+            y = pad + (ky - 2) * step
+            for kx in range(5):
+                x = pad + (kx - 2) * step
+
+                shifted = padded[y:y + height, x:x + width]
+                difference = shifted - result
+                weight = atrous_kernel[ky] * atrous_kernel[kx] * np.exp(-np.sum(difference * difference, axis=2) * inv_sigma_sq)
+
+                accum += shifted * weight[:, :, None]
+                weights += weight
+
+        result = accum / weights[:, :, None]
+
+    return np.expm1(result)
+
+class TLM_Atrous_Denoise:
+
+    image_array = []
+
+    image_output_destination = ""
+
+    def __init__(self, sceneProperties, img_array, dirpath):
+
+        self.sceneProperties = sceneProperties
+
+        self.image_array = img_array
+
+        self.image_output_destination = dirpath
+
+    def denoise_image(self, rgb):
+
+        return atrous_filter(rgb)
+
+    def denoise(self):
+
+        if bpy.context.scene.TLM_SceneProperties.tlm_verbose:
+            print("NumPy: Denoising")
+
+        denoise_scheduler = scheduler.TLM_Denoise_Scheduler(self, self.sceneProperties.tlm_denoise_jobs, self.sceneProperties.tlm_denoise_memory)
+        denoise_scheduler.run([os.path.join(self.image_output_destination, image) for image in self.image_array])
+
+    def clean(self):
+
+        self.image_array.clear()
@@ -1,5 +1,6 @@
-import bpy, os, sys, re, platform, subprocess
+import bpy, os, sys, re, io, platform, subprocess, tempfile, threading
 import numpy as np
+from . import scheduler
 
 class TLM_OIDN_Denoise:
 
@@ -9,10 +10,12 @@ class TLM_OIDN_Denoise:
 
     denoised_array = []
 
-    def __init__(self, oidnProperties, img_array, dirpath):
+    def __init__(self, oidnProperties, img_array, dirpath, sceneProperties):
 
         self.oidnProperties = oidnProperties
 
+        self.sceneProperties = sceneProperties
+
         self.image_array = img_array
 
         self.image_output_destination = dirpath
@@ -46,101 +49,107 @@ class TLM_OIDN_Denoise:
 
     def denoise(self):
 
-        for image in self.image_array:
+        jobs = self.sceneProperties.tlm_denoise_jobs if self.sceneProperties.tlm_denoise_jobs > 0 else min(os.cpu_count() or 1, 4)
 
-            if image not in self.denoised_array:
+        #Split the cores between the denoiser processes unless a thread count is set
+        self.threads = self.oidnProperties.tlm_oidn_threads
+        if self.threads == 0:
+            self.threads = max(1, (os.cpu_count() or 1) // jobs)
 
-                image_path = os.path.join(self.image_output_destination, image)
+        if self.oidnProperties.tlm_oidn_verbose:
+            print("Denoiser search: " + bpy.path.abspath(self.oidnProperties.tlm_oidn_path))
 
-                #Save to pfm
-                loaded_image = bpy.data.images.load(image_path, check_existing=False)
+        image_paths = [os.path.join(self.image_output_destination, image) for image in self.image_array if image not in self.denoised_array]
 
-                width = loaded_image.size[0]
-                height = loaded_image.size[1]
+        denoise_scheduler = scheduler.TLM_Denoise_Scheduler(self, jobs, self.sceneProperties.tlm_denoise_memory)
+        denoise_scheduler.run(image_paths)
 
-                image_output_array = np.zeros([width, height, 3], dtype="float32")
-                image_output_array = np.array(loaded_image.pixels)
-                image_output_array = image_output_array.reshape(height, width, 4)
-                image_output_array = np.float32(image_output_array[:,:,:3])
+        self.denoised_array.extend(os.path.basename(image_path) for image_path in image_paths)
 
-                image_output_denoise_destination = image_path[:-4] + ".pfm"
+    def denoise_image(self, rgb):
 
-                image_output_denoise_result_destination = image_path[:-4] + "_denoised.pfm"
+        verbose = self.oidnProperties.tlm_oidn_verbose
 
-                with open(image_output_denoise_destination, "wb") as fileWritePFM:
-                    self.save_pfm(fileWritePFM, image_output_array)
+        with tempfile.TemporaryDirectory(prefix="tlm_oidn_") as tmpdir:
 
-                #Denoise
-                if bpy.context.scene.TLM_SceneProperties.tlm_verbose:
-                    print("Loaded image: " + str(loaded_image))
+            #The denoiser picks the image format from the file extension
+            input_path = os.path.join(tmpdir, "input.pfm")
+            output_path = os.path.join(tmpdir, "output.pfm")
 
-                verbose = self.oidnProperties.tlm_oidn_verbose
-                affinity = self.oidnProperties.tlm_oidn_affinity
+            #Stream the images through named pipes where available
+            use_pipes = hasattr(os, "mkfifo")
 
-                if verbose:
-                    print("Denoiser search: " + bpy.path.abspath(self.oidnProperties.tlm_oidn_path))
-                    v = "3"
-                else:
-                    v = "0"
+            if use_pipes:
+                os.mkfifo(input_path)
+                os.mkfifo(output_path)
+            else:
+                with open(input_path, "wb") as fileWritePFM:
+                    self.save_pfm(fileWritePFM, rgb)
 
-                if affinity:
-                    a = "1"
-                else:
-                    a = "0"
+            pipePath = [bpy.path.abspath(self.oidnProperties.tlm_oidn_path), '-f', 'RTLightmap', '-hdr', input_path, '-o', output_path, '-verbose', "3" if verbose else "0", '-threads', str(self.threads), '-affinity', "1" if self.oidnProperties.tlm_oidn_affinity else "0", '-maxmem', str(self.oidnProperties.tlm_oidn_maxmem)]
 
-                threads = str(self.oidnProperties.tlm_oidn_threads)
-                maxmem = str(self.oidnProperties.tlm_oidn_maxmem)
+            denoisePipe = subprocess.Popen(pipePath, stdout=None if verbose else subprocess.DEVNULL)
 
-                if platform.system() == 'Windows':
-                    oidnPath = bpy.path.abspath(self.oidnProperties.tlm_oidn_path)
-                    pipePath = [oidnPath, '-f', 'RTLightmap', '-hdr', image_output_denoise_destination, '-o', image_output_denoise_result_destination, '-verbose', v, '-threads', threads, '-affinity', a, '-maxmem', maxmem]
-                elif platform.system() == 'Darwin':
-                    oidnPath = bpy.path.abspath(self.oidnProperties.tlm_oidn_path)
-                    pipePath = [oidnPath + ' -f ' + ' RTLightmap ' + ' -hdr ' + image_output_denoise_destination + ' -o ' + image_output_denoise_result_destination + ' -verbose ' + v]
-                else:
-                    oidnPath = bpy.path.abspath(self.oidnProperties.tlm_oidn_path)
-                    oidnPath = oidnPath.replace(' ', '\\ ')
-                    image_output_denoise_destination = image_output_denoise_destination.replace(' ', '\\ ')
-                    image_output_denoise_result_destination = image_output_denoise_result_destination.replace(' ', '\\ ')
-                    pipePath = [oidnPath + ' -f ' + ' RTLightmap ' + ' -hdr ' + image_output_denoise_destination + ' -o ' + image_output_denoise_result_destination + ' -verbose ' + v]
-                    
-                if not verbose:
-                    denoisePipe = subprocess.Popen(pipePath, stdout=subprocess.PIPE, stderr=None, shell=True)
-                else:
-                    denoisePipe = subprocess.Popen(pipePath, shell=True)
+            if use_pipes:
+
+                result = {}
+
+                def write_input():
+                    try:
+                        with open(input_path, "wb") as fileWritePFM:
+                            self.save_pfm(fileWritePFM, rgb)
+                    except OSError:
+                        #Reported through the exit code of the denoiser
+                        pass
 
-                denoisePipe.communicate()[0]
+                def read_output():
+                    with open(output_path, "rb") as f:
+                        result["data"] = f.read()
 
-                if platform.system() != 'Windows':
-                    image_output_denoise_result_destination = image_output_denoise_result_destination.replace('\\', '')
+                writer = threading.Thread(target=write_input)
+                reader = threading.Thread(target=read_output)
+                writer.start()
+                reader.start()
 
-                with open(image_output_denoise_result_destination, "rb") as f:
-                    denoise_data, scale = self.load_pfm(f)
+                denoisePipe.wait()
 
-                ndata = np.array(denoise_data)
-                ndata2 = np.dstack((ndata, np.ones((width,height))))
-                img_array = ndata2.ravel()
+                #Release the threads if the denoiser exited without opening a pipe
+                self.release_pipe(input_path, os.O_RDONLY, writer)
+                self.release_pipe(output_path, os.O_WRONLY, reader)
 
-                loaded_image.pixels = img_array
-                loaded_image.filepath_raw = image_output_denoise_result_destination = image_path[:-10] + "_denoised.hdr"
-                loaded_image.file_format = "HDR"
-                loaded_image.save()
+                data = result.get("data", b"")
 
-                self.denoised_array.append(image)
+            else:
 
-                print(image_path)
+                denoisePipe.wait()
+
+                data = b""
+                if os.path.isfile(output_path):
+                    with open(output_path, "rb") as f:
+                        data = f.read()
+
+            if denoisePipe.returncode != 0 or len(data) == 0:
+                raise Exception("OIDN denoiser failed with exit code " + str(denoisePipe.returncode))
+
+            denoise_data, scale = self.load_pfm(io.BytesIO(data))
+
+        return denoise_data
+
+    def release_pipe(self, path, flags, thread):
+
+        #Opening the other end of a pipe lets a thread blocked on it continue
+        while thread.is_alive():
+            try:
+                os.close(os.open(path, flags | os.O_NONBLOCK))
+            except OSError:
+                pass
+            thread.join(0.05)
 
     def clean(self):
 
         self.denoised_array.clear()
         self.image_array.clear()
 
-        for file in self.image_output_destination:
-                if file.endswith("_baked.hdr"):
-                    baked_image_array.append(file)
-
-        #self.image_output_destination
-
         #Clean temporary files here..
         #...pfm
         #...denoised.hdr
@@ -170,7 +179,7 @@ class TLM_OIDN_Denoise:
         else:
             endian = ">"  # big-endian
 
-        data = np.fromfile(file, endian + "f")
+        data = np.frombuffer(file.read(), endian + "f")
         shape = (height, width, 3) if color else (height, width)
         if as_flat_list:
             result = data
@@ -202,6 +211,6 @@ class TLM_OIDN_Denoise:
 
         file.write(b"%f\n" % scale)
 
-        image.tofile(file)
+        file.write(image.tobytes())
 
         #print("PFM export took %.3f s" % (time() - start))
@@ -81,12 +81,6 @@ class TLM_Optix_Denoise:
         self.denoised_array.clear()
         self.image_array.clear()
 
-        for file in self.image_output_destination:
-                if file.endswith("_baked.hdr"):
-                    baked_image_array.append(file)
-
-        #self.image_output_destination
-
         #Clean temporary files here..
         #...pfm
         #...denoised.hdr
\ No newline at end of file
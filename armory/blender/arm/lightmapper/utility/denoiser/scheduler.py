@@ -0,0 +1,78 @@
+import bpy, os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+class TLM_Denoise_Scheduler:
+
+    """Denoises baked lightmaps with a pluggable denoiser, which is any
+    object with a denoise_image(rgb) method taking and returning a
+    height x width x 3 float32 array. The method is called from worker
+    threads, several lightmaps are denoised at once.
+
+    Blender images are only accessed from the calling thread. Pixels
+    are transferred with foreach_get/foreach_set."""
+
+    def __init__(self, denoiser, max_jobs=0, max_memory=0):
+
+        self.denoiser = denoiser
+
+        #Zero means one job per core
+        self.max_jobs = max_jobs if max_jobs > 0 else (os.cpu_count() or 1)
+
+        #Memory budget in MB for the pixel data of all running jobs, zero means no limit
+        self.max_memory = max_memory * 1024 * 1024
+
+    def job_memory(self, width, height):
+
+        #Input RGBA, RGB copy for the denoiser and its result, in float32
+        return width * height * (4 + 3 + 3) * 4
+
+    def run(self, image_paths):
+
+        with ThreadPoolExecutor(max_workers=self.max_jobs) as pool:
+
+            pending = deque()
+            memory = 0
+
+            for image_path in image_paths:
+
+                loaded_image = bpy.data.images.load(image_path, check_existing=False)
+
+                width = loaded_image.size[0]
+                height = loaded_image.size[1]
+                job_memory = self.job_memory(width, height)
+
+                #Wait for running jobs until this one fits into the budget.
+                #A single job larger than the budget still runs alone.
+                while len(pending) > 0 and (len(pending) >= self.max_jobs or (self.max_memory > 0 and memory + job_memory > self.max_memory)):
+                    memory -= self.finish(*pending.popleft())
+
+                if bpy.context.scene.TLM_SceneProperties.tlm_verbose:
+                    print("Loaded image: " + str(loaded_image))
+
+                pixels = np.empty(width * height * 4, dtype=np.float32)
+                loaded_image.pixels.foreach_get(pixels)
+                pixels = pixels.reshape(height, width, 4)
+
+                future = pool.submit(self.denoiser.denoise_image, np.ascontiguousarray(pixels[:, :, :3]))
+                pending.append((loaded_image, image_path, pixels, future, job_memory))
+                memory += job_memory
+
+            while len(pending) > 0:
+                memory -= self.finish(*pending.popleft())
+
+    def finish(self, loaded_image, image_path, pixels, future, job_memory):
+
+        pixels[:, :, :3] = future.result()
+        pixels[:, :, 3] = 1.0
+
+        loaded_image.pixels.foreach_set(pixels.reshape(-1))
+        loaded_image.filepath_raw = image_path[:-10] + "_denoised.hdr"
+        loaded_image.file_format = "HDR"
+        loaded_image.save()
+
+        if bpy.context.scene.TLM_SceneProperties.tlm_verbose:
+            print("Denoised image: " + image_path)
+
+        return job_memory
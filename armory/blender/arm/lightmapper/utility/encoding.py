@@ -1,4 +1,6 @@
 import bpy, math, os, gpu, bgl, importlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from . import utility
 from fractions import Fraction
@@ -561,114 +563,122 @@ def encodeImageRGBMGPU(image, maxRange, outDir, quality):
     #Todo - Find a way to save
     #bpy.ops.image.save_all_modified()
 
-def encodeImageRGBMCPU(image, maxRange, outDir, quality):
-    input_image = bpy.data.images[image.name]
-    image_name = input_image.name
+# The CPU encoders work on (n, 4) float32 arrays of RGBA pixels
 
-    if input_image.colorspace_settings.name != 'Linear':
-        input_image.colorspace_settings.name = 'Linear'
+def encodeRGBM(pixels, maxRange):
+    rgb = pixels[:, :3] * (1.0 / maxRange)
+    alpha = np.clip(np.maximum(np.max(rgb, axis=1), 1e-6), 0.0, 1.0)
+    alpha = np.ceil(alpha * 255.0) / 255.0
 
-    # Removing .exr or .hdr prefix
-    if image_name[-4:] == '.exr' or image_name[-4:] == '.hdr':
-        image_name = image_name[:-4]
+    result = np.empty_like(pixels)
+    result[:, :3] = rgb / alpha[:, None]
+    result[:, 3] = alpha
+    return result
 
-    target_image = bpy.data.images.get(image_name + '_encoded')
-    if bpy.context.scene.TLM_SceneProperties.tlm_verbose:
-        print(image_name + '_encoded')
-    if not target_image:
-        target_image = bpy.data.images.new(
-                name = image_name + '_encoded',
-                width = input_image.size[0],
-                height = input_image.size[1],
-                alpha = True,
-                float_buffer = False
-                )
-    
-    num_pixels = len(input_image.pixels)
-    result_pixel = list(input_image.pixels)
-
-    for i in range(0,num_pixels,4):
-        for j in range(3):
-            result_pixel[i+j] *= 1.0 / maxRange;
-        result_pixel[i+3] = saturate(max(result_pixel[i], result_pixel[i+1], result_pixel[i+2], 1e-6))
-        result_pixel[i+3] = math.ceil(result_pixel[i+3] * 255.0) / 255.0
-        for j in range(3):
-            result_pixel[i+j] /= result_pixel[i+3]
-    
-    target_image.pixels = result_pixel
-    input_image = target_image
-    
-    #Save RGBM
-    if bpy.context.scene.TLM_SceneProperties.tlm_verbose:
-        print(input_image.name)
-    input_image.filepath_raw = outDir + "/" + input_image.name + ".png"
-    input_image.file_format = "PNG"
-    bpy.context.scene.render.image_settings.quality = quality
-    input_image.save()
+def encodeRGBD(pixels, maxRange):
+    # Matches the GPU encoder, which uses a fixed range
+    rgbdMaxRange = 255.0
 
-    #input_image.save_render(filepath = input_image.filepath_raw, scene = bpy.context.scene)
-    # input_image.filepath_raw = outDir + "_encoded.png"
-    # input_image.file_format = "PNG"
-    # bpy.context.scene.render.image_settings.quality = quality
-    # input_image.save_render(filepath = input_image.filepath_raw, scene = bpy.context.scene)
-    #input_image.
-    #input_image.save()
-
-def saturate(num, floats=True):
-    if num <= 0:
-        num = 0
-    elif num > (1 if floats else 255):
-        num = (1 if floats else 255)
-    return num
-
-def maxEps(x):
-    return max(x, 1e-6)
+    maxRGB = np.maximum(np.max(pixels[:, :3], axis=1), 1e-6)
+    D = np.maximum(rgbdMaxRange / maxRGB, 1.0)
+    D = np.clip(np.floor(D) / 255.0, 0.0, 1.0)
 
-def encodeImageRGBDCPU(image, maxRange, outDir, quality):
-    input_image = bpy.data.images[image.name]
-    image_name = input_image.name
+    result = np.empty_like(pixels)
+    result[:, :3] = np.power(np.maximum(pixels[:, :3] * D[:, None], 0.0), 1 / 2.2)
+    result[:, 3] = D
+    return result
+
+# Transposed cLogLuvM matrix of the GPU encoder, GLSL matrices are column major
+logLuvM = np.array([[0.2209, 0.3390, 0.4184], [0.1138, 0.6780, 0.7319], [0.0102, 0.1130, 0.2969]], dtype=np.float32)
+
+def encodeLogLuv(pixels, maxRange):
+    Xp_Y_XYZp = np.maximum(pixels[:, :3] @ logLuvM, 1e-6)
+    Le = 2.0 * np.log2(Xp_Y_XYZp[:, 1]) + 127.0
+
+    result = np.empty_like(pixels)
+    result[:, :2] = Xp_Y_XYZp[:, :2] / Xp_Y_XYZp[:, 2:3]
+    result[:, 3] = Le - np.floor(Le)
+    result[:, 2] = (Le - np.floor(result[:, 3] * 255.0) / 255.0) / 255.0
+    return result
+
+def encodeHDR(pixels, maxRange):
+    return pixels
+
+cpuEncoders = {
+    'RGBM': encodeRGBM,
+    'RGBD': encodeRGBD,
+    'LogLuv': encodeLogLuv,
+    'HDR': encodeHDR
+}
+
+def getEncodeTarget(input_image, float_buffer):
 
     if input_image.colorspace_settings.name != 'Linear':
         input_image.colorspace_settings.name = 'Linear'
 
+    image_name = input_image.name
+
     # Removing .exr or .hdr prefix
     if image_name[-4:] == '.exr' or image_name[-4:] == '.hdr':
         image_name = image_name[:-4]
 
     target_image = bpy.data.images.get(image_name + '_encoded')
+    if bpy.context.scene.TLM_SceneProperties.tlm_verbose:
+        print(image_name + '_encoded')
     if not target_image:
         target_image = bpy.data.images.new(
                 name = image_name + '_encoded',
                 width = input_image.size[0],
                 height = input_image.size[1],
                 alpha = True,
-                float_buffer = False
+                float_buffer = float_buffer
                 )
-    
-    num_pixels = len(input_image.pixels)
-    result_pixel = list(input_image.pixels)
-
-    rgbdMaxRange = 255.0
-
-    for i in range(0,num_pixels,4):
 
-        maxRGB = maxEps(max(result_pixel[i], result_pixel[i+1], result_pixel[i+2]))
-        D = max(rgbdMaxRange/maxRGB, 1.0)
-        D = np.clip((math.floor(D) / 255.0), 0.0, 1.0)
+    return target_image
+
+def encodeImagesCPU(images, mode, maxRange, outDir, quality):
+    """Encode the given lightmaps with the CPU encoder of the given mode
+    and save them to outDir. Blender images can only be accessed from
+    the main thread, the encoding itself runs in a thread pool while the
+    next lightmap is read."""
+
+    encoder = cpuEncoders[mode]
+    # Each lightmap in flight holds its full float pixel data
+    num_workers = min(os.cpu_count() or 1, 4)
+
+    def save(target_image, future):
+        target_image.pixels.foreach_set(future.result().reshape(-1))
+
+        if bpy.context.scene.TLM_SceneProperties.tlm_verbose:
+            print(target_image.name)
+        if mode == 'HDR':
+            target_image.filepath_raw = outDir + "/" + target_image.name + ".exr"
+            target_image.file_format = "OPEN_EXR"
+        else:
+            target_image.filepath_raw = outDir + "/" + target_image.name + ".png"
+            target_image.file_format = "PNG"
+        bpy.context.scene.render.image_settings.quality = quality
+        target_image.save()
+
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        # Limit the amount of pixel data kept in memory
+        pending = deque()
+        for image in images:
+            input_image = bpy.data.images[image.name]
+            target_image = getEncodeTarget(input_image, mode == 'HDR')
+
+            pixels = np.empty(len(input_image.pixels), dtype=np.float32)
+            input_image.pixels.foreach_get(pixels)
+            pending.append((target_image, pool.submit(encoder, pixels.reshape(-1, 4), maxRange)))
+
+            while len(pending) > num_workers:
+                save(*pending.popleft())
+
+        while len(pending) > 0:
+            save(*pending.popleft())
 
-        result_pixel[i] = math.pow(result_pixel[i] * D, 1/2.2)
-        result_pixel[i+1] = math.pow(result_pixel[i+1] * D, 1/2.2)
-        result_pixel[i+2] = math.pow(result_pixel[i+2] * D, 1/2.2)
-        result_pixel[i+3] = D
-    
-    target_image.pixels = result_pixel
-    
-    input_image = target_image
+def encodeImageRGBMCPU(image, maxRange, outDir, quality):
+    encodeImagesCPU([image], 'RGBM', maxRange, outDir, quality)
 
-    #Save RGBD
-    if bpy.context.scene.TLM_SceneProperties.tlm_verbose:
-        print(input_image.name)
-    input_image.filepath_raw = outDir + "/" + input_image.name + ".png"
-    input_image.file_format = "PNG"
-    bpy.context.scene.render.image_settings.quality = quality
-    input_image.save()
\ No newline at end of file
+def encodeImageRGBDCPU(image, maxRange, outDir, quality):
+    encodeImagesCPU([image], 'RGBD', maxRange, outDir, quality)
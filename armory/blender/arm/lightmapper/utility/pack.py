@@ -1,6 +1,6 @@
 import bpy, os, sys, math, mathutils, importlib
 import numpy as np
-from . rectpack import newPacker, PackingMode, PackingBin
+from . rectpack import newPacker, PackingMode, PackingBin, MaxRectsNpBssf
 
 def postpack():
 
@@ -89,7 +89,7 @@ def postpack():
 
         for atlas in bpy.context.scene.TLM_PostAtlasList: #For each atlas
 
-            packer[atlas.name] = newPacker(PackingMode.Offline, PackingBin.BFF, rotation=False)
+            packer[atlas.name] = newPacker(PackingMode.Offline, PackingBin.BFF, pack_algo=MaxRectsNpBssf, rotation=False)
 
             bpy.app.driver_namespace["logman"].append("Postpacking: " + str(atlas.name))
 
@@ -8,6 +8,9 @@ from .guillotine import GuillotineBssfSas, GuillotineBssfLas, \
 
 from .maxrects import MaxRectsBl, MaxRectsBssf, MaxRectsBaf, MaxRectsBlsf
 
+from .maxrects_np import MaxRectsNpBl, MaxRectsNpBssf, MaxRectsNpBaf, \
+    MaxRectsNpBlsf
+
 from .skyline import SkylineMwf, SkylineMwfl, SkylineBl, \
     SkylineBlWm, SkylineMwfWm, SkylineMwflWm
 
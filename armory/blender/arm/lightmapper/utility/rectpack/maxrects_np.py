@@ -0,0 +1,284 @@
+from .pack_algo import PackingAlgorithm
+from .geometry import Rectangle
+from .maxrects import MaxRects, MaxRectsBl, MaxRectsBssf, MaxRectsBaf, MaxRectsBlsf
+import numpy as np
+
+
+# Columns of the max_rects array
+X, Y, W, H = 0, 1, 2, 3
+
+
+def _is_integer(*values):
+    return all(isinstance(v, (int, np.integer)) for v in values)
+
+
+class MaxRectsNp(PackingAlgorithm):
+    """
+    MaxRects with the maximal rectangles stored in a (n, 4) numpy array
+    of x, y, width, height rows. Fitness, splitting and the removal of
+    contained rectangles are evaluated for all maximal rectangles at
+    once, instead of one Rectangle object at a time.
+
+    Placement is the same as MaxRects, so they can be used
+    interchangeably, but it is much faster once there are many free
+    rectangles. With only a few of them the per call overhead of numpy
+    is larger than the work, so rectangles are placed by the MaxRects
+    variant in _list_algo until there are more than list_max_rects
+    free rectangles.
+    """
+
+    # Pure Python variant with the same placement, used while there are
+    # only a few free rectangles
+    _list_algo = MaxRects
+
+    # Free rectangles above which the numpy array is used, about where
+    # both take the same time per rectangle
+    list_max_rects = 48
+
+    def __init__(self, width, height, rot=True, *args, **kwargs):
+        super(MaxRectsNp, self).__init__(width, height, rot, *args, **kwargs)
+
+    def _to_array(self):
+        """
+        Continue with the free rectangles of the MaxRects variant in a
+        numpy array.
+        """
+        values = [(m.x, m.y, m.width, m.height) for m in self._list._max_rects]
+        dtype = np.int64 if all(_is_integer(*v) for v in values) else np.float64
+        self._max_rects = np.array(values, dtype=dtype).reshape(-1, 4)
+        self._list = None
+
+    def _rect_fitness(self, max_rects, width, height):
+        """
+        Arguments:
+            max_rects (ndarray): Destination max_rects
+            width (int, float): Rectangle width
+            height (int, float): Rectangle height
+
+        Returns:
+            ndarray: fitness value for each max_rect, lower is better
+        """
+        return np.zeros(len(max_rects))
+
+    def _fitness(self, width, height):
+        """
+        Fitness of all max_rects, inf where the rectangle doesn't fit.
+        """
+        m = self._max_rects
+        fits = (m[:, W] >= width) & (m[:, H] >= height)
+        return np.where(fits, self._rect_fitness(m, width, height), np.inf)
+
+    def _select_position(self, w, h):
+        """
+        Find max_rect with best fitness for placing a rectangle
+        of dimentsions w*h
+
+        Arguments:
+            w (int, float): Rectangle width
+            h (int, float): Rectangle height
+
+        Returns:
+            (rect, index)
+            rect (Rectangle): Placed rectangle or None if was unable.
+            index (int): Index of the max_rect where rect was placed
+        """
+        count = len(self._max_rects)
+        if count == 0:
+            return None, None
+
+        # Normal rectangle followed by the rotated one, so that ties are
+        # resolved in the same order as MaxRects
+        fit = self._fitness(w, h)
+        if self.rot:
+            fit = np.concatenate((fit, self._fitness(h, w)))
+
+        best = np.argmin(fit).item()
+        if fit[best] == np.inf:
+            return None, None
+
+        if best >= count:
+            best -= count
+            w, h = h, w
+
+        m = self._max_rects[best]
+        return Rectangle(m[X].item(), m[Y].item(), w, h), best
+
+    def _split(self, rect):
+        """
+        Split all max_rects intersecting the rectangle rect into up to
+        4 new max_rects, and remove the new ones contained by any other
+        max_rect. Max_rects that were already there can't be contained
+        by the new ones, as they would be contained by the max_rect
+        they were split from.
+
+        Arguments:
+            rect (Rectangle): Rectangle
+        """
+        m = self._max_rects
+        left, bottom = m[:, X], m[:, Y]
+        right, top = left + m[:, W], bottom + m[:, H]
+
+        hit = ~((bottom >= rect.top) | (top <= rect.bottom) |
+                (left >= rect.right) | (right <= rect.left))
+        if not hit.any():
+            return
+
+        s = m[hit]
+        s_left, s_bottom = left[hit], bottom[hit]
+        s_right, s_top = right[hit], top[hit]
+
+        # Left, right, top and bottom split of each intersected max_rect,
+        # in place of it, so that the order is the same as in MaxRects
+        pieces = np.zeros((len(m), 4, 4), dtype=m.dtype)
+        pieces[~hit, 0] = m[~hit]
+        pieces[hit, 0] = np.stack((s_left, s_bottom, rect.left - s_left, s[:, H]), axis=1)
+        pieces[hit, 1] = np.stack((np.full_like(s_left, rect.right), s_bottom, s_right - rect.right, s[:, H]), axis=1)
+        pieces[hit, 2] = np.stack((s_left, np.full_like(s_bottom, rect.top), s[:, W], s_top - rect.top), axis=1)
+        pieces[hit, 3] = np.stack((s_left, s_bottom, s[:, W], rect.bottom - s_bottom), axis=1)
+        is_split = np.zeros((len(m), 4), dtype=bool)
+        is_split[hit] = True
+
+        pieces = pieces.reshape(-1, 4)
+        valid = (pieces[:, W] > 0) & (pieces[:, H] > 0)
+        candidates = pieces[valid]
+        is_split = is_split.reshape(-1)[valid]
+
+        # Remove every new max_rect contained by another one, keeping the
+        # first of equal ones
+        splits = candidates[is_split]
+        s_left, s_bottom = splits[:, X, None], splits[:, Y, None]
+        s_right, s_top = s_left + splits[:, W, None], s_bottom + splits[:, H, None]
+        c_left, c_bottom = candidates[None, :, X], candidates[None, :, Y]
+        c_right, c_top = c_left + candidates[None, :, W], c_bottom + candidates[None, :, H]
+
+        contained = (c_left <= s_left) & (c_bottom <= s_bottom) & (c_right >= s_right) & (c_top >= s_top)
+        equal = (c_left == s_left) & (c_bottom == s_bottom) & (c_right == s_right) & (c_top == s_top)
+        later = np.arange(len(candidates))[None, :] >= np.flatnonzero(is_split)[:, None]
+        contained &= ~(equal & later)
+
+        keep = np.ones(len(candidates), dtype=bool)
+        keep[is_split] = ~contained.any(axis=1)
+        self._max_rects = candidates[keep]
+
+    def fitness(self, width, height):
+        """
+        Metric used to rate how much space is wasted if a rectangle is placed.
+        Returns a value greater or equal to zero, the smaller the value the more
+        'fit' is the rectangle. If the rectangle can't be placed, returns None.
+
+        Arguments:
+            width (int, float): Rectangle width
+            height (int, float): Rectangle height
+
+        Returns:
+            int, float: Rectangle fitness
+            None: Rectangle can't be placed
+        """
+        assert(width > 0 and height > 0)
+
+        if self._list is not None:
+            return self._list.fitness(width, height)
+
+        rect, index = self._select_position(width, height)
+        if rect is None:
+            return None
+
+        # Return fitness
+        return self._rect_fitness(self._max_rects[index:index+1], rect.width, rect.height)[0].item()
+
+    def add_rect(self, width, height, rid=None):
+        """
+        Add rectangle of widthxheight dimensions.
+
+        Arguments:
+            width (int, float): Rectangle width
+            height (int, float): Rectangle height
+            rid: Optional rectangle user id
+
+        Returns:
+            Rectangle: Rectangle with placemente coordinates
+            None: If the rectangle couldn be placed.
+        """
+        assert(width > 0 and height >0)
+
+        if self._list is not None:
+            # Shares the list of placed rectangles
+            rect = self._list.add_rect(width, height, rid)
+            if len(self._list._max_rects) > self.list_max_rects:
+                self._to_array()
+            return rect
+
+        # Integer bins switch to float coordinates with the first float
+        # rectangle, splitting it in integers would truncate the pieces
+        if self._max_rects.dtype != np.float64 and not _is_integer(width, height):
+            self._max_rects = self._max_rects.astype(np.float64)
+
+        # Search best position and orientation
+        rect, _ = self._select_position(width, height)
+        if not rect:
+            return None
+
+        # Subdivide all the max rectangles intersecting with the selected
+        # rectangle.
+        self._split(rect)
+
+        # Store and return rectangle position.
+        rect.rid = rid
+        self.rectangles.append(rect)
+        return rect
+
+    def add_rects(self, rects):
+        """
+        Add several rectangles, in the given order.
+
+        Arguments:
+            rects (list): (width, height) or (width, height, rid) tuples
+
+        Returns:
+            list: Placed Rectangle, or None if it couldn't be placed,
+                for each of the rectangles
+        """
+        return [self.add_rect(*r) for r in rects]
+
+    def reset(self):
+        super(MaxRectsNp, self).reset()
+        self._list = self._list_algo(self.width, self.height, self.rot)
+        self._list.rectangles = self.rectangles
+        self._max_rects = None
+
+
+
+
+class MaxRectsNpBl(MaxRectsNp):
+    """
+    Select the position where the y coordinate of the top of the rectangle
+    is lower
+    """
+    _list_algo = MaxRectsBl
+
+    def _rect_fitness(self, max_rects, width, height):
+        return max_rects[:, Y] + height
+
+
+class MaxRectsNpBssf(MaxRectsNp):
+    """Best Sort Side Fit minimize short leftover side"""
+    _list_algo = MaxRectsBssf
+
+    def _rect_fitness(self, max_rects, width, height):
+        return np.minimum(max_rects[:, W] - width, max_rects[:, H] - height)
+
+class MaxRectsNpBaf(MaxRectsNp):
+    """Best Area Fit pick maximal rectangle with smallest area
+    where the rectangle can be placed"""
+    _list_algo = MaxRectsBaf
+
+    def _rect_fitness(self, max_rects, width, height):
+        return max_rects[:, W] * max_rects[:, H] - width * height
+
+
+class MaxRectsNpBlsf(MaxRectsNp):
+    """Best Long Side Fit minimize long leftover side"""
+    _list_algo = MaxRectsBlsf
+
+    def _rect_fitness(self, max_rects, width, height):
+        return np.maximum(max_rects[:, W] - width, max_rects[:, H] - height)
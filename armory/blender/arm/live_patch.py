@@ -1,6 +1,9 @@
+import collections
+import hashlib
 import os
 import shutil
-from typing import Any, Type
+import time
+from typing import Any, Deque, Dict, List, Set, Tuple, Type
 
 import bpy
 
@@ -32,6 +35,30 @@ else:
     __running = False
     """Whether live patch is currently active"""
 
+    patch_latencies: Deque[float] = collections.deque(maxlen=100)
+    """Seconds between the first change and the written patch, for the
+    most recent patches"""
+
+    __dirty_transforms: Set[str] = set()
+    """Names of objects whose transform changed since the last patch"""
+
+    __dirty_lights: Set[str] = set()
+    """Names of lights whose data changed since the last patch"""
+
+    __dirty_export = False
+    """Whether a change requires the scene to be re-exported"""
+
+    __dirty_since = 0.0
+    """Time of the first change that is not yet patched"""
+
+    __file_digests: Dict[str, Tuple[int, int, bytes]] = {}
+    """(mtime, size, digest) of compiled files, to find the files that
+    actually changed or were added after a re-export"""
+
+# Extensions of exported scene and mesh data files, which khamake
+# copies into the build without processing them
+SCENE_DATA_EXTENSIONS = ('.arm', '.lz4', '.json')
+
 # Any object can act as a message bus owner
 msgbus_owner = object()
 
@@ -50,29 +77,112 @@ def start():
         listen(light_type, "color", "light_color")
         listen(light_type, "energy", "light_energy")
 
+    # Hash the compiled files of the running build, so that files added
+    # by a re-export can be told apart from changed ones
+    fp_compiled = os.path.join(arm.utils.get_fp_build(), 'compiled')
+    with arm.utils.WorkingDir(arm.utils.get_fp()):
+        changed_files(os.path.join(fp_compiled, 'Shaders'))
+        changed_files(os.path.join(fp_compiled, 'Assets'))
+
     global __running
     __running = True
 
 
 def stop():
     """Stop the live patch session."""
-    global __running, patch_id
+    global __running, patch_id, __dirty_export
     if __running:
         __running = False
         patch_id = 0
+        __dirty_transforms.clear()
+        __dirty_lights.clear()
+        __dirty_export = False
+        __file_digests.clear()
 
         log.debug("Live patch session stopped")
         bpy.msgbus.clear_by_owner(msgbus_owner)
 
 
+def mark_dirty(transform: str = None, light: str = None, export=False):
+    """Mark the given object transform or light data as changed, or the
+    whole scene as requiring a re-export if `export` is true."""
+    global __dirty_export, __dirty_since
+    if not is_dirty():
+        __dirty_since = time.perf_counter()
+
+    if transform is not None:
+        __dirty_transforms.add(transform)
+    if light is not None:
+        __dirty_lights.add(light)
+    __dirty_export = __dirty_export or export
+
+
+def is_dirty() -> bool:
+    return __dirty_export or len(__dirty_transforms) > 0 or len(__dirty_lights) > 0
+
+
+def on_depsgraph_update(depsgraph: bpy.types.Depsgraph):
+    """Collect the datablocks changed by the given depsgraph update.
+    This decides how a change is patched: object transforms and light
+    data are sent as a delta patch, any other change falls back to a
+    full re-export of the scene in patch_export()."""
+    if not __running:
+        return
+
+    for update in depsgraph.updates:
+        uid = update.id.original
+
+        if isinstance(uid, bpy.types.Object):
+            # Geometry and shading changes of an object (modifiers,
+            # material slots, ...) are re-exported
+            if update.is_updated_geometry or update.is_updated_shading:
+                mark_dirty(export=True)
+            elif update.is_updated_transform:
+                mark_dirty(transform=uid.name)
+
+        elif isinstance(uid, bpy.types.Light):
+            mark_dirty(light=uid.name)
+
+        # Selection and frame changes only update the scene, logic
+        # trees are patched with the 'ln_*' events
+        elif isinstance(uid, bpy.types.Scene):
+            continue
+        elif isinstance(uid, bpy.types.NodeTree) and uid.bl_idname == 'ArmLogicTreeType':
+            continue
+
+        # Everything else (meshes, materials, worlds, cameras, added or
+        # removed objects, ...) has no delta patch and is re-exported
+        else:
+            mark_dirty(export=True)
+
+
 def patch_export():
-    """Re-export the current scene and update the game accordingly."""
-    if not __running or state.proc_build is not None:
+    """Update the game with all changes since the last patch. Changed
+    transforms and lights are sent as a single patch, other changes
+    re-export the scene and only invoke khamake if something other than
+    already known scene data changed."""
+    global __dirty_export
+    if not __running or state.proc_build is not None or not is_dirty():
+        return
+
+    if not __dirty_export:
+        js = ''.join(transform_patch(bpy.data.objects[name]) for name in __dirty_transforms if name in bpy.data.objects)
+        js += ''.join(light_patch(bpy.data.lights[name]) for name in __dirty_lights if name in bpy.data.lights)
+        __dirty_transforms.clear()
+        __dirty_lights.clear()
+        if js != '':
+            write_patch(js)
+            record_latency()
         return
 
+    __dirty_transforms.clear()
+    __dirty_lights.clear()
+    __dirty_export = False
+
     arm.assets.invalidate_enabled = False
 
     with arm.utils.WorkingDir(arm.utils.get_fp()):
+        fp_compiled = os.path.join(arm.utils.get_fp_build(), 'compiled')
         asset_path = arm.utils.get_fp_build() + '/compiled/Assets/' + arm.utils.safestr(bpy.context.scene.name) + '.arm'
         ArmoryExporter.export_scene(bpy.context, asset_path, scene=bpy.context.scene)
 
@@ -81,6 +191,22 @@ def patch_export():
             dir_std_shaders_src = os.path.join(arm.utils.get_sdk_path(), 'armory', 'Shaders', 'std')
             shutil.copytree(dir_std_shaders_src, dir_std_shaders_dst)
 
+        changed_shaders, _ = changed_files(os.path.join(fp_compiled, 'Shaders'))
+        changed_assets, added_assets = changed_files(os.path.join(fp_compiled, 'Assets'))
+        dir_krom = os.path.join(arm.utils.get_fp_build(), 'debug', 'krom')
+
+        # Scene and mesh data are copied by khamake without processing,
+        # so there is no need to run it if only such files changed. New
+        # files have to be added to khamake's asset list, other assets
+        # may need to be converted.
+        only_scene_data = all(path.endswith(SCENE_DATA_EXTENSIONS) for path in changed_assets)
+        if len(changed_shaders) == 0 and len(added_assets) == 0 and only_scene_data and os.path.isdir(dir_krom):
+            for path in changed_assets:
+                shutil.copyfile(path, os.path.join(dir_krom, os.path.basename(path)))
+            arm.assets.invalidate_enabled = True
+            patch_done()
+            return
+
         node_path = arm.utils.get_node_path()
         khamake_path = arm.utils.get_khamake_path()
         cmd = [
@@ -100,8 +226,73 @@ def patch_done():
     """Signal Iron to reload the running scene after a re-export."""
     js = 'iron.Scene.patch();'
     write_patch(js)
+    record_latency()
     state.proc_build = None
 
+    # Apply changes made while khamake was running
+    patch_export()
+
+
+def changed_files(directory: str) -> Tuple[List[str], List[str]]:
+    """Return the files in the given directory whose content changed
+    since the last call, and the ones among them that were not there
+    before. Files are only hashed if their modification time or size
+    changed."""
+    changed = []
+    added = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            cached = __file_digests.get(path)
+            if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                continue
+
+            with open(path, 'rb') as f:
+                digest = hashlib.blake2b(f.read(), digest_size=16).digest()
+            if cached is None or cached[2] != digest:
+                changed.append(path)
+            if cached is None:
+                added.append(path)
+            __file_digests[path] = (st.st_mtime_ns, st.st_size, digest)
+
+    return changed, added
+
+
+def record_latency():
+    """Record the time between the first change and its patch."""
+    latency = time.perf_counter() - __dirty_since
+    patch_latencies.append(latency)
+    log.debug(f'Live patch applied after {latency * 1000:.1f} ms')
+
+
+def transform_patch(bobject: bpy.types.Object) -> str:
+    """Return the javascript code that updates the transform of the
+    given object in Iron."""
+    loc, rot, scale = bobject.matrix_local.decompose()
+    return (f'var o = iron.Scene.active.getChild("{bobject.name}"); if (o != null) {{ '
+            f'o.transform.loc.set({loc[0]}, {loc[1]}, {loc[2]}); '
+            f'o.transform.rot.set({rot[1]}, {rot[2]}, {rot[3]}, {rot[0]}); '
+            f'o.transform.scale.set({scale[0]}, {scale[1]}, {scale[2]}); '
+            'o.transform.dirty = true; }')
+
+
+def light_patch(light: bpy.types.Light) -> str:
+    """Return the javascript code that updates the color and strength
+    of the given light in Iron."""
+    # Align strength to Armory, see exporter.export_light()
+    # TODO: Use exporter.export_light() and simply reload all raw light data in Iron?
+    strength_fac = 1.0
+    if light.type == 'SUN':
+        strength_fac = 0.325
+    elif light.type in ('POINT', 'SPOT', 'AREA'):
+        strength_fac = 0.01
+
+    vec = light.color
+    return (f'var l = iron.Scene.active.getLight("{light.name}"); if (l != null) {{ var lRaw = l.data.raw; '
+            f'lRaw.color[0]={vec[0]}; lRaw.color[1]={vec[1]}; lRaw.color[2]={vec[2]}; '
+            f'lRaw.strength={light.energy * strength_fac}; }}')
+
 
 def write_patch(js: str):
     """Write the given javascript code to 'krom.patch'."""
@@ -134,42 +325,16 @@ def send_event(event_id: str, opt_data: Any = None):
         obj = bpy.context.object.name
 
         if bpy.context.object.mode == "OBJECT":
-            if event_id == "obj_location":
-                vec = bpy.context.object.location
-                js = f'var o = iron.Scene.active.getChild("{obj}"); o.transform.loc.set({vec[0]}, {vec[1]}, {vec[2]}); o.transform.dirty = true;'
-                write_patch(js)
-
-            elif event_id == 'obj_scale':
-                vec = bpy.context.object.scale
-                js = f'var o = iron.Scene.active.getChild("{obj}"); o.transform.scale.set({vec[0]}, {vec[1]}, {vec[2]}); o.transform.dirty = true;'
-                write_patch(js)
-
-            elif event_id == 'obj_rotation':
-                vec = bpy.context.object.rotation_euler.to_quaternion()
-                js = f'var o = iron.Scene.active.getChild("{obj}"); o.transform.rot.set({vec[1]}, {vec[2]}, {vec[3]}, {vec[0]}); o.transform.dirty = true;'
-                write_patch(js)
-
-            elif event_id == 'light_color':
-                light: bpy.types.Light = bpy.context.object.data
-                vec = light.color
-                js = f'var lRaw = iron.Scene.active.getLight("{light.name}").data.raw; lRaw.color[0]={vec[0]}; lRaw.color[1]={vec[1]}; lRaw.color[2]={vec[2]};'
-                write_patch(js)
-
-            elif event_id == 'light_energy':
-                light: bpy.types.Light = bpy.context.object.data
-
-                # Align strength to Armory, see exporter.export_light()
-                # TODO: Use exporter.export_light() and simply reload all raw light data in Iron?
-                strength_fac = 1.0
-                if light.type == 'SUN':
-                    strength_fac = 0.325
-                elif light.type in ('POINT', 'SPOT', 'AREA'):
-                    strength_fac = 0.01
-
-                js = f'var lRaw = iron.Scene.active.getLight("{light.name}").data.raw; lRaw.strength={light.energy * strength_fac};'
-                write_patch(js)
+            if event_id in ('obj_location', 'obj_scale', 'obj_rotation'):
+                mark_dirty(transform=obj)
+                patch_export()
+
+            elif event_id in ('light_color', 'light_energy'):
+                mark_dirty(light=bpy.context.object.data.name)
+                patch_export()
 
         else:
+            mark_dirty(export=True)
             patch_export()
 
     if event_id == 'ln_insert_link':
@@ -349,16 +514,9 @@ def on_operator(operator_id: str):
     if operator_id in IGNORE_OPERATORS:
         return
 
-    if operator_id == 'TRANSFORM_OT_translate':
-        send_event('obj_location')
-    elif operator_id in ('TRANSFORM_OT_rotate', 'TRANSFORM_OT_trackball'):
-        send_event('obj_rotation')
-    elif operator_id == 'TRANSFORM_OT_resize':
-        send_event('obj_scale')
-
-    # Rebuild
-    else:
-        patch_export()
+    # Patch everything the depsgraph reported as changed, see
+    # on_depsgraph_update()
+    patch_export()
 
 
 # Don't re-export the scene for the following operators
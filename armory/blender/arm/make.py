@@ -28,9 +28,11 @@ import arm.make_logic as make_logic
 import arm.make_renderpath as make_renderpath
 import arm.make_state as state
 import arm.make_world as make_world
+import arm.profiler as profiler
 import arm.utils
 import arm.utils_vs
 import arm.write_data as write_data
+import arm.write_textures as write_textures
 
 if arm.is_reload(__name__):
     assets = arm.reload_module(assets)
@@ -44,20 +46,22 @@ if arm.is_reload(__name__):
     make_renderpath = arm.reload_module(make_renderpath)
     state = arm.reload_module(state)
     make_world = arm.reload_module(make_world)
+    profiler = arm.reload_module(profiler)
     arm.utils = arm.reload_module(arm.utils)
     arm.utils_vs = arm.reload_module(arm.utils_vs)
     write_data = arm.reload_module(write_data)
+    write_textures = arm.reload_module(write_textures)
 else:
     arm.enable_reload(__name__)
 
-scripts_mtime = 0 # Monitor source changes
+scripts_mtime = 0 # Monitor source changes, in nanoseconds
 profile_time = 0
 
 # Queue of threads and their done callbacks. Item format: [thread, done]
 thread_callback_queue = Queue(maxsize=0)
 
 
-def run_proc(cmd, done: Callable) -> subprocess.Popen:
+def run_proc(cmd, done: Callable, trace_name: str = 'process') -> subprocess.Popen:
     """Creates a subprocess with the given command and returns it.
 
     If Blender is not running in background mode, a thread is spawned
@@ -66,11 +70,15 @@ def run_proc(cmd, done: Callable) -> subprocess.Popen:
     the subprocess has finished.
 
     If `done` is not `None`, it is called afterwards in the main thread.
+    The run time of the subprocess is added to the build trace under
+    the name `trace_name`.
     """
     use_thread = not bpy.app.background
+    start = time.perf_counter()
 
     def wait_for_proc(proc: subprocess.Popen):
         proc.wait()
+        profiler.add_span(trace_name, 'process', start, time.perf_counter(), thread_name=trace_name)
 
         if use_thread:
             # Put the done callback into the callback queue so that it
@@ -100,7 +108,8 @@ def compile_shader_pass(res, raw_shaders_path, shader_name, defs, make_variants)
     json_data = json.loads(json_file)
 
     fp = arm.utils.get_fp_build()
-    arm.lib.make_datas.make(res, shader_name, json_data, fp, defs, make_variants)
+    with profiler.span('make_datas', 'shader', name=shader_name):
+        arm.lib.make_datas.make(res, shader_name, json_data, fp, defs, make_variants)
 
     path = fp + '/compiled/Shaders'
     contexts = json_data['contexts']
@@ -221,12 +230,16 @@ def export_data(fp, sdk_path):
     export_network = bpy.data.worlds['Arm'].arm_network != 'Disabled'
 
     assets.reset()
+    write_textures.reset()
 
     # Build node trees
     ArmoryExporter.import_traits = []
-    make_logic.build()
-    make_world.build()
-    make_renderpath.build()
+    with profiler.span('make_logic'):
+        make_logic.build()
+    with profiler.span('make_world'):
+        make_world.build()
+    with profiler.span('make_renderpath'):
+        make_renderpath.build()
 
     # Export scene data
     assets.embedded_data = sorted(list(set(assets.embedded_data)))
@@ -264,7 +277,8 @@ def export_data(fp, sdk_path):
             assets.reset_shader_cons()
             ext = '.lz4' if ArmoryExporter.compress_enabled else '.arm'
             asset_path = build_dir + '/compiled/Assets/' + arm.utils.safestr(scene.name + "_" + os.path.basename(scene.library.filepath).replace(".blend", "") if scene.library else scene.name) + ext
-            ArmoryExporter.export_scene(bpy.context, asset_path, scene=scene, depsgraph=depsgraph, build_cache=build_cache)
+            with profiler.span('export_scene', scene=scene.name):
+                ArmoryExporter.export_scene(bpy.context, asset_path, scene=scene, depsgraph=depsgraph, build_cache=build_cache)
             if ArmoryExporter.export_physics:
                 physics_found = True
             if ArmoryExporter.export_navigation:
@@ -275,6 +289,14 @@ def export_data(fp, sdk_path):
                 network_found = True
             assets.add(asset_path)
 
+    # Wait until the data files of all scenes are written
+    with profiler.span('write_data_files'):
+        build_cache.finish()
+
+    # Convert the images collected while exporting the materials
+    with profiler.span('write_textures'):
+        write_textures.run()
+
     if physics_found is False: # Disable physics if no rigid body is exported
         export_physics = False
 
@@ -330,12 +352,13 @@ def export_data(fp, sdk_path):
     if not os.path.isfile(build_dir + '/compiled/Shaders/shader_datas.arm') or state.last_world_defs != wrd.world_defs:
         res = {'shader_datas': []}
 
-        for ref in assets.shader_passes:
-            # Ensure shader pass source exists
-            if not os.path.exists(raw_shaders_path + '/' + ref):
-                continue
-            assets.shader_passes_assets[ref] = []
-            compile_shader_pass(res, raw_shaders_path, ref, defs + cdefs, make_variants=has_config)
+        with profiler.span('compile_shader_passes'):
+            for ref in assets.shader_passes:
+                # Ensure shader pass source exists
+                if not os.path.exists(raw_shaders_path + '/' + ref):
+                    continue
+                assets.shader_passes_assets[ref] = []
+                compile_shader_pass(res, raw_shaders_path, ref, defs + cdefs, make_variants=has_config)
 
         # Workaround to also export non-material world shaders
         res['shader_datas'] += make_world.shader_datas
@@ -386,11 +409,13 @@ def export_data(fp, sdk_path):
         wrd.arm_project_version = arm.utils.change_version_project(wrd.arm_project_version)
 
     # Write khafile.js
-    write_data.write_khafilejs(state.is_play, export_physics, export_navigation, export_ui, export_network, state.is_publish, ArmoryExporter.import_traits)
+    with profiler.span('write_khafilejs'):
+        write_data.write_khafilejs(state.is_play, export_physics, export_navigation, export_ui, export_network, state.is_publish, ArmoryExporter.import_traits)
 
     # Write Main.hx - depends on write_khafilejs for writing number of assets
     scene_name = arm.utils.get_project_scene_name()
-    write_data.write_mainhx(scene_name, resx, resy, state.is_play, state.is_publish)
+    with profiler.span('write_mainhx'):
+        write_data.write_mainhx(scene_name, resx, resy, state.is_play, state.is_publish)
     if scene_name != state.last_scene or resx != state.last_resx or resy != state.last_resy:
         wrd.arm_recompile = True
         state.last_resx = resx
@@ -415,7 +440,7 @@ def compile(assets_only=False):
             if item.arm_project_target == 'custom' and item.arm_project_khamake != '':
                 for s in item.arm_project_khamake.split(' '):
                     cmd.append(s)
-        state.proc_build = run_proc(cmd, build_done)
+        state.proc_build = run_proc(cmd, build_done, 'khamake')
     else:
         target_name = state.target
         kha_target_name = arm.utils.get_kha_target(target_name)
@@ -482,7 +507,7 @@ def compile(assets_only=False):
         #Project needs to be compiled at least once
         #before compilation server can work
         if not os.path.exists(arm.utils.build_dir() + '/debug/krom/krom.js') and not state.is_publish:
-            state.proc_build = run_proc(cmd, build_done)
+            state.proc_build = run_proc(cmd, build_done, 'khamake')
         else:
             if assets_only or compilation_server:
                 cmd.append('--nohaxe')
@@ -492,7 +517,7 @@ def compile(assets_only=False):
                 if item.arm_project_khamake != "":
                     for s in item.arm_project_khamake.split(" "):
                         cmd.append(s)
-            state.proc_build = run_proc(cmd, assets_done if compilation_server else build_done)
+            state.proc_build = run_proc(cmd, assets_done if compilation_server else build_done, 'khamake')
             if bpy.app.background:
                 if state.proc_build.returncode == 0:
                     build_success()
@@ -502,7 +527,20 @@ def compile(assets_only=False):
 def build(target, is_play=False, is_publish=False, is_export=False):
     global profile_time
     profile_time = time.time()
+    if arm.utils.get_pref_or_default('trace_build', False):
+        profiler.start_trace()
+    else:
+        profiler.stop_trace()
 
+    try:
+        _build(target, is_play, is_publish, is_export)
+    except BaseException:
+        # The trace is otherwise finished once compilation is done,
+        # which doesn't happen for a failed build
+        profiler.finish_trace()
+        raise
+
+def _build(target, is_play, is_publish, is_export):
     state.target = target
     state.is_play = is_play
     state.is_publish = is_publish
@@ -560,7 +598,8 @@ def build(target, is_play=False, is_publish=False, is_export=False):
                 f.write(text.as_string())
 
     # Export data
-    export_data(fp, sdk_path)
+    with profiler.span('export_data'):
+        export_data(fp, sdk_path)
 
     if state.target == 'html5':
         w, h = arm.utils.get_render_resolution(arm.utils.get_active_scene())
@@ -589,10 +628,11 @@ def assets_done():
         # Connect to the compilation server
         os.chdir(arm.utils.build_dir() + '/debug/')
         cmd = [arm.utils.get_haxe_path(), '--connect', '6000', 'project-krom.hxml']
-        state.proc_build = run_proc(cmd, compilation_server_done)
+        state.proc_build = run_proc(cmd, compilation_server_done, 'haxe')
     else:
         state.proc_build = None
         state.redraw_ui = True
+        profiler.finish_trace()
         log.error('Build failed, check console')
 
 def compilation_server_done():
@@ -608,11 +648,13 @@ def compilation_server_done():
     else:
         state.proc_build = None
         state.redraw_ui = True
+        profiler.finish_trace()
         log.error('Build failed, check console')
 
 def build_done():
     wrd = bpy.data.worlds['Arm']
     log.info('Finished in {:0.3f}s'.format(time.time() - profile_time))
+    profiler.finish_trace()
     if log.num_warnings > 0:
         log.print_warn(f'{log.num_warnings} warning{"s" if log.num_warnings > 1 else ""} occurred during compilation')
     if state.proc_build is None:
@@ -655,20 +697,16 @@ def play():
 
     # Trait sources modified
     state.mod_scripts = []
-    script_path = arm.utils.get_fp() + '/Sources/' + arm.utils.safestr(wrd.arm_project_package)
+    package = arm.utils.safestr(wrd.arm_project_package)
+    script_path = arm.utils.get_fp() + '/Sources/' + package
     if os.path.isdir(script_path):
+        # Updates the trait props of modified scripts
+        index = arm.utils.get_script_index(script_path)
         new_mtime = scripts_mtime
-        for fn in glob.iglob(os.path.join(script_path, '**', '*.hx'), recursive=True):
-            mtime = os.path.getmtime(fn)
-            if scripts_mtime < mtime:
-                arm.utils.fetch_script_props(fn) # Trait props
-                fn = fn.split('Sources/')[1]
-                fn = fn[:-3] #.hx
-                fn = fn.replace('/', '.')
-                state.mod_scripts.append(fn)
-                wrd.arm_recompile = True
-                if new_mtime < mtime:
-                    new_mtime = mtime
+        for rel_path in index.modified_since(scripts_mtime):
+            state.mod_scripts.append(package + '.' + rel_path[:-3].replace('/', '.'))
+            wrd.arm_recompile = True
+            new_mtime = max(new_mtime, index.entries[rel_path]['mtime'])
         scripts_mtime = new_mtime
         if len(state.mod_scripts) > 0: # Trait props
             arm.utils.fetch_trait_props()
@@ -689,7 +727,8 @@ def build_success():
             t = threading.Thread(name='localserver',
                 target=arm.lib.server.run_tcp,
                 args=(prefs.html5_server_port,
-                prefs.html5_server_log),
+                prefs.html5_server_log,
+                arm.utils.get_fp()),
                 daemon=True)
             t.start()
             build_dir = arm.utils.build_dir()
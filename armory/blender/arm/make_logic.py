@@ -1,16 +1,21 @@
+import json
 import os
-from typing import Optional, TextIO
+from typing import Any, Optional, TextIO, Union
 
 import bpy
 
+import arm.assets as assets
 from arm.exporter import ArmoryExporter
+import arm.lib.armpack
 import arm.log
 import arm.node_utils
 import arm.utils
 
 if arm.is_reload(__name__):
+    assets = arm.reload_module(assets)
     arm.exporter = arm.reload_module(arm.exporter)
     from arm.exporter import ArmoryExporter
+    arm.lib.armpack = arm.reload_module(arm.lib.armpack)
     arm.log = arm.reload_module(arm.log)
     arm.node_utils = arm.reload_module(arm.node_utils)
     arm.utils = arm.reload_module(arm.utils)
@@ -24,6 +29,145 @@ function_node_outputs = dict()
 group_name = ''
 
 
+class HaxeTreeWriter:
+    """Writes the nodes and links of a tree as Haxe code into the add()
+    function of the generated tree class."""
+
+    def __init__(self, f: TextIO):
+        self.f = f
+
+    def create_node(self, name: str, node_type: str):
+        self.f.write('\t\tvar ' + name + ' = new armory.logicnode.' + node_type + '(this);\n')
+
+    def add_function_node(self, name: str):
+        self.f.write('\t\tthis.functionNodes.set("' + name + '", ' + name + ');\n')
+
+    def add_function_output_node(self, name: str):
+        self.f.write('\t\tthis.functionOutputNodes.set("' + name + '", ' + name + ');\n')
+
+    def watch_node(self, name: str):
+        self.f.write('\t\t' + name + '.name = "' + name[1:] + '";\n')
+        self.f.write('\t\t' + name + '.watch(true);\n')
+
+    def add_patch_node(self, name: str):
+        self.f.write('\t\t' + name + '.name = "' + name[1:] + '";\n')
+        self.f.write(f'\t\tthis.nodes["{name[1:]}"] = {name};\n')
+
+    def set_property(self, name: str, node: bpy.types.Node, prop_py_name: str, prop_hx_name: str):
+        prop = arm.node_utils.haxe_format_prop_value(node, prop_py_name)
+        self.f.write('\t\t' + name + '.' + prop_hx_name + ' = ' + prop + ';\n')
+
+    def prealloc(self, name: str, num_inputs: int, num_outputs: int):
+        self.f.write(f'\t\t{name}.preallocInputs({num_inputs});\n')
+        self.f.write(f'\t\t{name}.preallocOutputs({num_outputs});\n')
+
+    def create_default_node(self, socket: bpy.types.NodeSocket) -> str:
+        return build_default_node(socket)
+
+    def add_link(self, from_node: str, to_node: str, from_index: int, to_index: int, from_type: str, socket: bpy.types.NodeSocket):
+        """Link the given nodes. `from_type` and `socket` (the socket
+        whose default value is used if the link is removed) are only
+        required for live patching."""
+        use_live_patch = arm.utils.is_livepatch_enabled()
+        self.f.write(f'\t\t{"var __link = " if use_live_patch else ""}armory.logicnode.LogicNode.addLink({from_node}, {to_node}, {from_index}, {to_index});\n')
+        if use_live_patch:
+            to_type = arm.node_utils.get_socket_type(socket)
+            self.f.write(f'\t\t__link.fromType = "{from_type}";\n')
+            self.f.write(f'\t\t__link.toType = "{to_type}";\n')
+            self.f.write(f'\t\t__link.toValue = {arm.node_utils.haxe_format_socket_val(socket.get_default_value())};\n')
+
+
+class DataTreeWriter:
+    """Collects the nodes and links of a tree into the tables of a data
+    file that is loaded by armory.logicnode.DataLogicTree.
+
+    Node classes and constants (property values, default values and
+    names) are pooled and referenced by their index. The tables are
+    stored as a single int array, starting with the number of nodes,
+    properties, links and watched nodes:
+
+    - nodes: class, value constant, input count, output count. The
+      value constant is -1 for regular nodes, other nodes are default
+      nodes created with that value (which may be null).
+    - props: node, property name constant, value constant
+    - links: from node, to node, from index, to index
+    - watched: node, name constant
+    """
+
+    def __init__(self):
+        self.classes: list[str] = []
+        self.class_ids: dict[str, int] = {}
+        # Start with null to prevent the pool from being packed as a
+        # typed array if its first value is a number
+        self.constants: list[Any] = [None]
+        self.constant_ids: dict[str, int] = {'null': 0}
+        self.node_ids: dict[str, int] = {}
+        self.nodes: list[int] = []
+        self.props: list[int] = []
+        self.links: list[int] = []
+        self.watched: list[int] = []
+
+    def get_class(self, node_type: str) -> int:
+        class_id = self.class_ids.get(node_type)
+        if class_id is None:
+            class_id = len(self.classes)
+            self.classes.append(node_type)
+            self.class_ids[node_type] = class_id
+        return class_id
+
+    def get_constant(self, value: Any) -> int:
+        # JSON keeps 1, 1.0 and true apart
+        key = json.dumps(value)
+        constant_id = self.constant_ids.get(key)
+        if constant_id is None:
+            constant_id = len(self.constants)
+            self.constants.append(value)
+            self.constant_ids[key] = constant_id
+        return constant_id
+
+    def get_node(self, node: Union[str, int]) -> int:
+        return node if isinstance(node, int) else self.node_ids[node]
+
+    def add_node(self, node_type: str, value_id: int) -> int:
+        self.nodes += [self.get_class(node_type), value_id, 0, 0]
+        return len(self.nodes) // 4 - 1
+
+    def create_node(self, name: str, node_type: str):
+        self.node_ids[name] = self.add_node(node_type, -1)
+
+    def watch_node(self, name: str):
+        self.watched += [self.node_ids[name], self.get_constant(name[1:])]
+
+    def set_property(self, name: str, node: bpy.types.Node, prop_py_name: str, prop_hx_name: str):
+        value = arm.node_utils.get_prop_data_value(node, prop_py_name)
+        self.props += [self.node_ids[name], self.get_constant(prop_hx_name), self.get_constant(value)]
+
+    def prealloc(self, name: str, num_inputs: int, num_outputs: int):
+        i = self.node_ids[name] * 4
+        self.nodes[i + 2] = num_inputs
+        self.nodes[i + 3] = num_outputs
+
+    def create_default_node(self, socket: bpy.types.NodeSocket) -> int:
+        node_type, default_value = get_default_node(socket)
+        if node_type == 'NullNode':
+            default_value = None
+        return self.add_node(node_type, self.get_constant(arm.node_utils.get_socket_data_value(default_value)))
+
+    def add_link(self, from_node: Union[str, int], to_node: Union[str, int], from_index: int, to_index: int, from_type: str, socket: bpy.types.NodeSocket):
+        self.links += [self.get_node(from_node), self.get_node(to_node), from_index, to_index]
+
+    def write(self, filepath: str, tree_name: str):
+        tables = [len(self.nodes) // 4, len(self.props) // 3, len(self.links) // 4, len(self.watched) // 2]
+        output = {
+            'classes': self.classes,
+            'constants': self.constants,
+            'tables': tables + self.nodes + self.props + self.links + self.watched,
+            'name': tree_name
+        }
+        with open(filepath, 'wb') as f:
+            arm.lib.armpack.pack(output, f)
+
+
 def get_logic_trees() -> list['arm.nodes_logic.ArmLogicTree']:
     ar = []
     for node_group in bpy.data.node_groups:
@@ -63,6 +207,18 @@ def build_node_tree(node_group: 'arm.nodes_logic.ArmLogicTree'):
 
     group_name = arm.node_utils.get_export_tree_name(node_group, do_warn=True)
     file = path + group_name + '.hx'
+    data_file = get_data_path(group_name)
+
+    if arm.node_utils.is_data_logic_tree(node_group):
+        # Remove the class generated by a previous build, the tree is
+        # loaded by armory.logicnode.DataLogicTree instead
+        if os.path.isfile(file):
+            os.remove(file)
+        build_node_tree_data(node_group, root_nodes, data_file)
+        return
+
+    if os.path.isfile(data_file):
+        os.remove(data_file)
 
     if node_group.arm_cached and os.path.isfile(file):
         return
@@ -93,8 +249,9 @@ def build_node_tree(node_group: 'arm.nodes_logic.ArmLogicTree'):
         f.write('\t\tnotifyOnAdd(add);\n')
         f.write('\t}\n\n')
         f.write('\toverride public function add() {\n')
+        writer = HaxeTreeWriter(f)
         for node in root_nodes:
-            build_node(node, f)
+            build_node(node, writer)
         f.write('\t}\n')
 
         # Create node functions
@@ -118,7 +275,27 @@ def build_node_tree(node_group: 'arm.nodes_logic.ArmLogicTree'):
     node_group.arm_cached = True
 
 
-def build_node_group_tree(node_group: 'arm.nodes_logic.ArmLogicTree', f: TextIO, group_node_name: str):
+def get_data_path(tree_name: str) -> str:
+    """Return the path of the data file of a tree exported as data."""
+    return os.path.join(arm.utils.get_fp_build(), 'compiled', 'Assets', 'logic', 'logic_' + tree_name + '.arm')
+
+
+def build_node_tree_data(node_group: 'arm.nodes_logic.ArmLogicTree', root_nodes: list[bpy.types.Node], data_file: str):
+    """Writes the given node tree into a data file, changes of the
+    tree don't require a recompilation then."""
+    if not node_group.arm_cached or not os.path.isfile(data_file):
+        writer = DataTreeWriter()
+        for node in root_nodes:
+            build_node(node, writer)
+
+        os.makedirs(os.path.dirname(data_file), exist_ok=True)
+        writer.write(data_file, group_name)
+        node_group.arm_cached = True
+
+    assets.add(data_file)
+
+
+def build_node_group_tree(node_group: 'arm.nodes_logic.ArmLogicTree', writer: Union[HaxeTreeWriter, DataTreeWriter], group_node_name: str):
     """Builds the given node tree as a node group"""
 
     root_nodes = get_root_nodes(node_group)
@@ -135,13 +312,13 @@ def build_node_group_tree(node_group: 'arm.nodes_logic.ArmLogicTree', f: TextIO,
             group_output_name = group_node_name + '_' + tree_name + arm.node_utils.get_export_node_name(node)
 
     for node in root_nodes:
-        build_node(node, f, group_node_name + '_' + tree_name)
+        build_node(node, writer, group_node_name + '_' + tree_name)
     node_group.arm_cached = True
     return group_input_name, group_output_name
 
 
-def build_node(node: bpy.types.Node, f: TextIO, name_prefix: str = None) -> Optional[str]:
-    """Builds the given node and returns its name. f is an opened file object."""
+def build_node(node: bpy.types.Node, writer: Union[HaxeTreeWriter, DataTreeWriter], name_prefix: str = None) -> Optional[str]:
+    """Builds the given node and returns its name."""
     global parsed_nodes
     global parsed_ids
 
@@ -151,7 +328,7 @@ def build_node(node: bpy.types.Node, f: TextIO, name_prefix: str = None) -> Opti
 
     if node.type == 'REROUTE':
         if len(node.inputs) > 0 and len(node.inputs[0].links) > 0:
-            return build_node(node.inputs[0].links[0].from_node, f)
+            return build_node(node.inputs[0].links[0].from_node, writer)
         else:
             return None
 
@@ -164,7 +341,7 @@ def build_node(node: bpy.types.Node, f: TextIO, name_prefix: str = None) -> Opti
     if node.bl_idname == 'LNCallGroupNode':
         prop = node.group_tree
         if prop is not None:
-            group_input_name, group_output_name = build_node_group_tree(prop, f, name)
+            group_input_name, group_output_name = build_node_group_tree(prop, writer, name)
             link_group = True
 
     # Link tree variable nodes using IDs
@@ -189,35 +366,31 @@ def build_node(node: bpy.types.Node, f: TextIO, name_prefix: str = None) -> Opti
     if not link_group:
         # Create node
         node_type = node.bl_idname[2:]  # Discard 'LN' prefix
-        f.write('\t\tvar ' + name + ' = new armory.logicnode.' + node_type + '(this);\n')
+        writer.create_node(name, node_type)
 
         # Handle Function Nodes if no node groups exist
         if node_type == 'FunctionNode' and name_prefix is None:
-                f.write('\t\tthis.functionNodes.set("' + name + '", ' + name + ');\n')
+                writer.add_function_node(name)
                 function_nodes[name] = node
         elif node_type == 'FunctionOutputNode' and name_prefix is None:
-                f.write('\t\tthis.functionOutputNodes.set("' + name + '", ' + name + ');\n')
+                writer.add_function_output_node(name)
                 # Index function output name by corresponding function name
                 function_node_outputs[node.function_name] = name
         wrd = bpy.data.worlds['Arm']
 
         # Watch in debug console
         if node.arm_watch and wrd.arm_debug_console:
-                f.write('\t\t' + name + '.name = "' + name[1:] + '";\n')
-                f.write('\t\t' + name + '.watch(true);\n')
+                writer.watch_node(name)
 
         elif use_live_patch:
-                f.write('\t\t' + name + '.name = "' + name[1:] + '";\n')
-                f.write(f'\t\tthis.nodes["{name[1:]}"] = {name};\n')
+                writer.add_patch_node(name)
 
         # Properties
         for prop_py_name, prop_hx_name in arm.node_utils.get_haxe_property_names(node):
-                prop = arm.node_utils.haxe_format_prop_value(node, prop_py_name)
-                f.write('\t\t' + name + '.' + prop_hx_name + ' = ' + prop + ';\n')
+                writer.set_property(name, node, prop_py_name, prop_hx_name)
 
         # Avoid unnecessary input/output array resizes
-        f.write(f'\t\t{name}.preallocInputs({len(node.inputs)});\n')
-        f.write(f'\t\t{name}.preallocOutputs({len(node.outputs)});\n')
+        writer.prealloc(name, len(node.inputs), len(node.outputs))
 
     # Create inputs
     if link_group:
@@ -248,7 +421,7 @@ def build_node(node: bpy.types.Node, f: TextIO, name_prefix: str = None) -> Opti
                             (socket.bl_idname == 'ArmNodeSocketAction' and inp.bl_idname != 'ArmNodeSocketAction'):
                         arm.log.warn(f'Sockets do not match in logic node tree "{group_name}": node "{node.name}", socket "{inp.name}"')
 
-                inp_name = build_node(n, f, name_prefix)
+                inp_name = build_node(n, writer, name_prefix)
                 for i in range(0, len(n.outputs)):
                     if n.outputs[i] == socket:
                         inp_from = i
@@ -257,23 +430,18 @@ def build_node(node: bpy.types.Node, f: TextIO, name_prefix: str = None) -> Opti
 
         # Not linked -> create node with default values
         else:
-            inp_name = build_default_node(inp)
+            inp_name = writer.create_default_node(inp)
             inp_from = 0
             from_type = arm.node_utils.get_socket_type(inp)
 
         # The input is linked to a reroute, but the reroute is unlinked
         if unconnected:
-            inp_name = build_default_node(inp)
+            inp_name = writer.create_default_node(inp)
             inp_from = 0
             from_type = arm.node_utils.get_socket_type(inp)
 
         # Add input
-        f.write(f'\t\t{"var __link = " if use_live_patch else ""}armory.logicnode.LogicNode.addLink({inp_name}, {name}, {inp_from}, {idx});\n')
-        if use_live_patch:
-            to_type = arm.node_utils.get_socket_type(inp)
-            f.write(f'\t\t__link.fromType = "{from_type}";\n')
-            f.write(f'\t\t__link.toType = "{to_type}";\n')
-            f.write(f'\t\t__link.toValue = {arm.node_utils.haxe_format_socket_val(inp.get_default_value())};\n')
+        writer.add_link(inp_name, name, inp_from, idx, from_type, inp)
 
     # Create outputs
     if link_group:
@@ -283,12 +451,7 @@ def build_node(node: bpy.types.Node, f: TextIO, name_prefix: str = None) -> Opti
         # Linked outputs are already handled after iterating over inputs
         # above, so only unconnected outputs are handled here
         if not out.is_linked:
-            f.write(f'\t\t{"var __link = " if use_live_patch else ""}armory.logicnode.LogicNode.addLink({name}, {build_default_node(out)}, {idx}, 0);\n')
-            if use_live_patch:
-                out_type = arm.node_utils.get_socket_type(out)
-                f.write(f'\t\t__link.fromType = "{out_type}";\n')
-                f.write(f'\t\t__link.toType = "{out_type}";\n')
-                f.write(f'\t\t__link.toValue = {arm.node_utils.haxe_format_socket_val(out.get_default_value())};\n')
+            writer.add_link(name, writer.create_default_node(out), idx, 0, arm.node_utils.get_socket_type(out), out)
 
     return name
 
@@ -296,7 +459,7 @@ def build_node(node: bpy.types.Node, f: TextIO, name_prefix: str = None) -> Opti
 # It first checks all outgoing links for non-reroute nodes and adds them to a list
 # Then it recursively checks all the discoverey reroute nodes
 # Returns all non reroute nodes which are directly or indirectly connected to this output.
-def collect_nodes_from_output(out, f):
+def collect_nodes_from_output(out, writer):
     outputs = []
     reroutes = []
     # skipped if there are no links
@@ -307,10 +470,10 @@ def collect_nodes_from_output(out, f):
             reroutes.append(n)
         else:
             # immediatly add the current node
-            outputs.append(build_node(n, f))
+            outputs.append(build_node(n, writer))
     for reroute in reroutes:
         for o in reroute.outputs:
-            outputs = outputs + collect_nodes_from_output(o, f)
+            outputs = outputs + collect_nodes_from_output(o, writer)
     return outputs
 
 def get_root_nodes(node_group):
@@ -330,8 +493,9 @@ def get_root_nodes(node_group):
             roots.append(node)
     return roots
 
-def build_default_node(inp: bpy.types.NodeSocket):
-    """Creates a new node to give a not connected input socket a value"""
+def get_default_node(inp: bpy.types.NodeSocket) -> tuple[str, Any]:
+    """Returns the class and value of the node that gives a not
+    connected input socket a value"""
     is_custom_socket = isinstance(inp, arm.logicnode.arm_sockets.ArmCustomSocket)
 
     if is_custom_socket:
@@ -343,29 +507,38 @@ def build_default_node(inp: bpy.types.NodeSocket):
         else:
             default_value = None
 
-    default_value = arm.node_utils.haxe_format_socket_val(default_value, array_outer_brackets=False)
-
     inp_type = arm.node_utils.get_socket_type(inp)
 
     if inp_type == 'VECTOR':
-        return f'new armory.logicnode.VectorNode(this, {default_value})'
+        return 'VectorNode', default_value
     elif inp_type == 'ROTATION':  # a rotation is internally represented as a quaternion.
-        return f'new armory.logicnode.RotationNode(this, {default_value})'
+        return 'RotationNode', default_value
     elif inp_type in ('RGB', 'RGBA'):
-        return f'new armory.logicnode.ColorNode(this, {default_value})'
+        return 'ColorNode', default_value
     elif inp_type == 'VALUE':
-        return f'new armory.logicnode.FloatNode(this, {default_value})'
+        return 'FloatNode', default_value
     elif inp_type == 'INT':
-        return f'new armory.logicnode.IntegerNode(this, {default_value})'
+        return 'IntegerNode', default_value
     elif inp_type == 'BOOLEAN':
-        return f'new armory.logicnode.BooleanNode(this, {default_value})'
+        return 'BooleanNode', default_value
     elif inp_type == 'STRING':
-        return f'new armory.logicnode.StringNode(this, {default_value})'
+        return 'StringNode', default_value
     elif inp_type == 'NONE':
-        return 'new armory.logicnode.NullNode(this)'
+        return 'NullNode', default_value
     elif inp_type == 'OBJECT':
-        return f'new armory.logicnode.ObjectNode(this, {default_value})'
+        return 'ObjectNode', default_value
     elif is_custom_socket:
-        return f'new armory.logicnode.DynamicNode(this, {default_value})'
+        return 'DynamicNode', default_value
     else:
+        return 'NullNode', default_value
+
+
+def build_default_node(inp: bpy.types.NodeSocket):
+    """Creates a new node to give a not connected input socket a value"""
+    node_type, default_value = get_default_node(inp)
+
+    if node_type == 'NullNode':
         return 'new armory.logicnode.NullNode(this)'
+
+    default_value = arm.node_utils.haxe_format_socket_val(default_value, array_outer_brackets=False)
+    return f'new armory.logicnode.{node_type}(this, {default_value})'
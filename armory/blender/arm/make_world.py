@@ -120,8 +120,6 @@ def build():
                             wrd.world_defs += '_Rad'
                             assets.add_khafile_def("arm_radiance")
 
-    write_probes.check_last_cmft_time()
-
 
 def create_world_shaders(world: bpy.types.World):
     """Creates fragment and vertex shaders for the given world."""
@@ -30,6 +30,7 @@ from arm.material.parser_state import ParserState, ParserContext, ParserPass
 from arm.material.shader import Shader, ShaderContext, floatstr, vec3str
 import arm.node_utils
 import arm.utils
+import arm.write_textures as write_textures
 
 if arm.is_reload(__name__):
     arm.assets = arm.reload_module(arm.assets)
@@ -836,8 +837,33 @@ def make_texture(
     if matname is None:
         matname = mat_state.material.name
 
+    rpdat = arm.utils.get_rp()
+    texfilter = rpdat.arm_texture_filter
+    if texfilter == 'Anisotropic':
+        interpolation = 'Smart'
+    elif texfilter == 'Linear':
+        interpolation = 'Linear'
+    elif texfilter == 'Point':
+        interpolation = 'Closest'
+
+    if interpolation == 'Cubic': # Mipmap linear
+        tex['mipmap_filter'] = 'linear'
+        tex['generate_mipmaps'] = True
+    elif interpolation == 'Smart': # Mipmap anisotropic
+        tex['min_filter'] = 'anisotropic'
+        tex['mipmap_filter'] = 'linear'
+        tex['generate_mipmaps'] = True
+    elif interpolation == 'Closest':
+        tex['min_filter'] = 'point'
+        tex['mag_filter'] = 'point'
+    # else defaults to linear
+
+    # Offline mipmaps are only written for converted images
+    write_mipmaps = bpy.data.worlds['Arm'].arm_texture_mipmaps and tex.get('generate_mipmaps', False) and image.source != 'MOVIE'
+
     # Get filepath
     filepath = image.filepath
+    is_generated = False
     if filepath == '':
         if image.packed_file is not None:
             filepath = './' + image.name
@@ -852,7 +878,10 @@ def make_texture(
                 os.makedirs(unpack_path)
 
             filepath = os.path.join(unpack_path, image.name + ".jpg")
-            arm.utils.convert_image(image, filepath, "JPEG")
+            mipmaps = write_textures.add(image, filepath, 'JPEG', mipmaps=write_mipmaps)
+            if len(mipmaps) > 0:
+                tex['mipmaps'] = mipmaps
+            is_generated = True
 
         else:
             log.warn(matname + '/' + image.name + ' - invalid file path')
@@ -876,7 +905,11 @@ def make_texture(
         new_ext = 'png' if (ext in ('tga', 'dds')) else 'jpg'
         tex['file'] = tex['file'].rsplit('.', 1)[0] + '.' + new_ext
 
-    if image.packed_file is not None or not is_ascii(texfile):
+    if is_generated:
+        # Already added to the assets by write_textures
+        pass
+
+    elif image.packed_file is not None or not is_ascii(texfile):
         # Extract packed data / copy non-ascii texture
         unpack_path = os.path.join(arm.utils.get_fp_build(), 'compiled', 'Assets', 'unpacked')
         if not os.path.exists(unpack_path):
@@ -884,9 +917,10 @@ def make_texture(
         unpack_filepath = os.path.join(unpack_path, tex['file'])
 
         if do_convert:
-            if not os.path.isfile(unpack_filepath):
-                fmt = 'PNG' if new_ext == 'png' else 'JPEG'
-                arm.utils.convert_image(image, unpack_filepath, file_format=fmt)
+            fmt = 'PNG' if new_ext == 'png' else 'JPEG'
+            mipmaps = write_textures.add(image, unpack_filepath, fmt, mipmaps=write_mipmaps)
+            if len(mipmaps) > 0:
+                tex['mipmaps'] = mipmaps
         else:
 
             # Write bytes if size is different or file does not exist yet
@@ -899,7 +933,7 @@ def make_texture(
                 if not os.path.isfile(unpack_filepath) or os.path.getsize(unpack_filepath) != os.path.getsize(texpath):
                     shutil.copy(texpath, unpack_filepath)
 
-        arm.assets.add(unpack_filepath)
+            arm.assets.add(unpack_filepath)
 
     else:
         if not os.path.isfile(arm.utils.asset_path(filepath)):
@@ -911,11 +945,10 @@ def make_texture(
             if not os.path.exists(unpack_path):
                 os.makedirs(unpack_path)
             converted_path = os.path.join(unpack_path, tex['file'])
-            # TODO: delete cache when file changes
-            if not os.path.isfile(converted_path):
-                fmt = 'PNG' if new_ext == 'png' else 'JPEG'
-                arm.utils.convert_image(image, converted_path, file_format=fmt)
-            arm.assets.add(converted_path)
+            fmt = 'PNG' if new_ext == 'png' else 'JPEG'
+            mipmaps = write_textures.add(image, converted_path, fmt, mipmaps=write_mipmaps)
+            if len(mipmaps) > 0:
+                tex['mipmaps'] = mipmaps
         else:
             # Link image path to assets
             # TODO: Khamake converts .PNG to .jpg? Convert ext to lowercase on windows
@@ -928,27 +961,6 @@ def make_texture(
     # if image_format != 'RGBA32':
         # tex['format'] = image_format
 
-    rpdat = arm.utils.get_rp()
-    texfilter = rpdat.arm_texture_filter
-    if texfilter == 'Anisotropic':
-        interpolation = 'Smart'
-    elif texfilter == 'Linear':
-        interpolation = 'Linear'
-    elif texfilter == 'Point':
-        interpolation = 'Closest'
-
-    if interpolation == 'Cubic': # Mipmap linear
-        tex['mipmap_filter'] = 'linear'
-        tex['generate_mipmaps'] = True
-    elif interpolation == 'Smart': # Mipmap anisotropic
-        tex['min_filter'] = 'anisotropic'
-        tex['mipmap_filter'] = 'linear'
-        tex['generate_mipmaps'] = True
-    elif interpolation == 'Closest':
-        tex['min_filter'] = 'point'
-        tex['mag_filter'] = 'point'
-    # else defaults to linear
-
     if extension != 'REPEAT': # Extend or clip
         tex['u_addressing'] = 'clamp'
         tex['v_addressing'] = 'clamp'
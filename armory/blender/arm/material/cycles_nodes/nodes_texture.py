@@ -12,6 +12,7 @@ from arm.material.parser_state import ParserState, ParserContext, ParserPass
 from arm.material.shader import floatstr, vec3str
 import arm.utils
 import arm.write_probes as write_probes
+import arm.write_textures as write_textures
 
 if arm.is_reload(__name__):
     assets = arm.reload_module(assets)
@@ -24,6 +25,7 @@ if arm.is_reload(__name__):
     from arm.material.shader import floatstr, vec3str
     arm.utils = arm.reload_module(arm.utils)
     write_probes = arm.reload_module(write_probes)
+    write_textures = arm.reload_module(write_textures)
 else:
     arm.enable_reload(__name__)
 
@@ -481,37 +483,25 @@ def parse_tex_environment(node: bpy.types.ShaderNodeTexEnvironment, out_socket:
             tex_file = base[0] + '.jpg'
             target_format = 'JPEG'
 
-    if image.packed_file is not None:
+    if do_convert:
+        # Converted again only if the image changed, the probes are
+        # generated from the file right away
+        filepath = os.path.join(write_textures.get_unpack_path(), tex_file)
+        write_textures.add(image, filepath, target_format, wait=True)
+
+    elif image.packed_file is not None:
         # Extract packed data
-        unpack_path = arm.utils.get_fp_build() + '/compiled/Assets/unpacked'
-        if not os.path.exists(unpack_path):
-            os.makedirs(unpack_path)
-        unpack_filepath = unpack_path + '/' + tex_file
+        unpack_filepath = os.path.join(write_textures.get_unpack_path(), tex_file)
         filepath = unpack_filepath
 
-        if do_convert:
-            if not os.path.isfile(unpack_filepath):
-                arm.utils.unpack_image(image, unpack_filepath, file_format=target_format)
-
-        elif not os.path.isfile(unpack_filepath) or os.path.getsize(unpack_filepath) != image.packed_file.size:
+        if not os.path.isfile(unpack_filepath) or os.path.getsize(unpack_filepath) != image.packed_file.size:
             with open(unpack_filepath, 'wb') as f:
                 f.write(image.packed_file.data)
 
         assets.add(unpack_filepath)
     else:
-        if do_convert:
-            unpack_path = arm.utils.get_fp_build() + '/compiled/Assets/unpacked'
-            if not os.path.exists(unpack_path):
-                os.makedirs(unpack_path)
-            converted_path = unpack_path + '/' + tex_file
-            filepath = converted_path
-            # TODO: delete cache when file changes
-            if not os.path.isfile(converted_path):
-                arm.utils.convert_image(image, converted_path, file_format=target_format)
-            assets.add(converted_path)
-        else:
-            # Link image path to assets
-            assets.add(arm.utils.asset_path(image.filepath))
+        # Link image path to assets
+        assets.add(arm.utils.asset_path(image.filepath))
 
     rpdat = arm.utils.get_rp()
 
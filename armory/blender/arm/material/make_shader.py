@@ -20,6 +20,7 @@ import arm.material.make_refract as make_refract
 import arm.material.make_voxel as make_voxel
 import arm.material.mat_state as mat_state
 import arm.material.mat_utils as mat_utils
+import arm.profiler
 from arm.material.shader import Shader, ShaderContext, ShaderData
 import arm.utils
 
@@ -37,6 +38,7 @@ if arm.is_reload(__name__):
     make_voxel = arm.reload_module(make_voxel)
     mat_state = arm.reload_module(mat_state)
     mat_utils = arm.reload_module(mat_utils)
+    arm.profiler = arm.reload_module(arm.profiler)
     arm.material.shader = arm.reload_module(arm.material.shader)
     from arm.material.shader import Shader, ShaderContext, ShaderData
     arm.utils = arm.reload_module(arm.utils)
@@ -47,6 +49,11 @@ rpass_hook = None
 
 
 def build(material: Material, mat_users: Dict[Material, List[Object]], mat_armusers) -> Tuple:
+    with arm.profiler.span('make_shader', 'material', material=material.name):
+        return _build(material, mat_users, mat_armusers)
+
+
+def _build(material: Material, mat_users: Dict[Material, List[Object]], mat_armusers) -> Tuple:
     mat_state.mat_users = mat_users
     mat_state.mat_armusers = mat_armusers
     mat_state.material = material
@@ -1,3 +1,5 @@
+import hashlib
+
 import bpy
 import arm
 import arm.material.cycles as cycles
@@ -19,13 +21,17 @@ else:
 batchDict = None
 signatureDict = None
 
-def traverse_tree(node, sign):
-    sign += node.type + '-'
-    for inp in node.inputs:
-        if inp.is_linked:
-            sign = traverse_tree(inp.links[0].from_node, sign)
-        else:
-            sign += 'o' # Unconnected socket
+def traverse_tree(node, memo):
+    """Return the structure of the node tree below the given node as
+    nested tuples. Subtrees linked to several inputs are only traversed
+    once, `memo` maps nodes to their already computed structure."""
+    sign = memo.get(node)
+    if sign is None:
+        sign = (node.type,) + tuple(
+            traverse_tree(inp.links[0].from_node, memo) if inp.is_linked else 'o' # Unconnected socket
+            for inp in node.inputs
+        )
+        memo[node] = sign
     return sign
 
 def get_signature(mat, object: bpy.types.Object):
@@ -33,34 +39,36 @@ def get_signature(mat, object: bpy.types.Object):
     output_node = cycles.node_by_type(nodes, 'OUTPUT_MATERIAL')
 
     if output_node != None:
-        sign = traverse_tree(output_node, '')
-        # Append flags
-        sign += '1' if mat.arm_cast_shadow else '0'
-        sign += '1' if mat.arm_ignore_irradiance else '0'
         if mat.arm_two_sided:
-            sign += '2'
+            cull = 2
         elif mat.arm_cull_mode == 'Clockwise':
-            sign += '1'
+            cull = 1
         else:
-            sign += '0'
-        sign += str(mat.arm_material_id)
-        sign += '1' if mat.arm_depth_read else '0'
-        sign += '1' if mat.arm_overlay else '0'
-        sign += '1' if mat.arm_decal else '0'
+            cull = 0
         if mat.arm_discard:
-            sign += '1'
-            sign += str(round(mat.arm_discard_opacity, 2))
-            sign += str(round(mat.arm_discard_opacity_shadows, 2))
+            discard = (True, round(mat.arm_discard_opacity, 2), round(mat.arm_discard_opacity_shadows, 2))
         else:
-            sign += '000'
-        sign += mat.arm_custom_material if mat.arm_custom_material != '' else '0'
-        sign += mat.arm_skip_context if mat.arm_skip_context != '' else '0'
-        sign += '1' if mat.arm_particle_fade else '0'
-        sign += mat.arm_billboard
-        sign += '_skin' if arm_utils.export_bone_data(object) else '0'
-        sign += '_morph' if arm_utils.export_morph_targets(object) else '0'
-        # sign += '_tilesheet' if mat.arm_tilesheet_flag else '0'
-        return sign
+            discard = (False,)
+        sign = (
+            traverse_tree(output_node, {}),
+            # Flags
+            mat.arm_cast_shadow,
+            mat.arm_ignore_irradiance,
+            cull,
+            mat.arm_material_id,
+            mat.arm_depth_read,
+            mat.arm_overlay,
+            mat.arm_decal,
+            discard,
+            mat.arm_custom_material,
+            mat.arm_skip_context,
+            mat.arm_particle_fade,
+            mat.arm_billboard,
+            arm_utils.export_bone_data(object),
+            arm_utils.export_morph_targets(object),
+            # mat.arm_tilesheet_flag,
+        )
+        return hashlib.blake2b(repr(sign).encode(), digest_size=16).hexdigest()
 
 def traverse_tree2(node, ar):
     ar.append(node)
@@ -126,18 +134,12 @@ def build(materialArray, mat_users, mat_armusers):
 
     mat_state.batch = True
 
-    # Build unique shaders
-    for mat in materialArray:
-        for mat2 in materialArray:
-            # Signature not found - build it
-            if mat == mat2:
-                batchDict[mat] = make_shader.build(mat, mat_users, mat_armusers)
-                break
-
-            # Already batched
-            if mat.signature == mat2.signature:
-                batchDict[mat] = batchDict[mat2]
-                break
+    # Build unique shaders, the first material of each signature builds
+    # the shader used by all of them
+    for mats in signatureDict.values():
+        shader_data = make_shader.build(mats[0], mat_users, mat_armusers)
+        for mat in mats:
+            batchDict[mat] = shader_data
 
     mat_state.batch = False
 
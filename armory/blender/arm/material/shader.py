@@ -366,14 +366,14 @@ class Shader:
     def write_attrib(self, s):
         self.main_attribs += '\t' + s + '\n'
 
-    def is_equal(self, sh):
+    def equality_key(self):
+        """Hashable key of the parts of the shader source compared by
+        is_equal(), used to look up equal shaders in a dict."""
         self.vstruct_to_vsin()
-        return self.ins == sh.ins and \
-               self.main == sh.main and \
-               self.main_normal == sh.main_normal and \
-               self.main_init == sh.main_init and \
-               self.main_textures == sh.main_textures and \
-               self.main_attribs == sh.main_attribs
+        return (tuple(self.ins), self.main, self.main_normal, self.main_init, self.main_textures, self.main_attribs)
+
+    def is_equal(self, sh):
+        return self.equality_key() == sh.equality_key()
 
     def data_size(self, data):
         if data == 'float1':
@@ -145,6 +145,26 @@ def get_export_tree_name(tree: bpy.types.NodeTree, do_warn=False) -> str:
     return export_name
 
 
+def is_data_logic_tree(tree: bpy.types.NodeTree) -> bool:
+    """Return whether the given logic node tree is exported as data
+    that is loaded by armory.logicnode.DataLogicTree instead of as a
+    generated Haxe class.
+
+    Function nodes need the methods of a generated class and live
+    patching works on generated classes, so such trees are always
+    exported as Haxe classes.
+    """
+    wrd = bpy.data.worlds['Arm']
+    if not wrd.arm_logic_data or arm.utils.is_livepatch_enabled():
+        return False
+
+    for node in tree.nodes:
+        if node.bl_idname in ('LNFunctionNode', 'LNFunctionOutputNode'):
+            return False
+
+    return True
+
+
 def get_export_node_name(node: bpy.types.Node) -> str:
     """Return the name of the given node that's used in the exported
     Haxe code.
@@ -231,6 +251,31 @@ def haxe_format_prop_value(node: bpy.types.Node, prop_name: str) -> str:
     return prop_value
 
 
+def get_socket_data_value(socket_val: Any) -> Any:
+    """Converts a socket value into a value that can be packed into an
+    Armory data file, see haxe_format_socket_val().
+    """
+    if isinstance(socket_val, (collections.abc.Sequence, bpy.types.bpy_prop_array, mathutils.Color, mathutils.Euler, mathutils.Vector)) and not isinstance(socket_val, str):
+        return [get_socket_data_value(v) for v in socket_val]
+
+    return socket_val
+
+
+def get_prop_data_value(node: bpy.types.Node, prop_name: str) -> Any:
+    """Converts a property value into a value that can be packed into
+    an Armory data file, see haxe_format_prop_value().
+    """
+    prop_value = getattr(node, prop_name)
+    if isinstance(prop_value, (str, bool)):
+        return prop_value
+    elif hasattr(prop_value, 'name'):  # PointerProperty
+        return prop_value.name
+    elif isinstance(prop_value, bpy.types.bpy_prop_array):
+        return list(prop_value)
+
+    return prop_value
+
+
 def nodetype_to_nodeitem(node_type: Type[bpy.types.Node]) -> NodeItem:
     """Create a NodeItem from a given node class."""
     # Internal node types seem to have no bl_idname attribute
@@ -1,6 +1,11 @@
+import collections
 import cProfile
+import json
 import os
 import pstats
+import threading
+import time
+from typing import Any, Dict, List, Optional
 
 import arm
 from arm import log, utils
@@ -39,3 +44,133 @@ class Profile:
                 stats.dump_stats(profile_path)
 
         return False
+
+
+class Span:
+    """Context manager that records the time spent in its body as a
+    span of the build trace. Use span() to create it."""
+    __slots__ = ('name', 'cat', 'args', 'start')
+
+    def __init__(self, name: str, cat: str, args: Optional[Dict[str, Any]]):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        add_span(self.name, self.cat, self.start, time.perf_counter(), self.args)
+        return False
+
+
+class _NoSpan:
+    """Shared span that does nothing, used while not tracing."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_no_span = _NoSpan()
+
+# Whether spans are currently recorded, check this before computing
+# expensive span names or arguments
+tracing = False
+_trace_start = 0.0
+_trace_events: List[Dict[str, Any]] = []
+_trace_threads: Dict[int, str] = {}
+_trace_lock = threading.Lock()
+
+
+def start_trace():
+    """Start recording spans for a new build trace, discarding the
+    spans of the previous one."""
+    global tracing, _trace_start, _trace_events, _trace_threads
+    tracing = True
+    _trace_start = time.perf_counter()
+    _trace_events = []
+    _trace_threads = {}
+
+
+def stop_trace():
+    """Stop recording without writing the trace, e.g. to discard the
+    trace of a build that failed before it was finished."""
+    global tracing, _trace_events, _trace_threads
+    tracing = False
+    _trace_events = []
+    _trace_threads = {}
+
+
+def span(name: str, cat: str = 'build', **args):
+    """Return a context manager recording the time spent in its body
+    under the given name and category, if a trace is being recorded.
+
+    Spans can be nested and used from any thread. The keyword arguments
+    are shown in the details of the span.
+    """
+    if not tracing:
+        return _no_span
+    return Span(name, cat, args or None)
+
+
+def add_span(name: str, cat: str, start: float, end: float, args: Optional[Dict[str, Any]] = None, thread_name: Optional[str] = None):
+    """Record a span of the build trace with the given start and end
+    time from time.perf_counter(), e.g. for a subprocess."""
+    if not tracing:
+        return
+
+    thread = threading.current_thread()
+    tid = thread.ident if thread_name is None else hash(thread_name) & 0xFFFFFFFF
+    event = {
+        'name': name, 'cat': cat, 'ph': 'X', 'pid': 0, 'tid': tid,
+        'ts': (start - _trace_start) * 1e6, 'dur': (end - start) * 1e6,
+    }
+    if args is not None:
+        event['args'] = {k: str(v) for k, v in args.items()}
+
+    with _trace_lock:
+        _trace_events.append(event)
+        if tid not in _trace_threads:
+            _trace_threads[tid] = thread.name if thread_name is None else thread_name
+
+
+def finish_trace():
+    """Stop recording and write the build trace to trace.json in the
+    build directory, which can be opened in Perfetto or
+    chrome://tracing. A summary of the time spent per span name is
+    printed to the console."""
+    global tracing
+    if not tracing:
+        return
+    tracing = False
+
+    with _trace_lock:
+        events = list(_trace_events)
+        threads = dict(_trace_threads)
+
+    metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': 0, 'tid': tid, 'args': {'name': name}}
+                for tid, name in threads.items()]
+
+    trace_path = os.path.join(utils.get_fp_build(), 'trace.json')
+    with open(trace_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, f)
+
+    totals = collections.defaultdict(lambda: [0, 0.0, 0.0])
+    for event in events:
+        total = totals[(event['cat'], event['name'])]
+        total[0] += 1
+        total[1] += event['dur']
+        total[2] = max(total[2], event['dur'])
+
+    rows = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+    width = max((len(f'{cat}/{name}') for (cat, name), _ in rows), default=4)
+    lines = [f'{"Span":<{width}}  {"Count":>6}  {"Total":>10}  {"Max":>10}']
+    for (cat, name), (count, total, longest) in rows:
+        lines.append(f'{f"{cat}/{name}":<{width}}  {count:>6}  {total / 1e6:>9.3f}s  {longest / 1e6:>9.3f}s')
+    log.info(f'Build trace written to {trace_path}\n' + '\n'.join(lines))
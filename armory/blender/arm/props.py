@@ -285,19 +285,26 @@ def init_properties():
         default='low'
     )
     bpy.types.World.arm_texture_quality = FloatProperty(name="Texture Quality", default=1.0, min=0.0, max=1.0, subtype='FACTOR', update=assets.invalidate_compiler_cache)
+    bpy.types.World.arm_texture_downscale = BoolProperty(name="Downscale Textures", description="Scale converted textures (generated, packed and non-JPEG/PNG images) by the texture quality instead of only using it as the compression quality", default=False, update=assets.invalidate_compiler_cache)
+    bpy.types.World.arm_texture_mipmaps = BoolProperty(name="Offline Mipmaps", description="Write the mipmaps of converted textures at build time instead of generating them when loading", default=False, update=assets.invalidate_compiler_cache)
     bpy.types.World.arm_sound_quality = FloatProperty(name="Sound Quality", default=0.9, min=0.0, max=1.0, subtype='FACTOR', update=assets.invalidate_compiler_cache)
     bpy.types.World.arm_copy_override = BoolProperty(name="Copy Override", description="Overrides any existing files when copying", default=False, update=assets.invalidate_compiled_data)
     bpy.types.World.arm_minimize = BoolProperty(name="Binary Scene Data", description="Export scene data in binary", default=True, update=assets.invalidate_compiled_data)
     bpy.types.World.arm_minify_js = BoolProperty(name="Minify JS", description="Minimize JavaScript output when publishing", default=True)
     bpy.types.World.arm_no_traces = BoolProperty(name="No Traces", description="Don't compile trace calls in the program when publishing", default=False)
+    bpy.types.World.arm_optimize_vertex_cache = BoolProperty(name="Optimize Vertex Cache", description="Reorder the triangles and vertices of exported meshes for better GPU vertex cache usage and less overdraw, prolongs build times. Only affects meshes exported with Optimize Data", default=False, update=assets.invalidate_compiled_data)
+    bpy.types.World.arm_anim_reduce = BoolProperty(name="Reduce Animation Keyframes", description="Remove baked animation frames that linear interpolation can reproduce within the maximum error", default=False, update=assets.invalidate_compiled_data)
+    bpy.types.World.arm_anim_reduce_error = FloatProperty(name="Max Error", description="Maximum allowed deviation of a removed animation frame, in scene units, radians or quaternion components", default=0.0001, min=0.0, precision=5, update=assets.invalidate_compiled_data)
+    bpy.types.World.arm_anim_quantize = BoolProperty(name="Quantize Bone Animations", description="Store baked bone animations as 16-bit translation, rotation and scale instead of 32-bit matrices", default=False, update=assets.invalidate_compiled_data)
     bpy.types.World.arm_optimize_data = BoolProperty(name="Optimize Data", description="Export more efficient geometry and shader data when publishing, prolongs build times", default=True, update=assets.invalidate_compiled_data)
     bpy.types.World.arm_deinterleaved_buffers = BoolProperty(name="Deinterleaved Buffers", description="Use deinterleaved vertex buffers", default=False, update=assets.invalidate_compiler_cache)
     bpy.types.World.arm_export_tangents = BoolProperty(name="Precompute Tangents", description="Precompute tangents for normal mapping, otherwise computed in shader", default=True, update=assets.invalidate_compiled_data)
     bpy.types.World.arm_batch_meshes = BoolProperty(name="Batch Meshes", description="Group meshes by materials to speed up rendering", default=False, update=assets.invalidate_compiler_cache)
     bpy.types.World.arm_batch_materials = BoolProperty(name="Batch Materials", description="Marge similar materials into single pipeline state", default=False, update=assets.invalidate_shader_cache)
     bpy.types.World.arm_stream_scene = BoolProperty(name="Stream Scene", description="Stream scene content", default=False, update=assets.invalidate_compiler_cache)
-    bpy.types.World.arm_lod_gen_levels = IntProperty(name="Levels", description="Number of levels to generate", default=3, min=1)
-    bpy.types.World.arm_lod_gen_ratio = FloatProperty(name="Decimate Ratio", description="Decimate ratio", default=0.8)
+    bpy.types.World.arm_lod_gen_levels = IntProperty(name="Levels", description="Number of levels to generate", default=3, min=1, update=assets.invalidate_mesh_data)
+    bpy.types.World.arm_lod_gen_ratio = FloatProperty(name="Decimate Ratio", description="Decimate ratio", default=0.8, update=assets.invalidate_mesh_data)
+    bpy.types.World.arm_lod_auto = BoolProperty(name="Generate on Export", description="Generate levels of detail for meshes without LODs when exporting, keeping UV seams and material boundaries intact. Skinned, morphed and instanced meshes are skipped", default=False, update=assets.invalidate_mesh_data)
     bpy.types.World.arm_cache_build = BoolProperty(name="Cache Build", description="Cache build files to speed up compilation", default=True)
     bpy.types.World.arm_assert_level = EnumProperty(
         items=[
@@ -308,6 +315,7 @@ def init_properties():
         name="Assertion Level", description="Ignore all assertions below this level (assertions are turned off completely for published builds)", default='Warning', update=assets.invalidate_compiler_cache)
     bpy.types.World.arm_assert_quit = BoolProperty(name="Quit On Assertion Fail", description="Whether to close the game when an 'Error' level assertion fails", default=False, update=assets.invalidate_compiler_cache)
     bpy.types.World.arm_live_patch = BoolProperty(name="Live Patch", description="Live patching for Krom", default=False)
+    bpy.types.World.arm_logic_data = BoolProperty(name="Logic Trees As Data", description="Export logic node trees as data loaded by a generic trait instead of generated Haxe classes, so that changing a tree doesn't require a recompilation. Trees with function nodes and live patching still use generated classes", default=False, update=assets.invalidate_compiler_cache)
     bpy.types.World.arm_clear_on_compile = BoolProperty(name="Clear Console", description="Clears the system console on compile", default=False)
     bpy.types.World.arm_play_camera = EnumProperty(
         items=[('Scene', 'Scene', 'Scene'),
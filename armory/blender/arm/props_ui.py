@@ -23,7 +23,6 @@ import arm.nodes_logic
 import arm.ui_icons as ui_icons
 import arm.utils
 import arm.utils_vs
-import arm.write_probes
 
 if arm.is_reload(__name__):
     arm.api = arm.reload_module(arm.api)
@@ -41,7 +40,6 @@ if arm.is_reload(__name__):
     ui_icons = arm.reload_module(ui_icons)
     arm.utils = arm.reload_module(arm.utils)
     arm.utils_vs = arm.reload_module(arm.utils_vs)
-    arm.write_probes = arm.reload_module(arm.write_probes)
 else:
     arm.enable_reload(__name__)
 
@@ -874,6 +872,12 @@ class ARM_PT_ArmoryExporterPanel(bpy.types.Panel):
         col.prop(wrd, 'arm_optimize_data')
         col.prop(wrd, 'arm_asset_compression')
         col.prop(wrd, 'arm_single_data_file')
+        col.prop(wrd, 'arm_optimize_vertex_cache')
+        col.prop(wrd, 'arm_anim_reduce')
+        sub = col.column()
+        sub.enabled = wrd.arm_anim_reduce
+        sub.prop(wrd, 'arm_anim_reduce_error')
+        col.prop(wrd, 'arm_anim_quantize')
 
 class ExporterTargetSettingsMixin:
     """Mixin for common exporter setting subpanel functionality.
@@ -1111,6 +1115,7 @@ class ARM_PT_ProjectFlagsPanel(bpy.types.Panel):
 
         col = layout.column(heading='Runtime', align=True)
         col.prop(wrd, 'arm_live_patch')
+        col.prop(wrd, 'arm_logic_data')
         col.prop(wrd, 'arm_stream_scene')
         col.prop(wrd, 'arm_loadscreen')
         col.prop(wrd, 'arm_write_config')
@@ -1125,6 +1130,8 @@ class ARM_PT_ProjectFlagsPanel(bpy.types.Panel):
         row = col.row()  # To expand below property UI horizontally
         row.prop(wrd, 'arm_canvas_img_scaling_quality', expand=True)
         col.prop(wrd, 'arm_texture_quality')
+        col.prop(wrd, 'arm_texture_downscale')
+        col.prop(wrd, 'arm_texture_mipmaps')
         col.prop(wrd, 'arm_sound_quality')
 
         col = layout.column(heading='External Assets')
@@ -1270,8 +1277,6 @@ class ArmoryStopButton(bpy.types.Operator):
             state.proc_build = None
         make.clear_external_scenes()
 
-        arm.write_probes.check_last_cmft_time()
-
         return {'FINISHED'}
 
 class ArmoryBuildProjectButton(bpy.types.Operator):
@@ -2201,6 +2206,7 @@ class ARM_PT_LodPanel(bpy.types.Panel):
             wrd = bpy.data.worlds['Arm']
             layout.prop(wrd, 'arm_lod_gen_levels')
             layout.prop(wrd, 'arm_lod_gen_ratio')
+            layout.prop(wrd, 'arm_lod_auto')
 
 class ArmGenTerrainButton(bpy.types.Operator):
     '''Generate terrain sectors'''
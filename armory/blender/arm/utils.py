@@ -1,5 +1,6 @@
 from enum import Enum, unique
 import glob
+import io
 import itertools
 import json
 import locale
@@ -19,6 +20,7 @@ import bpy
 
 import arm.lib.armpack
 from arm.lib.lz4 import LZ4
+import arm.lib.script_index
 import arm.log as log
 import arm.make_state as state
 import arm.props_renderpath
@@ -27,6 +29,7 @@ if arm.is_reload(__name__):
     arm.lib.armpack = arm.reload_module(arm.lib.armpack)
     arm.lib.lz4 = arm.reload_module(arm.lib.lz4)
     from arm.lib.lz4 import LZ4
+    arm.lib.script_index = arm.reload_module(arm.lib.script_index)
     log = arm.reload_module(log)
     state = arm.reload_module(state)
     arm.props_renderpath = arm.reload_module(arm.props_renderpath)
@@ -52,19 +55,28 @@ class WorkingDir:
     def __exit__(self, exc_type, exc_val, exc_tb):
         os.chdir(self.prev_cwd)
 
-def write_arm(filepath, output):
+def write_arm(filepath, output, minimize: Optional[bool] = None):
+    """Write the given data to an Armory data file. `minimize` defaults
+    to the world's arm_minimize setting and must be given if this is
+    called outside of the main thread."""
     if filepath.endswith('.lz4'):
-        with open(filepath, 'wb') as f:
-            packed = arm.lib.armpack.packb(output)
-            # Prepend packed data size for decoding. Haxe can't unpack
-            # an unsigned int64 so we use a signed int64 here
-            f.write(np.int64(LZ4.encode_bound(len(packed))).tobytes())
-
-            f.write(LZ4.encode(packed))
+        with open(filepath, 'wb') as f, io.BytesIO() as packed_fp:
+            arm.lib.armpack.pack(output, packed_fp)
+            # View into the packed data instead of a copy, released
+            # before the buffer is closed
+            with packed_fp.getbuffer() as packed:
+                # Prepend packed data size for decoding. Haxe can't unpack
+                # an unsigned int64 so we use a signed int64 here
+                f.write(np.int64(LZ4.encode_bound(len(packed))).tobytes())
+
+                f.write(LZ4.encode(packed))
     else:
-        if bpy.data.worlds['Arm'].arm_minimize:
+        if minimize is None:
+            minimize = bpy.data.worlds['Arm'].arm_minimize
+        if minimize:
             with open(filepath, 'wb') as f:
-                f.write(arm.lib.armpack.packb(output))
+                # Stream directly into the file
+                arm.lib.armpack.pack(output, f)
         else:
             filepath_json = filepath.split('.arm')[0] + '.json'
             with open(filepath_json, 'w') as f:
@@ -320,6 +332,20 @@ def get_pref_or_default(prop_name: str, default: Any) -> Any:
     addon_prefs = get_arm_preferences()
     return getattr(addon_prefs, prop_name, default)
 
+def get_mesh_cache_path() -> str:
+    """Return the directory of the persistent mesh cache."""
+    path = get_pref_or_default('mesh_cache_path', '')
+    if path != '':
+        return bpy.path.abspath(path)
+
+    if get_os() == 'win':
+        cache_home = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    elif get_os() == 'mac':
+        cache_home = os.path.expanduser('~/Library/Caches')
+    else:
+        cache_home = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return os.path.join(cache_home, 'armory', 'meshes')
+
 def get_node_path():
     if get_os() == 'win':
         return get_sdk_path() + '/nodejs/node.exe'
@@ -378,6 +404,10 @@ RX_VALUE = r'(?:\s*=\s*(?P<value>(?:\".*\")|(?:[^;]+)|))?'  # Optional default v
 
 PROP_REGEX_RAW = fr'@prop\s+{RX_MODIFIERS}(?P<attr_type>var|final)\s+{RX_IDENTIFIER}{RX_TYPE}{RX_VALUE};'
 PROP_REGEX = re.compile(PROP_REGEX_RAW, re.IGNORECASE)
+# Change when the result of parse_script_props() changes, to rebuild
+# the script indices of existing projects
+SCRIPT_INDEX_VERSION = '1'
+
 def fetch_script_props(filename: str):
     """Parses @prop declarations from the given Haxe script."""
     with open(filename, 'r', encoding='utf-8') as sourcefile:
@@ -396,9 +426,24 @@ def fetch_script_props(filename: str):
     if '\\' in filename:
         name = name.replace('\\', '.')
 
-    script_props[name] = []
-    script_props_defaults[name] = []
-    script_warnings[name] = []
+    set_script_props(name, parse_script_props(source))
+
+
+def set_script_props(name: str, parsed: Dict[str, list]):
+    """Registers the result of parse_script_props() for the given
+    script name."""
+    script_props[name] = [tuple(p) for p in parsed['props']]
+    script_props_defaults[name] = list(parsed['defaults'])
+    script_warnings[name] = [tuple(w) for w in parsed['warnings']]
+
+
+def parse_script_props(source: str) -> Dict[str, list]:
+    """Parses @prop declarations from the given Haxe source. Returns the
+    properties as (identifier, type) pairs, their default values and
+    (identifier, warning message) pairs."""
+    props = []
+    defaults = []
+    warnings = []
 
     for match in re.finditer(PROP_REGEX, source):
 
@@ -409,12 +454,12 @@ def fetch_script_props(filename: str):
 
         if p_modifiers is not None:
             if 'static' in p_modifiers:
-                script_warnings[name].append((p_identifier, '`static` modifier might cause unwanted behaviour!'))
+                warnings.append((p_identifier, '`static` modifier might cause unwanted behaviour!'))
             if 'inline' in p_modifiers:
-                script_warnings[name].append((p_identifier, '`inline` modifier is not supported!'))
+                warnings.append((p_identifier, '`inline` modifier is not supported!'))
                 continue
             if 'final' in p_modifiers or match.group('attr_type') == 'final':
-                script_warnings[name].append((p_identifier, '`final` properties are not supported!'))
+                warnings.append((p_identifier, '`final` properties are not supported!'))
                 continue
 
         # Property type is annotated
@@ -426,7 +471,7 @@ def fetch_script_props(filename: str):
 
             type_default_val = get_type_default_value(p_type)
             if type_default_val is None:
-                script_warnings[name].append((p_identifier, f'unsupported type `{p_type}`!'))
+                warnings.append((p_identifier, f'unsupported type `{p_type}`!'))
                 continue
 
             # Default value exists
@@ -442,19 +487,38 @@ def fetch_script_props(filename: str):
 
             # Type is not recognized
             if p_type is None:
-                script_warnings[name].append((p_identifier, 'could not infer property type from given value!'))
+                warnings.append((p_identifier, 'could not infer property type from given value!'))
                 continue
             if p_type == "String":
                 p_default_val = p_default_val.replace('\'', '').replace('"', '')
 
         else:
-            script_warnings[name].append((p_identifier, 'missing type or default value!'))
+            warnings.append((p_identifier, 'missing type or default value!'))
             continue
 
         # Register prop
-        prop = (p_identifier, p_type)
-        script_props[name].append(prop)
-        script_props_defaults[name].append(p_default_val)
+        props.append((p_identifier, p_type))
+        defaults.append(p_default_val)
+
+    return {'props': props, 'defaults': defaults, 'warnings': warnings}
+
+
+def get_script_index(sources_path: str) -> arm.lib.script_index.ScriptIndex:
+    """Returns the up-to-date index of the Haxe scripts in the given
+    directory, which is stored in the build directory. The @prop
+    declarations of the indexed scripts are registered like in
+    fetch_script_props(), with script names relative to `sources_path`.
+    """
+    index_path = os.path.join(get_fp_build(), 'compiled', 'script_index.json')
+    index = arm.lib.script_index.get_index(sources_path, index_path, parse_script_props, SCRIPT_INDEX_VERSION)
+
+    changed = set(index.update())
+    for rel_path, entry in index.entries.items():
+        name = rel_path.rsplit('.', 1)[0].replace('/', '.')
+        if rel_path in changed or name not in script_props:
+            set_script_props(name, entry['data'])
+
+    return index
 
 
 def get_prop_type_from_value(value: str):
@@ -518,15 +582,12 @@ def fetch_script_names():
     wrd.arm_scripts_list.clear()
     sources_path = os.path.join(get_fp(), 'Sources', safestr(wrd.arm_project_package))
     if os.path.isdir(sources_path):
-        with WorkingDir(sources_path):
-            # Glob supports recursive search since python 3.5 so it should cover both blender 2.79 and 2.8 integrated python
-            for file in glob.glob('**/*.hx', recursive=True):
-                mod = file.rsplit('.', 1)[0]
-                mod = mod.replace('\\', '/')
-                mod_parts = mod.rsplit('/')
-                if re.match('^[A-Z][A-Za-z0-9_]*$', mod_parts[-1]):
-                    wrd.arm_scripts_list.add().name = mod.replace('/', '.')
-                    fetch_script_props(file)
+        index = get_script_index(sources_path)
+        for rel_path in sorted(index.entries):
+            mod = rel_path.rsplit('.', 1)[0]
+            mod_parts = mod.rsplit('/')
+            if re.match('^[A-Z][A-Za-z0-9_]*$', mod_parts[-1]):
+                wrd.arm_scripts_list.add().name = mod.replace('/', '.')
 
     # Canvas
     wrd.arm_canvas_list.clear()
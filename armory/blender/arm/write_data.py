@@ -338,6 +338,12 @@ let project = new Project('""" + arm.utils.safesrc(wrd.arm_project_name + '-' +
                 # get instantiated
                 khafile.write("""project.addParameter("--macro include('armory.logicnode')");\n""")
 
+        if wrd.arm_logic_data and not use_live_patch:
+            assets.add_khafile_def('arm_logic_data')
+            # Logic trees exported as data can use any logic node
+            # class without a recompilation
+            khafile.write("""project.addParameter("--macro include('armory.logicnode')");\n""")
+
         import_traits = list(set(import_traits))
         for i in range(0, len(import_traits)):
             khafile.write("project.addParameter('" + import_traits[i] + "');\n")
@@ -1,21 +1,24 @@
 from contextlib import contextmanager
+import hashlib
 import math
-import multiprocessing
 import os
-import re
-import subprocess
-import time
+
+import numpy as np
 
 import bpy
 
 import arm.assets as assets
+import arm.lib.probes
 import arm.log as log
+import arm.profiler as profiler
 import arm.utils
 
 if arm.is_reload(__name__):
     import arm
     assets = arm.reload_module(assets)
+    arm.lib.probes = arm.reload_module(arm.lib.probes)
     log = arm.reload_module(log)
+    profiler = arm.reload_module(profiler)
     arm.utils = arm.reload_module(arm.utils)
 else:
     arm.enable_reload(__name__)
@@ -25,10 +28,6 @@ else:
 ENVMAP_FORMAT = 'JPEG'
 ENVMAP_EXT = 'hdr' if ENVMAP_FORMAT == 'HDR' else 'jpg'
 
-__cmft_start_time_seconds = 0.0
-__cmft_end_time_seconds = 0.0
-
-
 def add_irr_assets(output_file_irr):
     assets.add(output_file_irr + '.arm')
 
@@ -128,6 +127,48 @@ def render_envmap(target_dir: str, world: bpy.types.World) -> str:
     return image_name
 
 
+def load_envmap(filepath: str) -> np.ndarray:
+    """Load the RGB pixels of an image, first row at the top. Values of
+    8-bit images are returned as stored, without color conversion."""
+    image = bpy.data.images.load(filepath, check_existing=False)
+    try:
+        width, height = image.size
+        pixels = np.empty(width * height * 4, dtype=np.float32)
+        image.pixels.foreach_get(pixels)
+    finally:
+        bpy.data.images.remove(image)
+    return pixels.reshape(height, width, 4)[::-1, :, :3]
+
+
+def save_envmap(filepath: str, pixels: np.ndarray, file_format: str):
+    """Save RGB pixels (first row at the top) as they are, without
+    color conversion."""
+    height, width = pixels.shape[:2]
+    image = bpy.data.images.new('_arm_envmap_save', width, height, float_buffer=True)
+    try:
+        image.colorspace_settings.name = 'Non-Color'
+        rgba = np.ones((height, width, 4), dtype=np.float32)
+        rgba[:, :, :3] = pixels[::-1]
+        image.pixels.foreach_set(rgba.reshape(-1))
+        image.filepath_raw = filepath
+        image.file_format = file_format
+        image.save()
+    finally:
+        bpy.data.images.remove(image)
+
+
+def get_probe_key(input_file: str, target_w: int, rad_format: str, from_srgb: bool, arm_radiance: bool) -> str:
+    """Hash of everything the generated probes depend on."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(input_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    with open(arm.lib.probes.__file__, 'rb') as f:
+        h.update(f.read())
+    h.update(f'{target_w}:{rad_format}:{from_srgb}:{arm_radiance}'.encode())
+    return h.hexdigest()
+
+
 def write_probes(image_filepath: str, disable_hdr: bool, from_srgb: bool, cached_num_mips: int, arm_radiance=True) -> int:
     """Generate probes from environment map and return the mipmap count."""
     envpath = arm.utils.get_fp_build() + '/compiled/Assets/envmaps'
@@ -141,273 +182,63 @@ def write_probes(image_filepath: str, disable_hdr: bool, from_srgb: bool, cached
     output_file_irr = envpath + '/' + base_name + '_irradiance'
     output_file_rad = envpath + '/' + base_name + '_radiance'
     rad_format = 'jpg' if disable_hdr else 'hdr'
-
-    # Radiance & irradiance exists, keep cache
-    basep = envpath + '/' + base_name
-    if os.path.exists(basep + '_irradiance.arm'):
-        if not arm_radiance or os.path.exists(basep + '_radiance_0.' + rad_format):
-            add_irr_assets(output_file_irr)
-            if arm_radiance:
-                add_rad_assets(output_file_rad, rad_format, cached_num_mips)
-            return cached_num_mips
-
-    # Get paths
-    sdk_path = arm.utils.get_sdk_path()
-    kha_path = arm.utils.get_kha_path()
-
-    if arm.utils.get_os() == 'win':
-        cmft_path = sdk_path + '/lib/armory_tools/cmft/cmft.exe'
-        kraffiti_path = kha_path + '/Kore/Tools/windows_x64/kraffiti.exe'
-    elif arm.utils.get_os() == 'mac':
-        cmft_path = '"' + sdk_path + '/lib/armory_tools/cmft/cmft-osx"'
-        kraffiti_path = '"' + kha_path + '/Kore/Tools/macos_x64/kraffiti"'
-    else:
-        cmft_path = '"' + sdk_path + '/lib/armory_tools/cmft/cmft-linux64"'
-        kraffiti_path = '"' + kha_path + '/Kore/Tools/linux_x64/kraffiti"'
+    file_format = 'JPEG' if disable_hdr else 'HDR'
 
     input_file = arm.utils.asset_path(image_filepath)
 
-    # Scale map, ensure 2:1 ratio (required by cmft)
+    # Map is scaled to a 2:1 ratio, the radiance mips go down to 1x1
     rpdat = arm.utils.get_rp()
     target_w = int(rpdat.arm_radiance_size)
     target_h = int(target_w / 2)
-    scaled_file = output_file_rad + '.' + rad_format
-
-    if arm.utils.get_os() == 'win':
-        subprocess.check_output([
-            kraffiti_path,
-            'from=' + input_file,
-            'to=' + scaled_file,
-            'format=' + rad_format,
-            'width=' + str(target_w),
-            'height=' + str(target_h)])
-    else:
-        subprocess.check_output([
-            kraffiti_path
-            + ' from="' + input_file + '"'
-            + ' to="' + scaled_file + '"'
-            + ' format=' + rad_format
-            + ' width=' + str(target_w)
-            + ' height=' + str(target_h)], shell=True)
+    mip_count = int(math.log2(target_w)) if arm_radiance else cached_num_mips
+
+    # Keep cache if neither the image nor the settings changed
+    key = get_probe_key(input_file, target_w, rad_format, from_srgb, arm_radiance)
+    key_file = envpath + '/' + base_name + '_probes.key'
+    if os.path.exists(key_file) and os.path.exists(output_file_irr + '.arm'):
+        with open(key_file) as f:
+            cached_key = f.read()
+        if cached_key == key and (not arm_radiance or os.path.exists(output_file_rad + '_0.' + rad_format)):
+            add_irr_assets(output_file_irr)
+            if arm_radiance:
+                add_rad_assets(output_file_rad, rad_format, mip_count)
+            return mip_count
+
+    with profiler.span('load_envmap', 'probes', image=base_name):
+        scaled = arm.lib.probes.resize(load_envmap(input_file), target_w, target_h)
 
     # Convert sRGB colors into linear color space first (approximately)
-    input_gamma_numerator = '2.2' if from_srgb else '1.0'
+    linear = np.power(np.maximum(scaled, 0.0), 2.2) if from_srgb else scaled
 
     # Irradiance spherical harmonics
-    if arm.utils.get_os() == 'win':
-        subprocess.call([
-            cmft_path,
-            '--input', scaled_file,
-            '--filter', 'shcoeffs',
-            '--outputNum', '1',
-            '--output0', output_file_irr,
-            '--inputGammaNumerator', input_gamma_numerator,
-            '--inputGammaDenominator', '1.0',
-            '--outputGammaNumerator', '1.0',
-            '--outputGammaDenominator', '1.0'
-        ])
-    else:
-        subprocess.call([
-            cmft_path
-            + ' --input ' + '"' + scaled_file + '"'
-            + ' --filter shcoeffs'
-            + ' --outputNum 1'
-            + ' --output0 ' + '"' + output_file_irr + '"'
-            + ' --inputGammaNumerator' + input_gamma_numerator
-            + ' --inputGammaDenominator' + '1.0'
-            + ' --outputGammaNumerator' + '1.0'
-            + ' --outputGammaDenominator' + '1.0'
-        ], shell=True)
-
-    sh_to_json(output_file_irr)
+    with profiler.span('irradiance', 'probes', image=base_name):
+        write_irradiance(output_file_irr, arm.lib.probes.sh_irradiance(linear))
     add_irr_assets(output_file_irr)
 
     # Mip-mapped radiance
-    if not arm_radiance:
-        return cached_num_mips
-
-    # 4096 = 256 face
-    # 2048 = 128 face
-    # 1024 = 64 face
-    face_size = target_w / 8
-    if target_w == 2048:
-        mip_count = 9
-    elif target_w == 1024:
-        mip_count = 8
-    else:
-        mip_count = 7
-
-    wrd = bpy.data.worlds['Arm']
-    use_opencl = 'true' if arm.utils.get_pref_or_default("cmft_use_opencl", True) else 'false'
-
-    # cmft doesn't work correctly when passing the number of logical
-    # CPUs if there are more logical than physical CPUs on a machine
-    cpu_count = arm.utils.cpu_count(physical_only=True)
-
-    # CMFT might hang with OpenCl enabled, output warning in that case.
-    # See https://github.com/armory3d/armory/issues/2760 for details.
-    global __cmft_start_time_seconds, __cmft_end_time_seconds
-    __cmft_start_time_seconds = time.time()
+    if arm_radiance:
+        with profiler.span('radiance', 'probes', image=base_name):
+            save_envmap(output_file_rad + '.' + rad_format, scaled, file_format)
+            mips = arm.lib.probes.prefilter_radiance(linear, mip_count, max_workers=arm.utils.cpu_count())
+            for i, mip in enumerate(mips):
+                save_envmap(output_file_rad + '_' + str(i) + '.' + rad_format, mip, file_format)
+        add_rad_assets(output_file_rad, rad_format, mip_count)
 
-    try:
-        if arm.utils.get_os() == 'win':
-            cmd = [
-                cmft_path,
-                '--input', scaled_file,
-                '--filter', 'radiance',
-                '--dstFaceSize', str(face_size),
-                '--srcFaceSize', str(face_size),
-                '--excludeBase', 'false',
-                # '--mipCount', str(mip_count),
-                '--glossScale', '8',
-                '--glossBias', '3',
-                '--lightingModel', 'blinnbrdf',
-                '--edgeFixup', 'none',
-                '--numCpuProcessingThreads', str(cpu_count),
-                '--useOpenCL', use_opencl,
-                '--clVendor', 'anyGpuVendor',
-                '--deviceType', 'gpu',
-                '--deviceIndex', '0',
-                '--generateMipChain', 'true',
-                '--inputGammaNumerator', input_gamma_numerator,
-                '--inputGammaDenominator', '1.0',
-                '--outputGammaNumerator', '1.0',
-                '--outputGammaDenominator', '1.0',
-                '--outputNum', '1',
-                '--output0', output_file_rad,
-                '--output0params', 'hdr,rgbe,latlong'
-            ]
-            if not wrd.arm_verbose_output:
-                cmd.append('--silent')
-            print(cmd)
-            subprocess.call(cmd)
-        else:
-            cmd = cmft_path + \
-                ' --input "' + scaled_file + '"' + \
-                ' --filter radiance' + \
-                ' --dstFaceSize ' + str(face_size) + \
-                ' --srcFaceSize ' + str(face_size) + \
-                ' --excludeBase false' + \
-                ' --glossScale 8' + \
-                ' --glossBias 3' + \
-                ' --lightingModel blinnbrdf' + \
-                ' --edgeFixup none' + \
-                ' --numCpuProcessingThreads ' + str(cpu_count) + \
-                ' --useOpenCL ' + use_opencl + \
-                ' --clVendor anyGpuVendor' + \
-                ' --deviceType gpu' + \
-                ' --deviceIndex 0' + \
-                ' --generateMipChain true' + \
-                ' --inputGammaNumerator ' + input_gamma_numerator + \
-                ' --inputGammaDenominator 1.0' + \
-                ' --outputGammaNumerator 1.0' + \
-                ' --outputGammaDenominator 1.0' + \
-                ' --outputNum 1' + \
-                ' --output0 "' + output_file_rad + '"' + \
-                ' --output0params hdr,rgbe,latlong'
-            if not wrd.arm_verbose_output:
-                cmd += ' --silent'
-            print(cmd)
-            subprocess.call([cmd], shell=True)
-
-    except KeyboardInterrupt as e:
-        __cmft_end_time_seconds = time.time()
-        check_last_cmft_time()
-        raise e
-
-    __cmft_end_time_seconds = time.time()
-
-    # Remove size extensions in file name
-    mip_w = int(face_size * 4)
-    mip_base = output_file_rad + '_'
-    mip_num = 0
-    while mip_w >= 4:
-        mip_name = mip_base + str(mip_num)
-        os.rename(
-            mip_name + '_' + str(mip_w) + 'x' + str(int(mip_w / 2)) + '.hdr',
-            mip_name + '.hdr')
-        mip_w = int(mip_w / 2)
-        mip_num += 1
-
-    # Append mips
-    generated_files = []
-    for i in range(0, mip_count):
-        generated_files.append(output_file_rad + '_' + str(i))
-
-    # Convert to jpgs
-    if disable_hdr is True:
-        for f in generated_files:
-            if arm.utils.get_os() == 'win':
-                subprocess.call([
-                    kraffiti_path,
-                    'from=' + f + '.hdr',
-                    'to=' + f + '.jpg',
-                    'format=jpg'])
-            else:
-                subprocess.call([
-                    kraffiti_path
-                    + ' from="' + f + '.hdr"'
-                    + ' to="' + f + '.jpg"'
-                    + ' format=jpg'], shell=True)
-            os.remove(f + '.hdr')
-
-    # Scale from (4x2 to 1x1>
-    for i in range(0, 2):
-        last = generated_files[-1]
-        out = output_file_rad + '_' + str(mip_count + i)
-        if arm.utils.get_os() == 'win':
-            subprocess.call([
-                kraffiti_path,
-                'from=' + last + '.' + rad_format,
-                'to=' + out + '.' + rad_format,
-                'scale=0.5',
-                'format=' + rad_format], shell=True)
-        else:
-            subprocess.call([
-                kraffiti_path
-                + ' from=' + '"' + last + '.' + rad_format + '"'
-                + ' to=' + '"' + out + '.' + rad_format + '"'
-                + ' scale=0.5'
-                + ' format=' + rad_format], shell=True)
-        generated_files.append(out)
-
-    mip_count += 2
-
-    add_rad_assets(output_file_rad, rad_format, mip_count)
+    with open(key_file, 'w') as f:
+        f.write(key)
 
     return mip_count
 
 
-def sh_to_json(sh_file):
-    """Parse sh coefs produced by cmft into json array"""
-    with open(sh_file + '.c') as f:
-        sh_lines = f.read().splitlines()
-    band0_line = sh_lines[5]
-    band1_line = sh_lines[6]
-    band2_line = sh_lines[7]
-
-    irradiance_floats = []
-    parse_band_floats(irradiance_floats, band0_line)
-    parse_band_floats(irradiance_floats, band1_line)
-    parse_band_floats(irradiance_floats, band2_line)
-
+def write_irradiance(output_file_irr: str, sh_coeffs: np.ndarray):
+    """Write the 9 RGB spherical harmonics coefficients of
+    arm.lib.probes.sh_irradiance() as irradiance file."""
     # Lower exposure to adjust to Eevee and Cycles
-    for i in range(0, len(irradiance_floats)):
-        irradiance_floats[i] /= 2
+    irradiance_floats = [float(f) / 2 for f in sh_coeffs.reshape(-1)]
 
     sh_json = {'irradiance': irradiance_floats}
     ext = '.arm' if bpy.data.worlds['Arm'].arm_minimize else ''
-    arm.utils.write_arm(sh_file + ext, sh_json)
-
-    # Clean up .c
-    os.remove(sh_file + '.c')
-
-
-def parse_band_floats(irradiance_floats, band_line):
-    string_floats = re.findall(r'[-+]?\d*\.\d+|\d+', band_line)
-    string_floats = string_floats[1:]  # Remove 'Band 0/1/2' number
-    for s in string_floats:
-        irradiance_floats.append(float(s))
+    arm.utils.write_arm(output_file_irr + ext, sh_json)
 
 
 def write_sky_irradiance(base_name):
@@ -456,32 +287,3 @@ def write_color_irradiance(base_name, col):
     arm.utils.write_arm(output_file + '.arm', sh_json)
 
     assets.add(output_file + '.arm')
-
-
-def check_last_cmft_time():
-    global __cmft_start_time_seconds, __cmft_end_time_seconds
-
-    if __cmft_start_time_seconds <= 0.0:
-        # CMFT was not called
-        return
-
-    if __cmft_end_time_seconds <= 0.0:
-        # Build was aborted and CMFT didn't finish
-        __cmft_end_time_seconds = time.time()
-
-    cmft_duration_seconds = __cmft_end_time_seconds - __cmft_start_time_seconds
-
-    # We could also check here if the user already disabled OpenCL and
-    # then don't show the warning, but this might trick users into
-    # thinking they have fixed their issue even in the case that the
-    # slow runtime isn't caused by using OpenCL
-    if cmft_duration_seconds > 20:
-        log.warn(
-            "Generating the radiance map with CMFT took an unusual amount"
-            f" of time ({cmft_duration_seconds:.2f} s). If the issue persists,"
-            " try disabling \"CMFT: Use OpenCL\" in the Armory add-on preferences."
-            " For more information see https://github.com/armory3d/armory/issues/2760."
-        )
-
-    __cmft_start_time_seconds = 0.0
-    __cmft_end_time_seconds = 0.0
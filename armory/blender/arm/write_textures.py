@@ -0,0 +1,219 @@
+"""
+Conversion of images that can't be used by Kha as they are (other file
+formats, packed and generated images). Conversions are collected with
+add() while the materials are exported and run by run() afterwards,
+in parallel threads.
+
+Converted files are kept in compiled/Assets/unpacked between builds,
+together with the hash of everything they were generated from, so that
+they are only converted again if the source image or the settings
+change.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import bpy
+
+import arm.assets as assets
+import arm.lib.texture
+import arm.log as log
+import arm.utils
+
+if arm.is_reload(__name__):
+    import arm
+    assets = arm.reload_module(assets)
+    arm.lib.texture = arm.reload_module(arm.lib.texture)
+    log = arm.reload_module(log)
+    arm.utils = arm.reload_module(arm.utils)
+else:
+    arm.enable_reload(__name__)
+
+
+class TextureConversion:
+    """Conversion of an image into the file at `path` and optionally
+    its mipmaps."""
+
+    def __init__(self, image: bpy.types.Image, path: str, file_format: str, mipmaps: bool):
+        self.image = image
+        self.path = path
+        self.file_format = file_format
+
+        wrd = bpy.data.worlds['Arm']
+        self.quality = arm.utils.get_texture_quality_percentage()
+        self.scale = self.quality / 100 if wrd.arm_texture_downscale else 1.0
+
+        width, height = image.size
+        self.width = max(round(width * self.scale), 1)
+        self.height = max(round(height * self.scale), 1)
+
+        self.mipmap_paths = []
+        if mipmaps:
+            base, ext = os.path.splitext(path)
+            mip_w, mip_h = self.width, self.height
+            while mip_w > 1 or mip_h > 1:
+                mip_w, mip_h = max(mip_w // 2, 1), max(mip_h // 2, 1)
+                self.mipmap_paths.append(f'{base}_mip{len(self.mipmap_paths) + 1}{ext}')
+
+    def get_key(self) -> Optional[str]:
+        """Hash of the source image and conversion settings, None if
+        the image can't be hashed (unsaved changes)."""
+        image = self.image
+        if image.is_dirty:
+            return None
+
+        h = hashlib.blake2b(digest_size=20)
+        if image.packed_file is not None:
+            h.update(image.packed_file.data)
+        elif image.source == 'GENERATED':
+            h.update(repr((image.generated_type, tuple(image.generated_color), image.generated_width,
+                           image.generated_height, image.use_generated_float)).encode())
+        else:
+            filepath = arm.utils.asset_path(arm.utils.to_absolute_path(image.filepath, image.library))
+            with open(filepath, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+
+        with open(arm.lib.texture.__file__, 'rb') as f:
+            h.update(f.read())
+        h.update(f'{self.file_format}:{self.quality}:{self.width}x{self.height}:{len(self.mipmap_paths)}'.encode())
+        return h.hexdigest()
+
+    def read_pixels(self) -> np.ndarray:
+        """RGBA pixels of the image as stored, first row at the top.
+        Must be called from the main thread."""
+        width, height = self.image.size
+        pixels = np.empty(width * height * 4, dtype=np.float32)
+        self.image.pixels.foreach_get(pixels)
+        return pixels.reshape(height, width, 4)[::-1]
+
+    def convert(self, pixels: np.ndarray):
+        """Resize, encode and write the image and its mipmaps. Can be
+        called from any thread."""
+        if pixels.shape[0] != self.height or pixels.shape[1] != self.width:
+            pixels = arm.lib.texture.resize(pixels, self.width, self.height)
+
+        self.write(self.path, pixels)
+        if len(self.mipmap_paths) > 0:
+            for path, mip in zip(self.mipmap_paths, arm.lib.texture.mipmaps(pixels)):
+                self.write(path, mip)
+
+    def write(self, path: str, pixels: np.ndarray):
+        if self.file_format == 'HDR':
+            data = arm.lib.texture.encode_hdr(pixels)
+        elif self.file_format == 'PNG':
+            data = arm.lib.texture.encode_png(arm.lib.texture.to_bytes(pixels))
+        else:
+            data = arm.lib.texture.encode_jpeg(arm.lib.texture.to_bytes(pixels), self.quality)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+
+conversions: Dict[str, TextureConversion] = {}
+collecting = False
+
+
+def reset():
+    """Start collecting conversions for a new build."""
+    global conversions, collecting
+    conversions = {}
+    collecting = True
+
+
+def get_unpack_path() -> str:
+    unpack_path = os.path.join(arm.utils.get_fp_build(), 'compiled', 'Assets', 'unpacked')
+    if not os.path.exists(unpack_path):
+        os.makedirs(unpack_path)
+    return unpack_path
+
+
+def add(image: bpy.types.Image, path: str, file_format: str, mipmaps: bool = False, wait: bool = False) -> List[str]:
+    """Convert the given image into a PNG, JPEG or HDR file at `path`
+    and add it to the assets. Returns the file names of the generated
+    mipmaps, if requested.
+
+    The conversion is done by run(), or right away if no build is
+    collecting conversions or `wait` is true, e.g. because the file is
+    read during the export.
+    """
+    conversion = conversions.get(path)
+    if conversion is None or (mipmaps and len(conversion.mipmap_paths) == 0):
+        conversion = TextureConversion(image, path, file_format, mipmaps)
+        conversions[path] = conversion
+
+    assets.add(path)
+    for mip_path in conversion.mipmap_paths:
+        assets.add(mip_path)
+
+    if not collecting:
+        run()
+    elif wait:
+        convert({path: conversions.pop(path)})
+
+    return [arm.utils.safestr(arm.utils.extract_filename(p)) for p in conversion.mipmap_paths]
+
+
+def run(max_workers: Optional[int] = None):
+    """Run all collected conversions and stop collecting."""
+    global conversions, collecting
+    pending_conversions = conversions
+    conversions = {}
+    collecting = False
+    convert(pending_conversions, max_workers)
+
+
+def convert(pending_conversions: Dict[str, TextureConversion], max_workers: Optional[int] = None):
+    """Run the given conversions, reusing files converted by previous
+    builds if their source didn't change."""
+    if len(pending_conversions) == 0:
+        return
+
+    index_path = os.path.join(get_unpack_path(), 'textures.json')
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    max_workers = max_workers or arm.utils.cpu_count() or 1
+    num_converted = 0
+    num_reused = 0
+    pending = deque()
+
+    def finish():
+        nonlocal num_converted
+        conversion, key, future = pending.popleft()
+        future.result()
+        if key is not None:
+            index[os.path.basename(conversion.path)] = key
+        num_converted += 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for conversion in pending_conversions.values():
+                key = conversion.get_key()
+                name = os.path.basename(conversion.path)
+                if key is not None and index.get(name) == key and all(os.path.isfile(p) for p in [conversion.path] + conversion.mipmap_paths):
+                    num_reused += 1
+                    continue
+
+                # Limit the number of images held in memory
+                while len(pending) >= 2 * max_workers:
+                    finish()
+
+                index.pop(name, None)
+                log.info('Converting to ' + conversion.path)
+                pending.append((conversion, key, pool.submit(conversion.convert, conversion.read_pixels())))
+
+            while len(pending) > 0:
+                finish()
+    finally:
+        with open(index_path, 'w') as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+
+    log.info(f'Textures: {num_converted} converted, {num_reused} reused')
@@ -0,0 +1,113 @@
+"""
+Benchmark ArmoryExporter.export_mesh_data() against the per-loop reads
+it replaced, on a generated mesh. Needs Blender with the Armory add-on
+enabled:
+
+    blender -b --python tests/bench_export_mesh.py -- [subdivisions]
+
+The packed vertex and index arrays of both versions are compared, the
+script fails if they differ.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arm.exporter import ArmoryExporter
+
+
+def create_mesh(subdivisions: int) -> bpy.types.Object:
+    bpy.ops.mesh.primitive_uv_sphere_add(segments=64, ring_count=32)
+    obj = bpy.context.active_object
+    modifier = obj.modifiers.new('Subdivision', 'SUBSURF')
+    modifier.levels = subdivisions
+    bpy.ops.object.modifier_apply(modifier=modifier.name)
+    for name in ('A', 'B'):
+        material = bpy.data.materials.new(name)
+        material.export_uvs = True
+        obj.data.materials.append(material)
+    for poly in obj.data.polygons:
+        poly.material_index = poly.index % 2
+    return obj
+
+
+def export_per_loop(mesh: bpy.types.Mesh, scale_pos: float, invscale_tex: float):
+    """Position, normal and UV packing and index arrays as done before
+    the bulk reads, one MeshLoop at a time."""
+    if bpy.app.version < (4, 1, 0):
+        mesh.calc_normals_split()
+    mesh.calc_loop_triangles()
+    loops = mesh.loops
+    num_verts = len(loops)
+    verts = mesh.vertices
+    lay0 = mesh.uv_layers[0]
+    pdata = np.empty(num_verts * 4, dtype='<f4')
+    ndata = np.empty(num_verts * 2, dtype='<f4')
+    t0data = np.empty(num_verts * 2, dtype='<f4')
+    for i, loop in enumerate(loops):
+        co = verts[loop.vertex_index].co
+        normal = loop.normal
+        pdata[i * 4:i * 4 + 3] = co
+        pdata[i * 4 + 3] = normal[2] * scale_pos
+        ndata[i * 2:i * 2 + 2] = normal[0], normal[1]
+        uv = lay0.data[loop.index].uv
+        t0data[i * 2] = uv[0]
+        t0data[i * 2 + 1] = 1.0 - uv[1]
+
+    poly_map = [[] for _ in range(max(len(mesh.materials), 1))]
+    for poly in mesh.polygons:
+        poly_map[poly.material_index].append(poly)
+    tri_loops = {}
+    for tri in mesh.loop_triangles:
+        tri_loops.setdefault(tri.polygon_index, []).append(tri)
+    index_arrays = []
+    for polys in poly_map:
+        prim = [loops[i].index for poly in polys for tri in tri_loops[poly.index] for i in tri.loops]
+        if len(prim) > 0:
+            index_arrays.append(np.array(prim, dtype='<i4'))
+
+    pdata *= (1 / scale_pos) * 32767
+    ndata *= 32767
+    t0data *= invscale_tex
+    return np.array(pdata, dtype='<i2'), np.array(ndata, dtype='<i2'), np.array(t0data, dtype='<i2'), index_arrays
+
+
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    subdivisions = int(argv[0]) if len(argv) > 0 else 2
+
+    obj = create_mesh(subdivisions)
+    mesh = obj.data
+    print(f'{len(mesh.loops)} loops, {len(mesh.polygons)} polygons')
+
+    # export_mesh_data() only uses static helpers of the exporter
+    exporter = ArmoryExporter.__new__(ArmoryExporter)
+    out = {}
+    start = time.perf_counter()
+    exporter.export_mesh_data(mesh, obj, out)
+    bulk_time = time.perf_counter() - start
+
+    invscale_tex = (1 / out['scale_tex']) * 32767 if 'scale_tex' in out else 32767
+    start = time.perf_counter()
+    pdata, ndata, t0data, index_arrays = export_per_loop(mesh, out['scale_pos'], invscale_tex)
+    loop_time = time.perf_counter() - start
+
+    print(f'per loop {loop_time:.3f}s, bulk {bulk_time:.3f}s ({loop_time / bulk_time:.1f}x)')
+
+    arrays = {va['attrib']: va['values'] for va in out['vertex_arrays']}
+    assert np.array_equal(arrays['pos'], pdata)
+    assert np.array_equal(arrays['nor'], ndata)
+    assert np.array_equal(arrays['tex'], t0data)
+    assert len(out['index_arrays']) == len(index_arrays)
+    for ia, expected in zip(out['index_arrays'], index_arrays):
+        assert np.array_equal(ia['values'], expected)
+    print('Output identical')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark arm.lib.make_datas over the bundled shader passes against
+the line based parser it replaced, which is loaded from the given git
+revision. Needs Blender with the Armory add-on enabled:
+
+    blender -b --python tests/bench_make_datas.py -- [revision]
+
+The shader data of both versions is compared and the differences are
+printed. The new parser also evaluates #if/#elif and follows includes,
+so passes that use them are expected to differ.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arm.utils
+from arm import assets
+import arm.lib.make_datas as make_datas
+
+SHADERS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Shaders')
+
+# Parent of the commit that added the tokenizing parser
+DEFAULT_REVISION = '14111cb^'
+
+DEFINE_SETS = [
+    [],
+    ['_CSM', '_Irr', '_Rad', '_SSAO', '_Deferred', '_ShadowMap', '_Clusters', '_SinglePoint'],
+    ['_LDR', '_Brdf', '_SMSizeUniform', '_Spot', '_VoxelAOvar', '_SSR', '_Bloom'],
+]
+
+
+def load_old_module(revision: str) -> types.ModuleType:
+    source = subprocess.check_output(
+        ['git', 'show', revision + ':armory/blender/arm/lib/make_datas.py'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), text=True
+    )
+    module = types.ModuleType('make_datas_old')
+    exec(compile(source, 'make_datas_old.py', 'exec'), module.__dict__)
+    return module
+
+
+def make_all(module, passes, defs) -> dict:
+    result = {}
+    for name, json_data in passes:
+        assets.shader_passes_assets[name] = []
+        os.chdir(os.path.join(SHADERS_DIR, name))
+        res = {'shader_datas': []}
+        module.make(res, name, json_data, arm.utils.get_fp_build(), defs, False)
+        result[name] = res['shader_datas']
+    return result
+
+
+def print_differences(old: dict, new: dict):
+    for old_con, new_con in zip(old['contexts'], new['contexts']):
+        for key in sorted(set(old_con) | set(new_con)):
+            old_value = old_con.get(key)
+            new_value = new_con.get(key)
+            if old_value == new_value:
+                continue
+            if key in ('constants', 'texture_units', 'vertex_elements'):
+                old_names = [e['name'] for e in old_value]
+                new_names = [e['name'] for e in new_value]
+                added = [n for n in new_names if n not in old_names]
+                removed = [n for n in old_names if n not in new_names]
+                duplicates = sorted({n for n in old_names if old_names.count(n) > 1})
+                changes = []
+                if added:
+                    changes.append(f'added {added}')
+                if removed:
+                    changes.append(f'removed {removed}')
+                if duplicates:
+                    changes.append(f'deduplicated {duplicates}')
+                if not changes:
+                    changes.append('reordered' if sorted(old_names) == sorted(new_names) else 'changed links')
+                print(f'    {old_con["name"]} {key}: {", ".join(changes)}')
+            else:
+                print(f'    {old_con["name"]} {key}: {old_value} -> {new_value}')
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    revision = argv[0] if len(argv) > 0 else DEFAULT_REVISION
+    old_module = load_old_module(revision)
+
+    passes = []
+    for name in sorted(os.listdir(SHADERS_DIR)):
+        path = os.path.join(SHADERS_DIR, name, name + '.json')
+        if os.path.isfile(path):
+            with open(path, encoding='utf-8') as f:
+                passes.append((name, json.load(f)))
+    print(f'{len(passes)} shader passes')
+
+    cwd = os.getcwd()
+    get_fp_build = arm.utils.get_fp_build
+    with tempfile.TemporaryDirectory() as fp_build:
+        os.makedirs(os.path.join(fp_build, 'compiled', 'Shaders'))
+        arm.utils.get_fp_build = lambda: fp_build
+        try:
+            for defs in DEFINE_SETS:
+                make_datas._sources.clear()
+                make_datas._pass_cache.clear()
+                old, old_time = timed(make_all, old_module, passes, defs)
+                new, new_time = timed(make_all, make_datas, passes, defs)
+                cached, cached_time = timed(make_all, make_datas, passes, defs)
+                print(f'defines {defs}: old {old_time * 1000:.1f}ms, new {new_time * 1000:.1f}ms, cached {cached_time * 1000:.1f}ms')
+
+                assert cached == new
+                for name in old:
+                    if old[name] != new[name]:
+                        print(f'  {name}:')
+                        print_differences(old[name][0], new[name][0])
+        finally:
+            arm.utils.get_fp_build = get_fp_build
+            os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    main()
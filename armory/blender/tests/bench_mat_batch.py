@@ -0,0 +1,201 @@
+"""
+Benchmark material batching and shader merging against the list scans
+they replaced, on generated materials. Needs Blender with the Armory
+add-on enabled:
+
+    blender -b --python tests/bench_mat_batch.py -- [materials] [variants]
+
+Materials and shaders are grouped by both versions, the script fails if
+the groups differ.
+"""
+import os
+import sys
+import time
+import types
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import arm.assets as assets
+import arm.material.cycles as cycles
+import arm.material.mat_batch as mat_batch
+from arm.material.shader import Shader
+import arm.utils as arm_utils
+
+
+def create_materials(count: int, variants: int) -> list:
+    """Materials with a noise texture linked to several inputs of the
+    BSDF and a chain of math nodes whose length depends on the
+    variant."""
+    materials = []
+    for i in range(count):
+        mat = bpy.data.materials.new(f'BenchMaterial{i}')
+        mat.use_nodes = True
+        nodes = mat.node_tree.nodes
+        links = mat.node_tree.links
+        bsdf = cycles.node_by_type(nodes, 'BSDF_PRINCIPLED')
+        noise = nodes.new('ShaderNodeTexNoise')
+        links.new(noise.outputs['Color'], bsdf.inputs['Base Color'])
+        last = noise.outputs['Fac']
+        for _ in range(i % variants):
+            math = nodes.new('ShaderNodeMath')
+            links.new(last, math.inputs[0])
+            last = math.outputs[0]
+        links.new(last, bsdf.inputs['Roughness'])
+        links.new(last, bsdf.inputs['Metallic'])
+        materials.append(mat)
+    return materials
+
+
+def traverse_tree_string(node, sign):
+    sign += node.type + '-'
+    for inp in node.inputs:
+        if inp.is_linked:
+            sign = traverse_tree_string(inp.links[0].from_node, sign)
+        else:
+            sign += 'o'
+    return sign
+
+
+def get_signature_string(mat, obj):
+    """The string signature of mat_batch before the tuple signatures."""
+    output_node = cycles.node_by_type(mat.node_tree.nodes, 'OUTPUT_MATERIAL')
+    sign = traverse_tree_string(output_node, '')
+    sign += '1' if mat.arm_cast_shadow else '0'
+    sign += '1' if mat.arm_ignore_irradiance else '0'
+    if mat.arm_two_sided:
+        sign += '2'
+    elif mat.arm_cull_mode == 'Clockwise':
+        sign += '1'
+    else:
+        sign += '0'
+    sign += str(mat.arm_material_id)
+    sign += '1' if mat.arm_depth_read else '0'
+    sign += '1' if mat.arm_overlay else '0'
+    sign += '1' if mat.arm_decal else '0'
+    if mat.arm_discard:
+        sign += '1'
+        sign += str(round(mat.arm_discard_opacity, 2))
+        sign += str(round(mat.arm_discard_opacity_shadows, 2))
+    else:
+        sign += '000'
+    sign += mat.arm_custom_material if mat.arm_custom_material != '' else '0'
+    sign += mat.arm_skip_context if mat.arm_skip_context != '' else '0'
+    sign += '1' if mat.arm_particle_fade else '0'
+    sign += mat.arm_billboard
+    sign += '_skin' if arm_utils.export_bone_data(obj) else '0'
+    sign += '_morph' if arm_utils.export_morph_targets(obj) else '0'
+    return sign
+
+
+def build_scan(materials, obj, build):
+    """mat_batch.build() before the signature groups were used, with the
+    string signatures and the quadratic shader assignment."""
+    signatures = {mat: get_signature_string(mat, obj) for mat in materials}
+    groups = {}
+    for mat in materials:
+        groups.setdefault(signatures[mat], []).append(mat)
+    for mats in groups.values():
+        if len(mats) > 1:
+            mat_batch.mark_uniforms(mats)
+
+    batch = {}
+    for mat in materials:
+        for mat2 in materials:
+            if mat == mat2:
+                batch[mat] = build(mat)
+                break
+            if signatures[mat] == signatures[mat2]:
+                batch[mat] = batch[mat2]
+                break
+    return batch
+
+
+def create_shaders(count: int, variants: int) -> list:
+    shaders = []
+    for i in range(count):
+        sh = Shader(types.SimpleNamespace(data={'fragment_shader': f'shader{i}'}), 'frag')
+        sh.add_in('vec3 wnormal')
+        sh.write_init('vec3 n = normalize(wnormal);')
+        for j in range(i % variants):
+            sh.write(f'fragColor.rgb += vec3({j}.0) * n;')
+        shaders.append(sh)
+    return shaders
+
+
+def shader_equal_scan(sh, ar, shtype):
+    """assets.shader_equal() before the equality key index."""
+    for e in ar:
+        if sh.ins == e.ins and sh.main == e.main and sh.main_normal == e.main_normal and \
+                sh.main_init == e.main_init and sh.main_textures == e.main_textures and \
+                sh.main_attribs == e.main_attribs:
+            sh.context.data[shtype] = e.context.data[shtype]
+            sh.is_linked = True
+            return
+    ar.append(sh)
+
+
+def merge_shaders(shaders, ar, shader_equal):
+    for sh in shaders:
+        shader_equal(sh, ar, 'fragment_shader')
+    return ar
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def report(name, old_time, new_time):
+    print(f'{name}: old {old_time:.3f}s, new {new_time:.3f}s ({old_time / new_time:.1f}x)')
+
+
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    count = int(argv[0]) if len(argv) > 0 else 2000
+    variants = int(argv[1]) if len(argv) > 1 else 20
+
+    bpy.ops.mesh.primitive_cube_add()
+    obj = bpy.context.active_object
+    materials = create_materials(count, variants)
+    print(f'{count} materials, {variants} variants')
+
+    # Shader generation is left out, every build returns new shader data
+    # so that equal objects mean a shared shader
+    old_batch, old_time = timed(build_scan, materials, obj, lambda mat: object())
+    make_shader = mat_batch.make_shader
+    mat_batch.make_shader = types.SimpleNamespace(build=lambda mat, mat_users, mat_armusers: object())
+    try:
+        for mat in materials:
+            mat.signature = ''
+        _, new_time = timed(mat_batch.build, materials, {mat: [obj] for mat in materials}, {})
+    finally:
+        mat_batch.make_shader = make_shader
+    report('Batching', old_time, new_time)
+
+    def groups(batch):
+        shared = {}
+        for mat in materials:
+            shared.setdefault(id(batch[mat]), []).append(mat.name)
+        return sorted(shared.values())
+    assert groups(old_batch) == groups(mat_batch.batchDict)
+    assert len(groups(old_batch)) == variants
+
+    old_shaders = create_shaders(count, variants)
+    new_shaders = create_shaders(count, variants)
+    old_ar, old_time = timed(merge_shaders, old_shaders, [], shader_equal_scan)
+    new_ar, new_time = timed(merge_shaders, new_shaders, {}, assets.shader_equal)
+    report('Shader merging', old_time, new_time)
+
+    assert len(old_ar) == len(new_ar) == variants
+    assert [sh.context.data for sh in old_shaders] == [sh.context.data for sh in new_shaders]
+    print('Groups identical')
+
+    for mat in materials:
+        bpy.data.materials.remove(mat)
+
+
+if __name__ == '__main__':
+    main()
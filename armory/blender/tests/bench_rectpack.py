@@ -0,0 +1,39 @@
+"""
+Compare MaxRects with the array-backed MaxRectsNp on random lightmap
+atlas workloads. Run with `python tests/bench_rectpack.py` from the
+`armory/blender` directory.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from arm.lightmapper.utility.rectpack import MaxRectsBssf, MaxRectsNpBssf
+
+
+def pack(algo_cls, size, rects):
+    algo = algo_cls(size, size, rot=False)
+    start = time.perf_counter()
+    for w, h in rects:
+        algo.add_rect(w, h)
+    return time.perf_counter() - start, len(algo), algo.used_area() / (size * size)
+
+
+def main():
+    rng = random.Random(0)
+    workloads = [
+        ('400 random rects', 1024, [(rng.randint(4, 64), rng.randint(4, 64)) for _ in range(400)]),
+        ('300 power-of-two squares', 2048, [(s, s) for s in (2 ** rng.randint(3, 7) for _ in range(300))]),
+        ('1000 small random rects', 1024, [(rng.randint(2, 24), rng.randint(2, 24)) for _ in range(1000)]),
+    ]
+    for name, size, rects in workloads:
+        print(name)
+        for algo_cls in (MaxRectsBssf, MaxRectsNpBssf):
+            seconds, count, occupancy = pack(algo_cls, size, rects)
+            print(f'  {algo_cls.__name__:15} {seconds:8.3f}s  {count} packed  {occupancy:.1%} occupancy')
+
+
+if __name__ == '__main__':
+    main()
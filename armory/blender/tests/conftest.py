@@ -0,0 +1,12 @@
+"""
+Tests of the Blender add-on. Tests of the parts that don't depend on
+bpy run with `python -m pytest` from the `armory/blender` directory,
+the others are skipped unless run inside of Blender with the Armory
+add-on enabled:
+
+    blender -b --python-expr "import sys, pytest; sys.exit(pytest.main(['tests']))"
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
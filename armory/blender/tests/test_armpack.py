@@ -0,0 +1,45 @@
+"""
+Typed array selection of the armpack encoder.
+"""
+import numpy as np
+import pytest
+
+from arm.lib import armpack
+
+
+@pytest.mark.parametrize('values, tag, dtype', [
+    ([1, 2, -3], b'\xd2', np.int32),
+    ([0.5, 1.5], b'\xca', np.float32),
+    # Mixed lists are promoted to float instead of truncating
+    ([1, 0.5, -2], b'\xca', np.float32),
+    ([0.5, 1, 2], b'\xca', np.float32),
+    ((3, 0.25), b'\xca', np.float32),
+])
+def test_typed_arrays(values, tag, dtype):
+    packed = armpack.packb(values)
+    assert packed[1:2] == tag
+
+    decoded = armpack.unpackb(packed)
+    assert decoded.dtype == dtype
+    assert np.array_equal(decoded, np.array(values, dtype=dtype))
+
+
+def test_mixed_list_in_map():
+    packed = armpack.packb({'values': [1, 0.5], 'name': 'prop'})
+    decoded = armpack.unpackb(packed)
+    assert decoded['values'].tolist() == [1.0, 0.5]
+    assert decoded['name'] == 'prop'
+
+
+@pytest.mark.parametrize('values', [
+    [1, 'a'],
+    [1, None],
+    [1, 2 ** 31],
+])
+def test_invalid_int_lists(values):
+    with pytest.raises(Exception):
+        armpack.packb(values)
+
+
+def test_bool_list():
+    assert armpack.unpackb(armpack.packb([True, False, 1])) == [True, False, 1]
@@ -0,0 +1,135 @@
+"""
+Bone matrices baked with shared frame sweeps for several armatures and
+actions compared with baking each action on its own, needs Blender
+(see conftest.py).
+"""
+import types
+
+import numpy as np
+import pytest
+
+bpy = pytest.importorskip('bpy')
+
+from arm import exporter_anim
+
+
+class CountingScene:
+    """Counts the frame_set() calls of the bake."""
+
+    def __init__(self, scene):
+        self.scene = scene
+        self.frames = []
+
+    @property
+    def frame_current(self):
+        return self.scene.frame_current
+
+    @property
+    def frame_subframe(self):
+        return self.scene.frame_subframe
+
+    def frame_set(self, frame, subframe=0.0):
+        self.frames.append(frame)
+        self.scene.frame_set(frame, subframe=subframe)
+
+
+def create_armature(name):
+    bpy.ops.object.armature_add()
+    obj = bpy.context.active_object
+    obj.name = name
+    bpy.ops.object.mode_set(mode='EDIT')
+    child = obj.data.edit_bones.new('Child')
+    child.head = (0.0, 0.0, 1.0)
+    child.tail = (0.0, 0.5, 2.0)
+    child.parent = obj.data.edit_bones[0]
+    bpy.ops.object.mode_set(mode='OBJECT')
+    obj.animation_data_create()
+    return obj
+
+
+def create_action(obj, name, frame_range, seed):
+    rng = np.random.default_rng(seed)
+    action = bpy.data.actions.new(name)
+    obj.animation_data.action = action
+    for bone in obj.pose.bones:
+        for frame in (frame_range[0], sum(frame_range) // 2, frame_range[1]):
+            bone.location = rng.normal(0.0, 1.0, 3)
+            bone.rotation_quaternion = rng.normal(0.0, 1.0, 4)
+            bone.scale = rng.uniform(0.5, 2.0, 3)
+            for path in ('location', 'rotation_quaternion', 'scale'):
+                bone.keyframe_insert(path, frame=frame)
+    return action
+
+
+@pytest.fixture
+def scene_jobs():
+    arm_a = create_armature('BakeA')
+    arm_b = create_armature('BakeB')
+    actions = [
+        (arm_a, create_action(arm_a, 'BakeA1', (1, 20), 0), (1, 20)),
+        (arm_a, create_action(arm_a, 'BakeA2', (5, 30), 1), (5, 30)),
+        (arm_b, create_action(arm_b, 'BakeB1', (1, 10), 2), (1, 10)),
+    ]
+    arm_a.animation_data.action = actions[0][1]
+    arm_b.animation_data.action = actions[2][1]
+    yield [(obj, action, list(obj.pose.bones), frame_range) for obj, action, frame_range in actions]
+
+    for obj, action, _ in actions:
+        bpy.data.actions.remove(action)
+    for obj in (arm_a, arm_b):
+        data = obj.data
+        bpy.data.objects.remove(obj)
+        bpy.data.armatures.remove(data)
+
+
+def test_shared_sweep(scene_jobs):
+    scene = CountingScene(bpy.context.scene)
+    scene.frame_set(42, subframe=0.25)
+    scene.frames.clear()
+    shared = exporter_anim.bake_scene_bone_matrices(scene, scene_jobs)
+
+    # BakeA1 and BakeB1 share the first sweep over frames 1-20,
+    # BakeA2 has a second one over frames 5-30, then the current frame
+    # is restored
+    assert scene.frames == list(range(1, 21)) + list(range(5, 31)) + [42]
+    assert scene.frame_current == 42
+    assert scene.frame_subframe == pytest.approx(0.25)
+    assert scene_jobs[0][0].animation_data.action == scene_jobs[0][1]
+    assert scene_jobs[2][0].animation_data.action == scene_jobs[2][1]
+
+    for (armature, action, pose_bones, frame_range), matrices in zip(scene_jobs, shared):
+        orig_action = armature.animation_data.action
+        armature.animation_data.action = action
+        try:
+            expected = exporter_anim.bake_bone_matrices(bpy.context.scene, armature, pose_bones, frame_range)
+        finally:
+            armature.animation_data.action = orig_action
+
+        assert matrices.shape == (len(pose_bones), frame_range[1] - frame_range[0] + 1, 16)
+        assert np.array_equal(matrices, expected)
+
+
+def test_frame_restored_on_error(scene_jobs):
+    scene = bpy.context.scene
+    scene.frame_set(7)
+    armature, action, pose_bones, frame_range = scene_jobs[0]
+    # A bone that is not part of the armature fails after the first round
+    missing = types.SimpleNamespace(name='Missing', parent=None)
+    jobs = [scene_jobs[0], (armature, action, [missing], frame_range)]
+    with pytest.raises(KeyError):
+        exporter_anim.bake_scene_bone_matrices(scene, jobs)
+    assert scene.frame_current == 7
+
+
+def test_bone_matrices(scene_jobs):
+    armature, action, pose_bones, frame_range = scene_jobs[1]
+    matrices = exporter_anim.bake_scene_bone_matrices(bpy.context.scene, [scene_jobs[1]])[0]
+
+    armature.animation_data.action = action
+    for frame in (frame_range[0], 17, frame_range[1]):
+        bpy.context.scene.frame_set(frame)
+        root, child = pose_bones
+        expected = [root.matrix, root.matrix.inverted_safe() @ child.matrix]
+        for i, matrix in enumerate(expected):
+            row_major = np.array([list(row) for row in matrix]).reshape(-1)
+            assert np.allclose(matrices[i, frame - frame_range[0]], row_major, atol=1e-5)
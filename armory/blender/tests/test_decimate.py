@@ -0,0 +1,145 @@
+"""
+Mesh decimation of arm.lib.decimate: reached triangle counts, locked
+vertices and the quality of the simplified triangles.
+"""
+import numpy as np
+import pytest
+
+from arm.lib.decimate import decimate
+
+
+def grid(nx, ny):
+    """Triangulated grid of (nx + 1) * (ny + 1) points in [0, 1]^2,
+    returns the point coordinates and the triangles."""
+    ids = np.arange((nx + 1) * (ny + 1)).reshape(ny + 1, nx + 1)
+    a, b = ids[:-1, :-1].reshape(-1), ids[:-1, 1:].reshape(-1)
+    c, d = ids[1:, :-1].reshape(-1), ids[1:, 1:].reshape(-1)
+    tris = np.concatenate((np.stack((a, b, d), axis=1), np.stack((a, d, c), axis=1)))
+    u, v = np.meshgrid(np.linspace(0.0, 1.0, nx + 1), np.linspace(0.0, 1.0, ny + 1))
+    return np.stack((u.reshape(-1), v.reshape(-1)), axis=1), tris
+
+
+def sphere(nx=32, ny=16, seam=False):
+    """Closed UV sphere with outward facing triangles. With `seam`, the
+    vertices of the first meridian are split with different UVs."""
+    uv, tris = grid(nx, ny)
+    theta = uv[:, 0] * 2.0 * np.pi
+    phi = uv[:, 1] * np.pi
+    positions = np.stack((np.sin(phi) * np.cos(theta), np.sin(phi) * np.sin(theta), np.cos(phi)), axis=1)
+    # Snap the poles and the closing meridian to exactly equal points
+    positions[np.abs(uv[:, 1] - 0.5) == 0.5, :2] = 0.0
+    positions[uv[:, 0] == 1.0] = positions[uv[:, 0] == 0.0]
+    positions = np.round(positions, 6).astype(np.float32)
+    tris = tris[:, ::-1]
+
+    if seam:
+        attributes = np.concatenate((positions, uv.astype(np.float32)), axis=1)
+    else:
+        attributes = positions
+    return positions, attributes, tris
+
+
+def points(positions, tris):
+    """Distinct points referenced by the given triangles."""
+    return {tuple(p) for p in positions[np.asarray(tris).reshape(-1)]}
+
+
+def check_triangles(positions, tris, surface_normal):
+    """No degenerate triangles and none that are flipped or turned
+    sideways compared to the source surface."""
+    tris = np.asarray(tris).reshape(-1, 3)
+    p = positions[tris].astype(np.float64)
+    assert np.all((tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 2] != tris[:, 0]))
+    normals = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    assert np.all(lengths > 1e-6)
+
+    expected = surface_normal(p.mean(axis=1))
+    expected /= np.linalg.norm(expected, axis=1)[:, None]
+    assert np.all(np.sum(normals * expected, axis=1) > 0.2 * lengths)
+
+
+def sphere_normal(centers):
+    return centers
+
+
+def plane_normal(centers):
+    return np.tile([0.0, 0.0, 1.0], (len(centers), 1))
+
+
+@pytest.mark.parametrize('seam', [False, True])
+def test_target_counts(seam):
+    positions, attributes, tris = sphere(seam=seam)
+    num_tris = len(tris)
+    targets = [num_tris // 2, num_tris // 4, num_tris // 10]
+    levels = decimate(positions, attributes, [tris.reshape(-1)], targets)
+
+    assert len(levels) == len(targets)
+    counts = [len(level[0]) // 3 for level in levels]
+    assert counts == sorted(counts, reverse=True)
+    for count, target in zip(counts, targets):
+        # Each collapse removes two triangles
+        assert target - 1 <= count <= target
+
+
+@pytest.mark.parametrize('seam', [False, True])
+def test_triangle_quality(seam):
+    positions, attributes, tris = sphere(seam=seam)
+    targets = [len(tris) // 2, len(tris) // 4, len(tris) // 10]
+    for level in decimate(positions, attributes, [tris.reshape(-1)], targets):
+        check_triangles(positions, level[0], sphere_normal)
+
+
+def test_border_locked():
+    uv, tris = grid(16, 16)
+    positions = np.concatenate((uv, np.zeros((len(uv), 1))), axis=1).astype(np.float32)
+    # Slightly bumpy so that the collapses have different costs
+    positions[:, 2] = 0.05 * np.sin(uv[:, 0] * 7.0) * np.cos(uv[:, 1] * 5.0)
+    border = positions[(uv[:, 0] % 1.0 == 0.0) | (uv[:, 1] % 1.0 == 0.0)]
+
+    target = len(tris) // 4
+    level = decimate(positions, positions, [tris.reshape(-1)], [target])[0]
+    assert target - 1 <= len(level[0]) // 3 <= target
+    assert {tuple(p) for p in border} <= points(positions, level[0])
+    check_triangles(positions, level[0], plane_normal)
+
+
+def test_seam_locked():
+    positions, attributes, tris = sphere(seam=True)
+    # Without the poles, whose seam vertices are only used by
+    # degenerate triangles
+    on_seam = (attributes[:, 3] == 0.0) | (attributes[:, 3] == 1.0)
+    seam_vertices = np.flatnonzero(on_seam & (np.abs(positions[:, 2]) < 1.0))
+
+    target = len(tris) // 10
+    level = decimate(positions, attributes, [tris.reshape(-1)], [target])[0]
+    assert target - 1 <= len(level[0]) // 3 <= target
+    # Both sides of the seam keep all of their vertices
+    remaining = set(level[0].tolist())
+    seam_points = {tuple(p) for p in positions[seam_vertices]}
+    assert seam_points <= points(positions, level[0])
+    assert {tuple(attributes[i]) for i in seam_vertices} <= {tuple(attributes[i]) for i in remaining}
+    # Vertices with equal attributes are merged, the result only
+    # references the first of them
+    assert remaining <= set(np.unique(attributes, axis=0, return_index=True)[1].tolist())
+
+
+def test_material_boundary_locked():
+    positions, attributes, tris = sphere()
+    centers = positions[tris].mean(axis=1)
+    upper = centers[:, 2] > 0.0
+    index_arrays = [tris[upper].reshape(-1), tris[~upper].reshape(-1)]
+    upper_points = points(positions, index_arrays[0])
+    boundary = upper_points & points(positions, index_arrays[1])
+    assert len(boundary) > 0
+
+    target = len(tris) // 10
+    level = decimate(positions, attributes, index_arrays, [target])[0]
+    assert len(level) == 2
+    assert target - 1 <= (len(level[0]) + len(level[1])) // 3 <= target
+    assert boundary <= points(positions, level[0])
+    assert boundary <= points(positions, level[1])
+    # Triangles stay in their material
+    assert points(positions, level[0]) <= upper_points
+    for ia in level:
+        check_triangles(positions, ia, sphere_normal)
@@ -0,0 +1,86 @@
+import numpy as np
+
+from arm.lib import keyframes
+
+
+def _random_matrices(rng, num_frames):
+    """Smoothly animated row-major TRS matrices of shape (frame, 16),
+    the second half of them mirrored."""
+    t = np.linspace(0.0, 1.0, num_frames)
+    angle = np.pi * t
+    axis = np.array([1.0, 2.0, 3.0]) / np.sqrt(14.0)
+    quat = np.concatenate((np.sin(angle / 2)[:, None] * axis, np.cos(angle / 2)[:, None]), axis=1)
+    channels = np.empty((num_frames, 10))
+    channels[:, :3] = rng.uniform(-5.0, 5.0, 3) * t[:, None]
+    channels[:, 3:7] = quat
+    channels[:, 7:10] = 1.0 + 0.5 * np.sin(t)[:, None] * rng.uniform(0.0, 1.0, 3)
+    channels[num_frames // 2:, 7] *= -1.0
+    return keyframes.compose_matrices(channels)
+
+
+def _interpolate(channels, kept):
+    frames = np.arange(channels.shape[0])
+    return np.stack([np.interp(frames, kept, channels[kept, c]) for c in range(channels.shape[1])], axis=1)
+
+
+def test_reduce_keyframes_error():
+    rng = np.random.default_rng(0)
+    t = np.linspace(0.0, 4.0, 200)
+    channels = np.stack((np.sin(t), t * 0.5, np.where(t > 2.0, 1.0, 0.0) + rng.normal(0.0, 1e-6, t.size)), axis=1)
+
+    for max_error in (1e-4, 1e-2):
+        kept = keyframes.reduce_keyframes(channels, max_error)
+        assert kept[0] == 0 and kept[-1] == len(t) - 1
+        assert len(kept) < len(t)
+        error = np.abs(_interpolate(channels, kept) - channels).max()
+        assert error <= max_error
+
+
+def test_reduce_tracks_shares_frames():
+    t = np.linspace(0.0, 1.0, 50)
+    tracks = [
+        {'frames': np.arange(50, dtype='<i4'), 'values': t.astype('<f4')},
+        {'frames': np.arange(50, dtype='<i4'), 'values': (t * t).astype('<f4')},
+    ]
+    channels = np.stack([track['values'] for track in tracks], axis=1)
+    num_frames, num_kept, size_before, size_after = keyframes.reduce_tracks(tracks, channels, 1e-3)
+
+    assert num_frames == 50 and num_kept < 50
+    assert size_after < size_before
+    assert np.array_equal(tracks[0]['frames'], tracks[1]['frames'])
+    assert len(tracks[1]['values']) == num_kept
+
+
+def test_matrix_channels_round_trip():
+    rng = np.random.default_rng(1)
+    matrices = _random_matrices(rng, 60)
+    channels = keyframes.matrix_channels(matrices[None])
+    assert channels.shape == (60, 10)
+    # Mirrored matrices decompose into a negative x scale
+    assert np.all(channels[30:, 7] < 0.0)
+    assert np.allclose(keyframes.compose_matrices(channels), matrices, atol=1e-9)
+
+
+def test_quantize_channels_error():
+    rng = np.random.default_rng(2)
+    channels = rng.uniform(-100.0, 100.0, (500, 10))
+    channels[:, 4] = 0.25  # Constant channel
+
+    quantized, offset, scale = keyframes.quantize_channels(channels)
+    assert quantized.dtype == np.int16
+    decoded = keyframes.dequantize_channels(quantized, offset, scale)
+    error = np.abs(decoded - channels)
+    assert np.all(error <= scale * 0.5 + 1e-4)
+    assert np.allclose(decoded[:, 4], 0.25)
+
+
+def test_quantize_tracks_round_trip():
+    rng = np.random.default_rng(3)
+    matrices = _random_matrices(rng, 120)
+    track = {'target': 'transform', 'frames': np.arange(120, dtype='<i4'), 'values': matrices.astype('<f4').reshape(-1)}
+    size_before, size_after = keyframes.quantize_tracks([track])
+
+    assert 'values' not in track
+    assert size_after < size_before / 2
+    decoded = keyframes.compose_matrices(keyframes.dequantize_channels(track['trs'], track['trs_offset'], track['trs_scale']))
+    assert np.abs(decoded - matrices).max() < 1e-3
@@ -0,0 +1,121 @@
+"""
+NumPy lightmap denoiser and the parallel denoise scheduler, needs
+Blender (see conftest.py).
+"""
+import threading
+import time
+
+import numpy as np
+import pytest
+
+bpy = pytest.importorskip('bpy')
+
+from arm.lightmapper.utility.denoiser import atrous, scheduler
+
+
+def noisy_lightmap(rng, size=64):
+    """Two flat regions with a hard edge between them and multiplicative
+    noise like that of a low sample count bake."""
+    clean = np.full((size, size, 3), 0.2, dtype=np.float32)
+    clean[:, size // 2:] = 4.0
+    noise = rng.gamma(8.0, 1.0 / 8.0, clean.shape).astype(np.float32)
+    return clean, clean * noise
+
+
+def test_atrous_reduces_noise():
+    clean, noisy = noisy_lightmap(np.random.default_rng(0))
+    denoised = atrous.atrous_filter(noisy)
+
+    assert denoised.shape == noisy.shape
+    assert denoised.dtype == np.float32
+    error_before = np.abs(noisy - clean) / clean
+    error_after = np.abs(denoised - clean) / clean
+    assert error_after.mean() < 0.5 * error_before.mean()
+
+
+def test_atrous_preserves_edges():
+    clean, noisy = noisy_lightmap(np.random.default_rng(1))
+    denoised = atrous.atrous_filter(noisy)
+
+    # The columns next to the edge keep their side's brightness instead
+    # of being blurred into each other
+    half = clean.shape[1] // 2
+    assert np.median(denoised[:, half - 1]) < 0.4
+    assert np.median(denoised[:, half]) > 2.0
+
+
+def test_atrous_constant():
+    rgb = np.full((16, 24, 3), 1.5, dtype=np.float32)
+    assert np.allclose(atrous.atrous_filter(rgb), rgb)
+
+
+class RecordingDenoiser:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.calls = 0
+
+    def denoise_image(self, rgb):
+        with self.lock:
+            self.running += 1
+            self.calls += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        return rgb * 0.5
+
+
+@pytest.fixture
+def baked_images(tmp_path):
+    if not hasattr(bpy.context.scene, 'TLM_SceneProperties'):
+        pytest.skip('Armory add-on not enabled')
+
+    paths = []
+    for i in range(6):
+        image = bpy.data.images.new(f'Lightmap{i}', 8, 4, float_buffer=True)
+        image.pixels.foreach_set(np.full(8 * 4 * 4, i + 1.0, dtype=np.float32))
+        path = str(tmp_path / f'Lightmap{i}_baked.hdr')
+        image.filepath_raw = path
+        image.file_format = 'HDR'
+        image.save()
+        bpy.data.images.remove(image)
+        paths.append(path)
+    return paths
+
+
+def read_pixels(path):
+    image = bpy.data.images.load(path, check_existing=False)
+    try:
+        pixels = np.empty(len(image.pixels), dtype=np.float32)
+        image.pixels.foreach_get(pixels)
+    finally:
+        bpy.data.images.remove(image)
+    return pixels.reshape(-1, 4)
+
+
+def test_scheduler_output(baked_images):
+    denoiser = RecordingDenoiser()
+    scheduler.TLM_Denoise_Scheduler(denoiser, max_jobs=3).run(baked_images)
+
+    assert denoiser.calls == len(baked_images)
+    for i, path in enumerate(baked_images):
+        pixels = read_pixels(path[:-10] + '_denoised.hdr')
+        assert np.allclose(pixels[:, :3], (i + 1.0) * 0.5, rtol=1e-2)
+
+
+def test_scheduler_max_jobs(baked_images):
+    denoiser = RecordingDenoiser()
+    scheduler.TLM_Denoise_Scheduler(denoiser, max_jobs=2).run(baked_images)
+    assert denoiser.max_running == 2
+
+
+def test_scheduler_memory_budget(baked_images):
+    denoiser = RecordingDenoiser()
+    denoise_scheduler = scheduler.TLM_Denoise_Scheduler(denoiser, max_jobs=4)
+    # Room for a single lightmap, the jobs run one after another
+    denoise_scheduler.max_memory = denoise_scheduler.job_memory(8, 4)
+    denoise_scheduler.run(baked_images)
+    assert denoiser.max_running == 1
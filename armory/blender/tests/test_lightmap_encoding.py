@@ -0,0 +1,96 @@
+"""
+CPU lightmap encoders compared with the previous per-pixel code, needs
+Blender (see conftest.py).
+"""
+import math
+
+import numpy as np
+import pytest
+
+bpy = pytest.importorskip('bpy')
+pytest.importorskip('gpu')
+pytest.importorskip('bgl')
+
+from arm.lightmapper.utility import encoding
+
+
+@pytest.fixture
+def pixels():
+    rng = np.random.default_rng(0)
+    # HDR values with a few zero and very bright texels
+    data = rng.exponential(2.0, (4096, 4)).astype(np.float32)
+    data[:16, :3] = 0.0
+    data[16:32, :3] *= 100.0
+    data[:, 3] = 1.0
+    return data
+
+
+def encode_rgbm_per_pixel(pixels, max_range):
+    result = list(pixels.reshape(-1))
+    for i in range(0, len(result), 4):
+        for j in range(3):
+            result[i + j] *= 1.0 / max_range
+        result[i + 3] = min(max(max(result[i], result[i + 1], result[i + 2], 1e-6), 0.0), 1.0)
+        result[i + 3] = math.ceil(result[i + 3] * 255.0) / 255.0
+        for j in range(3):
+            result[i + j] /= result[i + 3]
+    return np.array(result).reshape(-1, 4)
+
+
+def encode_rgbd_per_pixel(pixels):
+    result = list(pixels.reshape(-1))
+    for i in range(0, len(result), 4):
+        max_rgb = max(max(result[i], result[i + 1], result[i + 2]), 1e-6)
+        d = max(255.0 / max_rgb, 1.0)
+        d = np.clip(math.floor(d) / 255.0, 0.0, 1.0)
+        for j in range(3):
+            result[i + j] = math.pow(result[i + j] * d, 1 / 2.2)
+        result[i + 3] = d
+    return np.array(result).reshape(-1, 4)
+
+
+def encode_logluv_per_pixel(pixels):
+    """LinearToLogLuv() of the GPU encoder, cLogLuvM is column major."""
+    result = []
+    for r, g, b, _ in pixels.tolist():
+        x = max(0.2209 * r + 0.1138 * g + 0.0102 * b, 1e-6)
+        y = max(0.3390 * r + 0.6780 * g + 0.1130 * b, 1e-6)
+        z = max(0.4184 * r + 0.7319 * g + 0.2969 * b, 1e-6)
+        le = 2.0 * math.log2(y) + 127.0
+        w = le - math.floor(le)
+        result.append((x / z, y / z, (le - math.floor(w * 255.0) / 255.0) / 255.0, w))
+    return np.array(result)
+
+
+def to_8bit(values):
+    return np.rint(np.clip(values, 0.0, 1.0) * 255.0)
+
+
+def test_rgbm(pixels):
+    max_range = 6.0
+    encoded = encoding.encodeRGBM(pixels, max_range)
+    expected = encode_rgbm_per_pixel(pixels, max_range)
+    assert encoded.dtype == np.float32
+    assert np.array_equal(to_8bit(encoded), to_8bit(expected))
+
+
+def test_rgbd(pixels):
+    encoded = encoding.encodeRGBD(pixels, 6.0)
+    expected = encode_rgbd_per_pixel(pixels)
+    assert np.abs(to_8bit(encoded) - to_8bit(expected)).max() <= 1
+
+
+def test_logluv(pixels):
+    encoded = encoding.encodeLogLuv(pixels, 1.0)
+    expected = encode_logluv_per_pixel(pixels)
+    assert np.allclose(encoded, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_rgbm_decodes(pixels):
+    # Within range, RGB * A * maxRange gives back the input up to the
+    # 8-bit quantization of the stored channels
+    max_range = 6.0
+    in_range = pixels[np.max(pixels[:, :3], axis=1) < max_range]
+    encoded = to_8bit(encoding.encodeRGBM(in_range, max_range)) / 255.0
+    decoded = encoded[:, :3] * encoded[:, 3:] * max_range
+    assert np.abs(decoded - in_range[:, :3]).max() <= max_range / 255.0
@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+
+import arm.lib.lz4
+from arm.lib import armpack
+from arm.lib.lz4 import LZ4
+
+
+@pytest.fixture(autouse=True)
+def numpy_encoder(monkeypatch):
+    # Test the NumPy matcher even if the native module is installed
+    monkeypatch.setattr(arm.lib.lz4, 'lz4_block', None)
+    # Small blocks so that matches across block boundaries are covered
+    monkeypatch.setattr(LZ4, 'block_size', 1 << 12)
+
+
+def _inputs():
+    rng = np.random.default_rng(0)
+    yield b''
+    yield b'a'
+    yield b'abcdefghijklm'
+    yield bytes(20000)
+    yield rng.integers(0, 256, 20000, dtype=np.uint8).tobytes()
+    yield b'Lorem ipsum dolor sit amet, ' * 2000
+    # Float data with repeated vertices, like exported meshes
+    yield np.repeat(rng.normal(size=(500, 3)).astype('<f4'), 4, axis=0).tobytes()
+    # Short repeated patterns close to the end of the input
+    yield rng.integers(0, 4, 9000, dtype=np.uint8).tobytes() + b'xyzxyzxyzxyz'
+
+
+def reference_decode(src: bytes) -> bytes:
+    """Decoder of raw LZ4 blocks written from the block format
+    description, independent of arm.lib.lz4. Also checks the end of
+    block conditions that decoders may rely on."""
+    out = bytearray()
+    pos = 0
+    last_match_start = None
+    while True:
+        token = src[pos]
+        pos += 1
+
+        literal_len = token >> 4
+        if literal_len == 15:
+            while True:
+                byte = src[pos]
+                pos += 1
+                literal_len += byte
+                if byte != 255:
+                    break
+        assert pos + literal_len <= len(src)
+        out += src[pos:pos + literal_len]
+        pos += literal_len
+
+        if pos == len(src):
+            if last_match_start is not None:
+                # "The last match must start at least 12 bytes before
+                # end of block" and "the last 5 bytes are always literals"
+                assert last_match_start <= len(out) - 12
+                assert literal_len >= 5
+            return bytes(out)
+
+        offset = src[pos] | src[pos + 1] << 8
+        pos += 2
+        assert 0 < offset <= len(out)
+
+        match_len = token & 15
+        if match_len == 15:
+            while True:
+                byte = src[pos]
+                pos += 1
+                match_len += byte
+                if byte != 255:
+                    break
+        match_len += 4
+
+        # Copy byte by byte, overlapping matches repeat the pattern
+        last_match_start = len(out)
+        start = len(out) - offset
+        for i in range(match_len):
+            out.append(out[start + i])
+
+
+def test_round_trip():
+    for data in _inputs():
+        encoded = LZ4.encode(data)
+        assert len(encoded) <= LZ4.encode_bound(len(data)) or len(data) == 0
+        assert LZ4.decode(encoded, len(data)) == data
+
+
+def test_reference_decoder():
+    for data in _inputs():
+        assert reference_decode(LZ4.encode(data)) == data
+
+
+def test_native_decoder():
+    lz4_block = pytest.importorskip('lz4.block')
+    for data in _inputs():
+        if len(data) == 0:
+            continue
+        assert lz4_block.decompress(LZ4.encode(data), uncompressed_size=len(data)) == data
+
+
+def test_compresses_redundant_data():
+    data = b'Lorem ipsum dolor sit amet, ' * 2000
+    assert len(LZ4.encode(data)) < len(data) // 20
+
+
+def test_armpack_lz4_round_trip():
+    rng = np.random.default_rng(1)
+    scene = {
+        'name': 'Scene',
+        'frame_time': 0.016666668,
+        'objects': [
+            {'name': f'Cube.{i:03}', 'type': 'mesh_object', 'visible': True, 'data_ref': 'cube',
+             'transform': {'values': rng.normal(size=16).astype('<f4')}}
+            for i in range(200)
+        ],
+        'mesh_datas': [{
+            'name': 'cube',
+            'vertex_arrays': [{'attrib': 'pos', 'values': rng.integers(-32768, 32767, 3000).astype(np.int16)}],
+            'index_arrays': [{'values': rng.integers(0, 1000, 6000).astype(np.int32)}],
+        }],
+        'indices': [1, 2, 3],
+        'weights': [0.5, 0.25],
+        'empty': [],
+        'nothing': None,
+    }
+    packed = armpack.packb(scene)
+    encoded = LZ4.encode(packed)
+    decoded = LZ4.decode(encoded, LZ4.encode_bound(len(packed)))
+    assert decoded[:len(packed)] == packed
+
+    # Typed arrays are unpacked as NumPy arrays, packing them again
+    # gives the same bytes
+    assert armpack.packb(armpack.unpackb(decoded[:len(packed)])) == packed
@@ -0,0 +1,235 @@
+"""
+Shader pass data of arm.lib.make_datas: preprocessor evaluation,
+includes and the pass cache, also over the bundled shader passes.
+Needs Blender (see conftest.py).
+"""
+import json
+import os
+
+import pytest
+
+pytest.importorskip('bpy')
+
+import arm.utils
+from arm import assets
+import arm.lib.make_datas as make_datas
+
+SHADERS_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'Shaders')
+
+
+@pytest.fixture(autouse=True)
+def build_dir(tmp_path, monkeypatch):
+    fp_build = tmp_path / 'build'
+    (fp_build / 'compiled' / 'Shaders').mkdir(parents=True)
+    monkeypatch.setattr(arm.utils, 'get_fp_build', lambda: str(fp_build))
+    monkeypatch.setattr(assets, 'shader_passes_assets', {})
+    monkeypatch.setattr(make_datas, '_sources', {})
+    monkeypatch.setattr(make_datas, '_pass_cache', {})
+    return fp_build
+
+
+def make_parser(defs=()):
+    c = {'links': []}
+    con = {'constants': [], 'texture_units': [], 'vertex_elements': []}
+    return make_datas.ShaderParser(c, con, make_datas.DefSet(list(defs)), [])
+
+
+@pytest.mark.parametrize('expr, expected', [
+    ('1', 1),
+    ('0', 0),
+    ('defined(_A)', 1),
+    ('defined _A', 1),
+    ('defined(_B)', 0),
+    ('!defined(_B) && defined(_A)', 1),
+    ('defined(_B) || 0', 0),
+    ('_A', 1),
+    ('_B', 0),
+    ('LEVEL >= 2', 1),
+    ('LEVEL * 2 == 6 && !(LEVEL < 3)', 1),
+    ('(LEVEL > 5) ? 7 : 9', 9),
+    ('1 + 2 * 3 - (8 >> 2)', 5),
+    ('0x10 | 1', 17),
+    ('NESTED == 4', 1),
+    ('1 / 0', 0),
+    ('vec3(1.0)', 0),
+])
+def test_evaluate(expr, expected):
+    parser = make_parser(['_A'])
+    parser.macros['LEVEL'] = '3'
+    parser.macros['NESTED'] = 'LEVEL + 1'
+    assert parser.evaluate(expr) == expected
+
+
+def test_evaluate_undef():
+    parser = make_parser(['_A'])
+    parser.macros['_A'] = None
+    assert parser.evaluate('defined(_A)') == 0
+    assert parser.is_defined('_A') is False
+
+
+def test_defs_queried():
+    parser = make_parser(['_A', '_C'])
+    parser.evaluate('defined(_A) || defined(_B)')
+    assert parser.defs.queried == {'_A': True, '_B': False}
+
+
+def write_shader(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def parse(tmp_path, frag_text, defs=()):
+    vert = write_shader(tmp_path / 'test.vert.glsl', '#version 450\nin vec3 pos;\nin vec2 tex;\nvoid main() {}\n')
+    frag = write_shader(tmp_path / 'test.frag.glsl', frag_text)
+    c = {'name': 'test', 'vertex_shader': vert, 'fragment_shader': frag, 'links': []}
+    sres = {'contexts': []}
+    files = make_datas.parse_context(c, sres, [], make_datas.DefSet(list(defs)), [])
+    return sres['contexts'][0], files
+
+
+def names(entries):
+    return [e['name'] for e in entries]
+
+
+CONDITIONS = """#version 450
+#define QUALITY 2
+#if QUALITY > 1 && defined(_A)
+uniform sampler2D texHigh;
+#elif QUALITY > 1
+uniform sampler2D texMedium;
+#else
+uniform sampler2D texLow;
+#endif
+#ifndef _A
+uniform float noA;
+#endif
+#undef QUALITY
+#if QUALITY
+uniform float quality;
+#endif
+void main() {}
+"""
+
+
+@pytest.mark.parametrize('defs, expected', [
+    ([], ['texMedium', 'noA']),
+    (['_A'], ['texHigh']),
+])
+def test_conditions(tmp_path, defs, expected):
+    con, _ = parse(tmp_path, CONDITIONS, defs)
+    assert names(con['texture_units']) + names(con['constants']) == expected
+
+
+def test_vertex_elements(tmp_path):
+    con, _ = parse(tmp_path, '#version 450\nvoid main() {}\n')
+    assert con['vertex_elements'] == [{'data': 'float3', 'name': 'pos'}, {'data': 'float2', 'name': 'tex'}]
+
+
+def test_include(tmp_path):
+    (tmp_path / 'std').mkdir()
+    write_shader(tmp_path / 'std' / 'common.glsl', 'uniform vec3 eye;\n#ifdef _A\nuniform float onlyA;\n#endif\n')
+    con, files = parse(tmp_path, '#version 450\n#include "std/common.glsl"\nuniform vec3 eye;\nvoid main() {}\n')
+
+    assert con['constants'] == [{'type': 'vec3', 'name': 'eye'}]
+    assert os.path.normpath(str(tmp_path / 'std' / 'common.glsl')) in files
+
+
+def test_sampler_array_once(tmp_path):
+    frag = '#version 450\n//!uniform sampler2D shadowMaps[2];\nuniform sampler2D shadowMaps[2];\nvoid main() {}\n'
+    con, _ = parse(tmp_path, frag)
+    assert names(con['texture_units']) == ['shadowMaps[0]', 'shadowMaps[1]']
+
+
+def test_source_cache(tmp_path):
+    path = write_shader(tmp_path / 'cached.glsl', 'uniform float a;\n')
+    source = make_datas.get_source(path)
+    assert make_datas.get_source(path) is source
+
+    os.utime(path, ns=(0, 0))
+    assert make_datas.get_source(path) is source
+
+    write_shader(tmp_path / 'cached.glsl', 'uniform float b;\n')
+    assert make_datas.get_source(path).digest != source.digest
+
+
+def shader_passes():
+    return sorted(
+        name for name in os.listdir(SHADERS_DIR)
+        if os.path.isfile(os.path.join(SHADERS_DIR, name, name + '.json'))
+    )
+
+
+def load_pass_json(name):
+    with open(os.path.join(SHADERS_DIR, name, name + '.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def make_pass(name, defs, make_variants=False):
+    pass_dir = os.path.join(SHADERS_DIR, name)
+    json_data = load_pass_json(name)
+    assets.shader_passes_assets.setdefault(name, [])
+
+    cwd = os.getcwd()
+    os.chdir(pass_dir)
+    try:
+        res = {'shader_datas': []}
+        make_datas.make(res, name, json_data, arm.utils.get_fp_build(), defs, make_variants)
+    finally:
+        os.chdir(cwd)
+    return res['shader_datas']
+
+
+DEFINE_SETS = [
+    [],
+    ['_CSM', '_Irr', '_Rad', '_SSAO', '_Deferred', '_ShadowMap', '_Clusters', '_SinglePoint'],
+    ['_LDR', '_Brdf', '_SMSizeUniform', '_Spot', '_VoxelAOvar', '_SSR', '_Bloom'],
+]
+
+
+@pytest.mark.parametrize('name', shader_passes())
+def test_shader_pass_cached(name):
+    for defs in DEFINE_SETS:
+        make_datas._pass_cache.clear()
+        fresh = make_pass(name, defs)
+        assert len(fresh) == 1 and len(fresh[0]['contexts']) > 0
+
+        cached = make_pass(name, defs)
+        assert cached == fresh
+
+        # The result is a copy that the caller may modify
+        cached[0]['contexts'][0]['name'] = 'modified'
+        assert make_pass(name, defs) == fresh
+
+
+def test_shader_pass_define_change(monkeypatch):
+    name = 'deferred_light'
+    make_pass(name, DEFINE_SETS[1])
+    queried = make_datas._pass_cache[name]['defs']
+
+    parsed = []
+    parse_file = make_datas.ShaderParser.parse_file
+    monkeypatch.setattr(make_datas.ShaderParser, 'parse_file', lambda self, *args: parsed.append(args) or parse_file(self, *args))
+
+    # A define the pass never looks up keeps the cached result
+    make_pass(name, DEFINE_SETS[1] + ['_NotUsedByAnyShader'])
+    assert parsed == []
+
+    # Changing a looked up define parses the pass again and gives the
+    # same result as a fresh build
+    removed = next(d for d, found in queried.items() if found)
+    changed = [d for d in DEFINE_SETS[1] if d != removed]
+    result = make_pass(name, changed)
+    assert parsed != []
+
+    make_datas._pass_cache.clear()
+    assert make_pass(name, changed) == result
+
+
+def test_shader_pass_variants(build_dir):
+    name = next(name for name in shader_passes() if len(load_pass_json(name).get('variants', [])) > 0)
+    variant = load_pass_json(name)['variants'][0]
+
+    first = make_pass(name, [variant], True)
+    assert (build_dir / 'compiled' / 'Shaders' / (name + variant + '.frag.glsl')).is_file()
+    assert name not in make_datas._pass_cache
+    assert make_pass(name, [variant], True) == first
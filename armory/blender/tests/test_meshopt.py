@@ -0,0 +1,75 @@
+import numpy as np
+
+from arm.lib import meshopt
+
+
+def _shuffled_grid(size, seed=0):
+    """Triangles of a size x size quad grid in random order, and the
+    vertex positions."""
+    rng = np.random.default_rng(seed)
+    v = np.arange((size + 1) * (size + 1)).reshape(size + 1, size + 1)
+    a, b, c, d = v[:-1, :-1].ravel(), v[:-1, 1:].ravel(), v[1:, :-1].ravel(), v[1:, 1:].ravel()
+    tris = np.concatenate((np.stack((a, b, d), axis=1), np.stack((a, d, c), axis=1)))
+    tris = tris[rng.permutation(len(tris))]
+
+    y, x = np.mgrid[0:size + 1, 0:size + 1]
+    positions = np.stack((x.ravel(), y.ravel(), np.sin(x.ravel() * 0.3)), axis=1).astype(np.float64)
+    return tris, positions
+
+
+def _is_permutation(order, count):
+    return np.array_equal(np.sort(order), np.arange(count))
+
+
+def test_vertex_cache_order():
+    tris, positions = _shuffled_grid(40)
+    num_verts = len(positions)
+    tri_order, cluster_starts = meshopt.optimize_vertex_cache(tris.reshape(-1), num_verts)
+
+    assert _is_permutation(tri_order, len(tris))
+    assert cluster_starts[0] == 0 and np.all(np.diff(cluster_starts) > 0)
+
+    acmr_before, atvr_before = meshopt.analyze_vertex_cache(tris)
+    acmr_after, atvr_after = meshopt.analyze_vertex_cache(tris[tri_order])
+    assert acmr_after < acmr_before * 0.6
+    assert atvr_after < atvr_before
+
+
+def test_overdraw_keeps_clusters():
+    tris, positions = _shuffled_grid(30, seed=1)
+    tri_order, cluster_starts = meshopt.optimize_vertex_cache(tris.reshape(-1), len(positions))
+    new_order = meshopt.optimize_overdraw(tris.reshape(-1), positions, tri_order, cluster_starts)
+
+    assert _is_permutation(new_order, len(tris))
+    # Clusters are moved as a whole
+    bounds = list(cluster_starts) + [len(tri_order)]
+    clusters = {tuple(tri_order[bounds[i]:bounds[i + 1]]) for i in range(len(bounds) - 1)}
+    position = 0
+    while position < len(new_order):
+        match = [c for c in clusters if tuple(new_order[position:position + len(c)]) == c]
+        assert len(match) == 1
+        position += len(match[0])
+
+
+def test_vertex_fetch_order():
+    tris, positions = _shuffled_grid(10, seed=2)
+    num_verts = len(positions) + 5  # Unused vertices
+    index_arrays = [tris[:50].reshape(-1), tris[50:].reshape(-1)]
+    order, remap = meshopt.optimize_vertex_fetch(index_arrays, num_verts)
+
+    assert _is_permutation(order, num_verts)
+    assert np.array_equal(remap[order], np.arange(num_verts))
+
+    # Remapped indices reference the same vertices, first used first
+    remapped = np.concatenate([remap[a] for a in index_arrays])
+    assert np.array_equal(order[remapped], np.concatenate(index_arrays))
+    _, first_use = np.unique(remapped, return_index=True)
+    assert np.all(np.diff(first_use) > 0)
+    assert set(order[-5:]) == set(range(len(positions), num_verts))
+
+
+def test_analyze_vertex_cache():
+    # Every vertex transformed once
+    acmr, atvr = meshopt.analyze_vertex_cache(np.array([0, 1, 2, 2, 1, 3]))
+    assert acmr == 2.0
+    assert atvr == 1.0
@@ -0,0 +1,95 @@
+"""
+Shape key export compared with the previous per-vertex code, needs
+Blender (see conftest.py).
+"""
+import numpy as np
+import pytest
+
+bpy = pytest.importorskip('bpy')
+bmesh = pytest.importorskip('bmesh')
+
+from arm.exporter import ArmoryExporter
+
+
+@pytest.fixture
+def morph_object():
+    bpy.ops.mesh.primitive_uv_sphere_add(segments=24, ring_count=12)
+    obj = bpy.context.active_object
+    obj.shape_key_add(name='Basis')
+    rng = np.random.default_rng(0)
+    for i in range(3):
+        key = obj.shape_key_add(name=f'Key{i}')
+        co = np.empty(len(key.data) * 3, dtype=np.float32)
+        key.data.foreach_get('co', co)
+        key.data.foreach_set('co', co + rng.normal(0.0, 0.1, co.size).astype(np.float32))
+    yield obj
+    bpy.data.objects.remove(obj)
+
+
+@pytest.fixture
+def exporter():
+    # The shape key methods don't use any exporter state
+    return ArmoryExporter.__new__(ArmoryExporter)
+
+
+def test_vertex_data(morph_object, exporter):
+    key_blocks = morph_object.data.shape_keys.key_blocks
+    base = key_blocks[0]
+    base_co, base_nor = exporter.get_shape_key_data(base)
+
+    for key in key_blocks[1:]:
+        data = exporter.get_vertex_data_from_shape_key(base_co, base_nor, key)
+
+        base_vert_pos = base.data.values()
+        base_vert_nor = base.normals_split_get()
+        vert_pos = key.data.values()
+        vert_nor = key.normals_split_get()
+        pos = [list(vert_pos[i].co - base_vert_pos[i].co) for i in range(len(vert_pos))]
+        nor = [[vert_nor[j + i * 3] - base_vert_nor[j + i * 3] for j in range(3)] for i in range(len(vert_pos))]
+
+        assert np.array_equal(data['pos'], np.array(pos))
+        assert np.array_equal(data['nor'], np.array(nor))
+
+
+def test_morph_uv_set(morph_object, exporter):
+    img_size = 16
+    exporter.create_morph_uv_set(morph_object, img_size)
+    uv_layer = morph_object.data.uv_layers['UVMap_shape_key']
+    uvs = np.empty(len(morph_object.data.loops) * 2, dtype=np.float32)
+    uv_layer.data.foreach_get('uv', uvs)
+
+    bm = bmesh.new()
+    bm.from_mesh(morph_object.data)
+    expected = np.empty_like(uvs)
+    pixel_size = 1.0 / img_size
+    for i, v in enumerate(bm.verts):
+        for loop in v.link_loops:
+            expected[loop.index * 2] = (i % img_size + 0.5) * pixel_size
+            expected[loop.index * 2 + 1] = (i // img_size + 0.5) * pixel_size
+    bm.free()
+
+    assert np.allclose(uvs, expected)
+
+
+def test_morph_image(tmp_path, exporter):
+    rng = np.random.default_rng(1)
+    img_size, extra_x = 8, 3
+    data = rng.uniform(0.0, 1.0, (2, 13, 3))
+    exporter.write_output_image(data, extra_x, img_size, 'morph', str(tmp_path))
+
+    padded = np.pad(data, ((0, 0), (0, extra_x), (0, 0)), 'minimum')
+    pixel_list = []
+    for y in range(len(padded)):
+        for x in range(len(padded[0])):
+            pixel_list.extend((padded[y, x, 0], padded[y, x, 1], padded[y, x, 2], 1.0))
+    pixel_list += [0] * (img_size * img_size * 4 - len(pixel_list))
+
+    image = bpy.data.images.load(str(tmp_path / 'morph.png'))
+    try:
+        image.colorspace_settings.name = 'Non-Color'
+        pixels = np.empty(img_size * img_size * 4, dtype=np.float32)
+        image.pixels.foreach_get(pixels)
+    finally:
+        bpy.data.images.remove(image)
+
+    assert np.allclose(pixels, pixel_list, atol=1.0 / 255.0)
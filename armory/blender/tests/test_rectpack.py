@@ -0,0 +1,87 @@
+import random
+
+from arm.lightmapper.utility.rectpack import MaxRectsBaf, MaxRectsBl, MaxRectsBlsf, MaxRectsBssf, \
+    MaxRectsNpBaf, MaxRectsNpBl, MaxRectsNpBlsf, MaxRectsNpBssf
+
+VARIANTS = [
+    (MaxRectsBl, MaxRectsNpBl),
+    (MaxRectsBssf, MaxRectsNpBssf),
+    (MaxRectsBaf, MaxRectsNpBaf),
+    (MaxRectsBlsf, MaxRectsNpBlsf),
+]
+
+
+def _random_rects(rng, count, max_size, integer=True):
+    if integer:
+        return [(rng.randint(1, max_size), rng.randint(1, max_size)) for _ in range(count)]
+    return [(rng.uniform(0.5, max_size), rng.uniform(0.5, max_size)) for _ in range(count)]
+
+
+def _pack(algo_cls, width, height, rects, rot=True):
+    algo = algo_cls(width, height, rot=rot)
+    for i, (w, h) in enumerate(rects):
+        algo.add_rect(w, h, rid=i)
+    return algo
+
+
+def test_same_placement_as_maxrects():
+    rng = random.Random(0)
+    for rot in (True, False):
+        rects = _random_rects(rng, 150, 40)
+        for py_cls, np_cls in VARIANTS:
+            expected = _pack(py_cls, 256, 256, rects, rot)
+            packed = _pack(np_cls, 256, 256, rects, rot)
+            assert packed.rect_list() == expected.rect_list()
+            assert packed.used_area() == expected.used_area()
+            packed.validate_packing()
+
+
+def test_float_rects_in_integer_bin():
+    rng = random.Random(1)
+    rects = _random_rects(rng, 150, 30.0, integer=False)
+    for py_cls, np_cls in VARIANTS:
+        packed = _pack(np_cls, 256, 256, rects)
+        # Raises on overlapping or out of bounds rectangles
+        packed.validate_packing()
+
+        expected = _pack(py_cls, 256, 256, rects)
+        assert len(packed) == len(expected)
+        assert abs(packed.used_area() - expected.used_area()) < 1e-6
+
+
+def test_float_bin():
+    rng = random.Random(2)
+    rects = _random_rects(rng, 100, 20)
+    packed = _pack(MaxRectsNpBssf, 200.5, 150.25, rects)
+    packed.validate_packing()
+    assert len(packed) == len(_pack(MaxRectsBssf, 200.5, 150.25, rects))
+
+
+def test_list_to_array_switch(monkeypatch):
+    rng = random.Random(3)
+    rects = _random_rects(rng, 120, 40)
+    for py_cls, np_cls in VARIANTS:
+        expected = _pack(py_cls, 256, 256, rects).rect_list()
+
+        # Few free rectangles are kept in the MaxRects variant
+        packed = _pack(np_cls, 256, 256, rects[:3])
+        assert packed._list is not None
+        assert packed.rect_list() == expected[:3]
+
+        # Placement is the same with the switch at any point
+        for list_max_rects in (0, 8, 10 ** 9):
+            monkeypatch.setattr(np_cls, 'list_max_rects', list_max_rects)
+            packed = _pack(np_cls, 256, 256, rects)
+            assert (packed._list is None) == (list_max_rects < 10 ** 9)
+            assert packed.rect_list() == expected
+            packed.validate_packing()
+
+
+def test_switch_with_float_rects(monkeypatch):
+    monkeypatch.setattr(MaxRectsNpBssf, 'list_max_rects', 4)
+    rng = random.Random(4)
+    rects = _random_rects(rng, 60, 30.0, integer=False)
+    packed = _pack(MaxRectsNpBssf, 256, 256, rects)
+    assert packed._list is None and packed._max_rects.dtype.kind == 'f'
+    packed.validate_packing()
+    assert len(packed) == len(_pack(MaxRectsBssf, 256, 256, rects))
@@ -0,0 +1,189 @@
+"""
+HTTP server of arm.lib.server: revalidation with ETags, byte ranges,
+precompressed siblings and the logged response sizes.
+"""
+import gzip
+import http.client
+import os
+import threading
+import time
+
+import pytest
+
+from arm.lib import server
+
+DATA = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def directory(tmp_path):
+    (tmp_path / 'data.arm').write_bytes(DATA)
+    (tmp_path / 'data.arm.gz').write_bytes(gzip.compress(DATA))
+    (tmp_path / 'data.arm.br').write_bytes(b'not really brotli')
+    (tmp_path / 'plain.js').write_bytes(b'var x = 1;')
+    return tmp_path
+
+
+@pytest.fixture
+def http_server(directory):
+    httpd = server.HTTPServer(0, str(directory), True)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def request_(http_server):
+    """Send a request on a keep-alive connection and return the status,
+    the headers and the body of the response."""
+    conn = http.client.HTTPConnection('127.0.0.1', http_server.server_address[1], timeout=5)
+
+    def send(path, headers=None, method='GET'):
+        conn.request(method, path, headers=headers or {})
+        response = conn.getresponse()
+        body = response.read()
+        return response.status, response.headers, body
+
+    yield send
+    conn.close()
+
+
+def wait_for_log(capsys, line):
+    """The log line is printed after the response has been sent."""
+    out = ''
+    deadline = time.monotonic() + 5.0
+    while time.monotonic() < deadline:
+        out += capsys.readouterr().out
+        if line in out:
+            return out
+        time.sleep(0.01)
+    raise AssertionError(f'{line!r} not logged in {out!r}')
+
+
+def test_get(request_):
+    status, headers, body = request_('/data.arm')
+    assert status == 200
+    assert body == DATA
+    assert headers['Content-Length'] == str(len(DATA))
+    assert headers['Accept-Ranges'] == 'bytes'
+    assert headers['Cache-Control'] == 'no-cache'
+    assert headers['Content-Encoding'] is None
+
+    status, headers, body = request_('/missing.arm')
+    assert status == 404
+
+
+def test_etag(request_):
+    _, headers, _ = request_('/data.arm')
+    etag = headers['ETag']
+    last_modified = headers['Last-Modified']
+
+    status, headers, body = request_('/data.arm', {'If-None-Match': etag})
+    assert status == 304
+    assert body == b''
+    assert headers['ETag'] == etag
+
+    status, _, body = request_('/data.arm', {'If-None-Match': '"other", ' + etag})
+    assert status == 304
+    status, _, body = request_('/data.arm', {'If-None-Match': '"other"'})
+    assert status == 200
+    assert body == DATA
+
+    status, _, _ = request_('/data.arm', {'If-Modified-Since': last_modified})
+    assert status == 304
+
+
+def test_etag_changes(request_, directory):
+    _, headers, _ = request_('/plain.js')
+    etag = headers['ETag']
+    path = directory / 'plain.js'
+    path.write_bytes(b'var x = 2;')
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+
+    status, headers, body = request_('/plain.js', {'If-None-Match': etag})
+    assert status == 200
+    assert body == b'var x = 2;'
+    assert headers['ETag'] != etag
+
+
+@pytest.mark.parametrize('header, start, end', [
+    ('bytes=0-99', 0, 99),
+    ('bytes=100-', 100, len(DATA) - 1),
+    ('bytes=-10', len(DATA) - 10, len(DATA) - 1),
+    ('bytes=5000-99999', 5000, len(DATA) - 1),
+    ('bytes=-99999', 0, len(DATA) - 1),
+])
+def test_range(request_, header, start, end):
+    status, headers, body = request_('/data.arm', {'Range': header})
+    assert status == 206
+    assert body == DATA[start:end + 1]
+    assert headers['Content-Range'] == f'bytes {start}-{end}/{len(DATA)}'
+    assert headers['Content-Length'] == str(end - start + 1)
+
+
+@pytest.mark.parametrize('header', ['bytes=10240-', 'bytes=20-10', 'bytes=-0'])
+def test_range_not_satisfiable(request_, header):
+    status, headers, body = request_('/data.arm', {'Range': header})
+    assert status == 416
+    assert body == b''
+    assert headers['Content-Range'] == f'bytes */{len(DATA)}'
+
+
+def test_if_range(request_):
+    _, headers, _ = request_('/data.arm')
+    status, _, body = request_('/data.arm', {'Range': 'bytes=0-9', 'If-Range': headers['ETag']})
+    assert status == 206
+    assert body == DATA[:10]
+
+    # Changed since, the whole file is sent
+    status, _, body = request_('/data.arm', {'Range': 'bytes=0-9', 'If-Range': '"other"'})
+    assert status == 200
+    assert body == DATA
+
+
+@pytest.mark.parametrize('accept, encoding', [
+    ('gzip, deflate, br', 'br'),
+    ('gzip', 'gzip'),
+    ('deflate', None),
+    ('', None),
+])
+def test_precompressed(request_, directory, accept, encoding):
+    status, headers, body = request_('/data.arm', {'Accept-Encoding': accept})
+    assert status == 200
+    assert headers['Content-Encoding'] == encoding
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert headers['Content-Type'] == request_('/data.arm')[1]['Content-Type']
+    ext = {'br': '.br', 'gzip': '.gz', None: ''}[encoding]
+    assert body == (directory / ('data.arm' + ext)).read_bytes()
+
+    # The encodings have their own ETags
+    if encoding is not None:
+        assert headers['ETag'] != request_('/data.arm')[1]['ETag']
+
+
+def test_stale_precompressed(request_, directory):
+    path = directory / 'data.arm'
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+
+    status, headers, body = request_('/data.arm', {'Accept-Encoding': 'gzip, br'})
+    assert status == 200
+    assert headers['Content-Encoding'] is None
+    assert body == DATA
+
+
+def test_logged_sizes(request_, capsys):
+    request_('/data.arm')
+    wait_for_log(capsys, f'GET /data.arm 200 {len(DATA)} B ')
+
+    request_('/data.arm', {'Range': 'bytes=0-99'})
+    wait_for_log(capsys, 'GET /data.arm 206 100 B ')
+
+    # Directory listings are sent without a known copy length
+    _, _, body = request_('/')
+    assert b'data.arm' in body
+    wait_for_log(capsys, f'GET / 200 {len(body)} B ')
@@ -0,0 +1,239 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from arm.lib import texture
+
+
+def _decode_hdr(data):
+    header_end = data.index(b'\n\n') + 2
+    resolution_end = data.index(b'\n', header_end)
+    _, height, _, width = data[header_end:resolution_end].split()
+    rgbe = np.frombuffer(data, dtype=np.uint8, offset=resolution_end + 1).reshape(int(height), int(width), 4)
+    scale = np.where(rgbe[:, :, 3] > 0, np.ldexp(1.0, rgbe[:, :, 3].astype(np.int64) - 136), 0.0)
+    return (rgbe[:, :, :3] + 0.5) * scale[:, :, None]
+
+
+def test_hdr_round_trip():
+    rng = np.random.default_rng(0)
+    pixels = np.exp(rng.uniform(-8.0, 8.0, (16, 24, 4))).astype(np.float32)
+    pixels[0, 0] = 0.0
+
+    data = texture.encode_hdr(pixels)
+    assert data.startswith(b'#?RADIANCE\n')
+    decoded = _decode_hdr(data)
+    assert decoded.shape == (16, 24, 3)
+    assert np.all(decoded[0, 0] == 0.0)
+
+    # Components share the exponent of the brightest one
+    brightest = pixels[:, :, :3].max(axis=2, keepdims=True)
+    assert np.all(np.abs(decoded - pixels[:, :, :3]) <= brightest / 128.0)
+
+
+def _unfilter_png(data):
+    """Decode an 8 bit, non-interlaced PNG written by encode_png(), with
+    any of the five row filters."""
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    pos = 8
+    idat = b''
+    while pos < len(data):
+        length, = struct.unpack_from('>I', data, pos)
+        chunk_type = data[pos + 4:pos + 8]
+        chunk = data[pos + 8:pos + 8 + length]
+        assert struct.unpack_from('>I', data, pos + 8 + length)[0] == zlib.crc32(chunk_type + chunk)
+        if chunk_type == b'IHDR':
+            width, height, depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', chunk)
+            assert depth == 8 and interlace == 0
+        elif chunk_type == b'IDAT':
+            idat += chunk
+        pos += 12 + length
+
+    channels = {0: 1, 4: 2, 2: 3, 6: 4}[color_type]
+    stride = width * channels
+    raw = zlib.decompress(idat)
+    assert len(raw) == height * (stride + 1)
+
+    out = np.zeros((height, stride), dtype=np.int64)
+    for y in range(height):
+        filter_type = raw[y * (stride + 1)]
+        line = np.frombuffer(raw, dtype=np.uint8, count=stride, offset=y * (stride + 1) + 1).astype(np.int64)
+        prior = out[y - 1] if y > 0 else np.zeros(stride, dtype=np.int64)
+        for x in range(stride):
+            a = out[y, x - channels] if x >= channels else 0
+            b = prior[x]
+            c = prior[x - channels] if x >= channels else 0
+            if filter_type == 0:
+                predictor = 0
+            elif filter_type == 1:
+                predictor = a
+            elif filter_type == 2:
+                predictor = b
+            elif filter_type == 3:
+                predictor = (a + b) // 2
+            else:
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                predictor = a if pa <= pb and pa <= pc else b if pb <= pc else c
+            out[y, x] = (line[x] + predictor) & 0xff
+    return out.astype(np.uint8).reshape(height, width, channels)
+
+
+class _BitReader:
+    def __init__(self, data):
+        # Remove the zero bytes stuffed after 0xFF
+        self.data = data.replace(b'\xff\x00', b'\xff')
+        self.pos = 0
+
+    def bit(self):
+        byte = self.data[self.pos >> 3]
+        value = (byte >> (7 - (self.pos & 7))) & 1
+        self.pos += 1
+        return value
+
+    def bits(self, count):
+        value = 0
+        for _ in range(count):
+            value = value << 1 | self.bit()
+        return value
+
+    def huffman(self, table):
+        code, length = 0, 0
+        while True:
+            code = code << 1 | self.bit()
+            length += 1
+            if (length, code) in table:
+                return table[(length, code)]
+            assert length < 16
+
+    def receive_extend(self, size):
+        if size == 0:
+            return 0
+        value = self.bits(size)
+        return value if value >= 1 << (size - 1) else value - (1 << size) + 1
+
+
+def _decode_jpeg(data):
+    """Decode a baseline JPEG without chroma subsampling or restart
+    intervals, as written by encode_jpeg()."""
+    assert data[:2] == b'\xff\xd8' and data[-2:] == b'\xff\xd9'
+    quant, huffman = {}, {}
+    pos = 2
+    while True:
+        marker = data[pos + 1]
+        length, = struct.unpack_from('>H', data, pos + 2)
+        segment = data[pos + 4:pos + 2 + length]
+        pos += 2 + length
+        if marker == 0xdb:
+            assert segment[0] >> 4 == 0
+            quant[segment[0] & 15] = np.frombuffer(segment, dtype=np.uint8, count=64, offset=1).astype(np.float64)
+        elif marker == 0xc4:
+            bits, values = segment[1:17], segment[17:]
+            table, code, k = {}, 0, 0
+            for length_index, count in enumerate(bits):
+                for _ in range(count):
+                    table[(length_index + 1, code)] = values[k]
+                    code += 1
+                    k += 1
+                code <<= 1
+            huffman[segment[0]] = table
+        elif marker == 0xc0:
+            height, width, num_components = struct.unpack_from('>HHB', segment, 1)
+            components = [segment[6 + 3 * i:9 + 3 * i] for i in range(num_components)]
+            assert all(c[1] == 0x11 for c in components)
+        elif marker == 0xda:
+            scan = [(segment[1 + 2 * i], segment[2 + 2 * i]) for i in range(segment[0])]
+            break
+
+    zigzag = sorted(range(64), key=lambda i: (i // 8 + i % 8, i // 8 if (i // 8 + i % 8) % 2 else -(i // 8)))
+    idct = np.array([[(np.sqrt(0.125) if u == 0 else 0.5) * np.cos((2 * x + 1) * u * np.pi / 16) for u in range(8)] for x in range(8)])
+
+    reader = _BitReader(data[pos:-2])
+    blocks_h, blocks_w = (height + 7) // 8, (width + 7) // 8
+    planes = np.zeros((num_components, blocks_h * 8, blocks_w * 8))
+    predictions = [0] * num_components
+    for by in range(blocks_h):
+        for bx in range(blocks_w):
+            for i, (component_id, table_ids) in enumerate(scan):
+                q = quant[components[i][2]]
+                dc_table, ac_table = huffman[table_ids >> 4], huffman[0x10 | table_ids & 15]
+                coeffs = np.zeros(64)
+                predictions[i] += reader.receive_extend(reader.huffman(dc_table))
+                coeffs[0] = predictions[i]
+                k = 1
+                while k < 64:
+                    symbol = reader.huffman(ac_table)
+                    if symbol == 0:
+                        break
+                    k += symbol >> 4
+                    coeffs[k] = reader.receive_extend(symbol & 15)
+                    k += 1
+                block = np.zeros(64)
+                block[zigzag] = coeffs * q
+                planes[i, by * 8:by * 8 + 8, bx * 8:bx * 8 + 8] = idct @ block.reshape(8, 8) @ idct.T
+
+    planes = planes[:, :height, :width]
+    if num_components == 1:
+        return np.clip(planes[0] + 128.0, 0.0, 255.0)
+    y, cb, cr = planes[0] + 128.0, planes[1], planes[2]
+    rgb = np.stack((y + 1.402 * cr, y - 0.344136 * cb - 0.714136 * cr, y + 1.772 * cb), axis=2)
+    return np.clip(rgb, 0.0, 255.0)
+
+
+def _test_image(height, width, channels):
+    """Smooth gradients with some noise, like a photo texture."""
+    rng = np.random.default_rng(height * 100 + width)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([127.5 + 100.0 * np.sin(x * (0.1 + 0.05 * c) + y * 0.07 * (c + 1)) for c in range(channels)], axis=2)
+    pixels += rng.normal(0.0, 4.0, pixels.shape)
+    return np.clip(pixels + 0.5, 0, 255).astype(np.uint8)
+
+
+# Sizes that are not multiples of the 8x8 JPEG blocks or of 16
+SIZES = [(1, 1), (7, 5), (8, 8), (13, 29), (16, 16), (21, 40), (33, 17)]
+
+
+@pytest.mark.parametrize('channels', [1, 2, 3, 4])
+@pytest.mark.parametrize('size', SIZES)
+def test_png_round_trip(size, channels):
+    pixels = _test_image(*size, channels)
+    decoded = _unfilter_png(texture.encode_png(pixels))
+    assert decoded.shape == pixels.shape
+    assert np.array_equal(decoded, pixels)
+
+
+def test_png_2d_grayscale():
+    pixels = _test_image(9, 11, 1)[:, :, 0]
+    assert np.array_equal(_unfilter_png(texture.encode_png(pixels))[:, :, 0], pixels)
+
+
+# Largest mean absolute error per channel value for each quality
+JPEG_ERRORS = {100: 1.0, 90: 3.5, 75: 5.0, 50: 6.5, 10: 14.0}
+
+
+@pytest.mark.parametrize('quality', sorted(JPEG_ERRORS))
+@pytest.mark.parametrize('size', SIZES)
+def test_jpeg_round_trip(size, quality):
+    pixels = _test_image(*size, 4)
+    decoded = _decode_jpeg(texture.encode_jpeg(pixels, quality))
+    assert decoded.shape == (*size, 3)
+    # Alpha is ignored
+    assert np.mean(np.abs(decoded - pixels[:, :, :3])) <= JPEG_ERRORS[quality]
+
+
+@pytest.mark.parametrize('channels', [1, 2])
+@pytest.mark.parametrize('quality', [90, 50])
+def test_jpeg_grayscale(channels, quality):
+    pixels = _test_image(21, 13, channels)
+    decoded = _decode_jpeg(texture.encode_jpeg(pixels, quality))
+    assert decoded.shape == (21, 13)
+    assert np.mean(np.abs(decoded - pixels[:, :, 0])) <= JPEG_ERRORS[quality]
+
+
+def test_jpeg_quality_order():
+    pixels = _test_image(40, 48, 3)
+    errors = [np.mean(np.abs(_decode_jpeg(texture.encode_jpeg(pixels, q)) - pixels)) for q in sorted(JPEG_ERRORS)]
+    sizes = [len(texture.encode_jpeg(pixels, q)) for q in sorted(JPEG_ERRORS)]
+    assert errors == sorted(errors, reverse=True)
+    assert sizes == sorted(sizes)